@@ -122,6 +122,7 @@ class Controller(threading.Thread):
     self.get_heartbeat_interval = functools.partial(self.netutil.get_agent_heartbeat_idle_interval_sec, self.heartbeat_idle_interval_min, self.heartbeat_idle_interval_max)
 
     self.recovery_manager = RecoveryManager(recovery_cache_dir)
+    ExitHelper().register(self.recovery_manager.flush_actions)
 
     self.cluster_configuration = ClusterConfiguration(cluster_config_cache_dir)
 
@@ -19,6 +19,7 @@ limitations under the License.
 '''
 
 import AmbariConfig
+import heapq
 import threading
 import os
 import time
@@ -32,6 +33,12 @@ class DataCleaner(threading.Thread):
   AUTO_COMMAND_FILE_NAMES_PATTERN = \
     'auto_command-\d+.json|auto_errors-\d+.txt|auto_output-\d+.txt|auto_structured-out-\d+.json'
   FILE_NAME_PATTERN = AUTO_COMMAND_FILE_NAMES_PATTERN + "|" + COMMAND_FILE_NAMES_PATTERN
+  # Between full scans of the data directory (one per that many seconds) only the directories
+  # changed since the previous cleanup are listed
+  FULL_SCAN_INTERVAL = 86400
+  # Files removed before pausing, so that a big cleanup does not starve command execution
+  REMOVE_BATCH_SIZE = 1000
+  REMOVE_BATCH_PAUSE = 0.5
 
   def __init__(self, config):
     threading.Thread.__init__(self)
@@ -64,47 +71,195 @@ class DataCleaner(threading.Thread):
     self.compiled_pattern = re.compile(self.FILE_NAME_PATTERN)
     self.stopped = False
 
+    # (mtime, path) heap of the kept command files, oldest first. Entries not matching
+    # self.files any more are stale and skipped.
+    self.files_index = []
+    # path -> (mtime, size) of the kept command files
+    self.files = {}
+    self.total_size_bytes = 0
+    # directory -> (mtime when it was listed, subdirectories, command files)
+    self.dirs_index = {}
+    self.last_full_scan = None
+    # start time of the previous scan, full or incremental
+    self.last_scan = None
+    self.removed_files = 0
+
   def __del__(self):
     logger.info('Data cleanup thread killed.')
 
   def cleanup(self):
     logger.debug("Cleaning up inside directory " + self.data_dir)
     now = time.time()
-    total_size_bytes = 0
-    file_path_to_timestamp = {}
-    file_path_to_size = {}
+    if self.last_full_scan is None or now - self.last_full_scan >= self.FULL_SCAN_INTERVAL:
+      self.full_scan()
+      self.last_full_scan = now
+    else:
+      self.incremental_scan(self.data_dir)
+    self.last_scan = now
+
+    self.remove_expired()
+    self.remove_oldest_over_size()
+
+  def full_scan(self):
+    """
+    Walk the whole data directory, removing expired files and rebuilding the index of the rest.
+    """
+    now = time.time()
+    self.files_index = []
+    self.files = {}
+    self.dirs_index = {}
+    self.total_size_bytes = 0
 
     for root, dirs, files in os.walk(self.data_dir):
+      dir_files = []
       for f in files:
         file_path = os.path.join(root, f)
         if self.compiled_pattern.match(f):
           try:
-            file_age = now - os.path.getmtime(file_path)
-            if file_age > self.file_max_age:
-              os.remove(os.path.join(file_path))
+            file_mtime = os.path.getmtime(file_path)
+            if now - file_mtime > self.file_max_age:
+              self.remove_file(file_path)
               logger.debug('Removed file: ' + file_path)
             else:
               # Since file wasn't deleted in first pass, consider it for the second one with oldest files first
-              file_size = os.path.getsize(file_path)
-              total_size_bytes += file_size
-              file_path_to_timestamp[file_path] = file_age
-              file_path_to_size[file_path] = file_size
+              self.index_file(file_path, file_mtime, os.path.getsize(file_path))
+              dir_files.append(file_path)
           except Exception:
             logger.error('Error when removing file: ' + file_path)
+      # listed again on the next incremental scan, files created during the walk may have been missed
+      self.dirs_index[root] = (None, [os.path.join(root, d) for d in dirs], dir_files)
+
+  def incremental_scan(self, dir_path):
+    """
+    Bring the index up to date with the directories modified since the previous scan. Those are
+    listed again: files which are gone are dropped from the index and new files are stat-ed. Indexed
+    files are stat-ed again only if they were modified shortly before the previous scan, since the
+    command writing them may still have been running. Other changes are caught up with by the next
+    full scan.
+    """
+    try:
+      dir_mtime = os.stat(dir_path).st_mtime
+    except OSError:
+      self.forget_dir(dir_path)
+      return
+
+    if dir_path in self.dirs_index and self.dirs_index[dir_path][0] == dir_mtime:
+      subdirs = self.dirs_index[dir_path][1]
+    else:
+      if dir_path in self.dirs_index:
+        old_subdirs, old_files = self.dirs_index[dir_path][1:]
+      else:
+        old_subdirs, old_files = [], []
+      subdirs = []
+      dir_files = []
+      for f in os.listdir(dir_path):
+        file_path = os.path.join(dir_path, f)
+        try:
+          if self.compiled_pattern.match(f):
+            if file_path not in self.files or self.files[file_path][0] >= self.last_scan - self.cleanup_interval:
+              st = os.stat(file_path)
+              self.index_file(file_path, st.st_mtime, st.st_size)
+            dir_files.append(file_path)
+          elif os.path.isdir(file_path) and not os.path.islink(file_path):
+            subdirs.append(file_path)
+        except OSError:
+          pass # removed meanwhile
+
+      for file_path in set(old_files).difference(dir_files):
+        self.unindex_file(file_path)
+      for subdir in set(old_subdirs).difference(subdirs):
+        self.forget_dir(subdir)
+      self.dirs_index[dir_path] = (dir_mtime, subdirs, dir_files)
+
+    for subdir in subdirs:
+      self.incremental_scan(subdir)
+
+  def forget_dir(self, dir_path):
+    """
+    Drop a directory which is gone, along with everything indexed below it.
+    """
+    if dir_path not in self.dirs_index:
+      return
+    dir_mtime, subdirs, dir_files = self.dirs_index.pop(dir_path)
+    for file_path in dir_files:
+      self.unindex_file(file_path)
+    for subdir in subdirs:
+      self.forget_dir(subdir)
+
+  def index_file(self, file_path, file_mtime, file_size):
+    """
+    Index the file or update its entry, if it has changed since it was indexed.
+    """
+    if file_path in self.files:
+      if self.files[file_path] == (file_mtime, file_size):
+        return
+      self.unindex_file(file_path)
+    heapq.heappush(self.files_index, (file_mtime, file_path))
+    self.files[file_path] = (file_mtime, file_size)
+    self.total_size_bytes += file_size
+
+  def unindex_file(self, file_path):
+    """
+    Drop the file from the index, its heap entry becomes stale.
+    """
+    if file_path in self.files:
+      self.total_size_bytes -= self.files.pop(file_path)[1]
+      # compact the heap once stale entries make up most of it
+      if len(self.files_index) > 2 * len(self.files) + self.REMOVE_BATCH_SIZE:
+        self.files_index = [(file_mtime, path) for path, (file_mtime, file_size) in self.files.iteritems()]
+        heapq.heapify(self.files_index)
+
+  def skip_stale_files(self):
+    while self.files_index:
+      file_mtime, file_path = self.files_index[0]
+      if file_path in self.files and self.files[file_path][0] == file_mtime:
+        break
+      heapq.heappop(self.files_index)
+
+  def pop_oldest_file(self):
+    self.skip_stale_files()
+    file_mtime, file_path = heapq.heappop(self.files_index)
+    self.total_size_bytes -= self.files.pop(file_path)[1]
+    return file_mtime, file_path
+
+  def remove_file(self, file_path):
+    os.remove(file_path)
+    # Yield to command execution every now and then when removing lots of files
+    self.removed_files += 1
+    if self.removed_files % self.REMOVE_BATCH_SIZE == 0:
+      time.sleep(self.REMOVE_BATCH_PAUSE)
+
+  def remove_expired(self):
+    now = time.time()
+    self.skip_stale_files()
+    while self.files_index and now - self.files_index[0][0] > self.file_max_age:
+      file_mtime, file_path = self.pop_oldest_file()
+      try:
+        # The file may have been written to since it was indexed
+        actual_mtime = os.path.getmtime(file_path)
+        if actual_mtime != file_mtime:
+          self.index_file(file_path, actual_mtime, os.path.getsize(file_path))
+        else:
+          self.remove_file(file_path)
+          logger.debug('Removed file: ' + file_path)
+      except OSError:
+        if os.path.exists(file_path):
+          logger.error('Error when removing file: ' + file_path)
+      self.skip_stale_files()
 
+  def remove_oldest_over_size(self):
     target_size_bytes = self.cleanup_max_size_MB * 1000000
-    if len(file_path_to_timestamp) and total_size_bytes > target_size_bytes:
+    if self.files and self.total_size_bytes > target_size_bytes:
       logger.info("DataCleaner values need to be more aggressive. Current size in bytes for all log files is %d, "
-                  "and will try to clean to reach %d bytes." % (total_size_bytes, target_size_bytes))
+                  "and will try to clean to reach %d bytes." % (self.total_size_bytes, target_size_bytes))
       # Prune oldest files first
       count = 0
-      file_path_oldest_first_list = sorted(file_path_to_timestamp, key=file_path_to_timestamp.get, reverse=True)
-      for file_path in file_path_oldest_first_list:
+      while self.files:
+        file_mtime, file_path = self.pop_oldest_file()
         try:
-          os.remove(os.path.join(file_path))
-          total_size_bytes -= file_path_to_size[file_path]
+          self.remove_file(file_path)
           count += 1
-          if total_size_bytes <= target_size_bytes:
+          if self.total_size_bytes <= target_size_bytes:
             # Finally reached below the cap
             break
         except Exception:
@@ -112,7 +267,7 @@ class DataCleaner(threading.Thread):
       else:
         # Did not reach below cap.
         logger.warn("DataCleaner deleted an additional %d files, currently log files occupy %d bytes." %
-                    (count, total_size_bytes))
+                    (count, self.total_size_bytes))
         pass
 
   def run(self):
@@ -33,6 +33,8 @@ import time
 import uuid
 import json
 import glob
+import threading
+from functools import wraps
 from AmbariConfig import AmbariConfig
 from ambari_commons import OSCheck, OSConst
 from ambari_commons.os_family_impl import OsFamilyImpl
@@ -52,6 +54,27 @@ def run_os_command(cmd):
   return process.returncode, stdoutdata, stderrdata
 
 
+_static_facts = {}
+_static_facts_lock = threading.RLock()
+
+def static_fact(func):
+  """
+  Computes a fact that can not change while the agent is running (OS, kernel, CPU
+  architecture, memory size ...) only once and returns the cached value afterwards.
+  """
+  @wraps(func)
+  def wrapper(self):
+    with _static_facts_lock:
+      if func.__name__ not in _static_facts:
+        _static_facts[func.__name__] = func(self)
+      return _static_facts[func.__name__]
+  return wrapper
+
+def clear_static_facts():
+  with _static_facts_lock:
+    _static_facts.clear()
+
+
 class Facter(object):
   def __init__(self, config):
     """
@@ -85,6 +108,7 @@ class Facter(object):
     return getpass.getuser()
 
   # Returns the OS name
+  @static_fact
   def getKernel(self):
     return platform.system()
 
@@ -101,6 +125,7 @@ class Facter(object):
     return self.getFqdn().split('.', 1)[0]
 
   # Returns the CPU hardware architecture
+  @static_fact
   def getArchitecture(self):
     result = platform.processor()
     if not result:
@@ -113,10 +138,12 @@ class Facter(object):
       return result
 
   # Returns the full name of the OS
+  @static_fact
   def getOperatingSystem(self):
     return OSCheck.get_os_type()
 
   # Returns the OS version
+  @static_fact
   def getOperatingSystemRelease(self):
     return OSCheck.get_os_version()
 
@@ -126,23 +153,26 @@ class Facter(object):
 
 
   # Returns the CPU count
+  @static_fact
   def getProcessorcount(self):
     return multiprocessing.cpu_count()
 
   # Returns the Kernel release
+  @static_fact
   def getKernelRelease(self):
     return platform.release()
 
 
   # Returns the Kernel release version
   def getKernelVersion(self):
-    kernel_release = platform.release()
+    kernel_release = self.getKernelRelease()
     return kernel_release.split('-', 1)[0]
 
   # Returns the major kernel release version
   def getKernelMajVersion(self):
     return '.'.join(self.getKernelVersion().split('.', 2)[0:2])
 
+  @static_fact
   def getMacAddress(self):
     mac = uuid.getnode()
     if uuid.getnode() == mac:
@@ -152,7 +182,7 @@ class Facter(object):
     return mac
 
   # Returns the operating system family
-
+  @static_fact
   def getOsFamily(self):
     return OSCheck.get_os_family()
 
@@ -376,8 +406,8 @@ class FacterLinux(Facter):
   GET_SE_LINUX_ST_CMD = "/usr/sbin/sestatus"
   GET_IFCONFIG_SHORT_CMD = "ifconfig -s"
   GET_IP_LINK_CMD = "ip link"
-  GET_UPTIME_CMD = "cat /proc/uptime"
-  GET_MEMINFO_CMD = "cat /proc/meminfo"
+  UPTIME_FILE = "/proc/uptime"
+  MEMINFO_FILE = "/proc/meminfo"
 
   def __init__(self, config):
     super(FacterLinux,self).__init__(config)
@@ -408,30 +438,30 @@ class FacterLinux(Facter):
       log.warn("Can't execute {0}".format(FacterLinux.GET_IP_LINK_CMD))
     return ""
 
+  # Returns the content of /proc/uptime
   @staticmethod
   def setDataUpTimeOutput():
+    return FacterLinux.read_proc_file(FacterLinux.UPTIME_FILE)
 
-    try:
-      result = os.popen(FacterLinux.GET_UPTIME_CMD).read()
-      return result
-    except OSError:
-      log.warn("Can't execute {0}".format(FacterLinux.GET_UPTIME_CMD))
-    return ""
-
+  # Returns the content of /proc/meminfo
   @staticmethod
   def setMemInfoOutput():
+    return FacterLinux.read_proc_file(FacterLinux.MEMINFO_FILE)
 
+  @staticmethod
+  def read_proc_file(path):
     try:
-      result = os.popen(FacterLinux.GET_MEMINFO_CMD).read()
-      return result
-    except OSError:
-      log.warn("Can't execute {0}".format(FacterLinux.GET_MEMINFO_CMD))
+      with open(path) as fp:
+        return fp.read()
+    except IOError:
+      log.warn("Can't read {0}".format(path))
     return ""
 
   # Returns the FQDN of the host
   def getFqdn(self):
     return hostname.hostname(self.config)
 
+  @static_fact
   def isSeLinux(self):
 
     try:
@@ -533,6 +563,7 @@ class FacterLinux(Facter):
       return 0
 
   # Return memorytotal
+  @static_fact
   def getMemoryTotal(self):
     try:
       return int(self.data_return_first("MemTotal:.*?(\d+) .*", self.DATA_MEMINFO_OUTPUT))
@@ -559,6 +590,7 @@ class FacterLinux(Facter):
       return 0
 
   # Return memorysize
+  @static_fact
   def getMemorySize(self):
     #:memorysize_mb => "MemTotal"
     try:
@@ -20,8 +20,9 @@ limitations under the License.
 
 import os.path
 import logging
-import subprocess
-from resource_management.core import shell
+import threading
+import time
+from collections import OrderedDict
 from resource_management.core.shell import call
 from resource_management.core.exceptions import ExecuteTimeoutException, Fail
 from ambari_commons.shell import shellRunner
@@ -42,7 +43,14 @@ class Hardware:
   CHECK_REMOTE_MOUNTS_TIMEOUT_DEFAULT = '10'
   IGNORE_ROOT_MOUNTS = ["proc", "dev", "sys"]
   IGNORE_DEVICES = ["proc", "tmpfs", "cgroup", "mqueue", "shm"]
+  REMOTE_FS_TYPES = ["nfs", "nfs4", "cifs", "smbfs", "ncpfs", "afs", "coda", "ceph", "glusterfs", "lustre", "gpfs",
+                     "9p", "davfs", "fuse.sshfs", "fuse.glusterfs", "fuse.ceph", "fuse.s3fs"]
   LINUX_PATH_SEP = "/"
+  MOUNTS_FILE = "/proc/mounts"
+
+  # mount point -> thread of a mount check which timed out and is still blocked
+  _hanging_mount_checks = {}
+  _hanging_mount_checks_lock = threading.Lock()
 
   def __init__(self, config):
     self.hardware = {
@@ -52,26 +60,133 @@ class Hardware:
     self.hardware.update(Facter(self.config).facterInfo())
 
   @classmethod
-  def _parse_df_line(cls, line):
+  def _parse_mounts_line(cls, line):
     """
-      Initialize data-structure from string in specific 'df' command output format
+      Initialize data-structure from a line of /proc/mounts
 
       Expected string format:
-       device fs_type disk_size used_size available_size capacity_used_percents mount_point
+       device mount_point fs_type options dump pass
 
     :type line str
     """
 
     line_split = line.split()
-    if len(line_split) != 7:
+    if len(line_split) < 3:
       return None
 
-    titles = ["device", "type", "size", "used", "available", "percent", "mountpoint"]
-    return dict(zip(titles, line_split))
+    # spaces and tabs in the mount point are escaped as octal sequences (\040)
+    device, mountpoint, fs_type = [item.decode("string_escape") for item in line_split[:3]]
+    return {"device": device, "type": fs_type, "mountpoint": mountpoint}
+
+  @classmethod
+  def _read_mounts(cls):
+    """Return mounted filesystems, without forking and touching them"""
+    try:
+      with open(cls.MOUNTS_FILE) as fp:
+        lines = fp.readlines()
+    except IOError as ex:
+      logger.warn("Reading {0} failed: {1}".format(cls.MOUNTS_FILE, str(ex)))
+      return []
+
+    # a mount point can be mounted over several times, only the last mount is visible
+    mounts = OrderedDict()
+    for line in lines:
+      mount = cls._parse_mounts_line(line)
+      if mount:
+        mounts.pop(mount["mountpoint"], None)
+        mounts[mount["mountpoint"]] = mount
+
+    return mounts.values()
+
+  @classmethod
+  def _get_mount_usage(cls, mount_point):
+    """
+    Return size, used and available kB and used percents of the filesystem the same way 'df -kP' does,
+    None for the pseudo filesystems (proc, sysfs, ...) which 'df' does not show either.
+    """
+    st = os.statvfs(mount_point)
+    if st.f_blocks == 0:
+      return None
+
+    size = st.f_blocks * st.f_frsize / 1024
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize / 1024
+    available = st.f_bavail * st.f_frsize / 1024
+    # df rounds the percentage up
+    percent = (used * 100 + used + available - 1) / (used + available) if used + available else 0
+
+    return {
+      "size": str(size),
+      "used": str(used),
+      "available": str(available),
+      "percent": "{0}%".format(percent)
+    }
+
+  @classmethod
+  def _check_mount(cls, mount, result):
+    """
+    Collect usage of the mount and check whether it may be used. Runs in a separate thread, as every
+    call touching the filesystem may block on an unresponsive remote mount.
+    """
+    try:
+      usage = cls._get_mount_usage(mount["mountpoint"])
+      if usage is None:
+        return
+
+      result.update(mount)
+      result.update(usage)
+      result["usable"] = mount["device"] not in cls.IGNORE_DEVICES and\
+                         mount["mountpoint"].split("/")[0] not in cls.IGNORE_ROOT_MOUNTS and\
+                         cls._chk_writable_mount(mount["mountpoint"]) and\
+                         not path_isfile(mount["mountpoint"])
+    except Exception as ex:
+      logger.warn("Checking mount {0} failed: {1}".format(mount["mountpoint"], str(ex)))
+      result.clear()
+
+  @classmethod
+  def _check_mounts(cls, mounts, timeout):
+    """
+    Check all mounts in parallel, giving up on the ones which did not answer within timeout seconds.
+    A mount whose previous check is still blocked is not checked again until that check returns.
+    """
+    checks = []
+    with cls._hanging_mount_checks_lock:
+      for mount in mounts:
+        hanging_check = cls._hanging_mount_checks.get(mount["mountpoint"])
+        if hanging_check and hanging_check.is_alive():
+          logger.warn("Previous check of mount {0} is still blocked, skipping it".format(mount["mountpoint"]))
+          continue
+
+        result = {}
+        check = threading.Thread(target=cls._check_mount, args=(mount, result),
+                                 name="Mount check {0}".format(mount["mountpoint"]))
+        check.daemon = True
+        check.start()
+        checks.append((mount, check, result))
+
+    deadline = time.time() + timeout
+    checked_mounts = []
+    for mount, check, result in checks:
+      check.join(max(0, deadline - time.time()))
+      with cls._hanging_mount_checks_lock:
+        if check.is_alive():
+          logger.warn("Checking mount {0} timed out after {1} seconds".format(mount["mountpoint"], timeout))
+          cls._hanging_mount_checks[mount["mountpoint"]] = check
+          continue
+        cls._hanging_mount_checks.pop(mount["mountpoint"], None)
+
+      if result:
+        checked_mounts.append(result)
+
+    return checked_mounts
+
+  @classmethod
+  def _is_remote_mount(cls, mount):
+    return mount["type"] in cls.REMOTE_FS_TYPES or mount["device"].startswith("//") or\
+           (":" in mount["device"] and not mount["device"].startswith("/"))
 
   @classmethod
   def _get_mount_check_timeout(cls, config=None):
-    """Return timeout for df call command"""
+    """Return timeout for checking a mount"""
     if config and config.has_option(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_TIMEOUT_KEY) \
       and config.get(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_TIMEOUT_KEY) != "0":
 
@@ -123,35 +238,32 @@ class Hardware:
   @classmethod
   @OsFamilyFuncImpl(OsFamilyImpl.DEFAULT)
   def osdisks(cls, config=None):
-    """ Run df to find out the disks on the host. Only works on linux
-    platforms. Note that this parser ignores any filesystems with spaces
-    and any mounts with spaces. """
-    timeout = cls._get_mount_check_timeout(config)
-    command = ["timeout", timeout, "df", "-kPT"]
+    """ Find out the disks on the host from /proc/mounts and statvfs, without
+    forking 'df'. Only works on linux platforms. Every mount is checked in a
+    separate thread, so a hanging remote mount only loses its own entry. """
+    timeout = int(cls._get_mount_check_timeout(config))
+    check_remote_mounts = cls._check_remote_mounts(config)
     blacklisted_mount_points = []
 
     if config:
       ignore_mount_value = config.get("agent", "ignore_mount_points", default="")
-      blacklisted_mount_points = [item.strip() for item in ignore_mount_value.split(",")]
-
-    if not cls._check_remote_mounts(config):
-      command.append("-l")
-
-    try:
-      code, out, err = shell.call(command, stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = int(timeout), quiet = True)
-      dfdata = out
-    except Exception as ex:
-      logger.warn("Checking disk usage failed: " + str(ex))
-      dfdata = ''
+      blacklisted_mount_points = [item.strip() for item in ignore_mount_value.split(",") if item.strip()]
 
-    mounts = [cls._parse_df_line(line) for line in dfdata.splitlines() if line]
-    result_mounts = []
+    mounts_to_check = []
     ignored_mounts = []
 
-    for mount in mounts:
-      if not mount:
+    # blacklisted and (if configured so) remote mounts must not be touched at all
+    for mount in cls._read_mounts():
+      if cls._is_mount_blacklisted(blacklisted_mount_points, mount["mountpoint"]):
+        ignored_mounts.append(mount)
+      elif not check_remote_mounts and cls._is_remote_mount(mount):
         continue
+      else:
+        mounts_to_check.append(mount)
+
+    result_mounts = []
 
+    for mount in cls._check_mounts(mounts_to_check, timeout):
       """
       We need to filter mounts by several parameters:
        - mounted device is not in the ignored list
@@ -159,12 +271,7 @@ class Hardware:
        - it is not file-mount (docker environment)
        - mount path or a part of mount path is not in the blacklist
       """
-      if mount["device"] not in cls.IGNORE_DEVICES and\
-         mount["mountpoint"].split("/")[0] not in cls.IGNORE_ROOT_MOUNTS and\
-         cls._chk_writable_mount(mount['mountpoint']) and\
-         not path_isfile(mount["mountpoint"]) and\
-         not cls._is_mount_blacklisted(blacklisted_mount_points, mount["mountpoint"]):
-
+      if mount.pop("usable"):
         result_mounts.append(mount)
       else:
         ignored_mounts.append(mount)
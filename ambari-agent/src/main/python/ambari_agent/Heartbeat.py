@@ -39,6 +39,8 @@ class Heartbeat:
     self.config = config
     self.reports = []
     self.collector = alert_collector
+    # Kept between heartbeats, it only collects what changed since the previous one
+    self.hostInfo = HostInfo(self.config)
 
   def build(self, id='-1', add_state=False, componentsMapped=False):
     global clusterId, clusterDefinitionRevision, firstContact
@@ -85,13 +87,12 @@ class Heartbeat:
 
     logger.debug("Heartbeat: %s", pformat(heartbeat))
 
-    hostInfo = HostInfo(self.config)
     if add_state:
       logger.info("Adding host info/state to heartbeat message.")
       nodeInfo = { }
       # for now, just do the same work as registration
       # this must be the last step before returning heartbeat
-      hostInfo.register(nodeInfo, componentsMapped, commandsInProgress)
+      self.hostInfo.register(nodeInfo, componentsMapped, commandsInProgress)
       heartbeat['agentEnv'] = nodeInfo
       mounts = Hardware.osdisks(self.config)
       heartbeat['mounts'] = mounts
@@ -175,8 +175,17 @@ class HostInfoLinux(HostInfo):
   THP_FILE_REDHAT = "/sys/kernel/mm/redhat_transparent_hugepage/enabled"
   THP_FILE_UBUNTU = "/sys/kernel/mm/transparent_hugepage/enabled"
 
+  # Only the pids which appeared since the previous scan are read from /proc. Every that many seconds
+  # all of them are read again, which catches a pid reused between two scans.
+  JAVA_PROCS_FULL_SCAN_INTERVAL = 600
+
   def __init__(self, config=None):
     super(HostInfoLinux, self).__init__(config)
+    # pid -> java process details, None for the processes which are not reported
+    self.java_procs_cache = {}
+    self.java_procs_full_scan_time = 0
+    # check name -> (modification times of the paths the check depends on, result)
+    self.checks_cache = {}
 
   def checkUsers(self, users, results):
     f = open('/etc/passwd', 'r')
@@ -213,37 +222,76 @@ class HostInfoLinux(HostInfo):
       logger.exception("Checking folders failed")
 
   def javaProcs(self, list):
-    import pwd
-
     try:
+      if time.time() - self.java_procs_full_scan_time > self.JAVA_PROCS_FULL_SCAN_INTERVAL:
+        self.java_procs_cache = {}
+        self.java_procs_full_scan_time = time.time()
+
       pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+      # the pids which went away since the previous scan are dropped from the cache
+      java_procs_cache = {}
       for pid in pids:
-        try:
-          fp = open(os.path.join('/proc', pid, 'cmdline'), 'rb')
-        except IOError:
-          continue # avoid race condition if this process already died, since the moment we got pids list.
-
-        cmd = fp.read()
-        fp.close()
-        cmd = cmd.replace('\0', ' ')
-        if not 'AmbariServer' in cmd:
-          if 'java' in cmd:
-            dict = {}
-            dict['pid'] = int(pid)
-            dict['hadoop'] = False
-            for filter in self.PROC_FILTER:
-              if filter in cmd:
-                dict['hadoop'] = True
-            dict['command'] = unicode(cmd.strip(), errors='ignore')
-            for line in open(os.path.join('/proc', pid, 'status')):
-              if line.startswith('Uid:'):
-                uid = int(line.split()[1])
-                dict['user'] = pwd.getpwuid(uid).pw_name
-            list.append(dict)
+        if pid in self.java_procs_cache:
+          dict = self.java_procs_cache[pid]
+        else:
+          try:
+            dict = self.readJavaProc(pid)
+          except IOError:
+            continue # avoid race condition if this process already died, since the moment we got pids list.
+
+        java_procs_cache[pid] = dict
+        if dict is not None:
+          list.append(dict)
+      self.java_procs_cache = java_procs_cache
     except:
       logger.exception("Checking java processes failed")
     pass
 
+  def readJavaProc(self, pid):
+    """
+    Return details of a java process, None if the process is not java or is the Ambari Server
+    """
+    import pwd
+
+    fp = open(os.path.join('/proc', pid, 'cmdline'), 'rb')
+    cmd = fp.read()
+    fp.close()
+    cmd = cmd.replace('\0', ' ')
+    if 'AmbariServer' in cmd or not 'java' in cmd:
+      return None
+
+    dict = {}
+    dict['pid'] = int(pid)
+    dict['hadoop'] = False
+    for filter in self.PROC_FILTER:
+      if filter in cmd:
+        dict['hadoop'] = True
+    dict['command'] = unicode(cmd.strip(), errors='ignore')
+    for line in open(os.path.join('/proc', pid, 'status')):
+      if line.startswith('Uid:'):
+        uid = int(line.split()[1])
+        dict['user'] = pwd.getpwuid(uid).pw_name
+    return dict
+
+  def getModificationTime(self, path):
+    try:
+      return os.stat(path).st_mtime
+    except OSError:
+      return None
+
+  def runCachedCheck(self, name, paths, check):
+    """
+    Return the result of check(), running it again only if one of the paths
+    it depends on was modified (or created, removed) since the previous run.
+    """
+    signature = [self.getModificationTime(path) for path in paths]
+    if name in self.checks_cache and self.checks_cache[name][0] == signature:
+      return self.checks_cache[name][1]
+
+    result = check()
+    self.checks_cache[name] = (signature, result)
+    return result
+
   def getTransparentHugePage(self):
     thp_regex = "\[(.+)\]"
     file_name = None
@@ -315,17 +363,27 @@ class HostInfoLinux(HostInfo):
       dict['existingUsers'] = []
 
     else:
-      etcs = []
-      self.etcAlternativesConf(self.DEFAULT_PROJECT_NAMES, etcs)
-      dict['alternatives'] = etcs
-
-      existingUsers = []
-      self.checkUsers(self.DEFAULT_USERS, existingUsers)
+      def etcAlternativesConf():
+        etcs = []
+        self.etcAlternativesConf(self.DEFAULT_PROJECT_NAMES, etcs)
+        return etcs
+      # Creating, removing or re-pointing an alternative modifies the directory
+      dict['alternatives'] = self.runCachedCheck('alternatives', ['/etc/alternatives'], etcAlternativesConf)
+
+      def checkUsers():
+        existingUsers = []
+        self.checkUsers(self.DEFAULT_USERS, existingUsers)
+        return existingUsers
+      existingUsers = self.runCachedCheck('existingUsers', ['/etc/passwd'], checkUsers)
       dict['existingUsers'] = existingUsers
 
-      dirs = []
-      self.checkFolders(self.DEFAULT_BASEDIRS, self.DEFAULT_PROJECT_NAMES, self.EXACT_DIRECTORIES, existingUsers, dirs)
-      dict['stackFoldersAndFiles'] = dirs
+      def checkFolders():
+        dirs = []
+        self.checkFolders(self.DEFAULT_BASEDIRS, self.DEFAULT_PROJECT_NAMES, self.EXACT_DIRECTORIES, existingUsers, dirs)
+        return dirs
+      # Home directories of the existing users are not reported, so the result depends on /etc/passwd as well
+      foldersPaths = self.DEFAULT_BASEDIRS + [os.path.dirname(path) for path in self.EXACT_DIRECTORIES] + ['/etc/passwd']
+      dict['stackFoldersAndFiles'] = self.runCachedCheck('stackFoldersAndFiles', foldersPaths, checkFolders)
 
       self.reportFileHandler.writeHostCheckFile(dict)
       pass
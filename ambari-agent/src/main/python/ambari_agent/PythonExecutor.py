@@ -44,6 +44,9 @@ class PythonExecutor(object):
   used as a singleton for a concurrent execution of python scripts
   """
   NO_ERROR = "none"
+  # how many <file>.N backups of a command output file are kept
+  DEFAULT_LOG_BACKUP_COUNT = 10
+  BACKUP_COUNTER_SUFFIX = ".backup_counter"
 
   def __init__(self, tmpDir, config):
     self.grep = Grep()
@@ -67,16 +70,36 @@ class PythonExecutor(object):
     return tmpout, tmperr
 
   def back_up_log_file_if_exists(self, file_path):
-    if os.path.isfile(file_path):
-      counter = 0
-      while True:
-        # Find backup name that is not used yet (saves logs
-        # from multiple command retries)
-        backup_name = file_path + "." + str(counter)
-        if not os.path.isfile(backup_name):
-          break
-        counter += 1
-      os.rename(file_path, backup_name)
+    """
+    Saves logs from multiple command retries. The next backup number is kept in
+    a counter file next to the log, so existing backups never have to be probed,
+    and the backup falling out of the retention window is removed.
+    """
+    if not os.path.isfile(file_path):
+      return
+
+    counter_file = file_path + self.BACKUP_COUNTER_SUFFIX
+    counter = 0
+    try:
+      with open(counter_file, 'r') as f:
+        counter = int(f.read().strip())
+    except (IOError, ValueError):
+      pass
+
+    backup_name = file_path + "." + str(counter)
+    if OSCheck.get_os_family() == OSConst.WINSRV_FAMILY and os.path.exists(backup_name):
+      os.remove(backup_name)
+    os.rename(file_path, backup_name)
+
+    backup_count = int(self.config.get('agent', 'command_log_backup_count', default=self.DEFAULT_LOG_BACKUP_COUNT))
+    if 0 < backup_count <= counter:
+      try:
+        os.remove(file_path + "." + str(counter - backup_count))
+      except OSError:
+        pass
+
+    with open(counter_file, 'w') as f:
+      f.write(str(counter + 1))
 
   def run_file(self, script, script_params, tmpoutfile, tmperrfile,
                timeout, tmpstructedoutfile, callback, task_id,
@@ -59,6 +59,8 @@ class RecoveryManager:
   COMMAND_REFRESH_DELAY_SEC = 600 #10 minutes
 
   FILENAME = "recovery.json"
+  # recovery actions are written behind, at most this many seconds after a change
+  ACTIONS_DUMP_DELAY_SEC = 1
 
   default_action_counter = {
     "lastAttempt": 0,
@@ -95,6 +97,9 @@ class RecoveryManager:
     self.__command_lock = threading.RLock()
     self.__active_command_lock = threading.RLock()
     self.__cache_lock = threading.RLock()
+    self.__dump_lock = threading.Lock()
+    self.__dump_timer = None
+    self.__actions_dirty = False
     self.active_command_count = 0
     self.paused = False
     self.recovery_timestamp = -1
@@ -456,19 +461,58 @@ class RecoveryManager:
       else:
         logger.error("%s occurrences in agent life time reached the limit for %s",
                      action_counter["lifetimeCount"], action_name)
-    self._dump_actions()
+    self._dump_actions_later()
     return executed
     pass
 
 
+  def _dump_actions_later(self):
+    """
+    Schedule a dump of recovery actions. All changes made until the dump runs
+    are written together, so the heartbeat thread never waits for the FS.
+    """
+    with self.__dump_lock:
+      self.__actions_dirty = True
+      if self.__dump_timer is None:
+        self.__dump_timer = threading.Timer(self.ACTIONS_DUMP_DELAY_SEC, self.flush_actions)
+        self.__dump_timer.daemon = True
+        self.__dump_timer.start()
+    pass
+
+
+  def flush_actions(self):
+    """
+    Write pending recovery action changes to FS right away
+    """
+    with self.__dump_lock:
+      if self.__dump_timer is not None:
+        if self.__dump_timer is not threading.current_thread():
+          self.__dump_timer.cancel()
+        self.__dump_timer = None
+      if not self.__actions_dirty:
+        return True
+      self.__actions_dirty = False
+
+    return self._dump_actions()
+    pass
+
+
   def _dump_actions(self):
     """
-    Dump recovery actions to FS
+    Dump recovery actions to FS. The file is replaced atomically, so a crash
+    leaves either the previous or the new content.
     """
     self.__cache_lock.acquire()
     try:
-      with open(self.__actions_json_file, 'w') as f:
-        json.dump(self.actions, f, indent=2)
+      actions = self.get_actions_copy()
+      tmp_file = self.__actions_json_file + ".tmp"
+      with open(tmp_file, 'w') as f:
+        json.dump(actions, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+      if os.name == 'nt' and os.path.exists(self.__actions_json_file):
+        os.remove(self.__actions_json_file)
+      os.rename(tmp_file, self.__actions_json_file)
     except Exception, exception:
       logger.exception("Unable to dump actions to {0}".format(self.__actions_json_file))
       return False
@@ -195,6 +195,7 @@ from ambari_commons.aggregate_functions import sample_standard_deviation_percent
 from ambari_commons.aggregate_functions import sample_standard_deviation
 from ambari_commons.aggregate_functions import mean
 from ambari_commons.aggregate_functions import count
+from ambari_commons.aggregate_functions import percentile
 
 def f(args):
   func = {0}
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+
+
+import math
+import unittest
+from ambari_commons import aggregate_functions
+from ambari_commons.aggregate_functions import RunningStatistics
+
+
+class TestAggregateFunctions(unittest.TestCase):
+
+  def test_aggregates(self):
+    values = [2, 4, 4, 4, 5, 5, 7, 9]
+
+    self.assertEqual(5, aggregate_functions.mean(values))
+    self.assertAlmostEqual(math.sqrt(32 / 7.0), aggregate_functions.sample_standard_deviation(values))
+    self.assertAlmostEqual(math.sqrt(32 / 7.0) / 5 * 100,
+                           aggregate_functions.sample_standard_deviation_percentage(values))
+    self.assertEqual(8, aggregate_functions.count(values))
+    self.assertEqual(8, aggregate_functions.count(iter(values)))
+
+    # generators are consumed in a single pass
+    self.assertEqual(5.0, aggregate_functions.mean(value for value in values))
+
+  def test_few_data_points(self):
+    self.assertEqual(0, aggregate_functions.mean([]))
+    self.assertEqual(0, aggregate_functions.sample_standard_deviation([]))
+    self.assertEqual(0, aggregate_functions.sample_standard_deviation([3]))
+    self.assertEqual(0, aggregate_functions.sample_standard_deviation_percentage([0, 0]))
+    self.assertEqual(0, aggregate_functions.percentile([], 50))
+
+  def test_numerical_stability(self):
+    # a large offset cancels out all precision in the naive sum of squares
+    values = [1e9 + 4, 1e9 + 7, 1e9 + 13, 1e9 + 16]
+    stats = RunningStatistics(values)
+
+    self.assertEqual(4, stats.count)
+    self.assertAlmostEqual(1e9 + 10, stats.mean)
+    self.assertAlmostEqual(30.0, stats.sample_variance())
+    self.assertEqual(1e9 + 4, stats.min)
+    self.assertEqual(1e9 + 16, stats.max)
+
+  def test_percentile(self):
+    values = range(1, 101)
+
+    self.assertEqual(1, aggregate_functions.percentile(values, 0))
+    self.assertAlmostEqual(50.5, aggregate_functions.percentile(values, 50))
+    self.assertAlmostEqual(95.05, aggregate_functions.percentile(values, 95))
+    self.assertEqual(100, aggregate_functions.percentile(values, 100))
+
+  def test_bounded_reservoir(self):
+    stats = RunningStatistics(xrange(100000), reservoir_size=100)
+
+    self.assertEqual(100000, stats.count)
+    self.assertEqual(100, len(stats.reservoir))
+    self.assertAlmostEqual(49999.5, stats.mean)
+    self.assertTrue(0 <= stats.percentile(50) < 100000)
@@ -24,6 +24,8 @@ from mock.mock import patch, MagicMock, call, Mock
 from ambari_agent import DataCleaner
 from ambari_agent import AmbariConfig
 import os
+import shutil
+import tempfile
 from ambari_commons import OSCheck
 from only_for_platform import os_distro_value
 
@@ -122,6 +124,134 @@ class TestDataCleaner(unittest.TestCase):
     self.assertTrue(DataCleaner.logger.error.call_count == 1)
     pass
 
+  @patch('time.time')
+  def test_cleanup_incremental(self, timeMock):
+    data_dir = tempfile.mkdtemp()
+    try:
+      self.config.get.side_effect = [86400, 3600, 10000, data_dir]
+      os.mkdir(os.path.join(data_dir, 'tmp'))
+      for file_name, mtime in [('output-1.txt', 1000), ('errors-1.txt', 1000), ('command-2.json', 55000),
+                               (os.path.join('tmp', 'output-3.txt'), 50000), ('version', 1000)]:
+        self.create_file(data_dir, file_name, mtime)
+
+      timeMock.return_value = 1000 + 86400 + 1
+      cleaner = DataCleaner.DataCleaner(self.config)
+      cleaner.cleanup()
+
+      self.assertEqual(['command-2.json', 'tmp', 'version'], sorted(os.listdir(data_dir)))
+      self.assertEqual(2, len(cleaner.files))
+      self.assertEqual(200, cleaner.total_size_bytes)
+
+      # only the directories changed since the previous cleanup are listed
+      self.create_file(data_dir, 'output-4.txt', 60000)
+      timeMock.return_value = 50000 + 86400 + 1
+      cleaner.cleanup()
+      with patch('os.listdir', wraps=os.listdir) as listdirMock:
+        cleaner.cleanup()
+        # tmp changed when the expired file in it was removed
+        self.assertEqual([call(os.path.join(data_dir, 'tmp'))], listdirMock.call_args_list)
+
+      self.assertEqual(['command-2.json', 'output-4.txt', 'tmp', 'version'], sorted(os.listdir(data_dir)))
+      self.assertEqual([], os.listdir(os.path.join(data_dir, 'tmp')))
+      self.assertEqual({os.path.join(data_dir, 'command-2.json'): (55000, 100),
+                        os.path.join(data_dir, 'output-4.txt'): (60000, 100)}, cleaner.files)
+
+      # a file written to since it was indexed is kept, the expired ones go away
+      self.create_file(data_dir, 'output-4.txt', 70000)
+      timeMock.return_value = 60000 + 86400 + 1
+      cleaner.cleanup()
+      self.assertEqual(['output-4.txt', 'tmp', 'version'], sorted(os.listdir(data_dir)))
+      self.assertEqual({os.path.join(data_dir, 'output-4.txt'): (70000, 100)}, cleaner.files)
+    finally:
+      shutil.rmtree(data_dir)
+
+  @patch('time.time')
+  def test_cleanup_incremental_drift(self, timeMock):
+    data_dir = tempfile.mkdtemp()
+    try:
+      self.config.get.side_effect = [86400, 3600, 10000, data_dir]
+      os.mkdir(os.path.join(data_dir, 'tmp'))
+      for file_name in ['output-1.txt', 'output-2.txt', os.path.join('tmp', 'output-3.txt')]:
+        self.create_file(data_dir, file_name, 1000)
+
+      timeMock.return_value = 2000
+      cleaner = DataCleaner.DataCleaner(self.config)
+      cleaner.cleanup()
+      self.assertEqual(300, cleaner.total_size_bytes)
+
+      # files removed, or written to shortly after the previous scan, are caught up with once their directory changes
+      os.remove(os.path.join(data_dir, 'output-1.txt'))
+      self.create_file(data_dir, 'output-2.txt', 1500, size=1000)
+      shutil.rmtree(os.path.join(data_dir, 'tmp'))
+      timeMock.return_value = 3000
+      cleaner.cleanup()
+
+      self.assertEqual({os.path.join(data_dir, 'output-2.txt'): (1500, 1000)}, cleaner.files)
+      self.assertEqual(1000, cleaner.total_size_bytes)
+      self.assertEqual([data_dir], cleaner.dirs_index.keys())
+
+      # the whole data directory is walked again once a day
+      with patch('os.walk', wraps=os.walk) as walkMock:
+        timeMock.return_value = 2000 + 86400 - 1
+        cleaner.cleanup()
+        self.assertFalse(walkMock.called)
+        timeMock.return_value = 2000 + 86400
+        cleaner.cleanup()
+        self.assertTrue(walkMock.called)
+    finally:
+      shutil.rmtree(data_dir)
+
+  @patch('time.time')
+  def test_cleanup_incremental_stats_new_files(self, timeMock):
+    data_dir = tempfile.mkdtemp()
+    try:
+      self.config.get.side_effect = [86400, 3600, 10000, data_dir]
+      for i in range(50):
+        self.create_file(data_dir, 'output-{0}.txt'.format(i), 1000)
+
+      timeMock.return_value = 10000
+      cleaner = DataCleaner.DataCleaner(self.config)
+      cleaner.cleanup()
+
+      # only the directory and the new file are stat-ed, not the files indexed long ago
+      self.create_file(data_dir, 'output-50.txt', 15000)
+      timeMock.return_value = 20000
+      with patch('os.stat', wraps=os.stat) as statMock:
+        cleaner.cleanup()
+        self.assertEqual([call(data_dir), call(os.path.join(data_dir, 'output-50.txt'))],
+                         statMock.call_args_list)
+      self.assertEqual(51, len(cleaner.files))
+      self.assertEqual(5100, cleaner.total_size_bytes)
+    finally:
+      shutil.rmtree(data_dir)
+
+  @patch('time.sleep')
+  @patch('time.time')
+  def test_cleanup_max_size_in_batches(self, timeMock, sleepMock):
+    data_dir = tempfile.mkdtemp()
+    try:
+      self.config.get.side_effect = [86400, 3600, 1, data_dir]
+      for i in range(6):
+        self.create_file(data_dir, 'output-{0}.txt'.format(i), 1000 + i, size=300000)
+
+      timeMock.return_value = 2000
+      cleaner = DataCleaner.DataCleaner(self.config)
+      cleaner.REMOVE_BATCH_SIZE = 2
+      cleaner.cleanup()
+
+      # oldest files are removed first, until the size is below 1 MB
+      self.assertEqual(['output-3.txt', 'output-4.txt', 'output-5.txt'], sorted(os.listdir(data_dir)))
+      self.assertEqual(900000, cleaner.total_size_bytes)
+      self.assertEqual(1, sleepMock.call_count)
+    finally:
+      shutil.rmtree(data_dir)
+
+  def create_file(self, data_dir, file_name, mtime, size=100):
+    file_path = os.path.join(data_dir, file_name)
+    with open(file_path, 'w') as f:
+      f.write('x' * size)
+    os.utime(file_path, (mtime, mtime))
+
 if __name__ == "__main__":
   suite = unittest.TestLoader().loadTestsFromTestCase(TestDataCleaner)
   unittest.TextTestRunner(verbosity=2).run(suite)
@@ -25,17 +25,22 @@ from mock.mock import patch, MagicMock, Mock
 import unittest
 import platform
 import socket
-import subprocess
 import os
+import threading
 from only_for_platform import not_for_platform, PLATFORM_WINDOWS
 from ambari_agent import hostname
 from ambari_agent.Hardware import Hardware
 from ambari_agent.AmbariConfig import AmbariConfig
-from ambari_agent.Facter import Facter, FacterLinux
+from ambari_agent.Facter import Facter, FacterLinux, clear_static_facts
 from ambari_commons import OSCheck
-from resource_management.core import shell
 
 
+def parse_mounts(mounts):
+  return [Hardware._parse_mounts_line(line) for line in mounts.splitlines() if line.strip()]
+
+def statvfs_result(blocks, free, available, block_size=4096):
+  return MagicMock(f_blocks=blocks, f_bfree=free, f_bavail=available, f_frsize=block_size)
+
 @not_for_platform(PLATFORM_WINDOWS)
 @patch.object(platform, "linux_distribution", new=MagicMock(return_value=('Suse', '11', 'Final')))
 @patch.object(socket, "getfqdn", new=MagicMock(return_value="ambari.apache.org"))
@@ -52,7 +57,11 @@ lo    16436   0        2      0      0      0        2      0      0      0 LRU'
 3: enp0s8: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc pfifo_fast state UP mode DEFAULT qlen 1000
     link/ether 08:00:27:09:92:3a brd ff:ff:ff:ff:ff:ff'''))
 class TestHardware(TestCase):
- 
+
+  def setUp(self):
+    clear_static_facts()
+    Hardware._hanging_mount_checks.clear()
+
   @patch.object(Hardware, "osdisks", new=MagicMock(return_value=[]))
   @patch.object(Hardware, "_chk_writable_mount", new=MagicMock(return_value=True))
   @patch.object(FacterLinux, "get_ip_address_by_ifname", new=MagicMock(return_value=None))
@@ -87,19 +96,25 @@ class TestHardware(TestCase):
 
   @patch.object(Hardware, "_chk_writable_mount")
   @patch("ambari_agent.Hardware.path_isfile")
-  @patch("resource_management.core.shell.call")
-  def test_osdisks_parsing(self, shell_call_mock, isfile_mock, chk_writable_mount_mock):
-    df_output =\
-                """Filesystem                                                                                        Type  1024-blocks     Used Available Capacity Mounted on
-                /dev/mapper/docker-253:0-4980899-d45c264d37ab18c8ed14f890f4d59ac2b81e1c52919eb36a79419787209515f3 xfs      31447040  1282384  30164656       5% /
-                tmpfs                                                                                             tmpfs    32938336        4  32938332       1% /dev
-                tmpfs                                                                                             tmpfs    32938336        0  32938336       0% /sys/fs/cgroup
-                /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /etc/resolv.conf
-                /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /etc/hostname
-                /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /etc/hosts
-                shm                                                                                               tmpfs       65536        0     65536       0% /dev/shm
-                /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /run/secrets
-                """
+  @patch("os.statvfs")
+  @patch.object(Hardware, "_read_mounts")
+  def test_osdisks_parsing(self, read_mounts_mock, statvfs_mock, isfile_mock, chk_writable_mount_mock):
+    read_mounts_mock.return_value = parse_mounts("""
+      /dev/mapper/docker-253:0-4980899-d45c264d37ab18c8ed14f890f4d59ac2b81e1c52919eb36a79419787209515f3 / xfs rw 0 0
+      proc /proc proc rw,nosuid,nodev,noexec,relatime 0 0
+      tmpfs /dev tmpfs rw,nosuid,mode=755 0 0
+      tmpfs /sys/fs/cgroup tmpfs ro,nosuid,nodev,noexec,mode=755 0 0
+      /dev/mapper/fedora-root /etc/resolv.conf ext4 rw,relatime,data=ordered 0 0
+      /dev/mapper/fedora-root /etc/hostname ext4 rw,relatime,data=ordered 0 0
+      /dev/mapper/fedora-root /etc/hosts ext4 rw,relatime,data=ordered 0 0
+      shm /dev/shm tmpfs rw,nosuid,nodev,noexec,relatime,size=65536k 0 0
+      /dev/mapper/fedora-root /run/secrets ext4 rw,relatime,data=ordered 0 0
+      """)
+
+    def statvfs_side_effect(path):
+      if path == "/proc":
+        return statvfs_result(0, 0, 0)
+      return statvfs_result(7861760, 7541164, 7541164)
 
     def isfile_side_effect(path):
       assume_files = ["/etc/resolv.conf", "/etc/hostname", "/etc/hosts"]
@@ -109,70 +124,132 @@ class TestHardware(TestCase):
       assume_read_only = ["/run/secrets"]
       return path not in assume_read_only
 
+    statvfs_mock.side_effect = statvfs_side_effect
     isfile_mock.side_effect = isfile_side_effect
     chk_writable_mount_mock.side_effect = chk_writable_mount_side_effect
-    shell_call_mock.return_value = (0, df_output, '')
 
     result = Hardware.osdisks()
 
     self.assertEquals(1, len(result))
+    self.assertEquals({
+      "device": "/dev/mapper/docker-253:0-4980899-d45c264d37ab18c8ed14f890f4d59ac2b81e1c52919eb36a79419787209515f3",
+      "type": "xfs",
+      "size": "31447040",
+      "used": "1282384",
+      "available": "30164656",
+      "percent": "5%",
+      "mountpoint": "/"
+    }, result[0])
 
-    expected_mounts_left = ["/"]
-    mounts_left = [item["mountpoint"] for item in result]
+  @patch("__builtin__.open")
+  def test_read_mounts(self, open_mock):
+    open_mock.return_value.__enter__.return_value.readlines.return_value = [
+      "/dev/sda1 / ext4 rw,relatime 0 0\n",
+      "server:/export /mnt/my\\040share nfs4 rw,relatime 0 0\n",
+      "/dev/sdb1 /data ext4 rw,relatime 0 0\n",
+      "/dev/sdc1 /data xfs rw,relatime 0 0\n",
+      "broken line\n"
+    ]
 
-    self.assertEquals(expected_mounts_left, mounts_left)
+    result = Hardware._read_mounts()
 
-  @patch.object(OSCheck, "get_os_type")
-  @patch.object(OSCheck, "get_os_version")
-  @patch("resource_management.core.shell.call")
-  def test_osdisks_remote(self, shell_call_mock, get_os_version_mock, get_os_type_mock):
-    get_os_type_mock.return_value = "suse"
-    get_os_version_mock.return_value = "11"
-    Hardware.osdisks()
-    timeout = 10
-    shell_call_mock.assert_called_with(['timeout', str(timeout), "df", "-kPT"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = timeout, quiet = True)
+    open_mock.assert_called_with("/proc/mounts")
+    self.assertEquals([
+      {"device": "/dev/sda1", "type": "ext4", "mountpoint": "/"},
+      {"device": "server:/export", "type": "nfs4", "mountpoint": "/mnt/my share"},
+      {"device": "/dev/sdc1", "type": "xfs", "mountpoint": "/data"}
+    ], result)
+
+  @patch.object(Hardware, "_chk_writable_mount", new=MagicMock(return_value=True))
+  @patch("ambari_agent.Hardware.path_isfile", new=MagicMock(return_value=False))
+  @patch("os.statvfs")
+  @patch.object(Hardware, "_read_mounts")
+  def test_osdisks_remote(self, read_mounts_mock, statvfs_mock):
+    read_mounts_mock.return_value = parse_mounts("""
+      /dev/sda1 / ext4 rw 0 0
+      server:/export /mnt/nfs nfs4 rw 0 0
+      //server/share /mnt/cifs cifs rw 0 0
+      """)
+    statvfs_mock.return_value = statvfs_result(100, 50, 50)
+
+    def mount_points(config):
+      return [mount["mountpoint"] for mount in Hardware.osdisks(config)]
+
+    self.assertEquals(["/", "/mnt/nfs", "/mnt/cifs"], mount_points(None))
 
     config = AmbariConfig()
-    Hardware.osdisks(config)
-    shell_call_mock.assert_called_with(['timeout', str(timeout), "df", "-kPT"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = timeout, quiet = True)
+    self.assertEquals(["/", "/mnt/nfs", "/mnt/cifs"], mount_points(config))
 
     config.add_section(AmbariConfig.AMBARI_PROPERTIES_CATEGORY)
     config.set(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_KEY, "true")
-    Hardware.osdisks(config)
-    shell_call_mock.assert_called_with(['timeout', str(timeout), "df", "-kPT"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = timeout, quiet = True)
+    self.assertEquals(["/", "/mnt/nfs", "/mnt/cifs"], mount_points(config))
 
+    statvfs_mock.reset_mock()
     config.set(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_KEY, "false")
-    Hardware.osdisks(config)
-    shell_call_mock.assert_called_with(['timeout', str(timeout), "df", "-kPT", "-l"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = timeout, quiet = True)
+    self.assertEquals(["/"], mount_points(config))
+    # remote mounts are not touched at all
+    statvfs_mock.assert_called_once_with("/")
 
+  def test_get_mount_check_timeout(self):
+    self.assertEquals("10", Hardware._get_mount_check_timeout(None))
+
+    config = AmbariConfig()
+    config.add_section(AmbariConfig.AMBARI_PROPERTIES_CATEGORY)
     config.set(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_TIMEOUT_KEY, "0")
-    Hardware.osdisks(config)
-    shell_call_mock.assert_called_with(['timeout', str(timeout), "df", "-kPT", "-l"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = timeout, quiet = True)
+    self.assertEquals("10", Hardware._get_mount_check_timeout(config))
+
+    config.set(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_TIMEOUT_KEY, "2")
+    self.assertEquals("2", Hardware._get_mount_check_timeout(config))
+
+  @patch.object(Hardware, "_chk_writable_mount", new=MagicMock(return_value=True))
+  @patch("ambari_agent.Hardware.path_isfile", new=MagicMock(return_value=False))
+  @patch("os.statvfs")
+  @patch.object(Hardware, "_read_mounts")
+  def test_osdisks_hanging_mount(self, read_mounts_mock, statvfs_mock):
+    read_mounts_mock.return_value = parse_mounts("""
+      /dev/sda1 / ext4 rw 0 0
+      server:/export /mnt/nfs nfs4 rw 0 0
+      /dev/sdb1 /data ext4 rw 0 0
+      """)
+    unblock_nfs = threading.Event()
+
+    def statvfs_side_effect(path):
+      if path == "/mnt/nfs":
+        unblock_nfs.wait()
+      return statvfs_result(100, 50, 50)
+
+    statvfs_mock.side_effect = statvfs_side_effect
+    config = AmbariConfig()
+    config.add_section(AmbariConfig.AMBARI_PROPERTIES_CATEGORY)
+    config.set(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_TIMEOUT_KEY, "1")
 
-    timeout = 1
-    config.set(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_TIMEOUT_KEY, str(timeout))
-    Hardware.osdisks(config)
-    shell_call_mock.assert_called_with(['timeout', str(timeout), "df", "-kPT", "-l"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = timeout, quiet = True)
+    try:
+      result = Hardware.osdisks(config)
+      self.assertEquals(["/", "/data"], [mount["mountpoint"] for mount in result])
 
-    timeout = 2
-    config.set(AmbariConfig.AMBARI_PROPERTIES_CATEGORY, Hardware.CHECK_REMOTE_MOUNTS_TIMEOUT_KEY, str(timeout))
-    Hardware.osdisks(config)
-    shell_call_mock.assert_called_with(['timeout', str(timeout), "df", "-kPT", "-l"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, timeout = timeout, quiet = True)
+      # the blocked check is not started again
+      result = Hardware.osdisks(config)
+      self.assertEquals(["/", "/data"], [mount["mountpoint"] for mount in result])
+      self.assertEquals(5, statvfs_mock.call_count)
+    finally:
+      unblock_nfs.set()
 
-  def test_parse_df_line(self):
-    df_line_sample = "device type size used available percent mountpoint"
+    Hardware._hanging_mount_checks["/mnt/nfs"].join()
+    result = Hardware.osdisks(config)
+    self.assertEquals(["/", "/mnt/nfs", "/data"], [mount["mountpoint"] for mount in result])
 
+  def test_parse_mounts_line(self):
     samples = [
       {
-        "sample": df_line_sample,
-        "expected": dict(zip(df_line_sample.split(), df_line_sample.split()))
+        "sample": "/dev/sda1 / ext4 rw,relatime 0 0",
+        "expected": {"device": "/dev/sda1", "type": "ext4", "mountpoint": "/"}
       },
       {
-        "sample": "device type size used available percent",
-        "expected": None,
+        "sample": "/dev/sda1 /mnt/with\\040space ext4 rw,relatime 0 0",
+        "expected": {"device": "/dev/sda1", "type": "ext4", "mountpoint": "/mnt/with space"}
       },
       {
-        "sample": "device type size used available percent mountpoint info",
+        "sample": "/dev/sda1 /",
         "expected": None,
       },
       {
@@ -182,7 +259,7 @@ class TestHardware(TestCase):
     ]
 
     for sample in samples:
-      result = Hardware._parse_df_line(sample["sample"])
+      result = Hardware._parse_mounts_line(sample["sample"])
       self.assertEquals(result, sample["expected"], "Failed with sample: '{0}', expected: {1}, got: {2}".format(
         sample["sample"],
         sample["expected"],
@@ -315,20 +392,62 @@ SwapFree:        1598676 kB
     self.assertEquals(result['osfamily'], 'redhat')
 
     get_os_family_mock.return_value = "ubuntu"
+    clear_static_facts()
     result = Facter(config).facterInfo()
     self.assertEquals(result['operatingsystem'], 'some_type_of_os')
     self.assertEquals(result['osfamily'], 'ubuntu')
 
     get_os_family_mock.return_value = "suse"
+    clear_static_facts()
     result = Facter(config).facterInfo()
     self.assertEquals(result['operatingsystem'], 'some_type_of_os')
     self.assertEquals(result['osfamily'], 'suse')
 
     get_os_family_mock.return_value = "My_new_family"
+    clear_static_facts()
     result = Facter(config).facterInfo()
     self.assertEquals(result['operatingsystem'], 'some_type_of_os')
     self.assertEquals(result['osfamily'], 'My_new_family')
 
+  @patch.object(FacterLinux, "get_ip_address_by_ifname", new=MagicMock(return_value=None))
+  @patch.object(FacterLinux, "setMemInfoOutput")
+  @patch.object(OSCheck, "get_os_type")
+  @patch.object(OSCheck, "get_os_family")
+  @patch.object(OSCheck, "get_os_version")
+  def test_static_facts_cached(self, get_os_version_mock, get_os_family_mock, get_os_type_mock,
+                               facter_setMemInfoOutput_mock):
+    get_os_type_mock.return_value = "some_type_of_os"
+    get_os_version_mock.return_value = "11"
+    get_os_family_mock.return_value = "redhat"
+    facter_setMemInfoOutput_mock.return_value = "MemTotal:        1832392 kB\nMemFree:          868648 kB\n"
+
+    Facter(None).facterInfo()
+    get_os_type_mock.return_value = "other_type_of_os"
+    get_os_family_mock.return_value = "suse"
+    facter_setMemInfoOutput_mock.return_value = "MemTotal:        2000000 kB\nMemFree:          123 kB\n"
+    result = Facter(None).facterInfo()
+
+    self.assertEquals(1, get_os_type_mock.call_count)
+    self.assertEquals(1, get_os_version_mock.call_count)
+    self.assertEquals(result['operatingsystem'], 'some_type_of_os')
+    self.assertEquals(result['osfamily'], 'redhat')
+    self.assertEquals(result['memorytotal'], 1832392)
+    # dynamic facts are still up to date
+    self.assertEquals(result['memoryfree'], 123)
+
+  @patch("__builtin__.open")
+  def test_read_proc_file(self, open_mock):
+    open_mock.return_value.__enter__.return_value.read.return_value = "262813.00 123.45"
+
+    self.assertEquals("262813.00 123.45", FacterLinux.setDataUpTimeOutput())
+    open_mock.assert_called_with("/proc/uptime")
+
+    open_mock.side_effect = IOError("No such file or directory")
+    self.assertEquals("", FacterLinux.setMemInfoOutput())
+    open_mock.assert_called_with("/proc/meminfo")
+
+  @patch.object(FacterLinux, "setDataUpTimeOutput", new=MagicMock(return_value=""))
+  @patch.object(FacterLinux, "setMemInfoOutput", new=MagicMock(return_value=""))
   @patch("os.path.exists")
   @patch("os.path.isdir")
   @patch("json.loads")
@@ -377,21 +496,21 @@ SwapFree:        1598676 kB
 
   @patch.object(Hardware, "_chk_writable_mount")
   @patch("ambari_agent.Hardware.path_isfile")
-  @patch("resource_management.core.shell.call")
-  def test_osdisks_blacklist(self, shell_call_mock, isfile_mock, chk_writable_mount_mock):
-    df_output = \
-      """Filesystem                                                                                        Type  1024-blocks     Used Available Capacity Mounted on
-      /dev/mapper/docker-253:0-4980899-d45c264d37ab18c8ed14f890f4d59ac2b81e1c52919eb36a79419787209515f3 xfs      31447040  1282384  30164656       5% /
-      tmpfs                                                                                             tmpfs    32938336        4  32938332       1% /dev
-      tmpfs                                                                                             tmpfs    32938336        0  32938336       0% /sys/fs/cgroup
-      /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /etc/resolv.conf
-      /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /etc/hostname
-      /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /etc/hosts
-      shm                                                                                               tmpfs       65536        0     65536       0% /dev/shm
-      /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /run/secrets
-      /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /mnt/blacklisted_mount
-      /dev/mapper/fedora-root                                                                           ext4    224161316 12849696 199901804       7% /mnt/blacklisted_mount/sub-dir
-      """
+  @patch("os.statvfs")
+  @patch.object(Hardware, "_read_mounts")
+  def test_osdisks_blacklist(self, read_mounts_mock, statvfs_mock, isfile_mock, chk_writable_mount_mock):
+    read_mounts_mock.return_value = parse_mounts("""
+      /dev/mapper/docker-253:0-4980899-d45c264d37ab18c8ed14f890f4d59ac2b81e1c52919eb36a79419787209515f3 / xfs rw 0 0
+      tmpfs /dev tmpfs rw,nosuid,mode=755 0 0
+      tmpfs /sys/fs/cgroup tmpfs ro,nosuid,nodev,noexec,mode=755 0 0
+      /dev/mapper/fedora-root /etc/resolv.conf ext4 rw,relatime,data=ordered 0 0
+      /dev/mapper/fedora-root /etc/hostname ext4 rw,relatime,data=ordered 0 0
+      /dev/mapper/fedora-root /etc/hosts ext4 rw,relatime,data=ordered 0 0
+      shm /dev/shm tmpfs rw,nosuid,nodev,noexec,relatime,size=65536k 0 0
+      /dev/mapper/fedora-root /run/secrets ext4 rw,relatime,data=ordered 0 0
+      /dev/mapper/fedora-root /mnt/blacklisted_mount ext4 rw,relatime,data=ordered 0 0
+      /dev/mapper/fedora-root /mnt/blacklisted_mount/sub-dir ext4 rw,relatime,data=ordered 0 0
+      """)
 
     def isfile_side_effect(path):
       assume_files = ["/etc/resolv.conf", "/etc/hostname", "/etc/hosts"]
@@ -401,6 +520,7 @@ SwapFree:        1598676 kB
       assume_read_only = ["/run/secrets"]
       return path not in assume_read_only
 
+    statvfs_mock.return_value = statvfs_result(7861760, 7541164, 7541164)
     isfile_mock.side_effect = isfile_side_effect
     chk_writable_mount_mock.side_effect = chk_writable_mount_side_effect
 
@@ -410,8 +530,6 @@ SwapFree:        1598676 kB
       }
     }
 
-    shell_call_mock.return_value = (0, df_output, '')
-
     def conf_get(section, key, default=""):
       if section in config_dict and key in config_dict[section]:
         return config_dict[section][key]
@@ -436,6 +554,8 @@ SwapFree:        1598676 kB
     mounts_left = [item["mountpoint"] for item in result]
 
     self.assertEquals(expected_mounts_left, mounts_left)
+    # blacklisted mounts are not touched at all
+    self.assertFalse("/mnt/blacklisted_mount" in [args[0][0] for args in statvfs_mock.call_args_list])
 
 @not_for_platform(PLATFORM_WINDOWS)
 @patch.object(platform, "linux_distribution", new=MagicMock(return_value=('Suse', '11', 'Final')))
@@ -449,6 +569,10 @@ SwapFree:        1598676 kB
 3: enp0s8: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc pfifo_fast state UP mode DEFAULT qlen 1000
     link/ether 08:00:27:09:92:3a brd ff:ff:ff:ff:ff:ff'''))
 class TestHardwareWithoutIfConfig(TestCase):
+
+  def setUp(self):
+    clear_static_facts()
+
   @patch("fcntl.ioctl")
   @patch("socket.socket")
   @patch("struct.pack")
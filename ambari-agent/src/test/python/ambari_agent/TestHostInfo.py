@@ -359,6 +359,76 @@ class TestHostInfo(TestCase):
     self.assertTrue(list[0]['hadoop'])
     self.assertEquals(list[0]['user'], 'user')
 
+  @patch.object(OSCheck, "os_distribution", new = MagicMock(return_value = ('redhat','11','Final')))
+  @patch("time.time")
+  @patch("os.listdir")
+  @patch.object(HostInfoLinux, "readJavaProc")
+  def test_javaProcs_incremental(self, read_java_proc_mock, os_listdir_mock, time_mock):
+    def read_java_proc(pid):
+      if pid == '3':
+        raise IOError("No such file or directory")
+      if pid in ['1', '4']:
+        return {'pid': int(pid)}
+      return None
+
+    read_java_proc_mock.side_effect = read_java_proc
+    time_mock.return_value = 1000
+    hostInfo = HostInfoLinux()
+
+    os_listdir_mock.return_value = ['1', '2', '3', 'self']
+    list = []
+    hostInfo.javaProcs(list)
+    self.assertEquals([{'pid': 1}], list)
+    self.assertEquals(3, read_java_proc_mock.call_count)
+
+    # only the new pids are read, the pid 3 which died while reading is retried
+    read_java_proc_mock.reset_mock()
+    os_listdir_mock.return_value = ['1', '2', '3', '4']
+    list = []
+    hostInfo.javaProcs(list)
+    self.assertEquals([{'pid': 1}, {'pid': 4}], list)
+    self.assertEquals(['3', '4'], [call[0][0] for call in read_java_proc_mock.call_args_list])
+
+    # processes which went away are not reported
+    read_java_proc_mock.reset_mock()
+    os_listdir_mock.return_value = ['2', '4']
+    list = []
+    hostInfo.javaProcs(list)
+    self.assertEquals([{'pid': 4}], list)
+    self.assertFalse(read_java_proc_mock.called)
+
+    # all pids are read again from time to time
+    time_mock.return_value = 1000 + HostInfoLinux.JAVA_PROCS_FULL_SCAN_INTERVAL + 1
+    list = []
+    hostInfo.javaProcs(list)
+    self.assertEquals([{'pid': 4}], list)
+    self.assertEquals(2, read_java_proc_mock.call_count)
+
+  @patch.object(OSCheck, "os_distribution", new = MagicMock(return_value = ('redhat','11','Final')))
+  @patch("os.stat")
+  def test_runCachedCheck(self, os_stat_mock):
+    mtimes = {'/etc/passwd': 100}
+
+    def stat_side_effect(path):
+      if path not in mtimes:
+        raise OSError("No such file or directory")
+      return MagicMock(st_mtime=mtimes[path])
+
+    os_stat_mock.side_effect = stat_side_effect
+    check = MagicMock(side_effect=[['user1'], ['user1', 'user2'], ['user3']])
+    hostInfo = HostInfoLinux()
+
+    self.assertEquals(['user1'], hostInfo.runCachedCheck('users', ['/etc/passwd', '/home'], check))
+    self.assertEquals(['user1'], hostInfo.runCachedCheck('users', ['/etc/passwd', '/home'], check))
+    self.assertEquals(1, check.call_count)
+
+    mtimes['/etc/passwd'] = 200
+    self.assertEquals(['user1', 'user2'], hostInfo.runCachedCheck('users', ['/etc/passwd', '/home'], check))
+
+    mtimes['/home'] = 300
+    self.assertEquals(['user3'], hostInfo.runCachedCheck('users', ['/etc/passwd', '/home'], check))
+    self.assertEquals(3, check.call_count)
+
   @patch.object(OSCheck, "get_os_type")
   @patch("resource_management.core.shell.call")
   def test_checkLiveServices(self, shell_call, get_os_type_method):
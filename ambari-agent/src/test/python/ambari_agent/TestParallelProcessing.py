@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+
+import threading
+import time
+import unittest
+from ambari_commons import parallel_processing
+from ambari_commons.parallel_processing import WorkerPool, execute_in_parallel, SUCCESS, FAILED
+
+
+class TestParallelProcessing(unittest.TestCase):
+
+  def test_wait_for_all(self):
+    def function(element, params):
+      if element == 'F':
+        raise Exception('failed')
+      return element + params
+
+    results = execute_in_parallel(function, ['S1', 'F', 'S2'], '-ok', wait_for_all=True, pool=WorkerPool(2))
+
+    self.assertEqual(['F', 'S1', 'S2'], sorted(results.keys()))
+    self.assertEqual(SUCCESS, results['S1'].status)
+    self.assertEqual('S1-ok', results['S1'].result)
+    self.assertEqual(SUCCESS, results['S2'].status)
+    self.assertEqual(FAILED, results['F'].status)
+    self.assertTrue('failed' in results['F'].result)
+
+  def test_first_success_cancels_pending(self):
+    started = []
+
+    def function(element, params):
+      started.append(element)
+      if element != 'S':
+        raise Exception('failed')
+      return element
+
+    # a single worker runs the tasks one by one, the ones after the first success never start
+    results = execute_in_parallel(function, ['F1', 'S', 'F2', 'F3'], None, pool=WorkerPool(1))
+    time.sleep(0.1)
+
+    self.assertEqual(['F1', 'S'], started)
+    self.assertEqual(['F1', 'S'], sorted(results.keys()))
+    self.assertEqual(SUCCESS, results['S'].status)
+
+  def test_timeout(self):
+    unblock = threading.Event()
+
+    def function(element, params):
+      if element == 'hanging':
+        unblock.wait()
+      return element
+
+    pool = WorkerPool(1)
+    try:
+      results = execute_in_parallel(function, ['hanging', 'quick'], None, wait_for_all=True, timeout=0.5, pool=pool)
+
+      self.assertEqual(FAILED, results['hanging'].status)
+      self.assertTrue('Timed out' in results['hanging'].result)
+      # the hanging worker was replaced, so the next task did not wait for it
+      self.assertEqual(SUCCESS, results['quick'].status)
+      self.assertEqual(1, len(pool.workers))
+    finally:
+      unblock.set()
+
+  def test_pool_reused(self):
+    pool = parallel_processing.get_worker_pool()
+    self.assertTrue(pool is parallel_processing.get_worker_pool())
+    self.assertEqual(parallel_processing.DEFAULT_POOL_SIZE, len(pool.workers))
+
+    threads = set()
+
+    def function(element, params):
+      threads.add(threading.current_thread())
+      return element
+
+    for i in range(5):
+      execute_in_parallel(function, range(20), None, wait_for_all=True)
+
+    self.assertTrue(len(threads) <= parallel_processing.DEFAULT_POOL_SIZE)
+    self.assertTrue(threads.issubset(pool.workers))
@@ -157,28 +157,35 @@ class TestPythonExecutor(TestCase):
     self.assertEquals("script", command[1])
     self.assertEquals("script_param1", command[2])
 
-  @patch.object(os.path, "isfile")
-  @patch.object(os, "rename")
   @patch.object(OSCheck, "os_distribution", new = MagicMock(return_value = os_distro_value))
-  def test_back_up_log_file_if_exists(self, rename_mock, isfile_mock):
-    # Test case when previous log file is absent
-    isfile_mock.return_value = False
-    log_file = "/var/lib/ambari-agent/data/output-13.txt"
-    executor = PythonExecutor("/tmp", AmbariConfig().getConfig())
-    executor.back_up_log_file_if_exists(log_file)
-    self.assertEquals(isfile_mock.called, True)
-    self.assertEquals(rename_mock.called, False)
+  def test_back_up_log_file_if_exists(self):
+    tmp_dir = tempfile.mkdtemp()
+    log_file = os.path.join(tmp_dir, "output-13.txt")
+    config = AmbariConfig()
+    config.set('agent', 'command_log_backup_count', '3')
+    executor = PythonExecutor("/tmp", config)
 
-    isfile_mock.reset_mock()
-
-    # Test case when 3 previous log files are absent
-    isfile_mock.side_effect = [True, True, True, False]
-    log_file = "/var/lib/ambari-agent/data/output-13.txt"
-    executor = PythonExecutor("/tmp", AmbariConfig().getConfig())
+    # Test case when previous log file is absent
     executor.back_up_log_file_if_exists(log_file)
-    self.assertEquals(isfile_mock.called, True)
-    self.assertEquals(rename_mock.call_args_list[0][0][0], "/var/lib/ambari-agent/data/output-13.txt")
-    self.assertEquals(rename_mock.call_args_list[0][0][1], "/var/lib/ambari-agent/data/output-13.txt.2")
+    self.assertEquals([], os.listdir(tmp_dir))
+
+    for i in range(5):
+      with open(log_file, "w") as f:
+        f.write(str(i))
+      executor.back_up_log_file_if_exists(log_file)
+      self.assertFalse(os.path.exists(log_file))
+
+    # only the newest backups are kept, numbering continues from the counter file
+    self.assertEquals(["output-13.txt.2", "output-13.txt.3", "output-13.txt.4", "output-13.txt.backup_counter"],
+                      sorted(os.listdir(tmp_dir)))
+    with open(log_file + ".4") as f:
+      self.assertEquals("4", f.read())
+
+    with open(log_file, "w") as f:
+      f.write("5")
+    PythonExecutor("/tmp", config).back_up_log_file_if_exists(log_file)
+    self.assertEquals(["output-13.txt.3", "output-13.txt.4", "output-13.txt.5", "output-13.txt.backup_counter"],
+                      sorted(os.listdir(tmp_dir)))
     pass
 
 
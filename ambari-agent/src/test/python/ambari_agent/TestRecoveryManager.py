@@ -21,6 +21,7 @@ limitations under the License.
 from unittest import TestCase
 import copy
 import tempfile
+import threading
 from ambari_agent.RecoveryManager import RecoveryManager
 from mock.mock import patch, MagicMock, call
 
@@ -117,10 +118,12 @@ class _TestRecoveryManager(TestCase):
   }
 
   def setUp(self):
-    pass
+    # recovery actions are dumped by a timer thread, which must not outlive the test
+    self.timer_patcher = patch.object(threading, "Timer")
+    self.timer_mock = self.timer_patcher.start()
 
   def tearDown(self):
-    pass
+    self.timer_patcher.stop()
 
   @patch.object(RecoveryManager, "update_desired_status")
   def test_process_commands(self, mock_uds):
@@ -691,3 +694,36 @@ class _TestRecoveryManager(TestCase):
 
     time_mock.return_value = 3602
     self.assertTrue(rm.is_action_info_stale("COMPONENT_NAME"))
+
+  @patch.object(RecoveryManager, "_dump_actions")
+  @patch.object(RecoveryManager, "_now_")
+  def test_dump_actions_write_behind(self, time_mock, dump_mock):
+    rm = RecoveryManager(tempfile.mktemp(), True)
+    rm.update_config(5, 60, 1, 16, True, False, False, "", -1)
+    rm.ACTIONS_DUMP_DELAY_SEC = 3600
+
+    time_mock.return_value = 1000
+    self.assertTrue(rm.execute("COMPONENT"))
+    time_mock.return_value = 1100
+    self.assertTrue(rm.execute("COMPONENT"))
+    self.assertFalse(dump_mock.called)
+    self.assertEqual(1, self.timer_mock.call_count)
+    self.timer_mock.assert_called_with(3600, rm.flush_actions)
+
+    # all changes are coalesced into a single dump
+    rm.flush_actions()
+    self.assertEqual(1, dump_mock.call_count)
+    self.assertTrue(self.timer_mock.return_value.cancel.called)
+    rm.flush_actions()
+    self.assertEqual(1, dump_mock.call_count)
+
+
+  def test_dump_and_load_actions(self):
+    rm = RecoveryManager(tempfile.mktemp(), True)
+    rm.update_config(5, 60, 1, 16, True, False, False, "", -1)
+    self.assertTrue(rm.execute("COMPONENT"))
+    self.assertTrue(rm.flush_actions())
+
+    actions = rm._load_actions()
+    self.assertEqual(1, actions["COMPONENT"]["count"])
+    self.assertEqual(rm.get_actions_copy(), actions)
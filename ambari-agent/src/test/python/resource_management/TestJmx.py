@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+from unittest import TestCase
+from mock.mock import patch, MagicMock
+
+from resource_management.core.exceptions import Fail
+from resource_management.core.logger import Logger
+from resource_management.libraries.functions.jmx import wait_for_jmx_condition
+from resource_management.libraries.functions.hdfs_utils import wait_for_namenode_safemode_off, \
+  get_safemode_progress
+
+SAFEMODE_ON = "Safe mode is ON. The reported blocks {0} needs additional 10 blocks to reach the threshold " \
+              "0.9990 of total blocks 100. The number of live datanodes 3 has reached the minimum number 0."
+
+
+@patch.object(Logger, "logger", new = MagicMock())
+class TestJmx(TestCase):
+
+  @patch("time.sleep")
+  @patch("time.time")
+  def test_wait_for_jmx_condition_backs_off_until_progress(self, time_mock, sleep_mock):
+    time_mock.return_value = 0
+    jmx_connection = MagicMock()
+    jmx_connection.get_bean.side_effect = [{"blocks": 1}, {"blocks": 1}, {"blocks": 1}, None, {"blocks": 2},
+                                           {"blocks": 3, "done": True}]
+
+    bean = wait_for_jmx_condition(jmx_connection, "qry", lambda bean: bean.get("done"), 100,
+                                  progress=lambda bean: bean["blocks"], max_interval=5)
+
+    self.assertEqual({"blocks": 3, "done": True}, bean)
+    # the interval grows while nothing changes and drops back once the blocks move on
+    self.assertEqual([1, 2, 4, 5, 1], [args[0][0] for args in sleep_mock.call_args_list])
+
+  @patch("time.sleep")
+  @patch("time.time")
+  def test_wait_for_jmx_condition_timeout(self, time_mock, sleep_mock):
+    time_mock.side_effect = [0, 3, 9, 10]
+    jmx_connection = MagicMock()
+    jmx_connection.get_bean.return_value = {"Safemode": "ON"}
+
+    self.assertRaises(Fail, wait_for_jmx_condition, jmx_connection, "qry", lambda bean: False, 10)
+    self.assertEqual(3, jmx_connection.get_bean.call_count)
+    # never sleeps past the deadline
+    self.assertEqual([1, 1], [args[0][0] for args in sleep_mock.call_args_list])
+
+  @patch("time.sleep")
+  @patch("resource_management.libraries.functions.jmx.JmxConnection.get_bean")
+  def test_wait_for_namenode_safemode_off(self, get_bean_mock, sleep_mock):
+    get_bean_mock.side_effect = [{"Safemode": SAFEMODE_ON.format(50)}, {"Safemode": SAFEMODE_ON.format(50)},
+                                 {"Safemode": SAFEMODE_ON.format(90)}, {"Safemode": ""}]
+
+    self.assertTrue(wait_for_namenode_safemode_off("c6401.ambari.apache.org:50070", False, 600))
+    self.assertEqual(4, get_bean_mock.call_count)
+    get_bean_mock.assert_called_with("Hadoop:service=NameNode,name=NameNodeInfo")
+
+  @patch("resource_management.libraries.functions.jmx.JmxConnection.get_bean")
+  def test_wait_for_namenode_safemode_off_jmx_unavailable(self, get_bean_mock):
+    get_bean_mock.return_value = None
+
+    self.assertFalse(wait_for_namenode_safemode_off("c6401.ambari.apache.org:50070", False, 600))
+    self.assertEqual(1, get_bean_mock.call_count)
+
+  def test_get_safemode_progress(self):
+    self.assertEqual("reported 90 of 100 blocks", get_safemode_progress({"Safemode": SAFEMODE_ON.format(90)}))
+    self.assertEqual("Safe mode is ON. It was turned on manually.",
+                     get_safemode_progress({"Safemode": "Safe mode is ON. It was turned on manually."}))
@@ -17,13 +17,39 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 '''
+import threading
 from unittest import TestCase
+from mock.mock import patch, MagicMock
+from resource_management.core.logger import Logger
+from resource_management.libraries.functions import namenode_ha_utils
 from resource_management.libraries.functions.namenode_ha_utils import \
-  get_nameservice
+  get_nameservice, get_namenode_web_address, get_namenode_states, get_active_namenode, \
+  invalidate_namenode_states_cache
 
+HA_HDFS_SITE = {
+  "dfs.nameservices": "HAA",
+  "dfs.ha.namenodes.HAA": "nn1,nn2",
+  "dfs.http.policy": "HTTP_ONLY",
+  "dfs.https.enable": False,
+  "dfs.namenode.http-address.HAA.nn1": "hosta1:50070",
+  "dfs.namenode.http-address.HAA.nn2": "hosta2:50070",
+  "dfs.namenode.rpc-address.HAA.nn1": "hosta1:8020",
+  "dfs.namenode.rpc-address.HAA.nn2": "hosta2:8020",
+}
 
+
+@patch.object(Logger, "logger", new = MagicMock())
 class TestNamenodeHaUtils(TestCase):
 
+  def setUp(self):
+    invalidate_namenode_states_cache()
+
+  def join_namenode_state_probes(self):
+    # probes not waited for must not outlive the mocks of the test
+    for thread in threading.enumerate():
+      if thread.name.endswith("state probe"):
+        thread.join()
+
   def test_get_nameservice(self):
     # our cluster is HAA
 
@@ -58,3 +84,107 @@ class TestNamenodeHaUtils(TestCase):
     hdfs_site = {}
 
     self.assertEqual(None, get_nameservice(hdfs_site))
+
+  def test_get_namenode_web_address(self):
+    hdfs_site = {
+      "dfs.nameservices": "HAA",
+      "dfs.ha.namenodes.HAA": "nn1,nn2",
+      "dfs.http.policy": "HTTP_ONLY",
+      "dfs.namenode.http-address.HAA.nn1": "0.0.0.0:50070",
+      "dfs.namenode.http-address.HAA.nn2": "hosta2:50070",
+      "dfs.namenode.https-address.HAA.nn2": "hosta2:50470",
+      "dfs.namenode.rpc-address.HAA.nn1": "hosta1:8020",
+      "dfs.namenode.rpc-address.HAA.nn2": "hosta2:8020",
+    }
+
+    self.assertEqual(("hosta1:50070", False), get_namenode_web_address(hdfs_site, "nn1"))
+    self.assertEqual(("hosta2:50070", False), get_namenode_web_address(hdfs_site, "nn2"))
+
+    hdfs_site["dfs.http.policy"] = "HTTPS_ONLY"
+    self.assertEqual(("hosta2:50470", True), get_namenode_web_address(hdfs_site, "nn2"))
+    self.assertEqual((None, True), get_namenode_web_address(hdfs_site, "nn1"))
+
+    # Non HA
+    hdfs_site = {
+      "dfs.namenode.http-address": "c6401:50070",
+      "dfs.namenode.rpc-address": "c6401:8020",
+    }
+    self.assertEqual(("c6401:50070", False), get_namenode_web_address(hdfs_site, None))
+
+  @patch.object(namenode_ha_utils, "get_value_from_jmx")
+  def test_get_namenode_states_memoized(self, get_value_from_jmx_mock):
+    get_value_from_jmx_mock.side_effect = lambda uri, *args: "active" if "hosta2" in uri else "standby"
+
+    expected = ([("nn2", "hosta2:50070")], [("nn1", "hosta1:50070")], [])
+    self.assertEqual(expected, get_namenode_states(HA_HDFS_SITE, False, "hdfs"))
+    self.assertEqual(2, get_value_from_jmx_mock.call_count)
+
+    # polling callers always probe again, lookups of the active NameNode use the memoized states
+    self.assertEqual(expected, get_namenode_states(HA_HDFS_SITE, False, "hdfs"))
+    self.assertEqual(4, get_value_from_jmx_mock.call_count)
+    self.assertEqual(("nn2", "hosta2:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs"))
+    self.assertEqual(4, get_value_from_jmx_mock.call_count)
+
+    # after a failover
+    invalidate_namenode_states_cache(HA_HDFS_SITE)
+    get_value_from_jmx_mock.side_effect = lambda uri, *args: "active" if "hosta1" in uri else "standby"
+    self.assertEqual(("nn1", "hosta1:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs"))
+    self.join_namenode_state_probes()
+
+  @patch.object(namenode_ha_utils, "time")
+  @patch.object(namenode_ha_utils, "get_value_from_jmx")
+  def test_namenode_states_cache_expires(self, get_value_from_jmx_mock, time_mock):
+    get_value_from_jmx_mock.side_effect = lambda uri, *args: "active" if "hosta2" in uri else "standby"
+    time_mock.time.return_value = 1000
+    self.assertEqual(("nn2", "hosta2:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs"))
+    self.join_namenode_state_probes()
+
+    # a failover nobody told us about
+    get_value_from_jmx_mock.side_effect = lambda uri, *args: "active" if "hosta1" in uri else "standby"
+    time_mock.time.return_value = 1000 + namenode_ha_utils.NAMENODE_STATES_CACHE_TTL_SEC
+    self.assertEqual(("nn2", "hosta2:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs"))
+    self.assertEqual(("nn1", "hosta1:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs", use_cache=False))
+    self.join_namenode_state_probes()
+
+    invalidate_namenode_states_cache()
+    get_value_from_jmx_mock.side_effect = lambda uri, *args: "active" if "hosta2" in uri else "standby"
+    self.assertEqual(("nn2", "hosta2:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs"))
+    self.join_namenode_state_probes()
+    get_value_from_jmx_mock.side_effect = lambda uri, *args: "active" if "hosta1" in uri else "standby"
+    time_mock.time.return_value = 1001 + namenode_ha_utils.NAMENODE_STATES_CACHE_TTL_SEC * 2
+    self.assertEqual(("nn1", "hosta1:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs"))
+    self.join_namenode_state_probes()
+
+  @patch.object(namenode_ha_utils, "get_value_from_jmx")
+  def test_get_active_namenode_does_not_wait_for_all(self, get_value_from_jmx_mock):
+    standby_probe_released = threading.Event()
+    def get_value_from_jmx(uri, *args):
+      if "hosta1" in uri:
+        # a NameNode which does not answer
+        standby_probe_released.wait(10)
+        return "standby"
+      return "active"
+    get_value_from_jmx_mock.side_effect = get_value_from_jmx
+
+    try:
+      self.assertEqual(("nn2", "hosta2:50070"), get_active_namenode(HA_HDFS_SITE, False, "hdfs"))
+      # the partial states must not be used by callers which need all of them
+      self.assertEqual(None, namenode_ha_utils.get_cached_namenode_states(HA_HDFS_SITE))
+      self.assertEqual(([("nn2", "hosta2:50070")], [], [("nn1", "hosta1:50070")]),
+                       namenode_ha_utils.get_cached_namenode_states(HA_HDFS_SITE, complete=False))
+    finally:
+      standby_probe_released.set()
+      self.join_namenode_state_probes()
+
+  @patch.object(namenode_ha_utils, "get_value_from_jmx")
+  @patch("resource_management.core.shell.call")
+  def test_get_namenode_states_not_memoized_without_active(self, shell_call_mock, get_value_from_jmx_mock):
+    get_value_from_jmx_mock.return_value = None
+    shell_call_mock.return_value = (255, "")
+
+    self.assertEqual(([], [], [("nn1", "hosta1:50070"), ("nn2", "hosta2:50070")]),
+                     namenode_ha_utils.get_namenode_states_noretries(HA_HDFS_SITE, False, "hdfs"))
+    haadmin_commands = [args[0][0] for args in shell_call_mock.call_args_list if "haadmin" in args[0][0]]
+    self.assertEqual(["hdfs haadmin -ns HAA -getServiceState nn1", "hdfs haadmin -ns HAA -getServiceState nn2"],
+                     sorted(haadmin_commands))
+    self.assertEqual(None, namenode_ha_utils.get_cached_namenode_states(HA_HDFS_SITE, complete=False))
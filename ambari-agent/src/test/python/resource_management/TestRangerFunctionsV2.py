@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import threading
+import urllib2
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+from mock.mock import patch, MagicMock
+
+from resource_management.core.exceptions import Fail
+from resource_management.core.logger import Logger
+from resource_management.libraries.functions import ranger_functions_v2
+from resource_management.libraries.functions.ranger_functions_v2 import RangeradminV2
+
+
+class RangerAdminStubHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+
+  def do_GET(self):
+    self.server.client_ports.add(self.client_address[1])
+    if self.path == "/":
+      self.reply(302, "", {"Location": "/login.jsp"})
+    elif self.path == "/login.jsp":
+      self.reply(200, "login")
+    else:
+      self.reply(404, "not found")
+
+  def do_POST(self):
+    self.server.client_ports.add(self.client_address[1])
+    body = self.rfile.read(int(self.headers["Content-Length"]))
+    self.reply(200, body)
+
+  def reply(self, code, body, headers={}):
+    self.send_response(code)
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+@patch.object(Logger, "logger", new = MagicMock())
+class TestRangerFunctionsV2(TestCase):
+
+  def test_openurl_keeps_connection_alive(self):
+    server = HTTPServer(("localhost", 0), RangerAdminStubHandler)
+    server.client_ports = set()
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    try:
+      ranger_admin = RangeradminV2(url="http://localhost:{0}".format(server.server_port))
+
+      response = ranger_admin.openurl(ranger_admin.base_url)
+      self.assertEqual(200, response.getcode())
+      self.assertEqual("login", response.read())
+
+      request = urllib2.Request(ranger_admin.url_repos_pub, '{"name": "c1_hadoop"}', {"Content-Type": "application/json"})
+      self.assertEqual('{"name": "c1_hadoop"}', ranger_admin.openurl(request).read())
+
+      try:
+        ranger_admin.openurl(ranger_admin.url_users)
+        self.fail("HTTPError expected")
+      except urllib2.HTTPError, e:
+        self.assertEqual(404, e.code)
+        self.assertEqual("not found", e.read())
+
+      # all of the requests went through one connection
+      self.assertEqual(1, len(server.client_ports))
+      ranger_admin.close()
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  @patch("time.sleep")
+  def test_wait_for_ranger_admin(self, sleep_mock):
+    check = MagicMock(side_effect=[Fail("Connection refused"), Fail("Connection refused"), Fail("Connection refused"), 200])
+
+    self.assertEqual(200, RangeradminV2().wait_for_ranger_admin(check))
+    self.assertEqual(4, check.call_count)
+    intervals = [args[0][0] for args in sleep_mock.call_args_list]
+    self.assertEqual(1, intervals[0])
+    self.assertTrue(1 <= intervals[1] <= 2)
+    self.assertTrue(1 <= intervals[2] <= 4)
+
+  @patch("time.sleep")
+  @patch("time.time")
+  def test_wait_for_ranger_admin_timeout(self, time_mock, sleep_mock):
+    time_mock.side_effect = [0, 1, 3, 10, 601]
+    check = MagicMock(side_effect=Fail("Connection refused"))
+
+    self.assertEqual(None, RangeradminV2().wait_for_ranger_admin(check))
+    self.assertEqual(4, check.call_count)
+
+  def test_get_backoff_interval(self):
+    for attempt in range(10):
+      interval = ranger_functions_v2.get_backoff_interval(attempt, 30)
+      self.assertTrue(1 <= interval <= min(30, 2 ** attempt))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+from unittest import TestCase
+from mock.mock import patch, MagicMock
+
+from resource_management.core.exceptions import Fail
+from resource_management.core.logger import Logger
+from resource_management.libraries.functions.decorator import retry, safe_retry
+
+
+@patch.object(Logger, "logger", new = MagicMock())
+class TestRetryDecorator(TestCase):
+
+  @patch("time.sleep")
+  def test_retry(self, sleep_mock):
+    function = MagicMock(side_effect=[Fail("1"), Fail("2"), Fail("3"), "done"])
+
+    self.assertEqual("done", retry(times=4, sleep_time=1, backoff_factor=2, err_class=Fail)(function)())
+    self.assertEqual([1, 2, 4], [args[0][0] for args in sleep_mock.call_args_list])
+
+    function = MagicMock(side_effect=Fail("always"))
+    self.assertRaises(Fail, retry(times=3, err_class=Fail)(function))
+    self.assertEqual(3, function.call_count)
+
+  @patch("time.sleep")
+  @patch("random.uniform")
+  def test_retry_jitter(self, uniform_mock, sleep_mock):
+    uniform_mock.side_effect = lambda low, high: high / 2.0
+    function = MagicMock(side_effect=[Fail("1"), Fail("2"), "done"])
+
+    self.assertEqual("done", retry(times=3, sleep_time=2, backoff_factor=2, err_class=Fail, jitter=True)(function)())
+    self.assertEqual([(0, 2), (0, 4)], [args[0] for args in uniform_mock.call_args_list])
+    self.assertEqual([1, 2], [args[0][0] for args in sleep_mock.call_args_list])
+
+  @patch("time.sleep")
+  @patch("time.time")
+  def test_retry_deadline(self, time_mock, sleep_mock):
+    time_mock.side_effect = [0, 1, 5, 9]
+    function = MagicMock(side_effect=Fail("always"))
+
+    self.assertRaises(Fail, retry(times=10, sleep_time=2, err_class=Fail, deadline=10)(function))
+    # the third retry would start after the deadline
+    self.assertEqual(3, function.call_count)
+    self.assertEqual(2, sleep_mock.call_count)
+
+  @patch("time.sleep")
+  def test_retry_transient_only(self, sleep_mock):
+    is_transient = lambda err: "refused" in str(err)
+    function = MagicMock(side_effect=[Fail("Connection refused"), Fail("Permission denied"), "done"])
+
+    self.assertRaises(Fail, retry(times=3, err_class=Fail, is_transient=is_transient)(function))
+    self.assertEqual(2, function.call_count)
+
+    function = MagicMock(side_effect=[Fail("Connection refused"), Fail("Permission denied"), "done"])
+    self.assertEqual("failed", safe_retry(times=3, err_class=Fail, return_on_fail="failed",
+                                          is_transient=is_transient)(function)())
+    self.assertEqual(2, function.call_count)
+
+  @patch("time.sleep")
+  def test_safe_retry(self, sleep_mock):
+    function = MagicMock(side_effect=Fail("always"))
+
+    self.assertEqual("failed", safe_retry(times=3, err_class=Fail, return_on_fail="failed")(function)())
+    self.assertEqual(3, function.call_count)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+from unittest import TestCase
+from mock.mock import patch, MagicMock
+
+from resource_management.core.exceptions import Fail
+from resource_management.core.logger import Logger
+from resource_management.libraries.functions import solr_cloud_util
+
+SOLR_CLI = "ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh"
+ZK = "c6401.ambari.apache.org:2181"
+
+
+@patch.object(solr_cloud_util, "AMBARI_SUDO_BINARY", new="ambari-sudo.sh")
+@patch.object(solr_cloud_util, "File", new=MagicMock())
+@patch.object(Logger, "logger", new=MagicMock())
+class TestSolrCloudUtil(TestCase):
+
+  def setUp(self):
+    solr_cloud_util.SolrCliBatch.unsupported_clis.clear()
+
+  def tearDown(self):
+    solr_cloud_util.SolrCliBatch.unsupported_clis.clear()
+
+  def run_commands(self):
+    with solr_cloud_util.SolrCliBatch("/tmp"):
+      solr_cloud_util.set_cluster_prop(ZK, "/infra-solr", "urlScheme", "http", "/usr/jdk64/jdk1.7.0_45")
+      solr_cloud_util.setup_kerberos_plugin(ZK, "/infra-solr", "/usr/jdk64/jdk1.7.0_45")
+
+  @patch.object(solr_cloud_util, "Execute")
+  def test_batch(self, execute_mock):
+    self.run_commands()
+
+    self.assertEqual(1, execute_mock.call_count)
+    self.assertTrue(execute_mock.call_args[0][0].startswith(SOLR_CLI + " --batch-file /tmp/solr_cli_batch_"))
+
+  @patch.object(solr_cloud_util, "Execute")
+  def test_batch_file_not_supported(self, execute_mock):
+    def execute(command):
+      if "--batch-file" in command:
+        raise Fail("Execution of '{0}' returned 1. Unrecognized option: --batch-file".format(command))
+    execute_mock.side_effect = execute
+
+    self.run_commands()
+    commands = [args[0][0] for args in execute_mock.call_args_list]
+    self.assertEqual(3, len(commands))
+    self.assertEqual([SOLR_CLI + " --zookeeper-connect-string " + ZK + "/infra-solr --cluster-prop "
+                      "--property-name urlScheme --property-value http",
+                      SOLR_CLI + " --zookeeper-connect-string " + ZK + " --znode /infra-solr --setup-kerberos-plugin"],
+                     commands[1:])
+
+    # the client is not asked again
+    execute_mock.reset_mock()
+    self.run_commands()
+    self.assertEqual(commands[1:], [args[0][0] for args in execute_mock.call_args_list])
+
+  @patch.object(solr_cloud_util, "Execute")
+  def test_batch_failure(self, execute_mock):
+    execute_mock.side_effect = Fail("Execution of 'solrCloudCli.sh' returned 1. Cannot set cluster property")
+
+    self.assertRaises(Fail, self.run_commands)
+    self.assertEqual(1, execute_mock.call_count)
+
+  @patch.object(solr_cloud_util, "Execute")
+  def test_batch_split_by_jaas_file(self, execute_mock):
+    with solr_cloud_util.SolrCliBatch("/tmp"):
+      solr_cloud_util.set_cluster_prop(ZK, "/infra-solr", "urlScheme", "http", "/usr/jdk64/jdk1.7.0_45")
+      solr_cloud_util.secure_solr_znode(ZK, "/infra-solr", "/etc/solr/jaas.conf", "/usr/jdk64/jdk1.7.0_45", "solr")
+      solr_cloud_util.secure_solr_znode(ZK, "/infra-solr", "/etc/solr/jaas.conf", "/usr/jdk64/jdk1.7.0_45", "atlas")
+
+    # one batch without a jaas file, one with it
+    self.assertEqual(2, execute_mock.call_count)
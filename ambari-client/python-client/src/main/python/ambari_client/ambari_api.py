@@ -18,7 +18,7 @@
 import logging
 from ambari_client.core.http_client import HttpClient
 from ambari_client.core.rest_resource import RestResource
-from ambari_client.model import blueprint, stack, cluster, host, status
+from ambari_client.model import blueprint, stack, cluster, host, status, utils
 
 __docformat__ = "epytext"
 
@@ -119,6 +119,15 @@ class AmbariClient(RestResource):
         """
         return host._get_all_hosts(self)
 
+    def iter_all_hosts(self, fields=None, page_size=utils.DEFAULT_PAGE_SIZE):
+        """
+        Iterate over all hosts in the Data Center, one page at a time
+        @param fields: The fields to request, e.g. ["Hosts/host_name"].
+        @param page_size: The number of hosts per request.
+        @return: A generator of HostModel objects.
+        """
+        return host._iter_all_hosts(self, fields, page_size)
+
     def get_request_status(self, request_id):
         """
         Get request status
@@ -256,6 +265,15 @@ class AmbariClient(RestResource):
         """
         return status._get_N_requests(self, cluster_name, noOfrequest)
 
+    def iter_requests(self, cluster_name, fields=None,
+                      page_size=utils.DEFAULT_PAGE_SIZE):
+        """
+        Iterate over all requests of a cluster, one page at a time
+        @param cluster_name: The name of the cluster.
+        @return: A generator of RequestModel objects.
+        """
+        return status._iter_requests(self, cluster_name, fields, page_size)
+
     def get_blueprint(self, blueprint_name):
         """
         get blueprint
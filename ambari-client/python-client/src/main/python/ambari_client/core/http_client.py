@@ -18,6 +18,8 @@
 import logging
 import posixpath
 import sys
+import threading
+import Queue
 try:
     import pycurl
 # pycurl is not necessary for testcases, mock it
@@ -26,7 +28,6 @@ except ImportError:
     pycurl = MagicMock()
 import cStringIO
 import StringIO
-import pdb
 try:
     import json
 except ImportError:
@@ -37,29 +38,40 @@ __docformat__ = "epytext"
 
 LOG = logging.getLogger(__name__)
 
+# number of curl handles, hence of kept alive connections, shared by the threads using a client
+DEFAULT_MAX_CONNECTIONS = 10
+
 
 class HttpClient(object):
 
     """
     Basic HTTP client for rest APIs.
+
+    Thread-safe: every request runs on a curl handle taken from a pool, reusing
+    its kept alive connection, and responses are transparently decompressed.
     """
 
-    def __init__(self, host_url, user_name, password):
+    def __init__(self, host_url, user_name, password,
+                 max_connections=DEFAULT_MAX_CONNECTIONS):
         """
         @param host_url: The base url to the API.
+        @param max_connections: The maximum number of concurrent requests.
 
         """
 
         self._host_url = host_url.rstrip('/')
         self._headers = {}
-        self.c = pycurl.Curl()
+        self._userpass = None
         if user_name is not None:
-            self.c.setopt(pycurl.HTTPAUTH, pycurl.HTTPAUTH_BASIC)
-            userpass = user_name + ':'
+            self._userpass = user_name + ':'
             if password is not None:
-                userpass += password
-        LOG.debug("pycurl.USERPWD value = " + str(userpass))
-        self.c.setopt(pycurl.USERPWD, userpass)
+                self._userpass += password
+        LOG.debug("pycurl.USERPWD value = " + str(self._userpass))
+
+        self._max_connections = max_connections
+        # idle handles, a request takes one of the slots before taking a handle
+        self._handles = Queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
 
     def set_headers(self, headers):
         """
@@ -72,12 +84,51 @@ class HttpClient(object):
     def host_url(self):
         return self._host_url
 
+    @property
+    def max_connections(self):
+        return self._max_connections
+
     def _get_headers(self, headers):
         res = self._headers.copy()
         if headers:
             res.update(headers)
         return res
 
+    def _acquire_handle(self):
+        """
+        Wait for a free slot and take an idle curl handle, creating one if
+        there is none
+        """
+        self._slots.acquire()
+        try:
+            return self._handles.get_nowait()
+        except Queue.Empty:
+            pass
+        try:
+            return pycurl.Curl()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release_handle(self, c):
+        """
+        Give back the slot, and the handle unless it is None
+        """
+        if c is not None:
+            self._handles.put(c)
+        self._slots.release()
+
+    def _prepare_handle(self, c):
+        # reset clears the options left by the previous request but keeps the connection cache
+        c.reset()
+        if self._userpass is not None:
+            c.setopt(pycurl.HTTPAUTH, pycurl.HTTPAUTH_BASIC)
+            c.setopt(pycurl.USERPWD, self._userpass)
+        c.setopt(pycurl.SSL_VERIFYPEER, 0)
+        # an empty string enables every encoding supported by libcurl
+        c.setopt(pycurl.ENCODING, "")
+        c.setopt(pycurl.NOSIGNAL, 1)
+
     def invoke(self, http_method, path, payload=None, headers=None):
         """
         Submit an HTTP request.
@@ -88,83 +139,121 @@ class HttpClient(object):
 
         @return: The result of REST request
         """
-        # pdb.set_trace()
         LOG.debug("invoke : http_method = " + str(http_method))
         # Prepare URL and params
         url = self._normalize(path)
         if http_method in ("GET", "DELETE"):
             if payload is not None:
-                self.logger.warn(
+                LOG.warn(
                     "GET http_method does not pass any payload. Path '%s'" %
                     (path,))
                 payload = None
 
-	self.c.unsetopt(pycurl.CUSTOMREQUEST)
-        buf = cStringIO.StringIO()
-        self.c.setopt(pycurl.WRITEFUNCTION, buf.write)
-        self.c.setopt(pycurl.SSL_VERIFYPEER, 0)
+        c = self._acquire_handle()
+        try:
+            return self._perform(c, url, http_method, payload, headers)
+        except Exception:
+            # the state of a handle that failed is unknown, don't reuse it
+            c.close()
+            c = None
+            raise
+        finally:
+            self._release_handle(c)
 
+    def _perform(self, c, url, http_method, payload, headers):
+        self._prepare_handle(c)
+        buf = cStringIO.StringIO()
+        c.setopt(pycurl.WRITEFUNCTION, buf.write)
 
         LOG.debug("invoke : url = " + str(url))
         # set http_method
         if http_method == "GET":
-            self.c.setopt(pycurl.HTTPGET, 1)
+            c.setopt(pycurl.HTTPGET, 1)
         elif http_method == "HEAD":
-            self.c.setopt(pycurl.HTTPGET, 1)
-            self.c.setopt(pycurl.NOBODY, 1)
+            c.setopt(pycurl.HTTPGET, 1)
+            c.setopt(pycurl.NOBODY, 1)
         elif http_method == "POST":
-            self.c.setopt(pycurl.POST, 1)
+            c.setopt(pycurl.POST, 1)
         elif http_method == "PUT":
-            self.c.setopt(pycurl.UPLOAD, 1)
+            c.setopt(pycurl.UPLOAD, 1)
         else:
-            self.c.setopt(pycurl.CUSTOMREQUEST, http_method)
+            c.setopt(pycurl.CUSTOMREQUEST, http_method)
 
         data = None
         if http_method in ('POST', 'PUT'):
             LOG.debug("data..........." + str(payload))
             data = json.dumps(payload)
-            # data= data.decode('unicode-escape')
-            # LOG.debug( "after unicode decode")
-            # LOG.debug( data)
             data = self._to_bytestring(data)
             LOG.debug("after _to_bytestring")
             LOG.debug(data)
             content = StringIO.StringIO(data)
-            LOG.debug(content)
             content_length = len(data)
             LOG.debug("content_length........." + str(content_length))
 
             if http_method == 'POST':
-                self.c.setopt(pycurl.POSTFIELDSIZE, content_length)
+                c.setopt(pycurl.POSTFIELDSIZE, content_length)
             else:
-                self.c.setopt(pycurl.INFILESIZE, content_length)
+                c.setopt(pycurl.INFILESIZE, content_length)
 
-            self.c.setopt(pycurl.READFUNCTION, content.read)
+            c.setopt(pycurl.READFUNCTION, content.read)
 
-        self.c.setopt(self.c.URL, url)
+        c.setopt(pycurl.URL, url)
         headers = self._get_headers(headers)
         headers_l = ["%s: %s" % pair for pair in sorted(headers.iteritems())]
         LOG.debug(headers_l)
-        self.c.setopt(pycurl.HTTPHEADER, headers_l)
+        c.setopt(pycurl.HTTPHEADER, headers_l)
 
-        LOG.debug(
-            "invoke : pycurl.EFFECTIVE_URL = " +
-            self.c.getinfo(
-                pycurl.EFFECTIVE_URL))
         try:
-            self.c.perform()
+            c.perform()
         except Exception as ex:
-            LOG.debug(sys.stderr, str(ex))
+            LOG.debug("invoke : %s %s failed: %s" % (http_method, url, str(ex)))
             raise ex
-        contents_type = self.c.getinfo(pycurl.CONTENT_TYPE)
-        LOG.debug("invoke : pycurl.CONTENT_TYPE = " + contents_type)
-        code = self.c.getinfo(pycurl.RESPONSE_CODE)
+        contents_type = c.getinfo(pycurl.CONTENT_TYPE)
+        LOG.debug("invoke : pycurl.CONTENT_TYPE = " + str(contents_type))
+        code = c.getinfo(pycurl.RESPONSE_CODE)
         LOG.debug("invoke : pycurl.RESPONSE_CODE = " + str(code))
         response = buf.getvalue()
         buf.close()
         LOG.debug("invoke : COMPLETED ")
         return response, code, contents_type
 
+    def invoke_batch(self, requests, max_parallel=None):
+        """
+        Submit several HTTP requests concurrently.
+        @param requests: A list of (http_method, path, payload, headers) tuples.
+        @param max_parallel: The maximum number of requests in flight,
+        max_connections by default.
+
+        @return: A list holding, in the order of the requests, the result of
+        every request or the exception it failed with.
+        """
+        results = [None] * len(requests)
+        pending = Queue.Queue()
+        for index, request in enumerate(requests):
+            pending.put((index, request))
+
+        def worker():
+            while True:
+                try:
+                    index, request = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                http_method, path, payload, headers = request
+                try:
+                    results[index] = self.invoke(
+                        http_method, path, payload=payload, headers=headers)
+                except Exception as ex:
+                    results[index] = ex
+
+        workers_count = min(len(requests), max_parallel or self._max_connections)
+        workers = [threading.Thread(target=worker) for i in range(workers_count)]
+        for t in workers:
+            t.daemon = True
+            t.start()
+        for t in workers:
+            t.join()
+        return results
+
     def _to_bytestring(self, s):
         #    if not isinstance(s, basestring):
         #      raise TypeError("value should be a str or unicode")
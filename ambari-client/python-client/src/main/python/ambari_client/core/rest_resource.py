@@ -67,7 +67,37 @@ class RestResource(object):
         path = self._join_uri(url_path)
         resp, code, content = self._make_invoke(
             http_method, payload, headers, path)
+        return self._parse_response(http_method, path, resp, code)
 
+    def invoke_batch(self, requests, max_parallel=None):
+        """
+        Invoke several API http_methods concurrently.
+        @param requests: A list of (http_method, url_path, payload) tuples.
+        @param max_parallel: The maximum number of requests in flight.
+        @return: A list of the dictionaries of the REST results, in the
+        order of the requests.
+        """
+        paths = [self._join_uri(url_path) for http_method, url_path, payload in requests]
+        results = self._client.invoke_batch(
+            [(http_method, path, payload, None)
+             for (http_method, url_path, payload), path in zip(requests, paths)],
+            max_parallel=max_parallel)
+
+        json_dicts = []
+        for (http_method, url_path, payload), path, result in zip(requests, paths, results):
+            if isinstance(result, Exception):
+                LOG.error(
+                    "Command '%s %s' failed with error %s" %
+                    (http_method, path, result))
+                json_dicts.append({
+                    "status": None, "message": "Command '%s %s' failed with error %s" %
+                    (http_method, path, result)})
+            else:
+                resp, code, content = result
+                json_dicts.append(self._parse_response(http_method, path, resp, code))
+        return json_dicts
+
+    def _parse_response(self, http_method, path, resp, code):
         LOG.debug("RESPONSE from the REST request >>>>>>> \n" + str(resp))
         LOG.debug(
             "\n===========================================================")
@@ -18,7 +18,7 @@
 import logging
 import time
 from ambari_client.model.base_model import BaseModel, ModelList
-from ambari_client.model import service, host, paths, status, configuration, utils
+from ambari_client.model import service, host, component, paths, status, configuration, utils
 
 
 LOG = logging.getLogger(__name__)
@@ -254,6 +254,33 @@ class ClusterModel(BaseModel):
             self._get_resource_root(),
             self.cluster_name)
 
+    def iter_hosts(self, fields=None, page_size=utils.DEFAULT_PAGE_SIZE):
+        """
+        Iterate over all hosts in this cluster, one page at a time.
+        @param fields: The fields to request, e.g. ["Hosts/host_name"].
+        @param page_size: The number of hosts per request.
+        @return: A generator of HostModel objects.
+        """
+        return host._iter_all_cluster_hosts(
+            self._get_resource_root(),
+            self.cluster_name,
+            fields,
+            page_size)
+
+    def iter_host_components(self, host_name=None, fields=None,
+                             page_size=utils.DEFAULT_PAGE_SIZE):
+        """
+        Iterate over the host components of a host, or of all the hosts
+        in this cluster, one page at a time.
+        @return: A generator of ComponentModel objects.
+        """
+        return component.iter_host_components(
+            self._get_resource_root(),
+            self.cluster_name,
+            host_name,
+            fields,
+            page_size)
+
     def get_host(self, hostname, detail=None):
         """
         Get a specific hosts in this cluster.
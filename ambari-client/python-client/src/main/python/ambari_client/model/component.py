@@ -35,6 +35,25 @@ def get_host_components(resource_root, cluster_name, host_name):
         "HostRoles")
 
 
+def iter_host_components(resource_root, cluster_name, host_name=None,
+                         fields=None, page_size=utils.DEFAULT_PAGE_SIZE):
+    """
+    Iterate over the host components of a host, or of the whole cluster
+    when host_name is None, one page at a time.
+    """
+    if host_name is None:
+        path = paths.CLUSTER_HOSTS_COMPONENTS_PATH % (cluster_name)
+    else:
+        path = paths.HOSTS_COMPONENTS_LIST_PATH % (cluster_name, host_name)
+    return utils.ModelUtils.iter_model_list(
+        ComponentModel,
+        resource_root,
+        path,
+        "HostRoles",
+        fields,
+        page_size)
+
+
 def get_host_component(resource_root, cluster_name, host_name, component_name):
     path = paths.HOSTS_COMPONENT_PATH % (
         cluster_name, host_name, component_name)
@@ -163,6 +163,43 @@ def _get_all_hosts(root_resource):
         "Hosts")
 
 
+def _iter_all_hosts(root_resource, fields=None,
+                    page_size=utils.DEFAULT_PAGE_SIZE):
+    """
+    Iterate over all hosts, one page at a time
+    @param root_resource: The root Resource.
+    @param fields: The fields to request, all by default.
+    @param page_size: The number of hosts per request.
+    @return: A generator of HostModel objects.
+    """
+    return utils.ModelUtils.iter_model_list(
+        HostModel,
+        root_resource,
+        paths.HOSTS_PATH,
+        "Hosts",
+        fields,
+        page_size)
+
+
+def _iter_all_cluster_hosts(root_resource, cluster_name, fields=None,
+                            page_size=utils.DEFAULT_PAGE_SIZE):
+    """
+    Iterate over all hosts in the cluster, one page at a time
+    @param root_resource: The root Resource.
+    @param cluster_name: The name of the cluster.
+    @param fields: The fields to request, all by default.
+    @param page_size: The number of hosts per request.
+    @return: A generator of HostModel objects.
+    """
+    return utils.ModelUtils.iter_model_list(
+        HostModel,
+        root_resource,
+        paths.CLUSTER_HOSTS_PATH % (cluster_name),
+        "Hosts",
+        fields,
+        page_size)
+
+
 def _get_all_cluster_hosts(root_resource, cluster_name):
     """
     Get all hosts in the cluster
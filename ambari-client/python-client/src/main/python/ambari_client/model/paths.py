@@ -34,6 +34,8 @@ HOST_PATH = "/hosts/%s"
 HOSTS_PATH = "/hosts"
 HOSTS_CREATE_PATH = "/clusters/%s/hosts"
 HOSTS_COMPONENTS_PATH = "/clusters/%s/hosts/%s/host_components?fields=HostRoles/state"
+HOSTS_COMPONENTS_LIST_PATH = "/clusters/%s/hosts/%s/host_components"
+CLUSTER_HOSTS_COMPONENTS_PATH = "/clusters/%s/host_components"
 HOSTS_COMPONENT_PATH = "/clusters/%s/hosts/%s/host_components/%s"
 HOSTS_ASSIGN_ROLE = "/clusters/%s/hosts?Hosts/host_name=%s"
 
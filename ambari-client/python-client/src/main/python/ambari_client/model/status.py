@@ -90,6 +90,22 @@ def _get_N_requests(resource_root, cluster_name, noOfrequest):
         "Requests")
 
 
+def _iter_requests(resource_root, cluster_name, fields=None,
+                   page_size=utils.DEFAULT_PAGE_SIZE):
+    """
+    Iterate over all requests of a cluster, one page at a time.
+    @param cluster_name :Cluster name.
+    @return: A generator of RequestModel objects.
+    """
+    return utils.ModelUtils.iter_model_list(
+        RequestModel,
+        resource_root,
+        paths.CLUSTER_REQUESTS_PATH % (cluster_name),
+        "Requests",
+        fields,
+        page_size)
+
+
 class RequestModel(BaseModel):
 
     """
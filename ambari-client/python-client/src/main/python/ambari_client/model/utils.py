@@ -28,6 +28,7 @@ ref_class_dic = {"ClusterModelRef": "cluster_name"}
 ref_pkg_dic = {"ClusterModelRef": "ambari_client.model.cluster"}
 LIST_KEY = "items"
 ALL = "ALL"
+DEFAULT_PAGE_SIZE = 100
 
 
 class ModelUtils(object):
@@ -140,6 +141,56 @@ class ModelUtils(object):
         LOG.debug(objects)
         return member_list_clss(objects)
 
+    @staticmethod
+    def iter_model_list(
+            member_cls,
+            resource_root,
+            path,
+            RESOURCE_KEY_WORD,
+            fields=None,
+            page_size=DEFAULT_PAGE_SIZE):
+        """
+        iterate over a collection, requesting one page at a time.
+        @param member_cls : model class.
+        @param resource_root : resource object.
+        @param path : path of the collection.
+        @param RESOURCE_KEY_WORD : tsake subset of the items based on this key.
+        @param fields : fields to request, all the RESOURCE_KEY_WORD ones by default.
+        @param page_size : number of items per request.
+        @return: A generator of model_cls objects, created as they are consumed.
+        """
+        if not fields:
+            fields = ["%s/*" % RESOURCE_KEY_WORD]
+        separator = "&" if "?" in path else "?"
+        offset = 0
+
+        while True:
+            page_path = "%s%sfields=%s&page_size=%d&from=%d" % (
+                path, separator, ",".join(fields), page_size, offset)
+            collection_dict = resource_root.get(page_path)
+            ModelUtils._check_is_error(
+                member_cls,
+                collection_dict,
+                resource_root)
+
+            json_list = []
+            if isinstance(collection_dict, dict) and LIST_KEY in collection_dict:
+                json_list = collection_dict[LIST_KEY]
+            LOG.debug(
+                "iter_model_list: %d items from %s" %
+                (len(json_list), page_path))
+
+            for x in json_list:
+                yield ModelUtils.create_model(
+                    member_cls,
+                    x.get(RESOURCE_KEY_WORD),
+                    resource_root,
+                    RESOURCE_KEY_WORD)
+
+            if len(json_list) < page_size:
+                return
+            offset += len(json_list)
+
     @staticmethod
     def create_model(
             model_cls,
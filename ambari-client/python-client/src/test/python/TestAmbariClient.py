@@ -116,6 +116,32 @@ class TestAmbariClient(unittest.TestCase):
     self.assertEqual(len(all_hosts), 12, "There should be 12 hosts from the response")
     self.assertEqual(all_hosts.to_json_dict(), expected_hosts_dict)
 
+  def test_iter_all_hosts(self):
+    """
+    Iterate over all hosts.
+    This testcase checks if iter_all_hosts requests one page at a time.
+    """
+    host_names = ["host%d" % i for i in range(5)]
+
+    def get_page(path):
+      offset = int(path.split("from=")[1])
+      return {"items": [{"Hosts": {"host_name": name}} for name in host_names[offset:offset + 2]]}
+
+    resource_mock = MagicMock()
+    resource_mock.get.side_effect = get_page
+    client = self.create_client()
+    client.get = resource_mock.get
+
+    hosts = client.iter_all_hosts(fields=["Hosts/host_name"], page_size=2)
+    self.assertEqual(0, resource_mock.get.call_count)
+
+    self.assertEqual("host0", hosts.next().host_name)
+    self.assertEqual(1, resource_mock.get.call_count)
+
+    self.assertEqual(host_names[1:], [host.host_name for host in hosts])
+    self.assertEqual(3, resource_mock.get.call_count)
+    self.assertEqual("/hosts?fields=Hosts/host_name&page_size=2&from=4", resource_mock.get.call_args[0][0])
+
   def ADisabledtest_bootstrap_hosts(self):
     """
     Test Bootstrap
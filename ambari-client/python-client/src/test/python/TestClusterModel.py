@@ -70,6 +70,21 @@ class TestClusterModel(unittest.TestCase):
     self.assertEqual(cluster.to_json_dict(), expected_dict_output, "to_json_dict should convert ClusterModel")
     self.assertEqual(len(serviceList), 3, "There should be a 3 services from the response")
 
+  def test_iter_host_components(self):
+    """
+    Iterate over the host components of the cluster
+    """
+    cluster = self.create_cluster()
+    get_mock = MagicMock(return_value={"items": [
+      {"HostRoles": {"component_name": "DATANODE", "host_name": "dev05.hortonworks.com"}},
+      {"HostRoles": {"component_name": "DATANODE", "host_name": "dev06.hortonworks.com"}}]})
+    cluster._get_resource_root().get = get_mock
+
+    components = list(cluster.iter_host_components(page_size=10))
+
+    self.assertEqual(["dev05.hortonworks.com", "dev06.hortonworks.com"], [c.host_name for c in components])
+    get_mock.assert_called_once_with("/clusters/test1/host_components?fields=HostRoles/*&page_size=10&from=0")
+
   def test_get_all_hosts(self):
     """
     Get all cluster hosts
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import threading
+import time
+
+from ambari_client.core import http_client
+from ambari_client.core.http_client import HttpClient
+from ambari_client.core.rest_resource import RestResource
+from mock.mock import MagicMock, patch
+import unittest
+
+
+class FakeCurl(object):
+  """
+  Answers every request with the url it was sent to.
+  """
+  lock = threading.Lock()
+  running = 0
+  max_running = 0
+  instances = []
+
+  def __init__(self):
+    self.options = {}
+    self.urls = []
+    FakeCurl.instances.append(self)
+
+  def reset(self):
+    self.options = {}
+
+  def setopt(self, option, value):
+    self.options[option] = value
+
+  def perform(self):
+    with FakeCurl.lock:
+      FakeCurl.running += 1
+      FakeCurl.max_running = max(FakeCurl.max_running, FakeCurl.running)
+    time.sleep(0.05)
+    with FakeCurl.lock:
+      FakeCurl.running -= 1
+
+    url = self.options[http_client.pycurl.URL]
+    self.urls.append(url)
+    if url.endswith("/fail"):
+      raise Exception("Couldn't connect to server")
+    self.options[http_client.pycurl.WRITEFUNCTION]('{"url": "%s"}' % url)
+
+  def getinfo(self, info):
+    if info == http_client.pycurl.RESPONSE_CODE:
+      return 200
+    return "application/json"
+
+  def close(self):
+    pass
+
+
+class TestHttpClient(unittest.TestCase):
+
+  def setUp(self):
+    FakeCurl.running = 0
+    FakeCurl.max_running = 0
+    FakeCurl.instances = []
+    self.pycurl_patcher = patch.object(http_client, "pycurl", MagicMock(Curl=FakeCurl))
+    self.pycurl_patcher.start()
+
+  def tearDown(self):
+    self.pycurl_patcher.stop()
+
+  def test_invoke_reuses_handles(self):
+    client = HttpClient("http://localhost:8080/api/v1", "admin", "admin")
+
+    self.assertEqual(('{"url": "http://localhost:8080/api/v1/clusters"}', 200, "application/json"),
+                     client.invoke("GET", "clusters"))
+    client.invoke("GET", "hosts")
+
+    self.assertEqual(1, len(FakeCurl.instances))
+    curl = FakeCurl.instances[0]
+    self.assertEqual("admin:admin", curl.options[http_client.pycurl.USERPWD])
+    self.assertEqual("", curl.options[http_client.pycurl.ENCODING])
+
+  def test_invoke_batch(self):
+    client = HttpClient("http://localhost:8080/api/v1", "admin", "admin", max_connections=4)
+    requests = [("GET", "hosts/host%d" % i, None, None) for i in range(12)]
+    requests.append(("GET", "fail", None, None))
+
+    results = client.invoke_batch(requests)
+
+    self.assertEqual(13, len(results))
+    for i in range(12):
+      self.assertEqual('{"url": "http://localhost:8080/api/v1/hosts/host%d"}' % i, results[i][0])
+    self.assertTrue(isinstance(results[12], Exception))
+    # requests ran in parallel, never on more handles than the pool size
+    self.assertEqual(4, FakeCurl.max_running)
+    self.assertTrue(len(FakeCurl.instances) <= 5)
+
+  def test_failed_request_frees_its_slot(self):
+    client = HttpClient("http://localhost:8080/api/v1", "admin", "admin", max_connections=1)
+    results = []
+
+    def invoke(path):
+      try:
+        results.append(client.invoke("GET", path)[1])
+      except Exception as e:
+        results.append(e)
+
+    threads = [threading.Thread(target=invoke, args=(path,)) for path in ["fail", "hosts", "fail", "hosts"]]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join(5)
+    self.assertFalse(any(thread.isAlive() for thread in threads))
+    self.assertEqual(2, results.count(200))
+
+    # more workers than connections, with failures
+    requests = [("GET", "fail" if i % 2 else "hosts", None, None) for i in range(6)]
+    results = client.invoke_batch(requests, max_parallel=3)
+    self.assertEqual(6, len(results))
+    self.assertEqual(1, FakeCurl.max_running)
+
+  def test_rest_resource_invoke_batch(self):
+    client = HttpClient("http://localhost:8080/api/v1", "admin", "admin")
+    resource = RestResource(client, "clusters/c1")
+
+    results = resource.invoke_batch([("GET", "hosts/host1", None), ("DELETE", "fail", None)])
+
+    self.assertEqual({"url": "http://localhost:8080/api/v1/clusters/c1/hosts/host1"}, results[0])
+    self.assertEqual(None, results[1]["status"])
@@ -18,29 +18,114 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import random
 from math import sqrt
 
+# number of values kept by RunningStatistics for percentile estimation; series
+# up to this size get exact percentiles, longer ones a uniform random sample
+DEFAULT_RESERVOIR_SIZE = 10000
+
+class RunningStatistics(object):
+  """
+  Single pass, constant memory aggregates over a stream of values.
+
+  Mean and variance are maintained with Welford's algorithm, which avoids the
+  cancellation errors of the naive sum of squares approach. Percentiles are
+  computed from a bounded reservoir sample of the stream.
+  """
+
+  def __init__(self, values=None, reservoir_size=DEFAULT_RESERVOIR_SIZE):
+    self.count = 0
+    self.total = 0
+    self.mean = 0.0
+    self.m2 = 0.0
+    self.min = None
+    self.max = None
+    self.reservoir_size = reservoir_size
+    self.reservoir = []
+    if values is not None:
+      self.update(values)
+
+  def add(self, value):
+    self.count += 1
+    self.total += value
+    delta = value - self.mean
+    self.mean += delta / float(self.count)
+    self.m2 += delta * (value - self.mean)
+
+    if self.min is None or value < self.min:
+      self.min = value
+    if self.max is None or value > self.max:
+      self.max = value
+
+    if len(self.reservoir) < self.reservoir_size:
+      self.reservoir.append(value)
+    elif self.reservoir_size > 0:
+      index = random.randint(0, self.count - 1)
+      if index < self.reservoir_size:
+        self.reservoir[index] = value
+
+  def update(self, values):
+    for value in values:
+      self.add(value)
+    return self
+
+  def sample_variance(self):
+    if self.count < 2:
+      return 0
+    return self.m2 / (self.count - 1)
+
+  def sample_standard_deviation(self):
+    return sqrt(self.sample_variance())
+
+  def sample_standard_deviation_percentage(self):
+    try:
+      return self.sample_standard_deviation() / self.mean * 100
+    except ZeroDivisionError:
+      return 0
+
+  def percentile(self, percent):
+    """
+    calculates the given percentile (0-100) using linear interpolation
+    between the closest ranks; exact while the stream fits the reservoir
+    """
+    if not self.reservoir:
+      return 0
+    values = sorted(self.reservoir)
+    rank = (len(values) - 1) * min(max(percent, 0), 100) / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
 def sample_standard_deviation(lst):
   """calculates standard deviation"""
-  if len(lst) < 2:
-    return 0
-  variance = sum([(element-mean(lst))**2 for element in lst]) / (len(lst) - 1)
-  return sqrt(variance)
+  return RunningStatistics(lst, reservoir_size=0).sample_standard_deviation()
 
 def mean(lst):
   """calculates mean"""
-  if len(lst) < 1:
+  stats = RunningStatistics(lst, reservoir_size=0)
+  if stats.count < 1:
     return 0
-  return sum(lst) / len(lst)
+  # same type as sum / len so integer series keep reporting integer means
+  return stats.total / stats.count
 
 def sample_standard_deviation_percentage(lst):
   """calculates sample standard deviation percentage"""
+  # should not be a zero mean for this alert
+  return RunningStatistics(lst, reservoir_size=0).sample_standard_deviation_percentage()
+
+def percentile(lst, percent):
+  """calculates percentile"""
   try:
-    return sample_standard_deviation(lst) / mean(lst) * 100
-  except ZeroDivisionError:
-    # should not be a case for this alert
-    return 0
+    # keep every value of an in-memory list so the result is exact
+    reservoir_size = max(len(lst), DEFAULT_RESERVOIR_SIZE)
+  except TypeError:
+    reservoir_size = DEFAULT_RESERVOIR_SIZE
+  return RunningStatistics(lst, reservoir_size=reservoir_size).percentile(percent)
 
 def count(lst):
   """calculates number of data points"""
-  return len(lst)
+  try:
+    return len(lst)
+  except TypeError:
+    return sum(1 for _ in lst)
@@ -19,63 +19,155 @@ limitations under the License.
 '''
 
 import logging
-from multiprocessing import Process, Queue
+import threading
+import time
+from Queue import Queue, Empty
 
 logger = logging.getLogger()
 
 SUCCESS = "SUCCESS"
 FAILED = "FAILED"
 
+DEFAULT_POOL_SIZE = 8
+
 class PrallelProcessResult(object):
     def __init__(self, element, status, result):
         self.result = result
         self.status = status
         self.element = element
 
-class ParallelProcess(Process):
-
+class ParallelTask(object):
+    """
+    Runs function(element, params) on a pool worker and puts (task, result) to the queue of the caller.
+    The tasks of one call share the 'done' event, a task picked up by a worker after it was set is skipped.
+    """
 
-    def __init__(self, function, element, params, queue):
+    def __init__(self, function, element, params, queue, done, stop_on_success):
         self.function = function
         self.element = element
         self.params = params
         self.queue = queue
-        super(ParallelProcess, self).__init__()
-
-    def return_name(self):
-        ## NOTE: self.name is an attribute of multiprocessing.Process
-        return "Process running function '%s' for element '%s'" % (self.function, self.element)
+        self.done = done
+        self.stop_on_success = stop_on_success
+        self.worker = None
+        self.start_time = None
 
     def run(self):
+        if self.done.is_set():
+            return
+        self.worker = threading.current_thread()
+        self.start_time = time.time()
         try:
             result = self.function(self.element, self.params)
-            self.queue.put(PrallelProcessResult(self.element, SUCCESS, result))
+            if self.stop_on_success:
+                self.done.set()
+            self.queue.put((self, PrallelProcessResult(self.element, SUCCESS, result)))
         except Exception as e:
-            self.queue.put(PrallelProcessResult(self.element, FAILED,
-                            "Exception while running function '%s' for '%s'. Reason : %s" % (self.function, self.element, str(e))))
-        return
-
-def execute_in_parallel(function, array, params, wait_for_all = False):
+            self.queue.put((self, PrallelProcessResult(self.element, FAILED,
+                            "Exception while running function '%s' for '%s'. Reason : %s" % (self.function, self.element, str(e)))))
+
+class WorkerPool(object):
+    """
+    Fixed number of daemon threads running the tasks of all execute_in_parallel calls of the process.
+    A worker stuck in a task which timed out is retired once the task returns and replaced right away,
+    so hanging tasks can not exhaust the pool.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE):
+        self.size = size
+        self.tasks = Queue()
+        self.lock = threading.Lock()
+        self.workers = set()
+        self.worker_count = 0
+        with self.lock:
+            for i in range(size):
+                self._start_worker()
+
+    def _start_worker(self):
+        self.worker_count += 1
+        worker = threading.Thread(target=self._work, name="ParallelWorker-%d" % self.worker_count)
+        worker.daemon = True
+        self.workers.add(worker)
+        worker.start()
+
+    def _work(self):
+        worker = threading.current_thread()
+        while True:
+            with self.lock:
+                if worker not in self.workers:
+                    return
+            task = self.tasks.get()
+            try:
+                task.run()
+            except Exception:
+                logger.exception("Running parallel task failed")
+
+    def submit(self, task):
+        self.tasks.put(task)
+
+    def retire(self, worker):
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+                self._start_worker()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
+
+def execute_in_parallel(function, array, params, wait_for_all = False, timeout = None, pool = None):
+    """
+    Run function(element, params) for every element of the array on a bounded pool of worker threads
+    and return {element: PrallelProcessResult}.
+
+    Unless wait_for_all is set, returns at the first successful result. The tasks not started yet are
+    cancelled then, the running ones complete in the background and their results are dropped.
+    A task running for more than timeout seconds is reported as FAILED without waiting for it.
+    """
     logger.info("Started running %s for %s" % (function, array))
-    processs = []
+    pool = pool or get_worker_pool()
     q = Queue()
-    counter = len(array)
+    done = threading.Event()
     results = {}
+    pending = set()
 
     for element in array:
-        process = ParallelProcess(function, element, params, q)
-        process.start()
-        processs.append(process)
-
-    while counter > 0:
-        tmp = q.get()
-        counter-=1
-        results[tmp.element] = tmp
-        if tmp.status == SUCCESS and not wait_for_all:
-            counter = 0
-
-    for process in processs:
-        process.terminate()
+        task = ParallelTask(function, element, params, q, done, not wait_for_all)
+        pending.add(task)
+        pool.submit(task)
+
+    while pending:
+        wait = None
+        if timeout is not None:
+            start_times = [task.start_time for task in pending if task.start_time is not None]
+            wait = max(0, min(start_times) + timeout - time.time()) if start_times else timeout
+
+        try:
+            task, result = q.get(timeout=wait) if wait is not None else q.get()
+            if task not in pending:
+                continue
+            pending.remove(task)
+            results[result.element] = result
+            if result.status == SUCCESS and not wait_for_all:
+                break
+        except Empty:
+            pass
+
+        if timeout is not None:
+            now = time.time()
+            for task in [task for task in pending if task.start_time is not None and now - task.start_time >= timeout]:
+                pending.remove(task)
+                results[task.element] = PrallelProcessResult(task.element, FAILED,
+                    "Timed out after %s seconds running function '%s' for '%s'" % (timeout, task.function, task.element))
+                pool.retire(task.worker)
+
+    done.set()
 
     logger.info("Finished running %s for %s" % (function, array))
 
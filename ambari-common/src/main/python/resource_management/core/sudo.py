@@ -67,6 +67,9 @@ if os.geteuid() == 0:
   def copy(src, dst):
     shutil.copy(src, dst)
     
+  def rename(src, dst):
+    os.rename(src, dst)
+
   def makedirs(path, mode):
     try:
       os.makedirs(path, mode)
@@ -268,6 +271,10 @@ else:
   def copy(src, dst):
     shell.checked_call(["sudo", "cp", "-r", src, dst], sudo=True)
 
+  # os.rename replacement
+  def rename(src, dst):
+    shell.checked_call(["mv", "-f", src, dst], sudo=True)
+
   # os.listdir replacement
   def listdir(path):
     if not path_isdir(path):
@@ -20,44 +20,37 @@ Ambari Agent
 
 """
 
+import random
 import time
 __all__ = ['retry', 'safe_retry', ]
 
 from resource_management.core.logger import Logger
 
 
-def retry(times=3, sleep_time=1, max_sleep_time=8, backoff_factor=1, err_class=Exception):
+def retry(times=3, sleep_time=1, max_sleep_time=8, backoff_factor=1, err_class=Exception, jitter=False,
+          deadline=None, is_transient=None):
   """
   Retry decorator for improved robustness of functions.
   :param times: Number of times to attempt to call the function.
   :param sleep_time: Initial sleep time between attempts
   :param backoff_factor: After every failed attempt, multiple the previous sleep time by this factor.
   :param err_class: Exception class to handle
+  :param jitter: Sleep a random time between 0 and the sleep time ("full jitter"), so that many hosts retrying
+  against the same service do not retry in lockstep.
+  :param deadline: Total number of seconds to keep retrying for, no retry is started after it passed.
+  :param is_transient: Function telling whether an err_class exception is worth retrying; others are raised at once.
   :return: Returns the output of the wrapped function.
   """
   def decorator(function):
     def wrapper(*args, **kwargs):
-      _times = times
-      _sleep_time = sleep_time
-      _backoff_factor = backoff_factor
-      _err_class = err_class
-
-      while _times > 1:
-        _times -= 1
-        try:
-          return function(*args, **kwargs)
-        except _err_class, err:
-          Logger.info("Will retry %d time(s), caught exception: %s. Sleeping for %d sec(s)" % (_times, str(err), _sleep_time))
-          time.sleep(_sleep_time)
-        if(_sleep_time * _backoff_factor <= max_sleep_time):
-          _sleep_time *= _backoff_factor
-
-      return function(*args, **kwargs)
+      return _call_with_retries(function, args, kwargs, times, sleep_time, max_sleep_time, backoff_factor, err_class,
+                                jitter, deadline, is_transient)
     return wrapper
   return decorator
 
 
-def safe_retry(times=3, sleep_time=1, max_sleep_time=8, backoff_factor=1, err_class=Exception, return_on_fail=None):
+def safe_retry(times=3, sleep_time=1, max_sleep_time=8, backoff_factor=1, err_class=Exception, return_on_fail=None,
+               jitter=False, deadline=None, is_transient=None):
   """
   Retry decorator for improved robustness of functions. Instead of error generation on the last try, will return
   return_on_fail value.
@@ -66,31 +59,50 @@ def safe_retry(times=3, sleep_time=1, max_sleep_time=8, backoff_factor=1, err_cl
   :param backoff_factor: After every failed attempt, multiple the previous sleep time by this factor.
   :param err_class: Exception class to handle
   :param return_on_fail value to return on the last try
+  :param jitter: Sleep a random time between 0 and the sleep time ("full jitter"), so that many hosts retrying
+  against the same service do not retry in lockstep.
+  :param deadline: Total number of seconds to keep retrying for, no retry is started after it passed.
+  :param is_transient: Function telling whether an err_class exception is worth retrying; return_on_fail is
+  returned at once for others.
   :return: Returns the output of the wrapped function.
   """
   def decorator(function):
     def wrapper(*args, **kwargs):
-      _times = times
-      _sleep_time = sleep_time
-      _backoff_factor = backoff_factor
-      _err_class = err_class
-      _return_on_fail = return_on_fail
-
-      while _times > 1:
-        _times -= 1
-        try:
-          return function(*args, **kwargs)
-        except _err_class, err:
-          Logger.info("Will retry %d time(s), caught exception: %s. Sleeping for %d sec(s)" % (_times, str(err), _sleep_time))
-          time.sleep(_sleep_time)
-        if(_sleep_time * _backoff_factor <= max_sleep_time):
-          _sleep_time *= _backoff_factor
-
       try:
-        return function(*args, **kwargs)
-      except _err_class, err:
+        return _call_with_retries(function, args, kwargs, times, sleep_time, max_sleep_time, backoff_factor, err_class,
+                                  jitter, deadline, is_transient)
+      except err_class, err:
         Logger.error(str(err))
-        return _return_on_fail
+        return return_on_fail
 
     return wrapper
   return decorator
+
+
+def _call_with_retries(function, args, kwargs, times, sleep_time, max_sleep_time, backoff_factor, err_class,
+                       jitter, deadline, is_transient):
+  _times = times
+  _sleep_time = sleep_time
+  _deadline = time.time() + deadline if deadline is not None else None
+
+  while _times > 1:
+    _times -= 1
+    try:
+      return function(*args, **kwargs)
+    except err_class, err:
+      if is_transient is not None and not is_transient(err):
+        raise
+
+      _sleep = random.uniform(0, _sleep_time) if jitter else _sleep_time
+      if _deadline is not None:
+        remaining = _deadline - time.time()
+        if remaining <= _sleep:
+          Logger.info("Will not retry, the retry deadline of %d sec(s) is reached, caught exception: %s" % (deadline, str(err)))
+          raise
+
+      Logger.info("Will retry %d time(s), caught exception: %s. Sleeping for %.1f sec(s)" % (_times, str(err), _sleep))
+      time.sleep(_sleep)
+    if(_sleep_time * backoff_factor <= max_sleep_time):
+      _sleep_time *= backoff_factor
+
+  return function(*args, **kwargs)
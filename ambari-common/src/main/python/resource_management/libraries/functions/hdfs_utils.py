@@ -19,7 +19,13 @@ limitations under the License.
 Ambari Agent
 
 """
+import re
+
 from resource_management.libraries.functions.is_empty import is_empty
+from resource_management.libraries.functions.jmx import JmxConnection, wait_for_jmx_condition
+
+NAMENODE_INFO_QRY = "Hadoop:service=NameNode,name=NameNodeInfo"
+SAFEMODE_BLOCKS_PATTERN = re.compile(r"reported blocks (\d+).*total blocks (\d+)")
 
 """
 Check both dfs.http.policy and deprecated dfs.https.enable
@@ -30,4 +36,42 @@ def is_https_enabled_in_hdfs(dfs_http_policy, dfs_https_enable):
         https_enabled = dfs_http_policy.lower() == "https_only"
     elif not is_empty(dfs_https_enable):
         https_enabled = dfs_https_enable
-    return https_enabled
\ No newline at end of file
+    return https_enabled
+
+def is_safemode_off(namenode_info):
+    """
+    NameNodeInfo reports an empty Safemode attribute once the NameNode has left safemode.
+    """
+    return not namenode_info.get("Safemode")
+
+def get_safemode_progress(namenode_info):
+    """
+    Turns the NameNodeInfo Safemode message into block report progress, like "reported 90 of 120 blocks".
+    """
+    safemode = namenode_info.get("Safemode", "")
+    match = SAFEMODE_BLOCKS_PATTERN.search(safemode)
+    if match:
+        return "reported {0} of {1} blocks".format(match.group(1), match.group(2))
+    return safemode
+
+def wait_for_namenode_safemode_off(namenode_web_address, is_https_enabled, timeout, security_enabled=False,
+                                   run_user=None):
+    """
+    Waits for the NameNode to receive enough block reports to leave safemode by polling its JMX,
+    logging the block report progress on the way.
+
+    :return: True once safemode is OFF, False if the NameNode JMX could never be read (the caller may then
+     fall back to dfsadmin)
+    :raises Fail: if the NameNode JMX was readable but safemode was still ON after timeout seconds
+    """
+    jmx_connection = JmxConnection(namenode_web_address, is_https_enabled=is_https_enabled,
+                                   security_enabled=security_enabled, run_user=run_user)
+    try:
+        if jmx_connection.get_bean(NAMENODE_INFO_QRY) is None:
+            return False
+        wait_for_jmx_condition(jmx_connection, NAMENODE_INFO_QRY, is_safemode_off, timeout,
+                               progress=get_safemode_progress,
+                               description="NameNode {0} to leave safemode".format(namenode_web_address))
+        return True
+    finally:
+        jmx_connection.close()
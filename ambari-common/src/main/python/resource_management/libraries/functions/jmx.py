@@ -17,12 +17,20 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 '''
+import httplib
+import socket
+import ssl
+import time
+import urllib
 import urllib2
 import ambari_simplejson as json # simplejson is much faster comparing to Python 2.6 json module and has the same functions set.
 from resource_management.core import shell
+from resource_management.core.exceptions import Fail
 from resource_management.core.logger import Logger
 from resource_management.libraries.functions.get_user_call_output import get_user_call_output
 
+JMX_CONNECTION_TIMEOUT = 10
+
 def get_value_from_jmx(qry, property, security_enabled, run_user, is_https_enabled):
   try:
     if security_enabled:
@@ -42,4 +50,126 @@ def get_value_from_jmx(qry, property, security_enabled, run_user, is_https_enabl
       return data_dict["beans"][0][property]
   except:
     Logger.logger.exception("Getting jmx metrics from NN failed. URL: " + str(qry))
-    return None
\ No newline at end of file
+    return None
+
+
+class JmxConnection(object):
+  """
+  Queries the /jmx servlet of a Hadoop daemon, keeping one HTTP(S) connection open between queries,
+  so that polling does not pay connection setup (or a JVM start, like CLI tools do) on every try.
+  With security enabled the servlet requires SPNEGO, so curl --negotiate is run as run_user instead.
+  """
+  def __init__(self, address, is_https_enabled=False, security_enabled=False, run_user=None,
+               timeout=JMX_CONNECTION_TIMEOUT):
+    """
+    :param address: host:port of the daemon web UI
+    """
+    self.address = address
+    self.is_https_enabled = is_https_enabled
+    self.security_enabled = security_enabled
+    self.run_user = run_user
+    self.timeout = timeout
+    self.connection = None
+
+  def get_url(self, qry):
+    protocol = "https" if self.is_https_enabled else "http"
+    return "{0}://{1}{2}".format(protocol, self.address, self.get_path(qry))
+
+  def get_path(self, qry):
+    return "/jmx?qry=" + urllib.quote(qry, safe=":=,*")
+
+  def get_bean(self, qry):
+    """
+    :return: the first bean matching the query or None if the daemon could not be queried
+    """
+    try:
+      if self.security_enabled:
+        data = self._get_with_curl(qry)
+      else:
+        data = self._get_with_connection(qry)
+
+      if data:
+        beans = json.loads(data)["beans"]
+        if beans:
+          return beans[0]
+    except Exception, err:
+      Logger.debug("Getting JMX bean {0} from {1} failed: {2}".format(qry, self.address, str(err)))
+    return None
+
+  def close(self):
+    if self.connection is not None:
+      self.connection.close()
+      self.connection = None
+
+  def _connect(self):
+    if self.is_https_enabled:
+      # the same as curl -k used for the secure case
+      if hasattr(ssl, "_create_unverified_context"):
+        return httplib.HTTPSConnection(self.address, timeout=self.timeout, context=ssl._create_unverified_context())
+      return httplib.HTTPSConnection(self.address, timeout=self.timeout)
+    return httplib.HTTPConnection(self.address, timeout=self.timeout)
+
+  def _get_with_connection(self, qry):
+    # a kept-alive connection may have been closed by the server meanwhile, so retry once on a new one
+    for attempt in range(2):
+      if self.connection is None:
+        self.connection = self._connect()
+      try:
+        self.connection.request("GET", self.get_path(qry))
+        response = self.connection.getresponse()
+        data = response.read()
+        if response.status != httplib.OK:
+          raise Fail("HTTP {0} {1}".format(response.status, response.reason))
+        return data
+      except (httplib.HTTPException, socket.error):
+        self.close()
+        if attempt > 0:
+          raise
+
+  def _get_with_curl(self, qry):
+    cmd = ['curl', '--negotiate', '-u', ':', '-s']
+    if self.is_https_enabled:
+      cmd.append("-k")
+    cmd.append(self.get_url(qry))
+    _, data, _ = get_user_call_output(cmd, user=self.run_user, quiet=True)
+    return data
+
+
+def wait_for_jmx_condition(jmx_connection, qry, condition, timeout, progress=None, description=None,
+                           min_interval=1, max_interval=10, backoff_factor=2):
+  """
+  Polls a JMX bean until condition(bean) is true. The polling interval starts at min_interval and grows
+  by backoff_factor up to max_interval while nothing changes; it drops back to min_interval as soon as
+  progress(bean) reports something new, since then the condition is likely to be met soon.
+  Unreachable daemons (bean is None) are polled like daemons which did not meet the condition yet.
+
+  :param condition: function(bean) returning True when the wait is over
+  :param progress: optional function(bean) returning a progress message, which is logged when it changes
+  :param description: what is waited for, used in log messages
+  :return: the bean which met the condition
+  :raises Fail: if the condition was not met within timeout seconds
+  """
+  description = description or "JMX condition on {0}".format(qry)
+  deadline = time.time() + timeout
+  interval = min_interval
+  last_progress = None
+
+  while True:
+    bean = jmx_connection.get_bean(qry)
+    if bean is not None:
+      if condition(bean):
+        return bean
+
+      if progress is not None:
+        current_progress = progress(bean)
+        if current_progress != last_progress:
+          Logger.info("Waiting for {0}: {1}".format(description, current_progress))
+          if last_progress is not None:
+            interval = min_interval
+          last_progress = current_progress
+
+    remaining = deadline - time.time()
+    if remaining <= 0:
+      raise Fail("Timed out after {0} seconds waiting for {1}".format(timeout, description))
+    time.sleep(min(interval, remaining))
+    interval = min(interval * backoff_factor, max_interval)
@@ -17,6 +17,10 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 '''
+import Queue
+import threading
+import time
+
 from resource_management.libraries.functions.is_empty import is_empty
 from resource_management.libraries.functions.format import format
 from resource_management.libraries.functions.jmx import get_value_from_jmx
@@ -28,7 +32,8 @@ from resource_management.libraries.functions.hdfs_utils import is_https_enabled_
 
 
 __all__ = ["get_namenode_states", "get_active_namenode",
-           "get_property_for_active_namenode", "get_nameservice"]
+           "get_property_for_active_namenode", "get_nameservice", "get_namenode_web_address",
+           "invalidate_namenode_states_cache"]
 
 HDFS_NN_STATE_ACTIVE = 'active'
 HDFS_NN_STATE_STANDBY = 'standby'
@@ -44,14 +49,34 @@ NAMENODE_RPC_NON_HA = 'dfs.namenode.rpc-address'
 JMX_URI_FRAGMENT = "{0}://{1}/jmx?qry=Hadoop:service=NameNode,name=FSNamesystem"
 INADDR_ANY = '0.0.0.0'
 
-def get_namenode_states(hdfs_site, security_enabled, run_user, times=10, sleep_time=1, backoff_factor=2):
+# memoized states are only trusted this long, a failover may happen at any time (e.g. triggered by ZKFC)
+NAMENODE_STATES_CACHE_TTL_SEC = 30
+
+# nameservice -> (NameNode states, whether all of the NameNodes answered, time the states were found)
+_namenode_states_cache = {}
+_namenode_states_cache_lock = threading.Lock()
+
+def get_namenode_states(hdfs_site, security_enabled, run_user, times=10, sleep_time=1, backoff_factor=2,
+                        use_cache=False, until_active=False):
   """
   return format [('nn1', 'hdfs://hostname1:port1'), ('nn2', 'hdfs://hostname2:port2')] , [....], [....]
+
+  :param use_cache: return the states found in the last NAMENODE_STATES_CACHE_TTL_SEC seconds, if any.
+   Callers polling for a state change must not use it.
+  :param until_active: stop probing as soon as an active NameNode is known; NameNodes which did not answer
+   by then are reported as unknown
   """
+  if use_cache:
+    cached_states = get_cached_namenode_states(hdfs_site, complete=not until_active)
+    if cached_states:
+      return cached_states
+
+  # not jittered: callers rely on the whole backoff (about a minute) to wait for a failover to complete
   @retry(times=times, sleep_time=sleep_time, backoff_factor=backoff_factor, err_class=Fail)
   def doRetries(hdfs_site, security_enabled, run_user):
     doRetries.attempt += 1
-    active_namenodes, standby_namenodes, unknown_namenodes = get_namenode_states_noretries(hdfs_site, security_enabled, run_user)
+    active_namenodes, standby_namenodes, unknown_namenodes = get_namenode_states_noretries(hdfs_site, security_enabled, run_user,
+                                                                                           until_active=until_active)
     Logger.info(
       "NameNode HA states: active_namenodes = {0}, standby_namenodes = {1}, unknown_namenodes = {2}".format(
         active_namenodes, standby_namenodes, unknown_namenodes))
@@ -65,62 +90,123 @@ def get_namenode_states(hdfs_site, security_enabled, run_user, times=10, sleep_t
   doRetries.attempt = 0
   return doRetries(hdfs_site, security_enabled, run_user)
 
-def get_namenode_states_noretries(hdfs_site, security_enabled, run_user):
+def get_namenode_states_noretries(hdfs_site, security_enabled, run_user, until_active=False):
   """
+  Probes all NameNodes of the nameservice concurrently. States which include an active NameNode are memoized
+  for a short while, see get_cached_namenode_states.
+
   return format [('nn1', 'hdfs://hostname1:port1'), ('nn2', 'hdfs://hostname2:port2')] , [....], [....]
   """
   active_namenodes = []
   standby_namenodes = []
   unknown_namenodes = []
-  
+
   name_service = get_nameservice(hdfs_site)
   nn_unique_ids_key = 'dfs.ha.namenodes.' + name_service
+  is_https_enabled = is_https_enabled_in_hdfs(hdfs_site['dfs.http.policy'], hdfs_site['dfs.https.enable'])
 
   # now we have something like 'nn1,nn2,nn3,nn4'
   # turn it into dfs.namenode.[property].[dfs.nameservices].[nn_unique_id]
   # ie dfs.namenode.http-address.hacluster.nn1
+  namenodes = []
   nn_unique_ids = hdfs_site[nn_unique_ids_key].split(',')
   for nn_unique_id in nn_unique_ids:
-    is_https_enabled = is_https_enabled_in_hdfs(hdfs_site['dfs.http.policy'], hdfs_site['dfs.https.enable'])
-
     rpc_key = NAMENODE_RPC_FRAGMENT.format(name_service,nn_unique_id)
     if not is_https_enabled:
       key = NAMENODE_HTTP_FRAGMENT.format(name_service,nn_unique_id)
-      protocol = "http"
     else:
       key = NAMENODE_HTTPS_FRAGMENT.format(name_service,nn_unique_id)
-      protocol = "https"
-    
+
     if key in hdfs_site:
       # use str() to ensure that unicode strings do not have the u' in them
-      value = str(hdfs_site[key])
-      if INADDR_ANY in value and rpc_key in hdfs_site:
-        rpc_value = str(hdfs_site[rpc_key])
-        if INADDR_ANY not in rpc_value:
-          rpc_host = rpc_value.split(":")[0]
-          value = value.replace(INADDR_ANY, rpc_host)
-
-      jmx_uri = JMX_URI_FRAGMENT.format(protocol, value)
-      
-      state = get_value_from_jmx(jmx_uri, 'tag.HAState', security_enabled, run_user, is_https_enabled)
-      # If JMX parsing failed
-      if not state:
-        check_service_cmd = "hdfs haadmin -ns {0} -getServiceState {1}".format(get_nameservice(hdfs_site), nn_unique_id)
-        code, out = shell.call(check_service_cmd, logoutput=True, user=run_user)
-        if code == 0 and out:
-          if HDFS_NN_STATE_STANDBY in out:
-            state = HDFS_NN_STATE_STANDBY
-          elif HDFS_NN_STATE_ACTIVE in out:
-            state = HDFS_NN_STATE_ACTIVE
-
-      if state == HDFS_NN_STATE_ACTIVE:
-        active_namenodes.append((nn_unique_id, value))
-      elif state == HDFS_NN_STATE_STANDBY:
-        standby_namenodes.append((nn_unique_id, value))
-      else:
-        unknown_namenodes.append((nn_unique_id, value))
+      value = resolve_inaddr_any(hdfs_site, str(hdfs_site[key]), rpc_key)
+      namenodes.append((nn_unique_id, value))
+
+  # a NameNode which is down may take a while to time out, so it should not delay asking the others
+  probe_results = Queue.Queue()
+  for nn_unique_id, value in namenodes:
+    probe_thread = threading.Thread(target=_probe_namenode_state, name="NameNode {0} state probe".format(nn_unique_id),
+                                    args=(probe_results, name_service, nn_unique_id, value, is_https_enabled,
+                                          security_enabled, run_user))
+    # with until_active the remaining probes are not waited for
+    probe_thread.daemon = True
+    probe_thread.start()
+
+  states = {}
+  while len(states) < len(namenodes):
+    nn_unique_id, state = probe_results.get()
+    states[nn_unique_id] = state
+    if until_active and state == HDFS_NN_STATE_ACTIVE:
+      break
+
+  for nn_unique_id, value in namenodes:
+    state = states.get(nn_unique_id)
+    if state == HDFS_NN_STATE_ACTIVE:
+      active_namenodes.append((nn_unique_id, value))
+    elif state == HDFS_NN_STATE_STANDBY:
+      standby_namenodes.append((nn_unique_id, value))
+    else:
+      unknown_namenodes.append((nn_unique_id, value))
+
+  namenode_states = active_namenodes, standby_namenodes, unknown_namenodes
+  # without an active NameNode a failover is most likely in progress, so the states would not stay valid
+  if active_namenodes:
+    with _namenode_states_cache_lock:
+      _namenode_states_cache[name_service] = (namenode_states, len(states) == len(namenodes), time.time())
+
+  return namenode_states
+
+def _probe_namenode_state(probe_results, name_service, nn_unique_id, value, is_https_enabled, security_enabled, run_user):
+  """
+  Puts (nn_unique_id, state) to probe_results, state being None if it could not be determined.
+  """
+  state = None
+  try:
+    protocol = "https" if is_https_enabled else "http"
+    jmx_uri = JMX_URI_FRAGMENT.format(protocol, value)
 
-  return active_namenodes, standby_namenodes, unknown_namenodes
+    state = get_value_from_jmx(jmx_uri, 'tag.HAState', security_enabled, run_user, is_https_enabled)
+    # If JMX parsing failed
+    if not state:
+      check_service_cmd = "hdfs haadmin -ns {0} -getServiceState {1}".format(name_service, nn_unique_id)
+      code, out = shell.call(check_service_cmd, logoutput=True, user=run_user)
+      if code == 0 and out:
+        if HDFS_NN_STATE_STANDBY in out:
+          state = HDFS_NN_STATE_STANDBY
+        elif HDFS_NN_STATE_ACTIVE in out:
+          state = HDFS_NN_STATE_ACTIVE
+  except Exception, err:
+    Logger.warning("Could not determine the HA state of NameNode {0}: {1}".format(nn_unique_id, str(err)))
+  finally:
+    probe_results.put((nn_unique_id, state))
+
+def get_cached_namenode_states(hdfs_site, complete=True):
+  """
+  Returns the NameNode states memoized by get_namenode_states_noretries or None. This module also lives in
+  long running processes (e.g. alerts), so the states expire after NAMENODE_STATES_CACHE_TTL_SEC seconds,
+  and invalidate_namenode_states_cache should be called after initiating a failover.
+
+  :param complete: only return states in which all of the NameNodes were asked
+  """
+  name_service = get_nameservice(hdfs_site)
+  with _namenode_states_cache_lock:
+    cached = _namenode_states_cache.get(name_service)
+    if cached and time.time() - cached[2] > NAMENODE_STATES_CACHE_TTL_SEC:
+      del _namenode_states_cache[name_service]
+      cached = None
+  if cached and (cached[1] or not complete):
+    return cached[0]
+  return None
+
+def invalidate_namenode_states_cache(hdfs_site=None):
+  """
+  Forgets the memoized NameNode states of the nameservice of hdfs_site, or of all nameservices if it is None.
+  """
+  with _namenode_states_cache_lock:
+    if hdfs_site is None:
+      _namenode_states_cache.clear()
+    else:
+      _namenode_states_cache.pop(get_nameservice(hdfs_site), None)
 
 def is_ha_enabled(hdfs_site):
   dfs_ha_nameservices = get_nameservice(hdfs_site)
@@ -138,17 +224,17 @@ def is_ha_enabled(hdfs_site):
       
   return False
 
-def get_active_namenode(hdfs_site, security_enabled, run_user):
+def get_active_namenode(hdfs_site, security_enabled, run_user, use_cache=True):
   """
   return format is nn_unique_id and it's address ('nn1', 'hdfs://hostname1:port1')
   """
-  active_namenodes = get_namenode_states(hdfs_site, security_enabled, run_user)[0]
+  active_namenodes = get_namenode_states(hdfs_site, security_enabled, run_user, use_cache=use_cache, until_active=True)[0]
   if active_namenodes:
     return active_namenodes[0]
 
   raise Fail('No active NameNode was found.')
   
-def get_property_for_active_namenode(hdfs_site, property_name, security_enabled, run_user):
+def get_property_for_active_namenode(hdfs_site, property_name, security_enabled, run_user, use_cache=True):
   """
   For dfs.namenode.rpc-address:
     - In non-ha mode it will return hdfs_site[dfs.namenode.rpc-address]
@@ -158,7 +244,7 @@ def get_property_for_active_namenode(hdfs_site, property_name, security_enabled,
   rpc_key = None
   if is_ha_enabled(hdfs_site):
     name_service = get_nameservice(hdfs_site)
-    active_namenodes = get_namenode_states(hdfs_site, security_enabled, run_user)[0]
+    active_namenodes = get_namenode_states(hdfs_site, security_enabled, run_user, use_cache=use_cache, until_active=True)[0]
     
     if not len(active_namenodes):
       raise Fail("There is no active namenodes.")
@@ -170,12 +256,41 @@ def get_property_for_active_namenode(hdfs_site, property_name, security_enabled,
     value = hdfs_site[property_name]
     rpc_key = NAMENODE_RPC_NON_HA
 
+  return resolve_inaddr_any(hdfs_site, value, rpc_key)
+
+def get_namenode_web_address(hdfs_site, namenode_id=None):
+  """
+  Returns the host:port of the web UI of the given NameNode (the only NameNode if HA is not enabled)
+  together with whether it is served over https, e.g. ('c6401.ambari.apache.org:50070', False).
+  None is returned for the address if it is not configured.
+  """
+  is_https_enabled = is_https_enabled_in_hdfs(hdfs_site.get(DFS_HTTP_POLICY, 'HTTP_ONLY'),
+                                              hdfs_site.get('dfs.https.enable', False))
+
+  if namenode_id and is_ha_enabled(hdfs_site):
+    name_service = get_nameservice(hdfs_site)
+    fragment = NAMENODE_HTTPS_FRAGMENT if is_https_enabled else NAMENODE_HTTP_FRAGMENT
+    key = fragment.format(name_service, namenode_id)
+    rpc_key = NAMENODE_RPC_FRAGMENT.format(name_service, namenode_id)
+  else:
+    key = NAMENODE_HTTPS_NON_HA if is_https_enabled else NAMENODE_HTTP_NON_HA
+    rpc_key = NAMENODE_RPC_NON_HA
+
+  if key not in hdfs_site:
+    return None, is_https_enabled
+
+  # use str() to ensure that unicode strings do not have the u' in them
+  return resolve_inaddr_any(hdfs_site, str(hdfs_site[key]), rpc_key), is_https_enabled
+
+def resolve_inaddr_any(hdfs_site, value, rpc_key):
+  """
+  NameNode web addresses may be bound to 0.0.0.0, in which case the host of its RPC address is used instead.
+  """
   if INADDR_ANY in value and rpc_key in hdfs_site:
     rpc_value = str(hdfs_site[rpc_key])
     if INADDR_ANY not in rpc_value:
       rpc_host = rpc_value.split(":")[0]
       value = value.replace(INADDR_ANY, rpc_host)
-
   return value
 
 def get_all_namenode_addresses(hdfs_site):
@@ -202,11 +317,7 @@ def get_all_namenode_addresses(hdfs_site):
       if key in hdfs_site:
         # use str() to ensure that unicode strings do not have the u' in them
         value = str(hdfs_site[key])
-        if INADDR_ANY in value and rpc_key in hdfs_site:
-          rpc_value = str(hdfs_site[rpc_key])
-          if INADDR_ANY not in rpc_value:
-            rpc_host = rpc_value.split(":")[0]
-            value = value.replace(INADDR_ANY, rpc_host)
+        value = resolve_inaddr_any(hdfs_site, value, rpc_key)
 
         if not value in nn_addresses:
           nn_addresses.append(value)
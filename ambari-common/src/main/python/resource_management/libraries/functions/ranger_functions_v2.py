@@ -20,8 +20,11 @@ limitations under the License.
 
 import re
 import time
+import random
+import socket
 import sys
 import urllib2
+import urlparse
 import base64
 import httplib
 
@@ -29,7 +32,6 @@ import httplib
 import ambari_simplejson as json
 
 from StringIO import StringIO as BytesIO
-from ambari_commons.inet_utils import openurl
 from resource_management.core.logger import Logger
 from ambari_commons.exceptions import TimeoutError
 from resource_management.core.exceptions import Fail
@@ -38,6 +40,13 @@ from resource_management.libraries.functions.format import format
 from resource_management.libraries.functions.curl_krb_request import curl_krb_request
 from resource_management.core.environment import Environment
 
+RANGER_ADMIN_REQUEST_TIMEOUT = 20
+# how long to wait for Ranger Admin to come up, as long as the former 75 tries 8 seconds apart
+RANGER_ADMIN_READY_TIMEOUT = 600
+RANGER_ADMIN_POLL_MIN_INTERVAL = 1
+RANGER_ADMIN_POLL_MAX_INTERVAL = 16
+REPOSITORY_RETRY_MAX_INTERVAL = 30
+MAX_REDIRECTS = 5
 
 class RangeradminV2:
   sInstance = None
@@ -56,11 +65,13 @@ class RangeradminV2:
     self.url_users = self.base_url + '/service/xusers/users'
     self.url_sec_users = self.base_url + '/service/xusers/secure/users'
     self.skip_if_rangeradmin_down = skip_if_rangeradmin_down
+    # (scheme, host:port) -> connection kept alive between the requests to Ranger Admin
+    self.connections = {}
 
     if self.skip_if_rangeradmin_down:
       Logger.info("RangeradminV2: Skip ranger admin if it's down !")
 
-  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None)
+  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None, jitter=True)
   def get_repository_by_name_urllib2(self, name, component, status, usernamepassword):
     """
     :param name: name of the component, from which, function will search in list of repositories
@@ -76,7 +87,7 @@ class RangeradminV2:
       request.add_header("Content-Type", "application/json")
       request.add_header("Accept", "application/json")
       request.add_header("Authorization", "Basic {0}".format(base_64_string))
-      result = openurl(request, timeout=20)
+      result = self.openurl(request)
       response_code = result.getcode()
       response = json.loads(result.read())
       if response_code == 200 and len(response) > 0:
@@ -127,7 +138,7 @@ class RangeradminV2:
               else:
                 if retryCount < 5:
                   Logger.info("Retry Repository Creation is being called")
-                  time.sleep(30) # delay for 30 seconds
+                  time.sleep(get_backoff_interval(retryCount, REPOSITORY_RETRY_MAX_INTERVAL))
                   retryCount += 1
                 else:
                   Logger.error('{0} Repository creation failed in Ranger admin'.format(component.title()))
@@ -154,7 +165,7 @@ class RangeradminV2:
               break
             else:
               if retryCount < 5:
-                time.sleep(30) # delay for 30 seconds
+                time.sleep(get_backoff_interval(retryCount, REPOSITORY_RETRY_MAX_INTERVAL))
                 retryCount += 1
               else:
                 Logger.error('{0} Repository creation failed in Ranger admin'.format(component.title()))
@@ -162,7 +173,7 @@ class RangeradminV2:
       else:
         Logger.error("Connection failed to Ranger Admin !")
 
-  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None)
+  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None, jitter=True)
   def create_repository_urllib2(self, data, usernamepassword):
     """
     :param data: json object to create repository
@@ -178,7 +189,7 @@ class RangeradminV2:
       }
       request = urllib2.Request(search_repo_url, data, headers)
       request.add_header("Authorization", "Basic {0}".format(base_64_string))
-      result = openurl(request, timeout=20)
+      result = self.openurl(request)
       response_code = result.getcode()
       response = json.loads(json.JSONEncoder().encode(result.read()))
 
@@ -197,15 +208,22 @@ class RangeradminV2:
     except TimeoutError:
       raise Fail("Connection to Ranger Admin failed. Reason - timeout")
 
-  @safe_retry(times=75, sleep_time=8, backoff_factor=1, err_class=Fail, return_on_fail=None)
   def check_ranger_login_urllib2(self, url):
+    """
+    Waits for Ranger Admin to answer, see wait_for_ranger_admin.
+
+    :param url: ranger admin host url
+    :return: Returns login check response code or None if Ranger Admin did not come up
+    """
+    return self.wait_for_ranger_admin(lambda: self.get_login_response_code(url))
+
+  def get_login_response_code(self, url):
     """
     :param url: ranger admin host url
-    :param usernamepassword: user credentials using which repository needs to be searched.
     :return: Returns login check response
     """
     try:
-      response = openurl(url, timeout=20)
+      response = self.openurl(url)
       response_code = response.getcode()
       return response_code
     except urllib2.URLError, e:
@@ -218,7 +236,7 @@ class RangeradminV2:
     except TimeoutError:
       raise Fail("Connection failed to Ranger Admin. Reason - timeout")
 
-  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None)
+  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None, jitter=True)
   def create_ambari_admin_user(self, ambari_admin_username, ambari_admin_password, usernamepassword):
     """
     :param ambari_admin_username: username of user to be created
@@ -237,7 +255,7 @@ class RangeradminV2:
       request.add_header("Content-Type", "application/json")
       request.add_header("Accept", "application/json")
       request.add_header("Authorization", "Basic {0}".format(base_64_string))
-      result = openurl(request, timeout=20)
+      result = self.openurl(request)
       response_code = result.getcode()
       response = json.loads(result.read())
       if response_code == 200 and len(response['vXUsers']) >= 0:
@@ -269,7 +287,7 @@ class RangeradminV2:
           }
           request = urllib2.Request(url, data, headers)
           request.add_header("Authorization", "Basic {0}".format(base_64_string))
-          result = openurl(request, timeout=20)
+          result = self.openurl(request)
           response_code = result.getcode()
           response = json.loads(json.JSONEncoder().encode(result.read()))
           if response_code == 200 and response is not None:
@@ -311,26 +329,118 @@ class RangeradminV2:
 
     return response, error_msg, time_millis
 
-  @safe_retry(times=75, sleep_time=8, backoff_factor=1, err_class=Fail, return_on_fail=None)
   def check_ranger_login_curl(self, component_user,component_user_keytab,component_user_principal,base_url,True):
     """
     :param url: ranger admin host url
     :param usernamepassword: user credentials using which repository needs to be searched.
-    :return: Returns login check response
+    :return: Returns login check response or None if Ranger Admin did not come up
     """
-    response = ''
-    error_msg = ''
-    time_millis = 0
-    try:
-      response,error_msg,time_millis = self.call_curl_request(component_user,component_user_keytab,component_user_principal,base_url,True)
-    except Fail,fail:
-      raise Fail(fail.args)
+    def check_login():
+      response = ''
+      error_msg = ''
+      time_millis = 0
+      try:
+        response,error_msg,time_millis = self.call_curl_request(component_user,component_user_keytab,component_user_principal,base_url,True)
+      except Fail,fail:
+        raise Fail(fail.args)
 
-    return response, error_msg,time_millis
+      return response, error_msg,time_millis
 
+    return self.wait_for_ranger_admin(check_login)
 
+  def wait_for_ranger_admin(self, check, timeout=RANGER_ADMIN_READY_TIMEOUT):
+    """
+    Calls check until it does not raise Fail, sleeping a jittered, exponentially growing interval
+    between the tries. The first tries come quickly, so that a Ranger Admin which has just been
+    started is noticed soon after it comes up, while one which stays down is not hammered.
 
-  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None)
+    :param check: function returning the result of a successful check and raising Fail otherwise
+    :return: the result of check or None if Ranger Admin did not come up within timeout seconds
+    """
+    deadline = time.time() + timeout
+    attempt = 0
+
+    while True:
+      try:
+        return check()
+      except Fail, err:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          Logger.error("Ranger Admin did not come up within {0} seconds: {1}".format(timeout, str(err)))
+          return None
+
+        interval = min(get_backoff_interval(attempt, RANGER_ADMIN_POLL_MAX_INTERVAL, RANGER_ADMIN_POLL_MIN_INTERVAL), remaining)
+        Logger.info("Ranger Admin is not ready yet, checking again in {0:.1f} seconds. Reason: {1}".format(interval, str(err)))
+        time.sleep(interval)
+        attempt += 1
+
+  def openurl(self, request):
+    """
+    Sends the request like urllib2.urlopen does, including raising HTTPError for error responses and
+    following redirects, but over a connection kept alive for the next requests to the same Ranger Admin.
+
+    :param request: url or urllib2.Request
+    :return: the response, having getcode() and read() like the one of urllib2.urlopen
+    """
+    if not isinstance(request, urllib2.Request):
+      request = urllib2.Request(request)
+
+    url = request.get_full_url()
+    data = request.get_data()
+    method = request.get_method()
+    headers = dict(request.header_items())
+
+    for redirect in range(MAX_REDIRECTS + 1):
+      status, reason, response_headers, body = self._send(url, method, data, headers)
+
+      location = response_headers.get('location')
+      if status in (301, 302, 303, 307) and location and method in ('GET', 'HEAD'):
+        url = urlparse.urljoin(url, location)
+        continue
+
+      if status >= 400:
+        raise urllib2.HTTPError(url, status, reason, response_headers, BytesIO(body))
+      return urllib2.addinfourl(BytesIO(body), response_headers, url, status)
+
+    raise urllib2.URLError("Too many redirects")
+
+  def close(self):
+    for connection in self.connections.values():
+      connection.close()
+    self.connections.clear()
+
+  def _send(self, url, method, data, headers):
+    parsed_url = urlparse.urlparse(url)
+    key = (parsed_url.scheme, parsed_url.netloc)
+    path = parsed_url.path or '/'
+    if parsed_url.query:
+      path += '?' + parsed_url.query
+
+    # a kept-alive connection may have been closed by Ranger Admin meanwhile, so retry once on a new one
+    for attempt in range(2):
+      connection = self.connections.get(key)
+      if connection is None:
+        connection_class = httplib.HTTPSConnection if parsed_url.scheme == 'https' else httplib.HTTPConnection
+        connection = connection_class(parsed_url.netloc, timeout=RANGER_ADMIN_REQUEST_TIMEOUT)
+        self.connections[key] = connection
+
+      try:
+        connection.request(method, path, data, headers)
+        response = connection.getresponse()
+        return response.status, response.reason, dict(response.getheaders()), response.read()
+      except socket.timeout, e:
+        self.connections.pop(key).close()
+        raise TimeoutError(e)
+      except (httplib.HTTPException, socket.error), e:
+        self.connections.pop(key).close()
+        if attempt > 0:
+          if isinstance(e, httplib.BadStatusLine):
+            raise
+          raise urllib2.URLError(e)
+
+
+
+  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None, jitter=True)
   def get_repository_by_name_curl(self, component_user, component_user_keytab, component_user_principal, name, component, status, is_keyadmin = False):
     """
     :param component_user: service user for which call is to be made
@@ -361,7 +471,7 @@ class RangeradminV2:
 
 
 
-  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None)
+  @safe_retry(times=5, sleep_time=8, backoff_factor=1.5, err_class=Fail, return_on_fail=None, jitter=True)
   def create_repository_curl(self, component_user, component_user_keytab, component_user_principal, name, data, policy_user, is_keyadmin = False):
     """
     :param component_user: service user for which call is to be made
@@ -395,3 +505,11 @@ class RangeradminV2:
         return None
     except Exception, err:
       raise Fail('Error in call for creating Ranger service:\n {0}'.format(err))
+
+
+def get_backoff_interval(attempt, max_interval, min_interval=1):
+  """
+  Exponential backoff with jitter: a random interval between min_interval and min_interval * 2 ^ attempt,
+  capped at max_interval, so that the plugins of several services started together do not poll in lockstep.
+  """
+  return random.uniform(min_interval, min(max_interval, min_interval * (2 ** attempt)))
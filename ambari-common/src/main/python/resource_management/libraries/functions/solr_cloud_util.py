@@ -18,6 +18,7 @@ limitations under the License.
 """
 import random
 import json
+import shlex
 from random import randrange
 from ambari_commons.constants import AMBARI_SUDO_BINARY
 from ambari_jinja2 import Environment as JinjaEnvironment
@@ -25,23 +26,134 @@ from resource_management.libraries.functions import get_kinit_path
 from resource_management.libraries.functions.default import default
 from resource_management.libraries.functions.format import format
 from resource_management.core.resources.system import Directory, Execute, File
+from resource_management.core.exceptions import Fail
 from resource_management.core.source import StaticFile
 from resource_management.core.shell import as_sudo
 from resource_management.core.logger import Logger
 
+BATCH_FILE_UNSUPPORTED_MESSAGE = "Unrecognized option: --batch-file"
+
 __all__ = ["upload_configuration_to_zk", "create_collection", "setup_kerberos", "set_cluster_prop",
-           "setup_kerberos_plugin", "create_znode", "check_znode", "secure_solr_znode", "secure_znode"]
+           "setup_kerberos_plugin", "create_znode", "check_znode", "secure_solr_znode", "secure_znode",
+           "SolrCliBatch"]
 
-def __create_solr_cloud_cli_prefix(zookeeper_quorum, solr_znode, java64_home, separated_znode=False):
+class SolrCliBatch(object):
+  """
+  Collects the solrCloudCli.sh commands issued inside the with block and runs all of them with a single
+  solrCloudCli.sh --batch-file invocation on exit, so the sequence pays the JVM startup and the Zookeeper
+  session setup only once. The commands run in order and the batch stops at the first failing one.
+
+  with SolrCliBatch(params.tmp_dir):
+    solr_cloud_util.set_cluster_prop(...)
+    solr_cloud_util.setup_kerberos_plugin(...)
+
+  Operations with conditions evaluated on the host (upload_configuration_to_zk, add_solr_roles) flush the
+  commands collected so far and run outside of the batch.
+
+  The jaas file of a command sets JVM-wide security properties in solrCloudCli.sh, which also reuses its Solr
+  and Zookeeper clients within a batch, so commands with different jaas files never share a batch: a change
+  of the jaas file flushes the commands collected so far.
+
+  Clients older than --batch-file reject the option; their batches fall back to running the commands one at
+  a time.
+  """
+  active = None
+  # solrCloudCli.sh commands found not to support --batch-file
+  unsupported_clis = set()
+
+  def __init__(self, tmp_dir):
+    self.tmp_dir = tmp_dir
+    self.solr_cli = None
+    self.jaas_file = None
+    self.commands = []
+
+  def __enter__(self):
+    if SolrCliBatch.active is not None:
+      raise Fail("A solrCloudCli.sh batch is already in progress")
+    SolrCliBatch.active = self
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    SolrCliBatch.active = None
+    if exc_type is None:
+      self.flush()
+
+  def add(self, solr_cli, args, command):
+    jaas_file = args[args.index("--jaas-file") + 1] if "--jaas-file" in args[:-1] else None
+    if self.solr_cli != solr_cli or self.jaas_file != jaas_file:
+      self.flush()
+    self.solr_cli = solr_cli
+    self.jaas_file = jaas_file
+    self.commands.append((args, command))
+
+  def flush(self):
+    if not self.commands:
+      return
+    solr_cli = self.solr_cli
+    commands = self.commands
+    self.commands = []
+    if solr_cli in SolrCliBatch.unsupported_clis:
+      self.run_one_by_one(commands)
+      return
+
+    random_num = random.random()
+    batch_file = format('{tmp_dir}/solr_cli_batch_{random_num}', tmp_dir=self.tmp_dir)
+    content = "".join("\t".join(args) + "\n" for args, command in commands)
+    File(batch_file,
+         content=content,
+         mode=0600
+         )
+    try:
+      Execute(format('{solr_cli} --batch-file {batch_file}'))
+    except Fail as ex:
+      # rejected by the option parser, before any command of the batch has run
+      if BATCH_FILE_UNSUPPORTED_MESSAGE not in str(ex):
+        raise
+      Logger.info(format("{solr_cli} does not support --batch-file, running the commands one at a time"))
+      SolrCliBatch.unsupported_clis.add(solr_cli)
+      self.run_one_by_one(commands)
+    finally:
+      File(batch_file,
+           action="delete"
+           )
+
+  def run_one_by_one(self, commands):
+    for args, command in commands:
+      Execute(command)
+
+def __create_solr_cloud_cli(java64_home):
   sudo = AMBARI_SUDO_BINARY
-  solr_cli_prefix = format('{sudo} JAVA_HOME={java64_home} /usr/lib/ambari-infra-solr-client/solrCloudCli.sh ' \
-                           '--zookeeper-connect-string {zookeeper_quorum}')
+  return format('{sudo} JAVA_HOME={java64_home} /usr/lib/ambari-infra-solr-client/solrCloudCli.sh')
+
+def __create_solr_cloud_cli_prefix(zookeeper_quorum, solr_znode, java64_home, separated_znode=False):
+  solr_cli = __create_solr_cloud_cli(java64_home)
+  solr_cli_prefix = format('{solr_cli} --zookeeper-connect-string {zookeeper_quorum}')
   if separated_znode:
     solr_cli_prefix+=format(' --znode {solr_znode}')
   else:
     solr_cli_prefix+=format('{solr_znode}')
   return solr_cli_prefix
 
+def __execute_solr_cli(command, java64_home):
+  """
+  Run a solrCloudCli.sh command, or add its arguments to the active SolrCliBatch
+  """
+  batch = SolrCliBatch.active
+  if batch is None:
+    Execute(command)
+    return
+  solr_cli = __create_solr_cloud_cli(java64_home)
+  if not command.startswith(solr_cli):
+    raise Fail(format("Command cannot be added to a solrCloudCli.sh batch: {command}"))
+  args = shlex.split(command[len(solr_cli):])
+  if [arg for arg in args if "\t" in arg or "\n" in arg]:
+    raise Fail("Arguments of a batched solrCloudCli.sh command cannot contain tabs or new lines")
+  batch.add(solr_cli, args, command)
+
+def __flush_solr_cli_batch():
+  if SolrCliBatch.active is not None:
+    SolrCliBatch.active.flush()
+
 def __append_flags_if_exists(command, flagsDict):
   for key, value in flagsDict.iteritems():
     if value is not None:
@@ -55,6 +167,7 @@ def upload_configuration_to_zk(zookeeper_quorum, solr_znode, config_set, config_
   At first, it tries to download configuration set if exists into a temporary location, then upload that one to
   zookeeper. If the configuration set does not exist in zookeeper then upload it based on the config_set_dir parameter.
   """
+  __flush_solr_cli_batch()
   random_num = random.random()
   tmp_config_set_dir = format('{tmp_dir}/solr_config_{config_set}_{random_num}')
   solr_cli_prefix = __create_solr_cloud_cli_prefix(zookeeper_quorum, solr_znode, java64_home)
@@ -119,7 +232,7 @@ def create_collection(zookeeper_quorum, solr_znode, collection, config_set, java
   create_collection_cmd = __append_flags_if_exists(create_collection_cmd, appendableDict)
   create_collection_cmd = format(create_collection_cmd, key_store_password_param=key_store_password, trust_store_password_param=trust_store_password)
 
-  Execute(create_collection_cmd)
+  __execute_solr_cli(create_collection_cmd, java64_home)
 
 def setup_kerberos(zookeeper_quorum, solr_znode, copy_from_znode, java64_home, secure=False, jaas_file=None):
   """
@@ -130,7 +243,7 @@ def setup_kerberos(zookeeper_quorum, solr_znode, copy_from_znode, java64_home, s
   setup_kerberos_cmd = format('{solr_cli_prefix} --setup-kerberos --copy-from-znode {copy_from_znode}')
   if secure and jaas_file is not None:
     setup_kerberos_cmd+=format(' --secure --jaas-file {jaas_file}')
-  Execute(setup_kerberos_cmd)
+  __execute_solr_cli(setup_kerberos_cmd, java64_home)
 
 def check_znode(zookeeper_quorum, solr_znode, java64_home, retry = 5, interval = 10):
   """
@@ -138,7 +251,7 @@ def check_znode(zookeeper_quorum, solr_znode, java64_home, retry = 5, interval =
   """
   solr_cli_prefix = __create_solr_cloud_cli_prefix(zookeeper_quorum, solr_znode, java64_home, True)
   check_znode_cmd = format('{solr_cli_prefix} --check-znode --retry {retry} --interval {interval}')
-  Execute(check_znode_cmd)
+  __execute_solr_cli(check_znode_cmd, java64_home)
 
 def create_znode(zookeeper_quorum, solr_znode, java64_home, retry = 5 , interval = 10):
   """
@@ -146,7 +259,7 @@ def create_znode(zookeeper_quorum, solr_znode, java64_home, retry = 5 , interval
   """
   solr_cli_prefix = __create_solr_cloud_cli_prefix(zookeeper_quorum, solr_znode, java64_home, True)
   create_znode_cmd = format('{solr_cli_prefix} --create-znode --retry {retry} --interval {interval}')
-  Execute(create_znode_cmd)
+  __execute_solr_cli(create_znode_cmd, java64_home)
 
 def setup_kerberos_plugin(zookeeper_quorum, solr_znode, java64_home, secure=False, security_json_location = None, jaas_file = None):
   """
@@ -156,7 +269,7 @@ def setup_kerberos_plugin(zookeeper_quorum, solr_znode, java64_home, secure=Fals
   setup_kerberos_plugin_cmd = format('{solr_cli_prefix} --setup-kerberos-plugin')
   if secure and jaas_file is not None and security_json_location is not None:
     setup_kerberos_plugin_cmd+=format(' --jaas-file {jaas_file} --secure --security-json-location {security_json_location}')
-  Execute(setup_kerberos_plugin_cmd)
+  __execute_solr_cli(setup_kerberos_plugin_cmd, java64_home)
 
 def set_cluster_prop(zookeeper_quorum, solr_znode, prop_name, prop_value, java64_home, jaas_file = None):
   """
@@ -166,7 +279,7 @@ def set_cluster_prop(zookeeper_quorum, solr_znode, prop_name, prop_value, java64
   set_cluster_prop_cmd = format('{solr_cli_prefix} --cluster-prop --property-name {prop_name} --property-value {prop_value}')
   if jaas_file is not None:
     set_cluster_prop_cmd+=format(' --jaas-file {jaas_file}')
-  Execute(set_cluster_prop_cmd)
+  __execute_solr_cli(set_cluster_prop_cmd, java64_home)
 
 def secure_znode(config, zookeeper_quorum, solr_znode, jaas_file, java64_home, sasl_users=[], retry = 5 , interval = 10):
   """
@@ -178,7 +291,7 @@ def secure_znode(config, zookeeper_quorum, solr_znode, jaas_file, java64_home, s
     sasl_users.append(__get_name_from_principal(config['configurations']['infra-solr-env']['infra_solr_kerberos_principal']))
   sasl_users_str = ",".join(str(__get_name_from_principal(x)) for x in sasl_users)
   secure_znode_cmd = format('{solr_cli_prefix} --secure-znode --jaas-file {jaas_file} --sasl-users {sasl_users_str} --retry {retry} --interval {interval}')
-  Execute(secure_znode_cmd)
+  __execute_solr_cli(secure_znode_cmd, java64_home)
 
 
 def secure_solr_znode(zookeeper_quorum, solr_znode, jaas_file, java64_home, sasl_users_str=''):
@@ -188,7 +301,7 @@ def secure_solr_znode(zookeeper_quorum, solr_znode, jaas_file, java64_home, sasl
   """
   solr_cli_prefix = __create_solr_cloud_cli_prefix(zookeeper_quorum, solr_znode, java64_home, True)
   secure_solr_znode_cmd = format('{solr_cli_prefix} --secure-solr-znode --jaas-file {jaas_file} --sasl-users {sasl_users_str}')
-  Execute(secure_solr_znode_cmd)
+  __execute_solr_cli(secure_solr_znode_cmd, java64_home)
 
 def default_config(config, name, default_value):
   subdicts = filter(None, name.split('/'))
@@ -294,6 +407,7 @@ def add_solr_roles(config, roles = [], new_service_principals = [], tries = 30,
   if it is then update the user-roles mapping for Solr (this will upgrade the solr_znode/security.json file).
   In case of custom security.json is used for infra-solr, this step will be skipped.
   """
+  __flush_solr_cli_batch()
   sudo = AMBARI_SUDO_BINARY
   solr_hosts = default_config(config, "/clusterHostInfo/infra_solr_hosts", [])
   security_enabled = config['configurations']['cluster-env']['security_enabled']
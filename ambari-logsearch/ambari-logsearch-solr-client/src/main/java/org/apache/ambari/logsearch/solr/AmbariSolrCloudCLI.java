@@ -26,12 +26,20 @@ import org.apache.commons.cli.HelpFormatter;
 import org.apache.commons.cli.Option;
 import org.apache.commons.cli.Options;
 import org.apache.commons.lang.StringUtils;
+import org.apache.solr.client.solrj.impl.CloudSolrClient;
+import org.apache.solr.common.cloud.SolrZkClient;
 import org.slf4j.Logger;
 import org.slf4j.LoggerFactory;
 
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Paths;
 import java.util.ArrayList;
 import java.util.Arrays;
+import java.util.HashMap;
 import java.util.List;
+import java.util.Map;
 
 public class AmbariSolrCloudCLI {
 
@@ -51,6 +59,8 @@ public class AmbariSolrCloudCLI {
   private static final String SECURE_ZNODE_COMMAND = "secure-znode";
   private static final String SECURE_SOLR_ZNODE_COMMAND = "secure-solr-znode";
   private static final String SECURITY_JSON_LOCATION = "security-json-location";
+  private static final String BATCH_FILE = "batch-file";
+  private static final String BATCH_FILE_ARGS_SEPARATOR = "\t";
   private static final String CMD_LINE_SYNTAX =
     "\n./solrCloudCli.sh --create-collection -z host1:2181,host2:2181/ambari-solr -c collection -cs conf_set"
       + "\n./solrCloudCli.sh --upload-config -z host1:2181,host2:2181/ambari-solr -d /tmp/myconfig_dir -cs config_set"
@@ -62,7 +72,8 @@ public class AmbariSolrCloudCLI {
       + "\n./solrCloudCli.sh --cluster-prop -z host1:2181,host2:2181/ambari-solr -cpn urlScheme -cpn http"
       + "\n./solrCloudCli.sh --secure-znode -z host1:2181,host2:2181 -zn /ambari-solr -su logsearch,atlas,ranger --jaas-file /etc/myconf/jaas_file"
       + "\n./solrCloudCli.sh --secure-solr-znode -z host1:2181,host2:2181 -zn /ambari-solr -su logsearch,atlas,ranger --jaas-file /etc/myconf/jaas_file"
-      + "\n./solrCloudCli.sh --setup-kerberos-plugin -z host1:2181,host2:2181 -zn /ambari-solr --security-json-location /etc/infra-solr/conf/security.json\n";
+      + "\n./solrCloudCli.sh --setup-kerberos-plugin -z host1:2181,host2:2181 -zn /ambari-solr --security-json-location /etc/infra-solr/conf/security.json"
+      + "\n./solrCloudCli.sh --batch-file /tmp/solr_cli_batch (one command per line, arguments separated by tabs)\n";
 
   public static void main(String[] args) {
     Options options = new Options();
@@ -314,6 +325,13 @@ public class AmbariSolrCloudCLI {
       .argName("security.json location")
       .build();
 
+    final Option batchFileOption = Option.builder("bf")
+      .longOpt(BATCH_FILE)
+      .desc("Run the commands of a batch file (one command per line) in one JVM, reusing the Zookeeper sessions")
+      .numberOfArgs(1)
+      .argName("batch file")
+      .build();
+
     final Option secureOption = Option.builder("sec")
       .longOpt("secure")
       .desc("Flag for enable/disable kerberos (with --setup-kerberos or --setup-kerberos-plugin)")
@@ -358,9 +376,9 @@ public class AmbariSolrCloudCLI {
     options.addOption(checkZnodeOption);
     options.addOption(setupKerberosPluginOption);
     options.addOption(securityJsonLocationOption);
+    options.addOption(batchFileOption);
 
-    AmbariSolrCloudClient solrCloudClient = null;
-
+    int exitCode = 0;
     try {
       CommandLineParser cmdLineParser = new DefaultParser();
       CommandLine cli = cmdLineParser.parse(options, args);
@@ -369,183 +387,244 @@ public class AmbariSolrCloudCLI {
         helpFormatter.printHelp("sample", options);
         exit(0, null);
       }
-      String command = "";
-      if (cli.hasOption("cc")) {
-        command = CREATE_COLLECTION_COMMAND;
-        validateRequiredOptions(cli, command, zkConnectStringOption, collectionOption, configSetOption);
-      } else if (cli.hasOption("uc")) {
-        command = UPLOAD_CONFIG_COMMAND;
-        validateRequiredOptions(cli, command, zkConnectStringOption, configSetOption, configDirOption);
-      } else if (cli.hasOption("dc")) {
-        command = DOWNLOAD_CONFIG_COMMAND;
-        validateRequiredOptions(cli, command, zkConnectStringOption, configSetOption, configDirOption);
-      } else if (cli.hasOption("csh")) {
-        command = CREATE_SHARD_COMMAND;
-        validateRequiredOptions(cli, command, zkConnectStringOption, collectionOption, shardNameOption);
-      } else if (cli.hasOption("chc")) {
-        command = CONFIG_CHECK_COMMAND;
-        validateRequiredOptions(cli, command, zkConnectStringOption, configSetOption);
-      } else if (cli.hasOption("cp")) {
-        command = SET_CLUSTER_PROP;
-        validateRequiredOptions(cli, command, zkConnectStringOption, propNameOption, propValueOption);
-      } else if (cli.hasOption("cz")) {
-        command = CREATE_ZNODE;
-        validateRequiredOptions(cli, command, zkConnectStringOption, znodeOption);
-      } else if (cli.hasOption("chz")){
-        command = CHECK_ZNODE;
-        validateRequiredOptions(cli, command, zkConnectStringOption, znodeOption);
-      } else if (cli.hasOption("skp")) {
-        command = SETUP_KERBEROS_PLUGIN;
-        validateRequiredOptions(cli, command, zkConnectStringOption, znodeOption);
-      } else if (cli.hasOption("sz")) {
-        command = SECURE_ZNODE_COMMAND;
-        validateRequiredOptions(cli, command, zkConnectStringOption, znodeOption, jaasFileOption, saslUsersOption);
-      } else if (cli.hasOption("ssz")) {
-        command = SECURE_SOLR_ZNODE_COMMAND;
-        validateRequiredOptions(cli, command, zkConnectStringOption, znodeOption, jaasFileOption, saslUsersOption);
+      if (cli.hasOption("bf")) {
+        exitCode = runBatch(cli.getOptionValue("bf"), options);
       } else {
-        List<String> commands = Arrays.asList(CREATE_COLLECTION_COMMAND, CREATE_SHARD_COMMAND, UPLOAD_CONFIG_COMMAND,
-          DOWNLOAD_CONFIG_COMMAND, CONFIG_CHECK_COMMAND, SET_CLUSTER_PROP, CREATE_ZNODE, SECURE_ZNODE_COMMAND,
-          SECURE_SOLR_ZNODE_COMMAND, CHECK_ZNODE, SETUP_KERBEROS_PLUGIN);
-        helpFormatter.printHelp(CMD_LINE_SYNTAX, options);
-        exit(1, String.format("One of the supported commands is required (%s)", StringUtils.join(commands, "|")));
-      }
-
-      String zkConnectString = cli.getOptionValue('z');
-      String collection = cli.getOptionValue('c');
-      String configSet = cli.getOptionValue("cs");
-      String configDir = cli.getOptionValue("d");
-      int shards = cli.hasOption('s') ? Integer.parseInt(cli.getOptionValue('s')) : 1;
-      int replication = cli.hasOption('r') ? Integer.parseInt(cli.getOptionValue('r')) : 1;
-      int retry = cli.hasOption("rt") ? Integer.parseInt(cli.getOptionValue("rt")) : 5;
-      int interval = cli.hasOption('i') ? Integer.parseInt(cli.getOptionValue('i')) : 10;
-      int maxShards = cli.hasOption('m') ? Integer.parseInt(cli.getOptionValue('m')) : shards * replication;
-      String routerName = cli.hasOption("rn") ? cli.getOptionValue("rn") : null;
-      String routerField = cli.hasOption("rf") ? cli.getOptionValue("rf") : null;
-      String shardName = cli.hasOption("sn") ? cli.getOptionValue("sn") : null;
-      boolean isSplitting = !cli.hasOption("ns");
-      String jaasFile = cli.hasOption("jf") ? cli.getOptionValue("jf") : null;
-      String keyStoreLocation = cli.hasOption("ksl") ? cli.getOptionValue("ksl") : null;
-      String keyStorePassword = cli.hasOption("ksp") ? cli.getOptionValue("ksp") : null;
-      String keyStoreType = cli.hasOption("kst") ? cli.getOptionValue("kst") : null;
-      String trustStoreLocation = cli.hasOption("tsl") ? cli.getOptionValue("tsl") : null;
-      String trustStorePassword = cli.hasOption("tsp") ? cli.getOptionValue("tsp") : null;
-      String trustStoreType = cli.hasOption("tst") ? cli.getOptionValue("tst") : null;
-      String clusterPropName = cli.hasOption("cpn") ? cli.getOptionValue("cpn") : null;
-      String clusterPropValue = cli.hasOption("cpv") ? cli.getOptionValue("cpv") : null;
-      String znode = cli.hasOption("zn") ? cli.getOptionValue("zn") : null;
-      boolean isSecure = cli.hasOption("sec");
-      String saslUsers = cli.hasOption("su") ? cli.getOptionValue("su") : "";
-      String securityJsonLocation = cli.hasOption("sjl") ? cli.getOptionValue("sjl") : "";
-
-      AmbariSolrCloudClientBuilder clientBuilder = new AmbariSolrCloudClientBuilder()
-        .withZkConnectString(zkConnectString)
-        .withCollection(collection)
-        .withConfigSet(configSet)
-        .withShards(shards)
-        .withReplication(replication)
-        .withMaxShardsPerNode(maxShards)
-        .withRetry(retry)
-        .withInterval(interval)
-        .withRouterName(routerName)
-        .withRouterField(routerField)
-        .withJaasFile(jaasFile) // call before creating SolrClient
-        .withSplitting(isSplitting)
-        .withSolrZkClient(ZK_CLIENT_TIMEOUT, ZK_CLIENT_CONNECT_TIMEOUT)
-        .withKeyStoreLocation(keyStoreLocation)
-        .withKeyStorePassword(keyStorePassword)
-        .withKeyStoreType(keyStoreType)
-        .withTrustStoreLocation(trustStoreLocation)
-        .withTrustStorePassword(trustStorePassword)
-        .withTrustStoreType(trustStoreType)
-        .withClusterPropName(clusterPropName)
-        .withClusterPropValue(clusterPropValue)
-        .withSecurityJsonLocation(securityJsonLocation)
-        .withZnode(znode)
-        .withSecure(isSecure)
-        .withSaslUsers(saslUsers);
-
-      switch (command) {
-        case CREATE_COLLECTION_COMMAND:
-          solrCloudClient = clientBuilder
-            .withSolrCloudClient()
-            .build();
-          solrCloudClient.createCollection();
-          break;
-        case UPLOAD_CONFIG_COMMAND:
-          solrCloudClient = clientBuilder
-            .withConfigDir(configDir)
-            .build();
-          solrCloudClient.uploadConfiguration();
-          break;
-        case DOWNLOAD_CONFIG_COMMAND:
-          solrCloudClient = clientBuilder
-            .withConfigDir(configDir)
-            .build();
-          solrCloudClient.downloadConfiguration();
-          break;
-        case CONFIG_CHECK_COMMAND:
-          solrCloudClient = clientBuilder.build();
-          boolean configExists = solrCloudClient.configurationExists();
-          if (!configExists) {
-            exit(1, null);
-          }
-          break;
-        case CREATE_SHARD_COMMAND:
-          solrCloudClient = clientBuilder
-            .withSolrCloudClient()
-            .build();
-          solrCloudClient.createShard(shardName);
-          break;
-        case SET_CLUSTER_PROP:
-          solrCloudClient = clientBuilder.build();
-          solrCloudClient.setClusterProp();
-          break;
-        case CREATE_ZNODE:
-          solrCloudClient = clientBuilder.build();
-          solrCloudClient.createZnode();
-          break;
-        case CHECK_ZNODE:
-          solrCloudClient = clientBuilder.build();
-          boolean znodeExists = solrCloudClient.isZnodeExists(znode);
-          if (!znodeExists) {
-            exit(1, String.format("'%s' znode does not exist. Solr is responsible to create the ZNode, " +
-              "check Solr started successfully or not", znode));
-          }
-          break;
-        case SETUP_KERBEROS_PLUGIN:
-          solrCloudClient = clientBuilder.build();
-          solrCloudClient.setupKerberosPlugin();
-          break;
-        case SECURE_ZNODE_COMMAND:
-          solrCloudClient = clientBuilder.build();
-          solrCloudClient.secureZnode();
-          break;
-        case SECURE_SOLR_ZNODE_COMMAND:
-          solrCloudClient = clientBuilder.build();
-          solrCloudClient.secureSolrZnode();
-          break;
-        default:
-          throw new AmbariSolrCloudClientException(String.format("Not found command: '%s'", command));
+        SolrClientCache clientCache = new SolrClientCache();
+        try {
+          exitCode = runCommand(cli, clientCache);
+        } finally {
+          clientCache.close();
+        }
       }
     } catch (Exception e) {
       helpFormatter.printHelp(
         CMD_LINE_SYNTAX, options);
       exit(1, e.getMessage());
-    } finally {
-      if (solrCloudClient != null && solrCloudClient.getSolrZkClient() != null) {
-        solrCloudClient.getSolrZkClient().close();
+    }
+    exit(exitCode, null);
+  }
+
+  /**
+   * Run every command of the batch file (one command per line, arguments separated by tabs) in order,
+   * sharing the Zookeeper and Solr clients between the commands. Stops at the first failing command.
+   * <p>
+   * All the commands of a batch have to use the same jaas file (or none): the jaas file is applied through
+   * JVM-wide System properties and a global http client configurer, see
+   * {@link AmbariSolrCloudClientBuilder#withJaasFile(String)}, so commands with different security settings
+   * cannot run in one JVM.
+   */
+  private static int runBatch(String batchFile, Options options) throws Exception {
+    List<CommandLine> commands = new ArrayList<>();
+    for (String line : readBatchFile(batchFile)) {
+      if (StringUtils.isNotBlank(line)) {
+        commands.add(new DefaultParser().parse(options, line.trim().split(BATCH_FILE_ARGS_SEPARATOR)));
       }
     }
-    exit(0, null);
+    for (CommandLine cli : commands) {
+      if (!StringUtils.equals(commands.get(0).getOptionValue("jf"), cli.getOptionValue("jf"))) {
+        throw new AmbariSolrCloudClientException(
+          String.format("Commands of batch file '%s' use different jaas files, which cannot be mixed in one batch", batchFile));
+      }
+    }
+
+    SolrClientCache clientCache = new SolrClientCache();
+    try {
+      int commandIndex = 0;
+      for (CommandLine cli : commands) {
+        commandIndex++;
+        LOG.info("Running command #{} of batch file '{}'", commandIndex, batchFile);
+        int exitCode = runCommand(cli, clientCache);
+        if (exitCode != 0) {
+          LOG.error("Command #{} of batch file '{}' failed, skipping the remaining commands", commandIndex, batchFile);
+          return exitCode;
+        }
+      }
+    } finally {
+      clientCache.close();
+    }
+    return 0;
+  }
+
+  private static List<String> readBatchFile(String batchFile) throws AmbariSolrCloudClientException {
+    try {
+      return Files.readAllLines(Paths.get(batchFile), StandardCharsets.UTF_8);
+    } catch (IOException e) {
+      throw new AmbariSolrCloudClientException(String.format("Cannot read batch file '%s': %s", batchFile, e.getMessage()), e);
+    }
+  }
+
+  private static int runCommand(CommandLine cli, SolrClientCache clientCache) throws Exception {
+    String command = "";
+    if (cli.hasOption("cc")) {
+      command = CREATE_COLLECTION_COMMAND;
+      validateRequiredOptions(cli, command, "z", "c", "cs");
+    } else if (cli.hasOption("uc")) {
+      command = UPLOAD_CONFIG_COMMAND;
+      validateRequiredOptions(cli, command, "z", "cs", "d");
+    } else if (cli.hasOption("dc")) {
+      command = DOWNLOAD_CONFIG_COMMAND;
+      validateRequiredOptions(cli, command, "z", "cs", "d");
+    } else if (cli.hasOption("csh")) {
+      command = CREATE_SHARD_COMMAND;
+      validateRequiredOptions(cli, command, "z", "c", "sn");
+    } else if (cli.hasOption("chc")) {
+      command = CONFIG_CHECK_COMMAND;
+      validateRequiredOptions(cli, command, "z", "cs");
+    } else if (cli.hasOption("cp")) {
+      command = SET_CLUSTER_PROP;
+      validateRequiredOptions(cli, command, "z", "cpn", "cpv");
+    } else if (cli.hasOption("cz")) {
+      command = CREATE_ZNODE;
+      validateRequiredOptions(cli, command, "z", "zn");
+    } else if (cli.hasOption("chz")){
+      command = CHECK_ZNODE;
+      validateRequiredOptions(cli, command, "z", "zn");
+    } else if (cli.hasOption("skp")) {
+      command = SETUP_KERBEROS_PLUGIN;
+      validateRequiredOptions(cli, command, "z", "zn");
+    } else if (cli.hasOption("sz")) {
+      command = SECURE_ZNODE_COMMAND;
+      validateRequiredOptions(cli, command, "z", "zn", "jf", "su");
+    } else if (cli.hasOption("ssz")) {
+      command = SECURE_SOLR_ZNODE_COMMAND;
+      validateRequiredOptions(cli, command, "z", "zn", "jf", "su");
+    } else {
+      List<String> commands = Arrays.asList(CREATE_COLLECTION_COMMAND, CREATE_SHARD_COMMAND, UPLOAD_CONFIG_COMMAND,
+        DOWNLOAD_CONFIG_COMMAND, CONFIG_CHECK_COMMAND, SET_CLUSTER_PROP, CREATE_ZNODE, SECURE_ZNODE_COMMAND,
+        SECURE_SOLR_ZNODE_COMMAND, CHECK_ZNODE, SETUP_KERBEROS_PLUGIN, BATCH_FILE);
+      throw new AmbariSolrCloudClientException(
+        String.format("One of the supported commands is required (%s)", StringUtils.join(commands, "|")));
+    }
+
+    String zkConnectString = cli.getOptionValue('z');
+    String collection = cli.getOptionValue('c');
+    String configSet = cli.getOptionValue("cs");
+    String configDir = cli.getOptionValue("d");
+    int shards = cli.hasOption('s') ? Integer.parseInt(cli.getOptionValue('s')) : 1;
+    int replication = cli.hasOption('r') ? Integer.parseInt(cli.getOptionValue('r')) : 1;
+    int retry = cli.hasOption("rt") ? Integer.parseInt(cli.getOptionValue("rt")) : 5;
+    int interval = cli.hasOption('i') ? Integer.parseInt(cli.getOptionValue('i')) : 10;
+    int maxShards = cli.hasOption('m') ? Integer.parseInt(cli.getOptionValue('m')) : shards * replication;
+    String routerName = cli.hasOption("rn") ? cli.getOptionValue("rn") : null;
+    String routerField = cli.hasOption("rf") ? cli.getOptionValue("rf") : null;
+    String shardName = cli.hasOption("sn") ? cli.getOptionValue("sn") : null;
+    boolean isSplitting = !cli.hasOption("ns");
+    String jaasFile = cli.hasOption("jf") ? cli.getOptionValue("jf") : null;
+    String keyStoreLocation = cli.hasOption("ksl") ? cli.getOptionValue("ksl") : null;
+    String keyStorePassword = cli.hasOption("ksp") ? cli.getOptionValue("ksp") : null;
+    String keyStoreType = cli.hasOption("kst") ? cli.getOptionValue("kst") : null;
+    String trustStoreLocation = cli.hasOption("tsl") ? cli.getOptionValue("tsl") : null;
+    String trustStorePassword = cli.hasOption("tsp") ? cli.getOptionValue("tsp") : null;
+    String trustStoreType = cli.hasOption("tst") ? cli.getOptionValue("tst") : null;
+    String clusterPropName = cli.hasOption("cpn") ? cli.getOptionValue("cpn") : null;
+    String clusterPropValue = cli.hasOption("cpv") ? cli.getOptionValue("cpv") : null;
+    String znode = cli.hasOption("zn") ? cli.getOptionValue("zn") : null;
+    boolean isSecure = cli.hasOption("sec");
+    String saslUsers = cli.hasOption("su") ? cli.getOptionValue("su") : "";
+    String securityJsonLocation = cli.hasOption("sjl") ? cli.getOptionValue("sjl") : "";
+
+    AmbariSolrCloudClientBuilder clientBuilder = new AmbariSolrCloudClientBuilder()
+      .withZkConnectString(zkConnectString)
+      .withCollection(collection)
+      .withConfigSet(configSet)
+      .withShards(shards)
+      .withReplication(replication)
+      .withMaxShardsPerNode(maxShards)
+      .withRetry(retry)
+      .withInterval(interval)
+      .withRouterName(routerName)
+      .withRouterField(routerField)
+      .withJaasFile(jaasFile) // call before creating SolrClient
+      .withSplitting(isSplitting)
+      .withSolrZkClient(clientCache.getSolrZkClient(zkConnectString, jaasFile))
+      .withKeyStoreLocation(keyStoreLocation)
+      .withKeyStorePassword(keyStorePassword)
+      .withKeyStoreType(keyStoreType)
+      .withTrustStoreLocation(trustStoreLocation)
+      .withTrustStorePassword(trustStorePassword)
+      .withTrustStoreType(trustStoreType)
+      .withClusterPropName(clusterPropName)
+      .withClusterPropValue(clusterPropValue)
+      .withSecurityJsonLocation(securityJsonLocation)
+      .withZnode(znode)
+      .withSecure(isSecure)
+      .withSaslUsers(saslUsers);
+
+    AmbariSolrCloudClient solrCloudClient;
+    switch (command) {
+      case CREATE_COLLECTION_COMMAND:
+        solrCloudClient = clientBuilder
+          .withSolrCloudClient(clientCache.getSolrCloudClient(zkConnectString, jaasFile))
+          .build();
+        solrCloudClient.createCollection();
+        break;
+      case UPLOAD_CONFIG_COMMAND:
+        solrCloudClient = clientBuilder
+          .withConfigDir(configDir)
+          .build();
+        solrCloudClient.uploadConfiguration();
+        break;
+      case DOWNLOAD_CONFIG_COMMAND:
+        solrCloudClient = clientBuilder
+          .withConfigDir(configDir)
+          .build();
+        solrCloudClient.downloadConfiguration();
+        break;
+      case CONFIG_CHECK_COMMAND:
+        solrCloudClient = clientBuilder.build();
+        boolean configExists = solrCloudClient.configurationExists();
+        if (!configExists) {
+          return 1;
+        }
+        break;
+      case CREATE_SHARD_COMMAND:
+        solrCloudClient = clientBuilder
+          .withSolrCloudClient(clientCache.getSolrCloudClient(zkConnectString, jaasFile))
+          .build();
+        solrCloudClient.createShard(shardName);
+        break;
+      case SET_CLUSTER_PROP:
+        solrCloudClient = clientBuilder.build();
+        solrCloudClient.setClusterProp();
+        break;
+      case CREATE_ZNODE:
+        solrCloudClient = clientBuilder.build();
+        solrCloudClient.createZnode();
+        break;
+      case CHECK_ZNODE:
+        solrCloudClient = clientBuilder.build();
+        boolean znodeExists = solrCloudClient.isZnodeExists(znode);
+        if (!znodeExists) {
+          LOG.error(String.format("'%s' znode does not exist. Solr is responsible to create the ZNode, " +
+            "check Solr started successfully or not", znode));
+          return 1;
+        }
+        break;
+      case SETUP_KERBEROS_PLUGIN:
+        solrCloudClient = clientBuilder.build();
+        solrCloudClient.setupKerberosPlugin();
+        break;
+      case SECURE_ZNODE_COMMAND:
+        solrCloudClient = clientBuilder.build();
+        solrCloudClient.secureZnode();
+        break;
+      case SECURE_SOLR_ZNODE_COMMAND:
+        solrCloudClient = clientBuilder.build();
+        solrCloudClient.secureSolrZnode();
+        break;
+      default:
+        throw new AmbariSolrCloudClientException(String.format("Not found command: '%s'", command));
+    }
+    return 0;
   }
 
-  private static void validateRequiredOptions(CommandLine cli, String command, Option... optionsToValidate)
+  private static void validateRequiredOptions(CommandLine cli, String command, String... optionsToValidate)
     throws AmbariSolrCloudClientException {
     List<String> requiredOptions = new ArrayList<>();
-    for (Option opt : optionsToValidate) {
-      if (!cli.hasOption(opt.getOpt())) {
-        requiredOptions.add(opt.getOpt());
+    for (String opt : optionsToValidate) {
+      if (!cli.hasOption(opt)) {
+        requiredOptions.add(opt);
       }
     }
     if (!requiredOptions.isEmpty()) {
@@ -562,4 +641,56 @@ public class AmbariSolrCloudCLI {
     LOG.info("Return code: {}", exitCode);
     System.exit(exitCode);
   }
+
+  /**
+   * Keeps one Zookeeper and one Solr client per Zookeeper connect string (and jaas file), so the commands
+   * of a batch file do not open a new session for every command.
+   * <p>
+   * Keying by jaas file does not isolate security settings: the jaas file is set through JVM-wide System
+   * properties, so a client created for one jaas file would silently pick up another one set later. This is
+   * why {@link #runBatch(String, Options)} rejects batches mixing jaas files.
+   */
+  private static class SolrClientCache {
+    private final Map<String, SolrZkClient> solrZkClients = new HashMap<>();
+    private final Map<String, CloudSolrClient> solrCloudClients = new HashMap<>();
+
+    SolrZkClient getSolrZkClient(String zkConnectString, String jaasFile) {
+      String key = getKey(zkConnectString, jaasFile);
+      SolrZkClient solrZkClient = solrZkClients.get(key);
+      if (solrZkClient == null) {
+        solrZkClient = new SolrZkClient(zkConnectString, ZK_CLIENT_TIMEOUT, ZK_CLIENT_CONNECT_TIMEOUT);
+        solrZkClients.put(key, solrZkClient);
+      }
+      return solrZkClient;
+    }
+
+    CloudSolrClient getSolrCloudClient(String zkConnectString, String jaasFile) {
+      String key = getKey(zkConnectString, jaasFile);
+      CloudSolrClient solrCloudClient = solrCloudClients.get(key);
+      if (solrCloudClient == null) {
+        solrCloudClient = new CloudSolrClient(zkConnectString);
+        solrCloudClients.put(key, solrCloudClient);
+      }
+      return solrCloudClient;
+    }
+
+    void close() {
+      for (CloudSolrClient solrCloudClient : solrCloudClients.values()) {
+        try {
+          solrCloudClient.close();
+        } catch (Exception e) {
+          LOG.warn("Cannot close Solr client: {}", e.getMessage());
+        }
+      }
+      for (SolrZkClient solrZkClient : solrZkClients.values()) {
+        solrZkClient.close();
+      }
+      solrCloudClients.clear();
+      solrZkClients.clear();
+    }
+
+    private String getKey(String zkConnectString, String jaasFile) {
+      return zkConnectString + "|" + StringUtils.defaultString(jaasFile);
+    }
+  }
 }
@@ -134,6 +134,16 @@ public class AmbariSolrCloudClientBuilder {
     return this;
   }
 
+  public AmbariSolrCloudClientBuilder withSolrCloudClient(CloudSolrClient solrCloudClient) {
+    this.solrCloudClient = solrCloudClient;
+    return this;
+  }
+
+  public AmbariSolrCloudClientBuilder withSolrZkClient(SolrZkClient solrZkClient) {
+    this.solrZkClient = solrZkClient;
+    return this;
+  }
+
   public AmbariSolrCloudClientBuilder withKeyStoreLocation(String keyStoreLocation) {
     if (keyStoreLocation != null) {
       System.setProperty(KEYSTORE_LOCATION_ARG, keyStoreLocation);
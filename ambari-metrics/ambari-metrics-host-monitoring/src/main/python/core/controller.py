@@ -21,12 +21,12 @@ limitations under the License.
 import logging
 import threading
 from Queue import Queue
-from threading import Timer
 from application_metric_map import ApplicationMetricMap
 from event_definition import HostMetricCollectEvent, ProcessMetricCollectEvent
 from metric_collector import MetricsCollector
 from emitter import Emitter
 from host_info import HostInfo
+from event_scheduler import EventScheduler
 
 logger = logging.getLogger()
 
@@ -49,42 +49,24 @@ class Controller(threading.Thread):
     self._stop_handler = stop_handler
     self.initialize_events_cache()
     self.emitter = Emitter(self.config, self.application_metric_map, stop_handler)
-    self._t = None
+    self.scheduler = EventScheduler(self.events_cache, self.metric_collector.process_event,
+                                    stop_handler, self.sleep_interval)
 
   def run(self):
     logger.info('Running Controller thread: %s' % threading.currentThread().getName())
 
     self.start_emitter()
 
-    # Wake every 5 seconds to push events to the queue
-    while True:
-      if (self.event_queue.full()):
-        logger.warn('Event Queue full!! Suspending further collections.')
-      else:
-        self.enqueque_events()
-      pass
-      # Wait for the service stop event instead of sleeping blindly
-      if 0 == self._stop_handler.wait(self.sleep_interval):
-        logger.info('Shutting down Controller thread')
-        break
-
-    if not self._t is None:
-      self._t.cancel()
-      self._t.join(5)
+    # Collect every event on its own interval until the service stop event
+    self.scheduler.run()
+    logger.info('Shutting down Controller thread, collection stats: {0}'.format(
+      self.scheduler.get_stats()))
 
     # The emitter thread should have stopped by now, just ensure it has shut
     # down properly
     self.emitter.join(5)
     pass
 
-  # TODO: Optimize to not use Timer class and use the Queue instead
-  def enqueque_events(self):
-    # Queue events for up to a minute
-    for event in self.events_cache:
-      self._t = Timer(event.get_collect_interval(), self.metric_collector.process_event, args=(event,))
-      self._t.start()
-    pass
-
   def initialize_events_cache(self):
     self.events_cache = []
     try:
@@ -103,13 +85,16 @@ class Controller(threading.Thread):
       pass
     pass
 
-    # if process_metrics_groups:
-    #   for name, properties in process_metrics_groups.iteritems():
-    #     event = ProcessMetricCollectEvent(properties, name)
-    #     logger.info('Adding event to cache, {0} : {1}'.format(name, properties))
-    #     #self.events_cache.append(event)
-    #   pass
-    # pass
+    if process_metrics_groups:
+      for name, properties in process_metrics_groups.iteritems():
+        if not name or not properties.get('pattern'):
+          logger.info('Skipping process metric group without a name or pattern, {0} : {1}'.format(name, properties))
+          continue
+        event = ProcessMetricCollectEvent(properties, name)
+        logger.info('Adding event to cache, {0} : {1}'.format(name, properties))
+        self.events_cache.append(event)
+      pass
+    pass
 
   pass
 
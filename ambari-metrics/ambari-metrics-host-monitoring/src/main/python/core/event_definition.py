@@ -77,8 +77,48 @@ class HostMetricCollectEvent(Event):
   def get_collect_interval(self):
     return int(self.group_interval if self.group_interval else DEFAULT_COLLECT_INTERVAL)
 
-class ProcessMetricCollectEvent:
+class ProcessMetricCollectEvent(Event):
+  """
+  Collects the metrics of the processes whose command line matches the
+  'pattern' regular expression of the group, e.g.
+  "namenode": {
+    "collect_every": "15",
+    "pattern": "org.apache.hadoop.hdfs.server.namenode.NameNode",
+    "metrics": [{"name": "cpu_percent"}, {"name": "mem_rss"}]
+  }
+  An empty metrics list collects every process metric.
+  """
 
   def __init__(self, group_config, group_name):
-    # Initialize the Process metric event
+    Event.__init__(self)
+    self.group_config = group_config
+    self.group_name = group_name
+    try:
+      self.group_interval = group_config['collect_every']
+      self.metrics = group_config['metrics']
+      self.pattern = group_config['pattern']
+    except KeyError, ex:
+      logger.warn('Unable to create event from process metric group. {0}'.format(
+        group_config))
+      raise ex
+
+  def get_metric_names(self):
+    metric_names = []
+
+    for metric in self.metrics:
+      try:
+        metric_names.append(metric['name'])
+      except:
+        logger.warn('Error parsing metric configuration. {0}'.format(metric))
     pass
+
+    return metric_names
+
+  def get_group_name(self):
+    return self.group_name
+
+  def get_pattern(self):
+    return self.pattern
+
+  def get_collect_interval(self):
+    return int(self.group_interval if self.group_interval else DEFAULT_COLLECT_INTERVAL)
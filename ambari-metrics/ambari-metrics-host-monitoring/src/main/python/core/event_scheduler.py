@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger()
+
+class EventScheduler:
+  """
+  Runs every event on its own fixed-rate timeline from a single thread.
+  Event i is due at start + n * interval, so the time spent collecting does
+  not shift the following ticks. Ticks that are missed entirely (a slow
+  collection, a suspended host) are skipped instead of being run back to
+  back, and a collection that starts late still runs once.
+  """
+  # A collection starting later than this after its tick is counted as late
+  LATE_THRESHOLD = 1
+  # Seconds between two logs of the collection stats while running
+  STATS_LOG_INTERVAL = 3600
+
+  def __init__(self, events, process_event, stop_handler, idle_interval):
+    self.lock = threading.Lock()
+    self.events = events
+    self.process_event = process_event
+    self._stop_handler = stop_handler
+    self.idle_interval = idle_interval
+    self.collections = 0
+    self.late_collections = 0
+    self.skipped_collections = 0
+    self.last_stats_log = None
+
+  def get_stats(self):
+    with self.lock:
+      return {
+        'collections': self.collections,
+        'late_collections': self.late_collections,
+        'skipped_collections': self.skipped_collections
+      }
+
+  def run(self):
+    """
+    Returns once the stop handler is signaled.
+    """
+    now = time.time()
+    self.last_stats_log = now
+    schedule = []
+    for index, event in enumerate(self.events):
+      # The index breaks ties between events due at the same time
+      heapq.heappush(schedule, (now + event.get_collect_interval(), index, event))
+    pass
+
+    while True:
+      if not schedule:
+        if 0 == self._stop_handler.wait(self.idle_interval):
+          break
+        continue
+
+      due, index, event = schedule[0]
+      delay = due - time.time()
+      if delay > event.get_collect_interval():
+        # The wall clock was set back, restart the timeline of the event
+        heapq.heapreplace(schedule, (time.time() + event.get_collect_interval(), index, event))
+        continue
+      if delay > 0 and 0 == self._stop_handler.wait(delay):
+        break
+
+      self.collect(due, event)
+      heapq.heapreplace(schedule, (self.next_due(due, event, time.time()), index, event))
+      self.log_stats(time.time())
+    pass
+
+  def collect(self, due, event):
+    lateness = time.time() - due
+    try:
+      self.process_event(event)
+    except Exception, e:
+      logger.warn('Unable to collect {0}. {1}'.format(event.get_classname(), str(e)))
+    pass
+
+    with self.lock:
+      self.collections += 1
+      if lateness > self.LATE_THRESHOLD:
+        self.late_collections += 1
+
+  def log_stats(self, now):
+    if now - self.last_stats_log < self.STATS_LOG_INTERVAL:
+      return
+    self.last_stats_log = now
+    stats = self.get_stats()
+    logger.info('Collection stats: {0} collections, {1} late, {2} skipped.'.format(
+      stats['collections'], stats['late_collections'], stats['skipped_collections']))
+
+  def next_due(self, due, event, now):
+    interval = event.get_collect_interval()
+    next_due = due + interval
+    if next_due > now:
+      return next_due
+
+    missed = int((now - next_due) // interval) + 1
+    logger.warn('Collection of {0} fell behind, skipping {1} tick(s).'.format(
+      event.get_classname(), missed))
+    with self.lock:
+      self.skipped_collections += missed
+    return next_due + missed * interval
@@ -21,11 +21,13 @@ limitations under the License.
 import logging
 from time import time
 from host_info import HostInfo
+from process_info import ProcessInfo
 from event_definition import HostMetricCollectEvent, ProcessMetricCollectEvent
 
 logger = logging.getLogger()
 
 DEFAULT_HOST_APP_ID = '_HOST'
+PROCESS_METRIC_PREFIX = 'process'
 
 class MetricsCollector():
   """
@@ -34,10 +36,12 @@ class MetricsCollector():
   not required if Timer class is used for metric groups.
   """
 
-  def __init__(self, emit_queue, application_metric_map, host_info):
+  def __init__(self, emit_queue, application_metric_map, host_info, process_info=None):
     self.emit_queue = emit_queue
     self.application_metric_map = application_metric_map
     self.host_info = host_info
+    self.process_info = process_info if process_info else ProcessInfo()
+    self.matched_process_groups = set()
   pass
 
   def process_event(self, event):
@@ -91,5 +95,29 @@ class MetricsCollector():
   def process_process_collection_event(self, event):
     """
     Collect Process level metrics and update the application metric map
+    Metrics are reported as process.<group name>.<metric name>, summed over
+    the processes of the group. A group is not reported until one of its
+    processes ran on the host.
     """
+    startTime = int(round(time() * 1000))
+    metrics = self.process_info.get_process_metrics(event.get_pattern())
+
+    if metrics.get('proc_count'):
+      self.matched_process_groups.add(event.get_group_name())
+    elif not event.get_group_name() in self.matched_process_groups:
+      return
+    pass
+
+    metric_names = event.get_metric_names()
+    if metric_names:
+      metrics = dict((name, value) for name, value in metrics.iteritems() if name in metric_names)
+    pass
+
+    group_metrics = {}
+    for name, value in metrics.iteritems():
+      group_metrics['{0}.{1}.{2}'.format(PROCESS_METRIC_PREFIX, event.get_group_name(), name)] = value
+    pass
+
+    if group_metrics:
+      self.application_metric_map.put_metric(DEFAULT_HOST_APP_ID, group_metrics, startTime)
     pass
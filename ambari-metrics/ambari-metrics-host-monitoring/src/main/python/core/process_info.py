@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import logging
+import psutil
+import re
+import threading
+import time
+
+logger = logging.getLogger()
+
+class ProcessInfo():
+  """
+  Collects metrics of the groups of processes whose command line matches a
+  pattern. Every pid is matched only once: on each collection the pid list is
+  read, only the command lines of new pids are matched against the registered
+  patterns, and the psutil.Process handles of the matching processes are kept
+  between collections (cpu_percent is computed from the previous call on the
+  same handle). Handles of exited processes are dropped.
+  New pids matching no pattern are matched again for a while, daemons are
+  started by launcher scripts which exec the JVM in the same pid.
+  """
+
+  PROCESS_METRICS = ['proc_count', 'cpu_percent', 'mem_rss', 'mem_vms',
+                     'read_bytes', 'write_bytes', 'num_fds', 'num_threads']
+  # Seconds during which a new pid matching no pattern is matched again
+  UNMATCHED_RETRY_INTERVAL = 120
+
+  def __init__(self):
+    self.__lock = threading.Lock()
+    self.__known_pids = set()
+    self.__patterns = {}
+    self.__matched_processes = {}
+    # pid -> (psutil.Process, time it was first seen) of the new pids matching no pattern
+    self.__unmatched_processes = {}
+
+  def get_process_metrics(self, pattern):
+    """
+    Return the metrics of the processes matching pattern, summed over the
+    matching processes
+    """
+    with self.__lock:
+      if not pattern in self.__patterns:
+        self.__register_pattern(pattern)
+      else:
+        self.__refresh()
+      processes = self.__matched_processes[pattern].items()
+
+    metrics = dict.fromkeys(self.PROCESS_METRICS, 0)
+    for pid, process in processes:
+      try:
+        # The pid may have been reused by another process since it was matched
+        if not process.is_running():
+          raise psutil.NoSuchProcess(pid)
+        process_metrics = self.__get_metrics(process)
+      except psutil.NoSuchProcess:
+        self.__forget(pid)
+        continue
+      except psutil.AccessDenied:
+        process_metrics = {}
+
+      metrics['proc_count'] += 1
+      for name, value in process_metrics.iteritems():
+        metrics[name] += value
+    pass
+
+    return metrics
+
+  def __register_pattern(self, pattern):
+    self.__patterns[pattern] = re.compile(pattern)
+    self.__matched_processes[pattern] = {}
+    self.__refresh()
+    # Pids seen before the pattern was registered are matched only for it
+    self.__match(self.__known_pids, [pattern])
+
+  def __refresh(self):
+    current_pids = set(psutil.pids())
+    new_pids = current_pids - self.__known_pids
+    exited_pids = self.__known_pids - current_pids
+
+    for matched_processes in self.__matched_processes.itervalues():
+      for pid in exited_pids:
+        matched_processes.pop(pid, None)
+    for pid in exited_pids:
+      self.__unmatched_processes.pop(pid, None)
+
+    self.__known_pids = current_pids
+    self.__retry_unmatched()
+    self.__match(new_pids, self.__patterns.keys())
+
+  def __forget(self, pid):
+    with self.__lock:
+      # An unknown pid is matched again on the next refresh
+      self.__known_pids.discard(pid)
+      self.__unmatched_processes.pop(pid, None)
+      for matched_processes in self.__matched_processes.itervalues():
+        matched_processes.pop(pid, None)
+
+  def __match(self, pids, patterns):
+    if not patterns:
+      return
+    now = time.time()
+    for pid in pids:
+      try:
+        process = psutil.Process(pid)
+        cmdline = " ".join(process.cmdline())
+      except (psutil.NoSuchProcess, psutil.AccessDenied):
+        continue
+
+      if not self.__match_cmdline(pid, process, cmdline, patterns) and not pid in self.__unmatched_processes:
+        self.__unmatched_processes[pid] = (process, now)
+    pass
+
+  def __retry_unmatched(self):
+    now = time.time()
+    for pid, (process, first_seen) in self.__unmatched_processes.items():
+      if now - first_seen > self.UNMATCHED_RETRY_INTERVAL:
+        del self.__unmatched_processes[pid]
+        continue
+      try:
+        cmdline = " ".join(process.cmdline())
+      except (psutil.NoSuchProcess, psutil.AccessDenied):
+        del self.__unmatched_processes[pid]
+        continue
+      if self.__match_cmdline(pid, process, cmdline, self.__patterns.keys()):
+        del self.__unmatched_processes[pid]
+    pass
+
+  def __match_cmdline(self, pid, process, cmdline, patterns):
+    matched = False
+    for pattern in patterns:
+      if self.__patterns[pattern].search(cmdline):
+        self.__matched_processes[pattern][pid] = process
+        matched = True
+    return matched
+
+  def __get_metrics(self, process):
+    metrics = {
+      'cpu_percent': process.cpu_percent(interval=None),
+      'num_threads': process.num_threads()
+    }
+
+    memory_info = process.memory_info()
+    metrics['mem_rss'] = memory_info.rss
+    metrics['mem_vms'] = memory_info.vms
+
+    # The monitor usually runs as a different user than the daemons, so the
+    # counters only readable by the process owner may be denied
+    try:
+      if hasattr(process, 'io_counters'):
+        io_counters = process.io_counters()
+        metrics['read_bytes'] = io_counters.read_bytes
+        metrics['write_bytes'] = io_counters.write_bytes
+    except psutil.AccessDenied:
+      pass
+
+    try:
+      if hasattr(process, 'num_fds'):
+        metrics['num_fds'] = process.num_fds()
+    except psutil.AccessDenied:
+      pass
+
+    return metrics
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import logging
+from core.event_scheduler import EventScheduler
+from mock.mock import patch, MagicMock, call
+from unittest import TestCase
+
+logger = logging.getLogger()
+
+class FakeClock:
+  """
+  Advances the time on every wait and signals the stop event at 'stop_at'.
+  """
+  def __init__(self, stop_at):
+    self.now = 1000.0
+    self.stop_at = stop_at
+    self.waits = []
+
+  def time(self):
+    return self.now
+
+  def wait(self, timeout=None):
+    self.waits.append(timeout)
+    if self.now + timeout >= self.stop_at:
+      return 0
+    self.now += timeout
+    return -1
+
+def create_event(name, interval):
+  event = MagicMock()
+  event.get_classname.return_value = name
+  event.get_collect_interval.return_value = interval
+  return event
+
+class TestEventScheduler(TestCase):
+
+  @patch("time.time")
+  def testFixedRate(self, time_mock):
+    clock = FakeClock(1000.0 + 65)
+    time_mock.side_effect = clock.time
+    collected = []
+
+    def process_event(event):
+      collected.append((event.get_classname(), clock.now))
+      # Collection takes some time, the next tick must not drift
+      clock.now += 2
+
+    events = [create_event('host', 10), create_event('process', 30)]
+    scheduler = EventScheduler(events, process_event, clock, 5)
+    scheduler.run()
+
+    self.assertEqual(collected, [('host', 1010.0), ('host', 1020.0), ('host', 1030.0),
+                                 ('process', 1032.0), ('host', 1040.0), ('host', 1050.0),
+                                 ('host', 1060.0), ('process', 1062.0)])
+    self.assertEqual(scheduler.get_stats(),
+                     {'collections': 8, 'late_collections': 2, 'skipped_collections': 0})
+
+  @patch("time.time")
+  def testSkipMissedTicks(self, time_mock):
+    clock = FakeClock(1000.0 + 50)
+    time_mock.side_effect = clock.time
+    collected = []
+
+    def process_event(event):
+      collected.append(clock.now)
+      # The first collection is slow enough to miss two ticks
+      if len(collected) == 1:
+        clock.now += 25
+
+    scheduler = EventScheduler([create_event('host', 10)], process_event, clock, 5)
+    scheduler.run()
+
+    self.assertEqual(collected, [1010.0, 1040.0])
+    self.assertEqual(scheduler.get_stats(),
+                     {'collections': 2, 'late_collections': 0, 'skipped_collections': 2})
+
+  @patch("time.time")
+  def testFailedCollection(self, time_mock):
+    clock = FakeClock(1000.0 + 25)
+    time_mock.side_effect = clock.time
+    process_event = MagicMock(side_effect=Exception('failed'))
+
+    scheduler = EventScheduler([create_event('host', 10)], process_event, clock, 5)
+    scheduler.run()
+
+    self.assertEqual(process_event.call_count, 2)
+    self.assertEqual(scheduler.get_stats()['collections'], 2)
+
+  @patch("core.event_scheduler.logger")
+  @patch("time.time")
+  def testLogStats(self, time_mock, logger_mock):
+    clock = FakeClock(1000.0 + 95)
+    time_mock.side_effect = clock.time
+
+    scheduler = EventScheduler([create_event('host', 10)], MagicMock(), clock, 5)
+    scheduler.STATS_LOG_INTERVAL = 30
+    scheduler.run()
+
+    # logged while running, every STATS_LOG_INTERVAL
+    self.assertEqual([call('Collection stats: 3 collections, 0 late, 0 skipped.'),
+                      call('Collection stats: 6 collections, 0 late, 0 skipped.'),
+                      call('Collection stats: 9 collections, 0 late, 0 skipped.')],
+                     logger_mock.info.call_args_list)
+
+  def testNoEvents(self):
+    stop_handler = MagicMock()
+    stop_handler.wait.side_effect = [-1, 0]
+
+    EventScheduler([], MagicMock(), stop_handler, 5).run()
+
+    self.assertEqual(stop_handler.wait.call_count, 2)
+    stop_handler.wait.assert_called_with(5)
@@ -19,11 +19,11 @@ limitations under the License.
 '''
 import logging
 from unittest import TestCase
-from mock.mock import patch
+from mock.mock import patch, MagicMock
 
 from core.application_metric_map import ApplicationMetricMap
 from core.metric_collector import MetricsCollector
-from core.event_definition import HostMetricCollectEvent
+from core.event_definition import HostMetricCollectEvent, ProcessMetricCollectEvent
 from core.host_info import HostInfo
 
 logger = logging.getLogger()
@@ -45,3 +45,47 @@ class TestMetricCollector(TestCase):
     metric_collector.process_event(e)
     
     self.assertEqual(amm_mock.put_metric.call_count, 1)
+
+  def testCollectProcessEvent(self):
+    amm_mock = MagicMock()
+    process_info_mock = MagicMock()
+    process_info_mock.get_process_metrics.return_value = {'proc_count': 1, 'cpu_percent': 2.5, 'mem_rss': 1024}
+
+    metric_collector = MetricsCollector(None, amm_mock, MagicMock(), process_info_mock)
+
+    group_config = {'collect_every' : 15, 'pattern' : 'NameNode',
+                    'metrics' : [{'name' : 'cpu_percent'}, {'name' : 'mem_rss'}]}
+
+    e = ProcessMetricCollectEvent(group_config, 'namenode')
+
+    metric_collector.process_event(e)
+
+    process_info_mock.get_process_metrics.assert_called_once_with('NameNode')
+    self.assertEqual(amm_mock.put_metric.call_count, 1)
+    self.assertEqual(amm_mock.put_metric.call_args[0][1],
+                     {'process.namenode.cpu_percent': 2.5, 'process.namenode.mem_rss': 1024})
+
+  def testCollectProcessEventNotRunning(self):
+    amm_mock = MagicMock()
+    process_info_mock = MagicMock()
+    process_info_mock.get_process_metrics.return_value = {'proc_count': 0, 'cpu_percent': 0}
+
+    metric_collector = MetricsCollector(None, amm_mock, MagicMock(), process_info_mock)
+
+    group_config = {'collect_every' : 15, 'pattern' : 'NameNode', 'metrics' : []}
+
+    e = ProcessMetricCollectEvent(group_config, 'namenode')
+
+    # not reported on hosts where the group never had a process
+    metric_collector.process_event(e)
+    self.assertFalse(amm_mock.put_metric.called)
+
+    process_info_mock.get_process_metrics.return_value = {'proc_count': 1, 'cpu_percent': 2.5}
+    metric_collector.process_event(e)
+
+    # but reported once its processes are gone
+    process_info_mock.get_process_metrics.return_value = {'proc_count': 0, 'cpu_percent': 0}
+    metric_collector.process_event(e)
+    self.assertEqual(amm_mock.put_metric.call_count, 2)
+    self.assertEqual(amm_mock.put_metric.call_args[0][1],
+                     {'process.namenode.proc_count': 0, 'process.namenode.cpu_percent': 0})
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import collections
+import logging
+import psutil
+from process_info import ProcessInfo
+from mock.mock import patch, MagicMock
+from unittest import TestCase
+
+logger = logging.getLogger()
+
+pmem = collections.namedtuple('pmem', ['rss', 'vms'])
+pio = collections.namedtuple('pio', ['read_count', 'write_count', 'read_bytes', 'write_bytes'])
+
+def create_process_mock(pid, cmdline, rss=100, fds=10):
+  process = MagicMock()
+  process.pid = pid
+  process.cmdline.return_value = cmdline
+  process.is_running.return_value = True
+  process.cpu_percent.return_value = 1.5
+  process.num_threads.return_value = 4
+  process.memory_info.return_value = pmem(rss, 2 * rss)
+  process.io_counters.return_value = pio(1, 2, 30, 40)
+  process.num_fds.return_value = fds
+  return process
+
+class TestProcessInfo(TestCase):
+
+  @patch("psutil.Process")
+  @patch("psutil.pids")
+  def testGetProcessMetrics(self, pids_mock, process_mock):
+    processes = {
+      1: create_process_mock(1, ['/sbin/init']),
+      2: create_process_mock(2, ['java', 'org.apache.hadoop.hdfs.server.namenode.NameNode'], rss=100, fds=10),
+      3: create_process_mock(3, ['java', 'org.apache.hadoop.hdfs.server.namenode.NameNode'], rss=200, fds=20)
+    }
+    processes[3].io_counters.side_effect = psutil.AccessDenied(3)
+    pids_mock.return_value = [1, 2, 3]
+    process_mock.side_effect = lambda pid: processes[pid]
+
+    process_info = ProcessInfo()
+    metrics = process_info.get_process_metrics('namenode.NameNode')
+
+    self.assertEqual(metrics['proc_count'], 2)
+    self.assertEqual(metrics['cpu_percent'], 3.0)
+    self.assertEqual(metrics['mem_rss'], 300)
+    self.assertEqual(metrics['mem_vms'], 600)
+    self.assertEqual(metrics['num_fds'], 30)
+    self.assertEqual(metrics['num_threads'], 8)
+    self.assertEqual(metrics['read_bytes'], 30)
+    self.assertEqual(metrics['write_bytes'], 40)
+
+    # Known pids are not matched again, the cached handles are reused
+    process_mock.reset_mock()
+    metrics = process_info.get_process_metrics('namenode.NameNode')
+    self.assertEqual(process_mock.call_count, 0)
+    self.assertEqual(metrics['proc_count'], 2)
+    self.assertEqual(processes[2].cpu_percent.call_count, 2)
+
+    # Only new pids are matched, exited processes are dropped
+    processes[4] = create_process_mock(4, ['java', 'org.apache.hadoop.hdfs.server.namenode.NameNode'])
+    pids_mock.return_value = [1, 3, 4]
+    metrics = process_info.get_process_metrics('namenode.NameNode')
+    process_mock.assert_called_once_with(4)
+    self.assertEqual(metrics['proc_count'], 2)
+    self.assertEqual(metrics['mem_rss'], 300)
+
+  @patch("psutil.Process")
+  @patch("psutil.pids")
+  def testGetProcessMetricsPidReused(self, pids_mock, process_mock):
+    namenode = create_process_mock(2, ['java', 'org.apache.hadoop.hdfs.server.namenode.NameNode'])
+    other = create_process_mock(2, ['sleep', '100'])
+    pids_mock.return_value = [2]
+    process_mock.return_value = namenode
+
+    process_info = ProcessInfo()
+    self.assertEqual(process_info.get_process_metrics('NameNode')['proc_count'], 1)
+    # A process registered before the pattern is matched for the new pattern
+    self.assertEqual(process_info.get_process_metrics('sleep')['proc_count'], 0)
+
+    namenode.is_running.return_value = False
+    process_mock.return_value = other
+    self.assertEqual(process_info.get_process_metrics('NameNode')['proc_count'], 0)
+    self.assertEqual(process_info.get_process_metrics('sleep')['proc_count'], 1)
+    self.assertEqual(process_info.get_process_metrics('NameNode')['proc_count'], 0)
+
+  @patch("time.time")
+  @patch("psutil.Process")
+  @patch("psutil.pids")
+  def testGetProcessMetricsLauncherExec(self, pids_mock, process_mock, time_mock):
+    launcher = create_process_mock(2, ['bash', '/usr/hdp/current/hadoop-hdfs-namenode/bin/hdfs', 'namenode'])
+    late_launcher = create_process_mock(3, ['bash', '/usr/hdp/current/hadoop-hdfs-datanode/bin/hdfs', 'datanode'])
+    processes = {2: launcher, 3: late_launcher}
+    pids_mock.return_value = [2]
+    process_mock.side_effect = lambda pid: processes[pid]
+    time_mock.return_value = 1000
+
+    process_info = ProcessInfo()
+    self.assertEqual(process_info.get_process_metrics('namenode.NameNode')['proc_count'], 0)
+    self.assertEqual(process_info.get_process_metrics('datanode.DataNode')['proc_count'], 0)
+
+    # The launcher execs the JVM in the same pid
+    launcher.cmdline.return_value = ['java', 'org.apache.hadoop.hdfs.server.namenode.NameNode']
+    time_mock.return_value = 1015
+    self.assertEqual(process_info.get_process_metrics('namenode.NameNode')['proc_count'], 1)
+    self.assertEqual(process_info.get_process_metrics('namenode.NameNode')['proc_count'], 1)
+
+    # Pids matching nothing are not matched again once they are old enough
+    pids_mock.return_value = [2, 3]
+    self.assertEqual(process_info.get_process_metrics('datanode.DataNode')['proc_count'], 0)
+    late_launcher.cmdline.return_value = ['java', 'org.apache.hadoop.hdfs.server.datanode.DataNode']
+    late_launcher.cmdline.reset_mock()
+    time_mock.return_value = 1015 + ProcessInfo.UNMATCHED_RETRY_INTERVAL + 1
+    self.assertEqual(process_info.get_process_metrics('datanode.DataNode')['proc_count'], 0)
+    self.assertEqual(late_launcher.cmdline.call_count, 0)
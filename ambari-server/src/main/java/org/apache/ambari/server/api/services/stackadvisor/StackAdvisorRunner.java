@@ -18,16 +18,27 @@
 
 package org.apache.ambari.server.api.services.stackadvisor;
 
+import java.io.BufferedReader;
+import java.io.BufferedWriter;
 import java.io.File;
 import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
 import java.util.ArrayList;
 import java.util.List;
+import java.util.concurrent.locks.ReentrantLock;
 
 import org.apache.ambari.server.api.services.stackadvisor.commands.StackAdvisorCommandType;
+import org.apache.ambari.server.configuration.Configuration;
 import org.apache.commons.io.FileUtils;
+import org.apache.commons.io.IOUtils;
+import org.codehaus.jackson.JsonNode;
+import org.codehaus.jackson.map.ObjectMapper;
+import org.codehaus.jackson.node.ObjectNode;
 import org.slf4j.Logger;
 import org.slf4j.LoggerFactory;
 
+import com.google.inject.Inject;
 import com.google.inject.Singleton;
 
 @Singleton
@@ -35,8 +46,47 @@ public class StackAdvisorRunner {
 
   private final static Logger LOG = LoggerFactory.getLogger(StackAdvisorRunner.class);
 
+  /**
+   * The stack advisor script action which starts a long-lived worker reading
+   * requests from its stdin and writing responses to its stdout, one JSON
+   * document per line.
+   */
+  private static final String SERVE_STDIO_ACTION = "serve-stdio";
+
+  private final ObjectMapper mapper = new ObjectMapper();
+
+  /**
+   * Whether requests are passed to the long-lived stack advisor worker.
+   */
+  private final boolean workerEnabled;
+
+  /**
+   * Guards the worker, which processes one request at a time.
+   */
+  private final ReentrantLock workerLock = new ReentrantLock();
+
+  private Process worker;
+  private String workerScript;
+  private BufferedWriter workerInput;
+  private BufferedReader workerOutput;
+
+  /**
+   * Creates a runner which runs the stack advisor script in a new process for
+   * every request.
+   */
+  public StackAdvisorRunner() {
+    workerEnabled = false;
+  }
+
+  @Inject
+  public StackAdvisorRunner(Configuration configuration) {
+    workerEnabled = configuration.isStackAdvisorWorkerEnabled();
+  }
+
   /**
    * Runs stack_advisor.py script in the specified {@code actionDirectory}.
+   * When the worker is enabled and idle, the request is passed to it and the
+   * script is only started in a new process if the worker fails.
    *
    * @param script stack advisor script
    * @param saCommandType {@link StackAdvisorCommandType} to run.
@@ -50,6 +100,10 @@ public class StackAdvisorRunner {
     String outputFile = actionDirectory + File.separator + "stackadvisor.out";
     String errorFile = actionDirectory + File.separator + "stackadvisor.err";
 
+    if (workerEnabled && runInWorker(script, saCommandType, actionDirectory, outputFile, errorFile)) {
+      return;
+    }
+
     ProcessBuilder builder = prepareShellCommand(script, saCommandType,
         actionDirectory, outputFile,
         errorFile);
@@ -61,41 +115,7 @@ public class StackAdvisorRunner {
         LOG.info("Stack-advisor output={}, error={}", outputFile, errorFile);
 
         int exitCode = process.waitFor();
-        String outMessage;
-        String errMessage = null;
-        try {
-          outMessage = FileUtils.readFileToString(new File(outputFile)).trim();
-          errMessage = FileUtils.readFileToString(new File(errorFile)).trim();
-          LOG.info("Stack advisor output files");
-          LOG.info("    advisor script stdout: {}", outMessage);
-          LOG.info("    advisor script stderr: {}", errMessage);
-        } catch (IOException io) {
-          LOG.error("Error in reading script log files", io);
-        }
-        if (exitCode > 0) {
-          String errorMessage;
-          if (errMessage != null) {
-            // We want to get the last line.
-            int index = errMessage.lastIndexOf("\n");
-            if (index > 0 && index == (errMessage.length() - 1)) {
-              index = errMessage.lastIndexOf("\n", index - 1); // sentence ended with newline
-            }
-            if (index > -1) {
-              errMessage = errMessage.substring(index + 1).trim();
-            }
-            errorMessage = "Stack Advisor reported an error: " + errMessage;
-          } else {
-            errorMessage = "Error occurred during stack advisor execution";
-          }
-          errorMessage += "\nStdOut file: " + outputFile + "\n";
-          errorMessage += "\nStdErr file: " + errorFile;
-          switch (exitCode) {
-            case 1:
-              throw new StackAdvisorRequestException(errorMessage);
-            case 2:
-              throw new StackAdvisorException(errorMessage);
-          }
-        }
+        checkExitCode(exitCode, outputFile, errorFile);
       } finally {
         process.destroy();
       }
@@ -108,6 +128,179 @@ public class StackAdvisorRunner {
     }
   }
 
+  /**
+   * Logs the script output and turns a non-zero exit code of the script into
+   * the matching exception.
+   *
+   * @param exitCode exit code of the script
+   * @param outputFile file with the script stdout
+   * @param errorFile file with the script stderr
+   */
+  private void checkExitCode(int exitCode, String outputFile, String errorFile)
+      throws StackAdvisorException {
+    String outMessage;
+    String errMessage = null;
+    try {
+      outMessage = FileUtils.readFileToString(new File(outputFile)).trim();
+      errMessage = FileUtils.readFileToString(new File(errorFile)).trim();
+      LOG.info("Stack advisor output files");
+      LOG.info("    advisor script stdout: {}", outMessage);
+      LOG.info("    advisor script stderr: {}", errMessage);
+    } catch (IOException io) {
+      LOG.error("Error in reading script log files", io);
+    }
+    if (exitCode > 0) {
+      String errorMessage;
+      if (errMessage != null) {
+        // We want to get the last line.
+        int index = errMessage.lastIndexOf("\n");
+        if (index > 0 && index == (errMessage.length() - 1)) {
+          index = errMessage.lastIndexOf("\n", index - 1); // sentence ended with newline
+        }
+        if (index > -1) {
+          errMessage = errMessage.substring(index + 1).trim();
+        }
+        errorMessage = "Stack Advisor reported an error: " + errMessage;
+      } else {
+        errorMessage = "Error occurred during stack advisor execution";
+      }
+      errorMessage += "\nStdOut file: " + outputFile + "\n";
+      errorMessage += "\nStdErr file: " + errorFile;
+      switch (exitCode) {
+        case 1:
+          throw new StackAdvisorRequestException(errorMessage);
+        case 2:
+          throw new StackAdvisorException(errorMessage);
+      }
+    }
+  }
+
+  /**
+   * Passes the request to the long-lived stack advisor worker, starting it if
+   * needed. The contents of the request files are sent to the worker, which
+   * answers with the result along with the script output. The result and the
+   * output are written to the same files the script would have written them to.
+   *
+   * @param script stack advisor script
+   * @param saCommandType {@link StackAdvisorCommandType} to run.
+   * @param actionDirectory directory for the action
+   * @param outputFile file for the script stdout
+   * @param errorFile file for the script stderr
+   * @return {@code false} if the worker is busy with another request or
+   *         failed, so that the request has to be run in a new process
+   */
+  private boolean runInWorker(String script, StackAdvisorCommandType saCommandType,
+      File actionDirectory, String outputFile, String errorFile) throws StackAdvisorException {
+    // rather than queueing behind a long request, run concurrent requests in processes of their own
+    if (!workerLock.tryLock()) {
+      LOG.debug("Stack advisor worker is busy, running {} in a new process", saCommandType);
+      return false;
+    }
+
+    JsonNode response;
+    try {
+      ObjectNode request = mapper.createObjectNode();
+      request.put("action", saCommandType.toString());
+      request.put("hosts", mapper.readTree(new File(actionDirectory, "hosts.json")));
+      request.put("services", mapper.readTree(new File(actionDirectory, "services.json")));
+
+      startWorker(script);
+      workerInput.write(mapper.writeValueAsString(request));
+      workerInput.newLine();
+      workerInput.flush();
+
+      String line = workerOutput.readLine();
+      if (line == null) {
+        throw new IOException("Stack advisor worker exited");
+      }
+      response = mapper.readTree(line);
+
+      FileUtils.writeStringToFile(new File(outputFile), response.get("stdout").getTextValue());
+      FileUtils.writeStringToFile(new File(errorFile), response.get("stderr").getTextValue());
+      if (response.get("exit_code").getIntValue() == 0) {
+        mapper.writeValue(new File(actionDirectory, response.get("result_file").getTextValue()),
+            response.get("result"));
+      }
+    } catch (Exception e) {
+      LOG.warn("Stack advisor worker failed, running " + saCommandType + " in a new process", e);
+      stopWorker();
+      return false;
+    } finally {
+      workerLock.unlock();
+    }
+
+    checkExitCode(response.get("exit_code").getIntValue(), outputFile, errorFile);
+    return true;
+  }
+
+  /**
+   * Starts the stack advisor worker, unless it is already running the same
+   * script.
+   *
+   * @param script stack advisor script
+   */
+  private void startWorker(String script) throws IOException {
+    if (worker != null && script.equals(workerScript)) {
+      try {
+        LOG.warn("Stack advisor worker exited with code {}", worker.exitValue());
+      } catch (IllegalThreadStateException e) {
+        // still running
+        return;
+      }
+    }
+    stopWorker();
+
+    LOG.info("Starting stack advisor worker {}", script);
+    worker = prepareWorkerCommand(script).start();
+    workerScript = script;
+    workerInput = new BufferedWriter(new OutputStreamWriter(worker.getOutputStream(), "UTF-8"));
+    workerOutput = new BufferedReader(new InputStreamReader(worker.getInputStream(), "UTF-8"));
+  }
+
+  /**
+   * Stops the stack advisor worker if it is running. Closing its stdin is
+   * enough for the worker to exit, it is destroyed in case it is stuck.
+   */
+  private void stopWorker() {
+    if (worker == null) {
+      return;
+    }
+    IOUtils.closeQuietly(workerInput);
+    IOUtils.closeQuietly(workerOutput);
+    worker.destroy();
+    worker = null;
+    workerScript = null;
+    workerInput = null;
+    workerOutput = null;
+  }
+
+  /**
+   * Gets an instance of a {@link ProcessBuilder} that's ready to start the
+   * long-lived stack advisor worker. Its stderr goes to the server output.
+   *
+   * @param script
+   * @return
+   */
+  ProcessBuilder prepareWorkerCommand(String script) {
+    List<String> builderParameters = new ArrayList<String>();
+    if (System.getProperty("os.name").contains("Windows")) {
+      builderParameters.add("cmd");
+      builderParameters.add("/c");
+      builderParameters.add(script + " " + SERVE_STDIO_ACTION);
+    } else {
+      builderParameters.add("sh");
+      builderParameters.add("-c");
+      // exec, so that destroying the process stops the worker itself
+      builderParameters.add("exec " + script + " " + SERVE_STDIO_ACTION);
+    }
+
+    LOG.debug("Stack advisor worker command is {}", builderParameters);
+
+    ProcessBuilder builder = new ProcessBuilder(builderParameters);
+    builder.redirectError(ProcessBuilder.Redirect.INHERIT);
+    return builder;
+  }
+
   /**
    * Gets an instance of a {@link ProcessBuilder} that's ready to execute the
    * shell command to run the stack advisor script. This will take the
@@ -445,6 +445,14 @@ public class Configuration {
       "stackadvisor.script",
       AmbariPath.getPath("/var/lib/ambari-server/resources/scripts/stack_advisor.py"));
 
+  /**
+   * Determines whether stack advisor requests are passed to a long-lived
+   * stack advisor process instead of running the script for every request.
+   */
+  @Markdown(description = "Determines whether stack advisor requests are passed to a long-lived stack advisor process, which keeps the stack advisors loaded between requests, instead of running the script for every request.")
+  public static final ConfigurationProperty<Boolean> STACK_ADVISOR_WORKER_ENABLED = new ConfigurationProperty<>(
+      "stackadvisor.worker.enabled", Boolean.TRUE);
+
   /**
    * The name of the shell script used to wrap all invocations of Python by Ambari.
    */
@@ -3353,6 +3361,14 @@ public class Configuration {
     return getProperty(STACK_ADVISOR_SCRIPT);
   }
 
+  /**
+   * @return true if stack advisor requests should be passed to a long-lived
+   *         stack advisor process
+   */
+  public boolean isStackAdvisorWorkerEnabled() {
+    return Boolean.parseBoolean(getProperty(STACK_ADVISOR_WORKER_ENABLED));
+  }
+
   /**
    * @return a list of prefixes. Packages whose name starts with any of these
    * prefixes, should be skipped during upgrade.
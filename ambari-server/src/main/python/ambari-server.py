@@ -310,10 +310,10 @@ def get_backup_path(args):
     path = None
   return path
 
-def backup(args):
+def backup(args, options=None):
   logger.info("Backup.")
   print "Backup requested."
-  backup_command = ["BackupRestore", 'backup']
+  backup_command = ["BackupRestore", 'incremental-backup' if options and options.incremental_backup else 'backup']
   path = get_backup_path(args)
   if not path is None:
     backup_command.append(path)
@@ -554,6 +554,15 @@ def init_parser_options(parser):
       parser=parser,
       optional_for_actions=[INSTALL_MPACK_ACTION]
   )
+  add_parser_options('--incremental',
+      action="store_true",
+      default=False,
+      help="Only back up the files changed since the previous backup in the same folder, "
+           "an existing archive is kept and a timestamp is added to the name of the new one",
+      dest="incremental_backup",
+      parser=parser,
+      optional_for_actions=[BACKUP_ACTION]
+  )
 
   parser.add_option('--ldap-url', default=None, help="Primary url for LDAP", dest="ldap_url")
   parser.add_option('--ldap-secondary-url', default=None, help="Secondary url for LDAP", dest="ldap_secondary_url")
@@ -753,7 +762,7 @@ def create_user_action_map(args, options):
         SET_CURRENT_ACTION: UserAction(set_current, options),
         SETUP_SECURITY_ACTION: UserActionRestart(setup_security, options),
         REFRESH_STACK_HASH_ACTION: UserAction(refresh_stack_hash_action),
-        BACKUP_ACTION: UserActionPossibleArgs(backup, [1, 2], args),
+        BACKUP_ACTION: UserActionPossibleArgs(backup, [1, 2], args, options),
         RESTORE_ACTION: UserActionPossibleArgs(restore, [1, 2], args),
         UPDATE_HOST_NAMES_ACTION: UserActionPossibleArgs(update_host_names, [2], args, options),
         CHECK_DATABASE_ACTION: UserAction(check_database, options),
@@ -21,12 +21,28 @@ limitations under the License.
 import sys
 import zipfile
 import os
+import hashlib
+import json
+import time
+from ambari_commons.parallel_processing import execute_in_parallel, DEFAULT_POOL_SIZE, SUCCESS
 from ambari_server.ambariPath import AmbariPath
 
 # Default values are hardcoded here
 BACKUP_PROCESS = 'backup'
+INCREMENTAL_BACKUP_PROCESS = 'incremental-backup'
 RESTORE_PROCESS = 'restore'
-SUPPORTED_PROCESSES = [BACKUP_PROCESS, RESTORE_PROCESS]
+SUPPORTED_PROCESSES = [BACKUP_PROCESS, INCREMENTAL_BACKUP_PROCESS, RESTORE_PROCESS]
+
+# Every archive stores a manifest of the backed up files (mtime, size, checksum and the archive
+# holding their content). A copy is kept next to the archives to drive the next incremental backup.
+MANIFEST_NAME = "ambari-backup-manifest.json"
+MANIFEST_VERSION = 1
+
+# Changed files bigger than this are compressed by the worker pool into part archives next to the
+# archive, <zipname>.part1, <zipname>.part2, ... The manifest tells which archive holds every file.
+LARGE_FILE_SIZE = 4 * 1024 * 1024
+PART_SUFFIX = ".part"
+CHUNK_SIZE = 1024 * 1024
 
 # The list of files where the ambari server state is kept on the filesystem
 AMBARI_FILESYSTEM_STATE = [AmbariPath.get("/etc/ambari-server/conf"),
@@ -51,16 +67,30 @@ class BackupRestore:
     self.zipname = zipname
     self.zip_folder_path = zip_folder_path
 
-  def perform_backup(self):
+  def perform_backup(self, incremental=False):
     """
     Used to perform the actual backup, by creating the zip archive
+    :param incremental: only archive the files changed since the previous backup in the same folder,
+    the unchanged ones are restored from the archives they were saved to. An existing archive is never
+    overwritten, a timestamp is added to the name of the new one instead.
     :return:
     """
     try:
+      previous_manifest = None
+      manifest_path = os.path.join(self.zip_folder_path, MANIFEST_NAME)
+      if incremental:
+        previous_manifest = load_manifest(manifest_path)
+        if previous_manifest is None:
+          print("No previous backup found in " + self.zip_folder_path + ", performing a full backup")
+        zipname = get_incremental_zipname(self.zip_folder_path, self.zipname)
+        if zipname != self.zipname:
+          print("The archive " + self.zipname + " already exists, creating " + zipname + " instead")
+          self.zipname = zipname
+
       print("Creating zip file...")
       # Use allowZip64=True to allow sizes greater than 4GB
       zipf = zipfile.ZipFile(self.zip_folder_path + self.zipname, 'w', allowZip64=True)
-      zipdir(zipf, self.state_file_list, self.zipname)
+      zipdir(zipf, self.state_file_list, self.zipname, previous_manifest, manifest_path)
     except Exception, e:
       sys.exit("Could not create zip file. Details: " + str(e))
 
@@ -73,7 +103,12 @@ class BackupRestore:
     """
     try:
       print("Extracting the archive " + self.zip_folder_path + self.zipname)
-      unzip(self.zip_folder_path + self.zipname, '/')
+      manifest = read_archive_manifest(self.zip_folder_path + self.zipname)
+      if manifest is None:
+        # archive created before manifests were introduced
+        unzip(self.zip_folder_path + self.zipname, '/')
+      else:
+        restore_from_manifest(self.zip_folder_path, self.zipname, manifest, '/')
     except Exception, e:
       sys.exit("Could not extract the zipfile " + self.zip_folder_path + self.zipname
                + " Details: " + str(e))
@@ -96,33 +131,268 @@ def unzip(source_filename, dest_dir):
     zf.close()
 
 
-def zipdir(zipf, state_file_list, zipname):
+def zipdir(zipf, state_file_list, zipname, previous_manifest=None, manifest_path=None):
   """
   Used to archive the specified directory
   :param zipf: the zipfile
   :param state_file_list: the file list to archive
   :param zipname: the name of the zip
-  :return:
+  :param previous_manifest: manifest of the previous backup, only the files changed since are archived
+  :param manifest_path: where to keep the manifest for the next incremental backup
+  :return: the manifest of the backup
   """
   try:
+    paths = []
     for path in state_file_list:
       for root, dirs, files in os.walk(path):
         for file in files:
-          if not file == zipname:
-            zipf.write(os.path.join(root, file))
+          if not is_backup_archive(file, zipname) and not file == MANIFEST_NAME:
+            paths.append(os.path.join(root, file))
+
+    manifest = build_manifest(paths, zipname, previous_manifest)
+    changed = [path for path in paths if path in manifest['files'] and manifest['files'][path]['archive'] == zipname]
+    print("Archiving {0} changed files, {1} unchanged files are kept in previous archives".format(
+      len(changed), len(manifest['files']) - len(changed)))
+
+    # the small files go to the archive itself, the large ones are spread over part archives
+    # (biggest first, so that the parts get similar sizes), all of them written in parallel
+    sizes = dict((path, manifest['files'][path]['size']) for path in changed)
+    large_paths = sorted([path for path in changed if sizes[path] >= LARGE_FILE_SIZE], key=sizes.get, reverse=True)
+    batches = [(None, [path for path in changed if sizes[path] < LARGE_FILE_SIZE])]
+    if large_paths:
+      folder = os.path.dirname(os.path.abspath(zipf.filename))
+      for index, part_paths in enumerate(split(large_paths, DEFAULT_POOL_SIZE)):
+        part_name = zipname + PART_SUFFIX + str(index + 1)
+        for path in part_paths:
+          manifest['files'][path]['archive'] = part_name
+        batches.append((os.path.join(folder, part_name), part_paths))
+      print("Archiving {0} large files to {1} part archives".format(len(large_paths), len(batches) - 1))
+    execute_batches(lambda batch: add_files(zipf, batch[1]) if batch[0] is None else write_archive(batch[0], batch[1]),
+                    batches)
+    zipf.writestr(MANIFEST_NAME, json.dumps(manifest))
   except Exception, e:
-    print("A problem occurred while unzipping. Details: " + str(e))
+    print("A problem occurred while zipping. Details: " + str(e))
     raise e
   finally:
     zipf.close()
 
+  if manifest_path:
+    save_manifest(manifest, manifest_path)
+  return manifest
+
+
+def split(elements, count):
+  """
+  Splits the elements in at most count lists of similar size
+  """
+  count = max(1, min(count, len(elements)))
+  return [elements[i::count] for i in range(count)]
+
+
+def execute_batches(function, batches):
+  """
+  Runs function(batch) for every batch on the worker pool and returns the results in order
+  """
+  results = execute_in_parallel(lambda index, params: function(params[index]), range(len(batches)), batches,
+                                wait_for_all=True)
+  for index in range(len(batches)):
+    if results[index].status != SUCCESS:
+      raise Exception(str(results[index].result))
+  return [results[index].result for index in range(len(batches))]
+
+
+def file_checksums(paths):
+  """
+  Returns {path: (mtime, size, md5)} for the paths still existing
+  """
+  checksums = {}
+  for path in paths:
+    try:
+      stat = os.stat(path)
+      md5 = hashlib.md5()
+      with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+          md5.update(chunk)
+      checksums[path] = (stat.st_mtime, stat.st_size, md5.hexdigest())
+    except (IOError, OSError):
+      # removed while the backup was running
+      pass
+  return checksums
+
+
+def build_manifest(paths, zipname, previous_manifest=None):
+  """
+  Creates the manifest of the backup. Files having the same mtime and size or the same checksum as in the
+  previous manifest keep pointing to the archive they were saved to, the others are saved to zipname
+  (zipdir moves the large ones to its parts).
+  :return: {'version', 'archive', 'files': {path: {'mtime', 'size', 'md5', 'archive'}}}
+  """
+  previous_files = previous_manifest['files'] if previous_manifest else {}
+  files = {}
+  to_checksum = []
+
+  for path in paths:
+    previous = previous_files.get(path)
+    try:
+      stat = os.stat(path)
+    except OSError:
+      continue
+    # an archive being overwritten can't provide the content of unchanged files anymore
+    if previous and not is_backup_archive(previous['archive'], zipname) and previous['mtime'] == stat.st_mtime \
+        and previous['size'] == stat.st_size:
+      files[path] = previous
+    else:
+      to_checksum.append(path)
+
+  for checksums in execute_batches(file_checksums, split(to_checksum, DEFAULT_POOL_SIZE)):
+    for path, (mtime, size, md5) in checksums.iteritems():
+      previous = previous_files.get(path)
+      archive = zipname
+      if previous and not is_backup_archive(previous['archive'], zipname) and previous['md5'] == md5:
+        archive = previous['archive']
+      files[path] = {'mtime': mtime, 'size': size, 'md5': md5, 'archive': archive}
+
+  return {'version': MANIFEST_VERSION, 'archive': zipname, 'files': files}
+
+
+def load_manifest(manifest_path):
+  """
+  Reads the manifest kept next to the archives, None if there is no usable one
+  """
+  if not os.path.isfile(manifest_path):
+    return None
+  try:
+    with open(manifest_path, 'r') as f:
+      manifest = json.load(f)
+  except ValueError, e:
+    print("Ignoring invalid manifest " + manifest_path + ". Details: " + str(e))
+    return None
+  if manifest.get('version') != MANIFEST_VERSION:
+    return None
+  return manifest
+
+
+def save_manifest(manifest, manifest_path):
+  tmp_path = manifest_path + ".tmp"
+  with open(tmp_path, 'w') as f:
+    json.dump(manifest, f)
+  os.rename(tmp_path, manifest_path)
+
+
+def read_archive_manifest(source_filename):
+  """
+  Returns the manifest stored in the archive, None for archives without one
+  """
+  zf = zipfile.ZipFile(source_filename)
+  try:
+    if MANIFEST_NAME not in zf.namelist():
+      return None
+    return json.loads(zf.read(MANIFEST_NAME))
+  finally:
+    zf.close()
+
+
+def get_incremental_zipname(zip_folder_path, zipname):
+  """
+  Name of the archive of an incremental backup. The files of the previous backups may still point to an
+  existing archive, so a timestamp is added to the name instead of overwriting it.
+  """
+  if not os.path.exists(os.path.join(zip_folder_path, zipname)):
+    return zipname
+  base, ext = os.path.splitext(zipname)
+  timestamped = base + time.strftime("-%Y%m%d-%H%M%S") + ext
+  unique_zipname = timestamped
+  count = 1
+  while os.path.exists(os.path.join(zip_folder_path, unique_zipname)):
+    unique_zipname = os.path.splitext(timestamped)[0] + "-" + str(count) + ext
+    count += 1
+  return unique_zipname
+
+
+def is_backup_archive(file_name, zipname):
+  """
+  Whether the file is the archive zipname or one of its parts
+  """
+  return file_name == zipname or file_name.startswith(zipname + PART_SUFFIX)
+
+
+def get_arcname(path):
+  """
+  Name of the archive member for the path, the same zipfile uses by default
+  """
+  arcname = os.path.normpath(os.path.splitdrive(path)[1])
+  while arcname[0] in (os.sep, os.altsep):
+    arcname = arcname[1:]
+  return arcname
+
+
+def add_files(zipf, paths):
+  for path in paths:
+    zipf.write(path, get_arcname(path), zipfile.ZIP_DEFLATED)
+
+
+def write_archive(archive_path, paths):
+  """
+  Creates an archive of the files, used for the part archives
+  """
+  zipf = zipfile.ZipFile(archive_path, 'w', allowZip64=True)
+  try:
+    add_files(zipf, paths)
+  finally:
+    zipf.close()
+
+
+def extract_members(source_filename, members, dest_dir):
+  """
+  Streams the members of the archive to dest_dir
+  """
+  zf = zipfile.ZipFile(source_filename)
+  try:
+    for member in members:
+      zf.extract(member, dest_dir)
+  finally:
+    zf.close()
+
+
+def restore_from_manifest(zip_folder_path, zipname, manifest, dest_dir):
+  """
+  Extracts every file of the manifest from the archive holding its content, in parallel
+  """
+  members = {}
+  for path, entry in manifest['files'].iteritems():
+    # the archive being restored, and so its parts, may have been renamed since it was created
+    archive = entry['archive']
+    if is_backup_archive(archive, manifest['archive']):
+      archive = zipname + archive[len(manifest['archive']):]
+    members.setdefault(archive, []).append(get_arcname(path))
+
+  for archive in members:
+    if not os.path.isfile(os.path.join(zip_folder_path, archive)):
+      raise Exception("The archive " + archive + " holding part of the backup is missing from " + zip_folder_path)
+
+  # create the folders upfront, concurrent extractions would race creating them
+  folders = set(os.path.dirname(os.path.join(dest_dir, member)) for archive_members in members.values()
+                for member in archive_members)
+  for folder in sorted(folders):
+    if not os.path.isdir(folder):
+      os.makedirs(folder)
+
+  batches = []
+  for archive, archive_members in members.iteritems():
+    for batch in split(archive_members, DEFAULT_POOL_SIZE):
+      batches.append((os.path.join(zip_folder_path, archive), batch))
+  execute_batches(lambda batch: extract_members(batch[0], batch[1], dest_dir), batches)
+
 def print_usage():
   """
   Usage instructions
   :return:
   """
   print("Usage: python BackupRestore.py <processType> [zip-folder-path|zip-file-path]\n\n"
-        + "    processType - backup : backs up the filesystem state of the Ambari server into a zip file\n"
+        + "    processType - backup : backs up the filesystem state of the Ambari server into a zip file,\n"
+        + "                           large files go to <zip file>.partN archives, which must be kept along with it\n"
+        + "    processType - incremental-backup : backs up the files changed since the previous backup in the same folder,\n"
+        + "                                       a timestamp is added to the archive name when the archive already exists\n"
         + "    processType - restore : restores the filesystem state of the Ambari server\n"
         + "    [zip-folder-path] used with backup specifies the path of the folder where the zip file to be created\n"
         + "    [zip-folder-path] used with restore specifies the path of the Ambari folder where the zip file to restore from is located\n")
@@ -174,9 +444,9 @@ def main(argv=None):
   backup_restore = BackupRestore(AMBARI_FILESYSTEM_STATE, ambari_backup_zip_filename, zip_file_path)
 
   print(process_type.title() + " process initiated.")
-  if process_type == BACKUP_PROCESS:
+  if process_type in [BACKUP_PROCESS, INCREMENTAL_BACKUP_PROCESS]:
     validate_folders(AMBARI_FILESYSTEM_STATE)
-    backup_restore.perform_backup()
+    backup_restore.perform_backup(incremental=(process_type == INCREMENTAL_BACKUP_PROCESS))
     print(BACKUP_PROCESS.title() + " complete.")
   if process_type == RESTORE_PROCESS:
     backup_restore.perform_restore()
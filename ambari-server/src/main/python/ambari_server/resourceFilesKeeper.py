@@ -23,6 +23,8 @@ import os, sys
 import zipfile
 import glob
 import pprint
+import json
+import multiprocessing
 
 
 class KeeperException(Exception):
@@ -47,6 +49,8 @@ class ResourceFilesKeeper():
 
   HASH_SUM_FILE=".hash"
   ARCHIVE_NAME="archive.zip"
+  MANIFEST_FILE=".hash_manifest"
+  TMP_FILE_SUFFIX=".tmp"
 
   PYC_EXT=".pyc"
   METAINFO_XML = "metainfo.xml"
@@ -56,14 +60,20 @@ class ResourceFilesKeeper():
   # Change that to True to see debug output at stderr
   DEBUG=False
 
-  def __init__(self, resources_dir, stacks_dir, verbose=False, nozip=False):
+  def __init__(self, resources_dir, stacks_dir, verbose=False, nozip=False,
+               incremental=False, parallel_jobs=1):
     """
       nozip = create only hash files and skip creating zip archives
+      incremental = keep a per-directory manifest of file sizes, mtimes and inodes,
+                    and do not re-read directories none of whose files changed
+      parallel_jobs = number of processes used to hash and archive directories
     """
     self.resources_dir = resources_dir
     self.stacks_root = stacks_dir
     self.verbose = verbose
     self.nozip = nozip
+    self.incremental = incremental
+    self.parallel_jobs = parallel_jobs
 
 
   def perform_housekeeping(self):
@@ -75,19 +85,51 @@ class ResourceFilesKeeper():
 
 
   def _iter_update_directory_archive(self, subdirs_list):
+    archive_dirs = []
     for subdir in subdirs_list:
       for root, dirs, _ in os.walk(subdir, followlinks=True):
         for d in dirs:
           if d in self.ARCHIVABLE_DIRS:
             full_path = os.path.abspath(os.path.join(root, d))
-            self.update_directory_archive(full_path)
+            archive_dirs.append(full_path)
+    return archive_dirs
 
   def _update_resources_subdir_archive(self, subdir):
     archive_root = os.path.join(self.resources_dir, subdir)
     self.dbg_out("Updating archive for {0} dir at {1}...".format(subdir, archive_root))
 
     # update the directories so that the .hash is generated
-    self.update_directory_archive(archive_root)
+    return [archive_root]
+
+  def _update_directory_archive_list(self, archive_dirs):
+    """
+    Updates archives of all given directories, using a pool of processes
+    if more than one parallel job is allowed
+    """
+    if self.parallel_jobs <= 1 or len(archive_dirs) <= 1:
+      for directory in archive_dirs:
+        self.update_directory_archive(directory)
+      return
+
+    # the same directory may be listed several times, never process it concurrently
+    unique_dirs = []
+    for directory in archive_dirs:
+      if directory not in unique_dirs:
+        unique_dirs.append(directory)
+
+    keeper_args = (self.resources_dir, self.stacks_root, self.verbose, self.nozip, self.incremental)
+    pool = multiprocessing.Pool(min(self.parallel_jobs, len(unique_dirs)))
+    try:
+      pool.map(_update_directory_archive_job, [keeper_args + (directory,) for directory in unique_dirs])
+      pool.close()
+    except KeeperException:
+      pool.terminate()
+      raise
+    except Exception, err:
+      pool.terminate()
+      raise KeeperException("Can not update directory archives: {0}".format(str(err)))
+    finally:
+      pool.join()
 
   def update_directory_archives(self):
     """
@@ -98,7 +140,7 @@ class ResourceFilesKeeper():
     valid_stacks = self.list_stacks(self.stacks_root)
     self.dbg_out("Stacks: {0}".format(pprint.pformat(valid_stacks)))
     # Iterate over stack directories
-    self._iter_update_directory_archive(valid_stacks)
+    archive_dirs = self._iter_update_directory_archive(valid_stacks)
 
     # archive common services
     common_services_root = os.path.join(self.resources_dir, self.COMMON_SERVICES_DIR)
@@ -106,7 +148,7 @@ class ResourceFilesKeeper():
     valid_common_services = self.list_common_services(common_services_root)
     self.dbg_out("Common Services: {0}".format(pprint.pformat(valid_common_services)))
     # Iterate over common services directories
-    self._iter_update_directory_archive(valid_common_services)
+    archive_dirs.extend(self._iter_update_directory_archive(valid_common_services))
 
     # archive extensions
     extensions_root = os.path.join(self.resources_dir, self.EXTENSIONS_DIR)
@@ -114,16 +156,18 @@ class ResourceFilesKeeper():
     valid_extensions = self.list_extensions(extensions_root)
     self.dbg_out("Extensions: {0}".format(pprint.pformat(valid_extensions)))
     # Iterate over extension directories
-    self._iter_update_directory_archive(valid_extensions)
+    archive_dirs.extend(self._iter_update_directory_archive(valid_extensions))
 
     # custom actions
-    self._update_resources_subdir_archive(self.CUSTOM_ACTIONS_DIR)
+    archive_dirs.extend(self._update_resources_subdir_archive(self.CUSTOM_ACTIONS_DIR))
 
     # agent host scripts
-    self._update_resources_subdir_archive(self.HOST_SCRIPTS_DIR)
+    archive_dirs.extend(self._update_resources_subdir_archive(self.HOST_SCRIPTS_DIR))
 
     # custom service dashboards
-    self._update_resources_subdir_archive(self.DASHBOARDS_DIR)
+    archive_dirs.extend(self._update_resources_subdir_archive(self.DASHBOARDS_DIR))
+
+    self._update_directory_archive_list(archive_dirs)
 
 
   def _list_metainfo_dirs(self, root_dir):
@@ -186,7 +230,9 @@ class ResourceFilesKeeper():
     Recursively counts hash sum of all files in directory and subdirectories.
     Files and directories are processed in alphabetical order.
     Ignores previously created directory archives and files containing
-    previously calculated hashes. Compiled pyc files are also ignored
+    previously calculated hashes. Compiled pyc files are also ignored.
+    In incremental mode files are not read at all if the size, mtime and inode
+    of every file match the manifest saved by the previous run
     """
     try:
       sha1 = hashlib.sha1()
@@ -197,6 +243,15 @@ class ResourceFilesKeeper():
             full_path = os.path.abspath(os.path.join(root, f))
             file_list.append(full_path)
       file_list.sort()
+
+      file_stats = None
+      if self.incremental:
+        file_stats = self.get_file_stats(file_list)
+        manifest = self.read_manifest(directory)
+        if manifest is not None and manifest.get("files") == file_stats:
+          self.dbg_out("No changes in {0} since the last run".format(directory))
+          return manifest["hash"]
+
       for path in file_list:
         self.dbg_out("Counting hash of {0}".format(path))
         with open(path, 'rb') as fh:
@@ -205,12 +260,51 @@ class ResourceFilesKeeper():
             if not data:
               break
             sha1.update(data)
-      return sha1.hexdigest()
+      hash_sum = sha1.hexdigest()
+      if file_stats:
+        self.write_manifest(directory, file_stats, hash_sum)
+      return hash_sum
     except Exception, err:
       raise KeeperException("Can not calculate directory "
                             "hash: {0}".format(str(err)))
 
 
+  def get_file_stats(self, file_list):
+    """
+    Returns [path, size, mtime, inode] of every file, in the given order
+    """
+    file_stats = []
+    for path in file_list:
+      stat = os.stat(path)
+      file_stats.append([path, stat.st_size, stat.st_mtime, stat.st_ino])
+    return file_stats
+
+
+  def read_manifest(self, directory):
+    """
+    Returns the manifest saved by the previous incremental run or None.
+    A broken manifest is not an error, the directory is just hashed again
+    """
+    manifest_file = os.path.join(directory, self.MANIFEST_FILE)
+    if not os.path.isfile(manifest_file):
+      return None
+    try:
+      with open(manifest_file) as fh:
+        return json.load(fh)
+    except Exception, err:
+      self.dbg_out("Can not read manifest {0} : {1}".format(manifest_file, str(err)))
+      return None
+
+
+  def write_manifest(self, directory, file_stats, hash_sum):
+    manifest_file = os.path.join(directory, self.MANIFEST_FILE)
+    try:
+      self.write_file_atomically(manifest_file, json.dumps({"hash": hash_sum, "files": file_stats}))
+    except Exception, err:
+      # the manifest is only an optimization for the next run
+      self.dbg_out("Can not write manifest {0} : {1}".format(manifest_file, str(err)))
+
+
   def read_hash_sum(self, directory):
     """
     Tries to read a hash sum from previously generated file. Returns string
@@ -235,17 +329,35 @@ class ResourceFilesKeeper():
     """
     hash_file = os.path.join(directory, self.HASH_SUM_FILE)
     try:
-      with open(hash_file, "w") as fh:
-        fh.write(new_hash)
+      self.write_file_atomically(hash_file, new_hash)
       os.chmod(hash_file, 0o755)
     except Exception, err:
       raise KeeperException("Can not write to file {0} : {1}".format(hash_file,
                                                                    str(err)))
 
+  def write_file_atomically(self, path, content):
+    """
+    Writes the content to a temporary file first and renames it over the target,
+    so that readers never see a partially written file
+    """
+    tmp_path = path + self.TMP_FILE_SUFFIX
+    with open(tmp_path, "w") as fh:
+      fh.write(content)
+    self.replace_file(tmp_path, path)
+
+
+  def replace_file(self, src, dst):
+    # rename does not replace existing files on Windows
+    if os.name == 'nt' and os.path.exists(dst):
+      os.remove(dst)
+    os.rename(src, dst)
+
+
   def zip_directory(self, directory, skip_if_empty = False):
     """
     Packs entire directory into zip file. Hash file is also packaged
-    into archive
+    into archive. The archive is built aside and renamed over the previous one,
+    so agents never download a partially written archive
     """
     self.dbg_out("creating archive for directory {0}".format(directory))
     try:
@@ -255,7 +367,8 @@ class ResourceFilesKeeper():
           return
 
       zip_file_path = os.path.join(directory, self.ARCHIVE_NAME)
-      zf = zipfile.ZipFile(zip_file_path, "w")
+      tmp_zip_file_path = zip_file_path + self.TMP_FILE_SUFFIX
+      zf = zipfile.ZipFile(tmp_zip_file_path, "w")
       abs_src = os.path.abspath(directory)
       for root, dirs, files in os.walk(directory):
         for filename in files:
@@ -267,7 +380,8 @@ class ResourceFilesKeeper():
                                         arcname))
             zf.write(absname, arcname)
       zf.close()
-      os.chmod(zip_file_path, 0o755)
+      os.chmod(tmp_zip_file_path, 0o755)
+      self.replace_file(tmp_zip_file_path, zip_file_path)
     except Exception, err:
       raise KeeperException("Can not create zip archive of "
                             "directory {0} : {1}".format(directory, str(err)))
@@ -277,7 +391,9 @@ class ResourceFilesKeeper():
     """
     returns True if filename is ignored when calculating hashing or archiving
     """
-    return filename in [self.HASH_SUM_FILE, self.ARCHIVE_NAME] or \
+    generated_files = [self.HASH_SUM_FILE, self.ARCHIVE_NAME, self.MANIFEST_FILE]
+    return filename in generated_files or \
+           filename in [f + self.TMP_FILE_SUFFIX for f in generated_files] or \
            filename.endswith(self.PYC_EXT)
 
 
@@ -288,6 +404,16 @@ class ResourceFilesKeeper():
       print text
 
 
+def _update_directory_archive_job(args):
+  """
+  Entry point of a pool process, updates the archive of a single directory
+  """
+  resources_dir, stacks_dir, verbose, nozip, incremental, directory = args
+  resource_files_keeper = ResourceFilesKeeper(resources_dir, stacks_dir, verbose=verbose,
+                                              nozip=nozip, incremental=incremental)
+  resource_files_keeper.update_directory_archive(directory)
+
+
 def main(argv=None):
   """
   This method is called by maven during rpm creation.
@@ -18,6 +18,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
+import multiprocessing
 import os
 import time
 from ambari_commons.exceptions import FatalException, NonFatalException
@@ -96,7 +97,8 @@ def is_server_runing():
 def refresh_stack_hash(properties):
   resources_location = get_resources_location(properties)
   stacks_location = get_stack_location(properties)
-  resource_files_keeper = ResourceFilesKeeper(resources_location, stacks_location)
+  resource_files_keeper = ResourceFilesKeeper(resources_location, stacks_location, incremental=True,
+                                              parallel_jobs=multiprocessing.cpu_count())
 
   try:
     print "Organizing resource files at {0}...".format(resources_location,
@@ -33,6 +33,9 @@ import subprocess
 import threading
 import traceback
 import re
+import hashlib
+import tarfile
+from StringIO import StringIO
 from datetime import datetime
 from ambari_commons import OSCheck, OSConst
 from ambari_commons.os_family_impl import OsFamilyFuncImpl, OsFamilyImpl
@@ -44,8 +47,14 @@ else:
 
 AMBARI_PASSPHRASE_VAR_NAME = "AMBARI_PASSPHRASE"
 HOST_BOOTSTRAP_TIMEOUT = 300
-# how many parallel bootstraps may be run at a time
+# how many parallel bootstraps are run at a time initially
 MAX_PARALLEL_BOOTSTRAPS = 20
+# bounds for the number of parallel bootstraps adapted to the observed ssh latency
+MIN_PARALLEL_BOOTSTRAPS = 5
+MAX_PARALLEL_BOOTSTRAPS_LIMIT = 200
+# parallelism is halved when connecting takes longer than LATENCY_BACKOFF_FACTOR * fastest connect + LATENCY_SLACK_SEC
+LATENCY_BACKOFF_FACTOR = 4
+LATENCY_SLACK_SEC = 1
 # How many seconds to wait between polling parallel bootstraps
 POLL_INTERVAL_SEC = 1
 DEBUG = False
@@ -77,6 +86,21 @@ class HostLog:
     logFile.close()
 
 
+def get_control_path(bootdir, user, host, sshPort):
+  """ Path of the socket of the multiplexed ssh master connection to the host.
+  Hashed, since unix socket paths are limited to ~100 characters """
+  connection = "{0}@{1}:{2}".format(user, host, sshPort)
+  return os.path.join(bootdir, "cm-" + hashlib.md5(connection).hexdigest()[:16])
+
+
+def get_control_options(bootdir, user, host, sshPort):
+  """ Makes ssh/scp reuse the master connection to the host, if it was opened """
+  control_path = get_control_path(bootdir, user, host, sshPort)
+  if os.path.exists(control_path):
+    return ["-o", "ControlPath=" + control_path]
+  return []
+
+
 class SCP:
   """ SCP implementation that is thread based. The status can be returned using
    status val """
@@ -97,8 +121,9 @@ class SCP:
                   "-r",
                   "-o", "ConnectTimeout=60",
                   "-o", "BatchMode=yes",
-                  "-o", "StrictHostKeyChecking=no", "-P", self.sshPort,
-                  "-i", self.sshkey_file, self.inputFile, self.user + "@" +
+                  "-o", "StrictHostKeyChecking=no", "-P", self.sshPort] + \
+                 get_control_options(self.bootdir, self.user, self.host, self.sshPort) + \
+                 ["-i", self.sshkey_file, self.inputFile, self.user + "@" +
                                                          self.host + ":" + self.remote]
     if DEBUG:
       self.host_log.write("Running scp command " + ' '.join(scpcommand))
@@ -117,8 +142,9 @@ class SCP:
 
 
 class SSH:
-  """ Ssh implementation of this """
-  def __init__(self, user, sshPort, sshkey_file, host, command, bootdir, host_log, errorMessage = None):
+  """ Ssh implementation of this. If input is given, it is streamed to the remote command's stdin """
+  def __init__(self, user, sshPort, sshkey_file, host, command, bootdir, host_log, errorMessage = None,
+               input = None):
     self.user = user
     self.sshPort = sshPort
     self.sshkey_file = sshkey_file
@@ -127,24 +153,34 @@ class SSH:
     self.bootdir = bootdir
     self.errorMessage = errorMessage
     self.host_log = host_log
+    self.input = input
     pass
 
 
   def run(self):
+    if self.input is None:
+      tty_option = "-tt" # Should prevent "tput: No value for $TERM and no -T specified" warning
+    else:
+      tty_option = "-T" # binary input must not pass through a terminal
     sshcommand = ["ssh",
                   "-o", "ConnectTimeOut=60",
                   "-o", "StrictHostKeyChecking=no",
-                  "-o", "BatchMode=yes",
-                  "-tt", # Should prevent "tput: No value for $TERM and no -T specified" warning
+                  "-o", "BatchMode=yes"] + \
+                 get_control_options(self.bootdir, self.user, self.host, self.sshPort) + \
+                 [tty_option,
                   "-i", self.sshkey_file, "-p", self.sshPort,
                   self.user + "@" + self.host, self.command]
     if DEBUG:
       self.host_log.write("Running ssh command " + ' '.join(sshcommand))
     self.host_log.write("==========================")
     self.host_log.write("\nCommand start time " + datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    sshstat = subprocess.Popen(sshcommand, stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
-    log = sshstat.communicate()
+    if self.input is None:
+      sshstat = subprocess.Popen(sshcommand, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+    else:
+      sshstat = subprocess.Popen(sshcommand, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+    log = sshstat.communicate(self.input)
     errorMsg = log[1]
     if self.errorMessage and sshstat.returncode != 0:
       errorMsg = self.errorMessage + "\n" + errorMsg
@@ -200,9 +236,13 @@ class Bootstrap(threading.Thread):
     threading.Thread.__init__(self)
     self.host = host
     self.shared_state = shared_state
+    self.copied_password_file = False
+    # (action name, seconds) for every executed bootstrap phase
+    self.phase_timings = []
     self.status = {
       "start_time": None,
       "return_code": None,
+      "phase_timings": self.phase_timings,
     }
     log_file = os.path.join(self.shared_state.bootdir, self.host + ".log")
     self.host_log = HostLog(log_file)
@@ -232,6 +272,23 @@ class Bootstrap(threading.Thread):
       self.host_log.write("Traceback: " + traceback.format_exc())
     return last_retcode
 
+  def execute_phase(self, action):
+    """ Executes the action and records how long it took """
+    start_time = time.time()
+    retcode = self.try_to_execute(action)
+    self.phase_timings.append((action.__name__, time.time() - start_time))
+    return retcode
+
+  def getConnectLatency(self):
+    """ Duration of the first bootstrap phase, which includes establishing the connection """
+    if self.phase_timings:
+      return self.phase_timings[0][1]
+    return None
+
+  def writePhaseTimings(self):
+    timings = ", ".join(["{0}={1:.2f}s".format(name, duration) for name, duration in self.phase_timings])
+    self.host_log.write("Bootstrap phase timings: " + timings)
+
   def getAmbariVersion(self):
     ambari_version = self.shared_state.ambari_version
     if ambari_version is None or ambari_version == "null":
@@ -378,18 +435,19 @@ class BootstrapWindows(Bootstrap):
     # Checking execution result   # Execution of action queue
       while action_queue and last_retcode == 0:
         action = action_queue.pop(0)
-        ret = self.try_to_execute(action)
+        ret = self.execute_phase(action)
         last_retcode = ret["exitstatus"]
         err_msg = ret["errormsg"]
         std_out = ret["log"]
     else:
       # If config file is not found, then assume that the hosts have
       # already been provisioned. Attempt to run the setupAgent script alone.
-      ret = self.try_to_execute(self.runSetupAgent)
+      ret = self.execute_phase(self.runSetupAgent)
       last_retcode = ret["exitstatus"]
       err_msg = ret["errormsg"]
       std_out = ret["log"]
       pass
+    self.writePhaseTimings()
     if last_retcode != 0:
       message = "ERROR: Bootstrap of host {0} fails because previous action " \
                 "finished with non-zero exit code ({1})\nERROR MESSAGE: {2}\nSTDOUT: {3}".format(self.host, last_retcode, err_msg, std_out)
@@ -455,57 +513,96 @@ class BootstrapDefault(Bootstrap):
     password_file = self.shared_state.password_file
     return password_file is not None and password_file != 'null'
   
-  def copyAmbariSudo(self):
-    # Copying the os check script file
-    fileToCopy = SERVER_AMBARI_SUDO
-    target = self.TEMP_FOLDER
+  def getControlPath(self):
     params = self.shared_state
-    self.host_log.write("==========================\n")
-    self.host_log.write("Copying ambari sudo script...")
-    scp = SCP(params.user, params.sshPort, params.sshkey_file, self.host, fileToCopy,
-              target, params.bootdir, self.host_log)
-    result = scp.run()
-    self.host_log.write("\n")
-    return result
+    return get_control_path(params.bootdir, params.user, self.host, params.sshPort)
 
-  def copyCreatePythonWrapScript(self):
-    # Copying the script which will create python wrap
-    fileToCopy = CREATE_PYTHON_WRAP_SCRIPT
-    target = self.TEMP_FOLDER
+  def openControlMaster(self):
+    """ Opens the ssh master connection to the host, which all later ssh and scp calls are multiplexed over.
+    Failing to open it is not an error, the calls then open connections of their own """
     params = self.shared_state
     self.host_log.write("==========================\n")
-    self.host_log.write("Copying create-python-wrap script...")
-    scp = SCP(params.user, params.sshPort, params.sshkey_file, self.host, fileToCopy,
-              target, params.bootdir, self.host_log)
-    result = scp.run()
+    self.host_log.write("Opening ssh master connection...")
+    sshcommand = ["ssh",
+                  "-o", "ConnectTimeOut=60",
+                  "-o", "StrictHostKeyChecking=no",
+                  "-o", "BatchMode=yes",
+                  "-o", "ControlMaster=yes",
+                  "-o", "ControlPath=" + self.getControlPath(),
+                  "-o", "ControlPersist=" + str(HOST_BOOTSTRAP_TIMEOUT),
+                  "-N", "-f",
+                  "-i", params.sshkey_file, "-p", params.sshPort,
+                  params.user + "@" + self.host]
+    # the backgrounded master keeps its output descriptors open, so they must not be pipes
+    logFile = open(self.host_log.log_file, "a+")
+    try:
+      retcode = subprocess.call(sshcommand, stdout=logFile, stderr=logFile)
+    finally:
+      logFile.close()
+    if retcode != 0:
+      self.host_log.write("Could not open ssh master connection (exitcode={0}), "
+                          "continuing with separate connections".format(retcode))
     self.host_log.write("\n")
-    return result
+    return {"exitstatus": 0, "log": "", "errormsg": ""}
 
-  def copyOsCheckScript(self):
-    # Copying the os check script file
-    fileToCopy = self.getOsCheckScript()
-    target = self.getOsCheckScriptRemoteLocation()
+  def closeControlMaster(self):
     params = self.shared_state
-    self.host_log.write("==========================\n")
-    self.host_log.write("Copying OS type check script...")
-    scp = SCP(params.user, params.sshPort, params.sshkey_file, self.host, fileToCopy,
-              target, params.bootdir, self.host_log)
-    result = scp.run()
-    self.host_log.write("\n")
-    return result
+    if not os.path.exists(self.getControlPath()):
+      return {"exitstatus": 0, "log": "", "errormsg": ""}
+    sshcommand = ["ssh", "-O", "exit",
+                  "-o", "ControlPath=" + self.getControlPath(),
+                  "-p", params.sshPort, params.user + "@" + self.host]
+    sshstat = subprocess.Popen(sshcommand, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    log = sshstat.communicate()
+    return {"exitstatus": sshstat.returncode, "log": log[0], "errormsg": log[1]}
+
+  def getBootstrapArchiveFiles(self):
+    """ Returns (local path, name relative to the remote temp folder) of all files needed for bootstrap """
+    files = [(SERVER_AMBARI_SUDO, os.path.basename(AMBARI_SUDO)),
+             (self.ambari_commons, os.path.basename(self.ambari_commons)),
+             (CREATE_PYTHON_WRAP_SCRIPT, os.path.basename(REMOTE_CREATE_PYTHON_WRAP_SCRIPT)),
+             (self.getOsCheckScript(), os.path.basename(self.getOsCheckScriptRemoteLocation())),
+             (self.shared_state.setup_agent_file, os.path.basename(self.getRemoteName(self.SETUP_SCRIPT_FILENAME)))]
+    if os.path.exists(self.getRepoFile()):
+      files.append((self.getRepoFile(), os.path.basename(self.getRemoteName(self.AMBARI_REPO_FILENAME))))
+    if self.hasPassword():
+      files.append((self.shared_state.password_file, os.path.basename(self.getPasswordFile())))
+    return files
+
+  def createBootstrapArchive(self):
+    """ Packs all files needed for bootstrap into a single tar stream """
+    buf = StringIO()
+    tar = tarfile.open(fileobj=buf, mode="w:gz")
+    try:
+      for local_path, remote_name in self.getBootstrapArchiveFiles():
+        if self.hasPassword() and local_path == self.shared_state.password_file:
+          tarinfo = tar.gettarinfo(local_path, remote_name)
+          tarinfo.mode = 0600
+          passwordFile = open(local_path, "rb")
+          try:
+            tar.addfile(tarinfo, passwordFile)
+          finally:
+            passwordFile.close()
+        else:
+          # compiled files are not needed, they are not readable for non-root users either
+          tar.add(local_path, remote_name, exclude=lambda name: name.endswith(".pyc"))
+    finally:
+      tar.close()
+    return buf.getvalue()
 
-  def copyCommonFunctions(self):
-    # Copying the os check script file
-    fileToCopy = self.ambari_commons
-    target = self.getCommonFunctionsRemoteLocation()
+  def copyBootstrapArchive(self):
+    """ Sends all files needed for bootstrap in a single archive stream """
     params = self.shared_state
     self.host_log.write("==========================\n")
-    self.host_log.write("Copying common functions script...")
-    scp = SCP(params.user, params.sshPort, params.sshkey_file, self.host, fileToCopy,
-              target, params.bootdir, self.host_log)
-    result = scp.run()
+    self.host_log.write("Copying bootstrap files...")
+    command = "tar --no-same-owner -xzf - -C {0}".format(self.TEMP_FOLDER)
+    if self.hasPassword():
+      command += " && chmod 600 " + self.getPasswordFile()
+      self.copied_password_file = True
+    ssh = SSH(params.user, params.sshPort, params.sshkey_file, self.host, command,
+              params.bootdir, self.host_log, input=self.createBootstrapArchive())
+    result = ssh.run()
     self.host_log.write("\n")
-    result["exitstatus"] = 0 # ignore not copied *.pyc files with permission denied. 
     return result
 
   def getMoveRepoFileWithPasswordCommand(self, targetDir):
@@ -530,70 +627,27 @@ class BootstrapDefault(Bootstrap):
   def getRepoFileChmodCommand(self):
     return "{0} chmod 644 {1}".format(AMBARI_SUDO, self.getRepoFile())
 
-  def copyNeededFiles(self):
-    # get the params
-    params = self.shared_state
+  def getInstallRepoFileCommand(self):
+    commands = [self.getMoveRepoFileCommand(self.getRepoDir()), self.getRepoFileChmodCommand()]
+    # Update repo cache for ubuntu OS
+    if OSCheck.is_ubuntu_family():
+      commands.append(self.getAptUpdateCommand())
+    return " && ".join(commands)
 
-    # Copying the files
-    fileToCopy = self.getRepoFile()
-    target = self.getRemoteName(self.AMBARI_REPO_FILENAME)
-
-    if (os.path.exists(fileToCopy)):
-      self.host_log.write("==========================\n")
-      self.host_log.write("Copying repo file to 'tmp' folder...")
-      scp = SCP(params.user, params.sshPort, params.sshkey_file, self.host, fileToCopy,
-                target, params.bootdir, self.host_log)
-      retcode1 = scp.run()
-      self.host_log.write("\n")
-
-      # Move file to repo dir
-      self.host_log.write("==========================\n")
-      self.host_log.write("Moving file to repo dir...")
-      targetDir = self.getRepoDir()
-      command = self.getMoveRepoFileCommand(targetDir)
-      ssh = SSH(params.user, params.sshPort, params.sshkey_file, self.host, command,
-                params.bootdir, self.host_log)
-      retcode2 = ssh.run()
-      self.host_log.write("\n")
-
-      # Change permissions on ambari.repo
-      self.host_log.write("==========================\n")
-      self.host_log.write("Changing permissions for ambari.repo...")
-      command = self.getRepoFileChmodCommand()
-      ssh = SSH(params.user, params.sshPort, params.sshkey_file, self.host, command,
-                params.bootdir, self.host_log)
-      retcode4 = ssh.run()
-      self.host_log.write("\n")
-
-      # Update repo cache for ubuntu OS
-      if OSCheck.is_ubuntu_family():
-        self.host_log.write("==========================\n")
-        self.host_log.write("Update apt cache of repository...")
-        command = self.getAptUpdateCommand()
-        ssh = SSH(params.user, params.sshPort, params.sshkey_file, self.host, command,
-                  params.bootdir, self.host_log)
-        retcode2 = ssh.run()
-        self.host_log.write("\n")
-
-      retcode = max(retcode1["exitstatus"], retcode2["exitstatus"], retcode4["exitstatus"])
-    else:
-      self.host_log.write("==========================\n")
-      self.host_log.write("Copying required files...")
+  def installRepoFile(self):
+    """ Moves the repo file copied with the bootstrap archive to the repo dir """
+    params = self.shared_state
+    self.host_log.write("==========================\n")
+    if not os.path.exists(self.getRepoFile()):
       self.host_log.write("Ambari repo file not found: {0}".format(self.getRepoFile()))
-      retcode = -1
-      pass
+      return {"exitstatus": 0, "log": "", "errormsg": ""}
 
-    # copy the setup script file
-    self.host_log.write("==========================\n")
-    self.host_log.write("Copying setup script file...")
-    fileToCopy = params.setup_agent_file
-    target = self.getRemoteName(self.SETUP_SCRIPT_FILENAME)
-    scp = SCP(params.user, params.sshPort, params.sshkey_file, self.host, fileToCopy,
-              target, params.bootdir, self.host_log)
-    retcode3 = scp.run()
+    self.host_log.write("Moving repo file to repo dir...")
+    ssh = SSH(params.user, params.sshPort, params.sshkey_file, self.host, self.getInstallRepoFileCommand(),
+              params.bootdir, self.host_log)
+    retcode = ssh.run()
     self.host_log.write("\n")
-
-    return max(retcode, retcode3["exitstatus"])
+    return retcode
 
   def getAmbariPort(self):
     server_port = self.shared_state.server_port
@@ -671,37 +725,6 @@ class BootstrapDefault(Bootstrap):
     self.host_log.write("\n")
     return retcode
 
-  def copyPasswordFile(self):
-    # Copy the password file
-    self.host_log.write("Copying password file to 'tmp' folder...")
-    params = self.shared_state
-    scp = SCP(params.user, params.sshPort, params.sshkey_file, self.host, params.password_file,
-              self.getPasswordFile(), params.bootdir, self.host_log)
-    retcode1 = scp.run()
-
-    self.copied_password_file = True
-
-    # Change password file mode to 600
-    self.host_log.write("Changing password file mode...")
-    command = "chmod 600 " + self.getPasswordFile()
-    ssh = SSH(params.user, params.sshPort, params.sshkey_file, self.host, command,
-              params.bootdir, self.host_log)
-    retcode2 = ssh.run()
-
-    self.host_log.write("Copying password file finished")
-    return max(retcode1["exitstatus"], retcode2["exitstatus"])
-
-  def changePasswordFileModeOnHost(self):
-    # Change password file mode to 600
-    self.host_log.write("Changing password file mode...")
-    params = self.shared_state
-    command = "chmod 600 " + self.getPasswordFile()
-    ssh = SSH(params.user, params.sshPort, params.sshkey_file, self.host, command,
-              params.bootdir, self.host_log)
-    retcode = ssh.run()
-    self.host_log.write("Change password file mode on host finished")
-    return retcode
-
   def deletePasswordFile(self):
     # Deleting the password file
     self.host_log.write("Deleting password file...")
@@ -750,31 +773,25 @@ class BootstrapDefault(Bootstrap):
     """ Copy files and run commands on remote host """
     self.status["start_time"] = time.time()
     # Population of action queue
-    action_queue = [self.createTargetDir,
-                    self.copyAmbariSudo,
-                    self.copyCommonFunctions,
-                    self.copyCreatePythonWrapScript,
-                    self.copyOsCheckScript,
+    action_queue = [self.openControlMaster,
+                    self.createTargetDir,
+                    self.copyBootstrapArchive,
                     self.runCreatePythonWrapScript,
                     self.runOsCheckScript,
-                    self.checkSudoPackage
+                    self.checkSudoPackage,
+                    self.installRepoFile,
+                    self.runSetupAgent,
     ]
-    if self.hasPassword():
-      action_queue.extend([self.copyPasswordFile,
-                           self.changePasswordFileModeOnHost])
-    action_queue.extend([
-      self.copyNeededFiles,
-      self.runSetupAgent,
-    ])
 
     # Execution of action queue
     last_retcode = 0
     while action_queue and last_retcode == 0:
       action = action_queue.pop(0)
-      ret = self.try_to_execute(action)
+      ret = self.execute_phase(action)
       last_retcode = ret["exitstatus"]
       err_msg = ret["errormsg"]
       std_out = ret["log"]
+    self.writePhaseTimings()
     # Checking execution result
     if last_retcode != 0:
       message = "ERROR: Bootstrap of host {0} fails because previous action " \
@@ -789,17 +806,48 @@ class BootstrapDefault(Bootstrap):
           "at {0}. Please delete it manually".format(self.getPasswordFile())
         self.host_log.write(message)
         logging.warn(message)
+    self.try_to_execute(self.closeControlMaster)
 
     self.createDoneFile(last_retcode)
     self.status["return_code"] = last_retcode
 
 
 
+class AdaptiveParallelism:
+  """ Adapts the number of parallel bootstraps to the observed connect latency.
+  Grows by one bootstrap for every host that connected about as fast as the fastest one,
+  and halves when connecting gets much slower, e.g. when the server or network is saturated """
+  def __init__(self, initial=MAX_PARALLEL_BOOTSTRAPS, minimum=MIN_PARALLEL_BOOTSTRAPS,
+               maximum=MAX_PARALLEL_BOOTSTRAPS_LIMIT):
+    self.limit = initial
+    self.minimum = minimum
+    self.maximum = maximum
+    self.fastest_latency = None
+    # do not halve again before bootstraps started with the previous limit have reported
+    self.cooldown = 0
+
+  def report(self, latency):
+    if latency is None:
+      return
+    if self.fastest_latency is None or latency < self.fastest_latency:
+      self.fastest_latency = latency
+
+    if self.cooldown > 0:
+      self.cooldown -= 1
+    if latency > self.fastest_latency * LATENCY_BACKOFF_FACTOR + LATENCY_SLACK_SEC:
+      if self.cooldown == 0:
+        self.limit = max(self.minimum, self.limit / 2)
+        self.cooldown = self.limit
+    else:
+      self.limit = min(self.maximum, self.limit + 1)
+
+
 class PBootstrap:
   """ BootStrapping the agents on a list of hosts"""
   def __init__(self, hosts, sharedState):
     self.hostlist = hosts
     self.sharedState = sharedState
+    self.parallelism = AdaptiveParallelism()
     pass
 
   def run_bootstrap(self, host):
@@ -808,7 +856,7 @@ class PBootstrap:
     return bootstrap
 
   def run(self):
-    """ Run up to MAX_PARALLEL_BOOTSTRAPS at a time in parallel """
+    """ Run bootstraps in parallel, MAX_PARALLEL_BOOTSTRAPS at a time initially """
     logging.info("Executing parallel bootstrap")
     queue = list(self.hostlist)
     queue.reverse()
@@ -819,6 +867,7 @@ class PBootstrap:
       for bootstrap in running_list:
         if bootstrap.getStatus()["return_code"] is not None:
           finished_list.append(bootstrap)
+          self.parallelism.report(bootstrap.getConnectLatency())
         else:
           starttime = bootstrap.getStatus()["start_time"]
           elapsedtime = time.time() - starttime
@@ -831,7 +880,7 @@ class PBootstrap:
       # Remove finished from the running list
       running_list[:] = [b for b in running_list if not b in finished_list]
       # Start new bootstraps from the queue
-      free_slots = MAX_PARALLEL_BOOTSTRAPS - len(running_list)
+      free_slots = self.parallelism.limit - len(running_list)
       for i in range(free_slots):
         if queue:
           next_host = queue.pop()
@@ -112,7 +112,12 @@ import os.path
 import logging
 import time
 import base64
-from urllib2 import HTTPPasswordMgrWithDefaultRealm, HTTPBasicAuthHandler, Request, build_opener, URLError, HTTPError
+import httplib
+import socket
+import urllib
+import urlparse
+from StringIO import StringIO
+from urllib2 import HTTPPasswordMgrWithDefaultRealm, HTTPBasicAuthHandler, URLError, HTTPError
 
 try:
   # try to import new simplejson version, which should be faster than outdated python 2.6 version
@@ -230,12 +235,15 @@ class Options(Const):
   """:type : StackAdvisor"""
   ambari_server = None
   """:type : AmbariServer"""
+  api_client = None
+  """:type : ApiClient"""
 
   # Api constants
   ROOT_URL = None
   CLUSTER_URL = None
   COMPONENTS_FORMAT = None
   TEZ_VIEW_URL = None
+  CONFIGS_BATCH_SIZE = 20  # config type/tag pairs requested at once from servers without "properties" filter
 
   # Curl options
   CURL_PRINT_ONLY = None
@@ -285,6 +293,15 @@ class Options(Const):
       return True
     return False
 
+  @classmethod
+  def isBatchConfigUpdateSupported(cls):
+    """
+    Several desired configs could be set by a single request
+    """
+    if cls.ambari_server.server_version[0] * 10 + cls.ambari_server.server_version[1] >= 20:
+      return True
+    return False
+
   @classmethod
   def initialize_logger(cls, filename=None):
     cls.logger = logging.getLogger('UpgradeHelper')
@@ -354,7 +371,7 @@ class AmbariServer(object):
     self._get_components()
 
   def _get_components(self):
-    info = curl(Options.COMPONENTS_URL, parse=True)
+    info = curl(Options.COMPONENTS_URL, parse=True, cache=True)
     self._components = []
     if CatConst.ITEMS_TAG in info:
       for item in info[CatConst.ITEMS_TAG]:
@@ -363,7 +380,7 @@ class AmbariServer(object):
           self._components.append(item["ServiceComponentInfo"]["component_name"])
 
   def _get_server_info(self):
-    info = curl(Options.AMBARI_SERVER_URL, parse=True)
+    info = curl(Options.AMBARI_SERVER_URL, parse=True, cache=True)
     self._server_version = [0, 0, 0]
 
     if "RootServiceComponents" in info:
@@ -375,7 +392,7 @@ class AmbariServer(object):
         pass
 
   def _get_agents_info(self):
-    info = curl(Options.AMBARI_AGENTS_URL, parse=True)
+    info = curl(Options.AMBARI_AGENTS_URL, parse=True, cache=True)
     self._agents = []
     if "hostComponents" in info:
       agent_props = info["hostComponents"]
@@ -397,24 +414,15 @@ class StackAdvisorFactory(object):
   def __init__(self):
     self._stack_info = self._load_stack_info()
 
-  def _load_stack_versions(self, stack):
-    versions = curl(Options.STACKS_VERSIONS_URL.format(stack), parse=True)
-    if CatConst.ITEMS_TAG in versions:
-      versions = list(map(lambda x: x["Versions"]["stack_version"], versions[CatConst.ITEMS_TAG]))
-
-    return versions
-
   def _load_stack_info(self):
-    stacks = curl(Options.STACKS_URL, parse=True)
-    if CatConst.ITEMS_TAG in stacks:
-      stacks = list(map(lambda x: x["Stacks"]["stack_name"], stacks["items"]))
-    else:
-      stacks = {}
-
+    # stacks along with their versions in a single request
+    stacks = curl(Options.STACKS_URL + "?fields=versions/Versions/stack_version", parse=True, cache=True)
     stacks_dict = {}
 
-    for stack in stacks:
-      stacks_dict[stack] = self._load_stack_versions(stack)
+    if CatConst.ITEMS_TAG in stacks:
+      for item in stacks[CatConst.ITEMS_TAG]:
+        versions = item["versions"] if "versions" in item else []
+        stacks_dict[item["Stacks"]["stack_name"]] = list(map(lambda x: x["Versions"]["stack_version"], versions))
 
     return stacks_dict
 
@@ -1051,7 +1059,21 @@ class ServerConfigFactory(object):
           new_cfg_group[new_property_name] = default_value
 
   def commit(self):
-    self.notify_observers(CatConst.ACTION_COMMIT)
+    if not Options.isBatchConfigUpdateSupported():
+      self.notify_observers(CatConst.ACTION_COMMIT)
+      return
+
+    # all the changed config groups are committed by a single request
+    changed_configs = []
+    for name in sorted(self._server_catalogs.keys()):
+      config_item = self._server_catalogs[name]
+      if config_item.is_changed():
+        Options.logger.info("Committing changes for \"%s\" configuration group ..." % name)
+        changed_configs.append((config_item.properties, name,
+                                config_item.attributes if config_item.is_attributes_exists() else None))
+
+    if changed_configs:
+      update_configs(changed_configs)
 
 
 class ServerConfig(object):
@@ -1118,8 +1140,11 @@ class ServerConfig(object):
   def attributes(self, value):
     self._configs[CatConst.STACK_PROPERTIES_ATTRIBUTES] = value
 
+  def is_changed(self):
+    return self._hash != self._calculate_hash()
+
   def _commit(self):
-    if self._hash != self._calculate_hash():
+    if self.is_changed():
       Options.logger.info("Committing changes for \"%s\" configuration group ..." % self._name)
       if self.is_attributes_exists():
         update_config(self.properties, self._name, self.attributes)
@@ -1232,7 +1257,7 @@ def delete_mr():
 def get_cluster_stackname():
   VERSION_URL_FORMAT = Options.CLUSTER_URL + '?fields=Clusters/version'
 
-  structured_resp = curl(VERSION_URL_FORMAT, validate=True, parse=True)
+  structured_resp = curl(VERSION_URL_FORMAT, validate=True, parse=True, cache=True)
 
   if 'Clusters' in structured_resp:
     if 'version' in structured_resp['Clusters']:
@@ -1247,16 +1272,16 @@ def has_component_in_stack_def(stack_name, service_name, component_name):
 
   try:
     curl(STACK_COMPONENT_URL_FORMAT.format(stack, stack_version, service_name, component_name),
-         validate=True)
+         validate=True, cache=True)
     return True
   except FatalException:
     return False
 
 
 def add_services():
-  SERVICE_URL_FORMAT = Options.CLUSTER_URL + '/services/{0}'
-  COMPONENT_URL_FORMAT = SERVICE_URL_FORMAT + '/components/{1}'
-  HOST_COMPONENT_URL_FORMAT = Options.CLUSTER_URL + '/hosts/{0}/host_components/{1}'
+  SERVICES_URL = Options.CLUSTER_URL + '/services'
+  COMPONENTS_URL_FORMAT = SERVICES_URL + '?ServiceInfo/service_name={0}'
+  HOSTS_URL = Options.CLUSTER_URL + '/hosts'
   service_comp = {
     "YARN": ["NODEMANAGER", "RESOURCEMANAGER", "YARN_CLIENT"],
     "MAPREDUCE2": ["HISTORYSERVER", "MAPREDUCE2_CLIENT"]}
@@ -1277,39 +1302,69 @@ def add_services():
 
   hostmapping = read_mapping()
 
+  # use the bulk create requests: one for the services, one per service for its components
+  # and one per component for all of its hosts
+  curl(SERVICES_URL, validate=True, request_type="POST",
+       data=[{"ServiceInfo": {"service_name": service}} for service in service_comp.keys()])
+
   for service in service_comp.keys():
-    curl(SERVICE_URL_FORMAT.format(service), validate=True, request_type="POST")
+    curl(COMPONENTS_URL_FORMAT.format(service), validate=True, request_type="POST",
+         data={"components": [{"ServiceComponentInfo": {"component_name": component}}
+                              for component in service_comp[service]]})
 
     for component in service_comp[service]:
-      curl(COMPONENT_URL_FORMAT.format(service, component),
-           validate=True, request_type="POST")
+      hosts = hostmapping[new_old_host_map[component]]
+      if hosts:
+        curl(HOSTS_URL, validate=True, request_type="POST",
+             data={"RequestInfo": {"query": "Hosts/host_name.in({0})".format(",".join(hosts))},
+                   "Body": {"host_components": [{"HostRoles": {"component_name": component}}]}})
 
-      for host in hostmapping[new_old_host_map[component]]:
-        curl(HOST_COMPONENT_URL_FORMAT.format(host, component),
-             validate=True, request_type="POST")
+
+def _desired_config(properties, config_type, attributes, tag):
+  desired_config = {"type": config_type, "tag": tag, "properties": properties}
+  if attributes is not None:
+    desired_config["properties_attributes"] = attributes
+  return desired_config
 
 
 def update_config(properties, config_type, attributes=None):
   tag = "version" + str(int(time.time() * 1000))
-  properties_payload = {"Clusters": {"desired_config": {"type": config_type, "tag": tag, "properties": properties}}}
-  if attributes is not None:
-    properties_payload["Clusters"]["desired_config"]["properties_attributes"] = attributes
+  properties_payload = {"Clusters": {"desired_config": _desired_config(properties, config_type, attributes, tag)}}
 
   expect_body = config_type != "cluster-env"  # ToDo: make exceptions more flexible
 
   curl(Options.CLUSTER_URL, request_type="PUT", data=properties_payload, validate=True, soft_validation=True)
 
 
+def update_configs(configs):
+  """
+  Set several desired configs by a single request
+  :param configs: list of (properties, config_type, attributes)
+  """
+  tag = "version" + str(int(time.time() * 1000))
+  properties_payload = {"Clusters": {"desired_config": [_desired_config(properties, config_type, attributes, tag)
+                                                        for properties, config_type, attributes in configs]}}
+
+  curl(Options.CLUSTER_URL, request_type="PUT", data=properties_payload, validate=True, soft_validation=True)
+
+
 def build_all_options(desired_configs):
   """
   Get all configs in the old-fashion way ( versions below 1.7.0 doesn't support "properties" filter )
   """
-  config_url_tpl = Options.CLUSTER_URL + "/configurations?type={0}&tag={1}"
+  config_url_tpl = Options.CLUSTER_URL + "/configurations?{0}"
   all_options = {CatConst.ITEMS_TAG: []}
-  for config in desired_configs:
-    cfg_item = curl(config_url_tpl.format(config, desired_configs[config]["tag"]), parse=True, validate=True)
-    if CatConst.ITEMS_TAG in cfg_item and len(cfg_item[CatConst.ITEMS_TAG]) == 1:
-      all_options[CatConst.ITEMS_TAG].append(cfg_item[CatConst.ITEMS_TAG][0])
+  configs = sorted(desired_configs.keys())
+  # ask for several type/tag pairs per request, keeping the url length reasonable
+  for i in range(0, len(configs), Options.CONFIGS_BATCH_SIZE):
+    predicate = "|".join(["(type={0}&tag={1})".format(urllib.quote(config), urllib.quote(desired_configs[config]["tag"]))
+                          for config in configs[i:i + Options.CONFIGS_BATCH_SIZE]])
+    cfg_items = curl(config_url_tpl.format(predicate), parse=True, validate=True)
+    if CatConst.ITEMS_TAG in cfg_items:
+      for cfg_item in cfg_items[CatConst.ITEMS_TAG]:
+        if cfg_item[CatConst.TYPE_TAG] in desired_configs and \
+          cfg_item["tag"] == desired_configs[cfg_item[CatConst.TYPE_TAG]]["tag"]:
+          all_options[CatConst.ITEMS_TAG].append(cfg_item)
 
   return all_options
 
@@ -1378,7 +1433,7 @@ def is_services_exists(required_services):
 
 def get_cluster_services():
   services_url = Options.CLUSTER_URL + '/services'
-  raw_services = curl(services_url, parse=True)
+  raw_services = curl(services_url, parse=True, cache=True)
 
   # expected structure:
   # items: [ {"href":"...", "ServiceInfo":{"cluster_name":"..", "service_name":".."}}, ..., ... ]
@@ -1389,8 +1444,12 @@ def get_cluster_services():
   return []
 
 
+def get_component_info(component):
+  return curl(Options.COMPONENTS_FORMAT.format(component), validate=False, parse=True, cache=True)
+
+
 def get_zookeeper_quorum():
-  zoo_cfg = curl(Options.COMPONENTS_FORMAT.format(Options.ZOOKEEPER_SERVER), validate=False, parse=True)
+  zoo_cfg = get_component_info(Options.ZOOKEEPER_SERVER)
   zoo_quorum = []
   zoo_def_port = "2181"
   if Options.server_config_factory is not None and Options.ZK_OPTIONS in Options.server_config_factory.items():
@@ -1407,7 +1466,7 @@ def get_zookeeper_quorum():
 
 def get_tez_history_url_base():
   try:
-    tez_view = curl(Options.TEZ_VIEW_URL, validate=False, parse=True)
+    tez_view = curl(Options.TEZ_VIEW_URL, validate=False, parse=True, cache=True)
   except HTTPError as e:
     raise TemplateProcessingException(str(e))
 
@@ -1436,7 +1495,7 @@ def get_kafka_listeners():
 
 def get_ranger_xaaudit_hdfs_destination_directory():
   namenode_hostname="localhost"
-  namenode_cfg = curl(Options.COMPONENTS_FORMAT.format(Options.NAMENODE), validate=False, parse=True)
+  namenode_cfg = get_component_info(Options.NAMENODE)
   if "host_components" in namenode_cfg:
     namenode_hostname = namenode_cfg["host_components"][0]["HostRoles"]["host_name"]
 
@@ -1560,7 +1619,7 @@ def get_jh_host(catalog):
   return ""
 
 def get_ranger_host():
-  ranger_config = curl(Options.COMPONENTS_FORMAT.format('RANGER_ADMIN'), validate=False, parse=True)
+  ranger_config = get_component_info('RANGER_ADMIN')
   ranger_host_list = []
   if "host_components" in ranger_config:
     for item in ranger_config["host_components"]:
@@ -1961,13 +2020,89 @@ def generate_auth_header(user, password):
   return {"Authorization": "Basic %s" % token.replace('\n', '')}
 
 
+class ApiClient(object):
+  """
+  Sends the requests of the whole run over one keep-alive connection per server and memoizes
+  the responses of read-only lookups until the next write request.
+  """
+  def __init__(self):
+    self._connections = {}
+    self._cache = {}
+    self.round_trips = 0
+
+  def _get_connection(self, scheme, netloc):
+    key = (scheme, netloc)
+    if key not in self._connections:
+      if scheme == "https":
+        self._connections[key] = httplib.HTTPSConnection(netloc)
+      else:
+        self._connections[key] = httplib.HTTPConnection(netloc)
+    return self._connections[key]
+
+  def _drop_connection(self, scheme, netloc):
+    connection = self._connections.pop((scheme, netloc), None)
+    if connection is not None:
+      connection.close()
+
+  def close(self):
+    for scheme, netloc in self._connections.keys():
+      self._drop_connection(scheme, netloc)
+
+  def get_cached(self, url):
+    return self._cache.get(url)
+
+  def cache(self, url, out):
+    self._cache[url] = out
+
+  def clear_cache(self):
+    self._cache = {}
+
+  def request(self, url, request_type, headers, data=None):
+    """
+    :return: (code, response body)
+    :raise HTTPError: on non 2xx response codes, as urllib2 does
+    :raise URLError: if the server couldn't be reached
+    """
+    parsed_url = urlparse.urlsplit(url)
+    path = urlparse.urlunsplit(("", "", parsed_url.path or "/", parsed_url.query, ""))
+
+    # a kept alive connection could have been closed by the server meanwhile, retry once over a new one
+    for attempt in range(2):
+      reused = (parsed_url.scheme, parsed_url.netloc) in self._connections
+      connection = self._get_connection(parsed_url.scheme, parsed_url.netloc)
+      try:
+        self.round_trips += 1
+        connection.request(request_type, path, data, headers)
+        resp = connection.getresponse()
+        out = resp.read()
+        break
+      except (httplib.HTTPException, socket.error) as e:
+        self._drop_connection(parsed_url.scheme, parsed_url.netloc)
+        if not reused or attempt > 0:
+          raise URLError(e)
+
+    if resp.will_close:
+      self._drop_connection(parsed_url.scheme, parsed_url.netloc)
+
+    if resp.status < 200 or resp.status > 299:
+      raise HTTPError(url, resp.status, resp.reason, resp.msg, StringIO(out))
+
+    return resp.status, out
+
+
+def get_api_client():
+  if Options.api_client is None:
+    Options.api_client = ApiClient()
+  return Options.api_client
+
+
 def curl(url, tokens=None, headers=None, request_type="GET", data=None, parse=False,
-         validate=False, soft_validation=False):
+         validate=False, soft_validation=False, cache=False):
   """
+  :param cache: memoize the response of a read-only lookup, until any write request is sent
   :rtype type
   """
   _headers = {}
-  handler_chain = []
   post_req = ["POST", "PUT"]
   get_req = ["GET", "DELETE"]
 
@@ -1977,7 +2112,7 @@ def curl(url, tokens=None, headers=None, request_type="GET", data=None, parse=Fa
   if request_type not in post_req + get_req:
     raise IOError("Wrong request type \"%s\" passed" % request_type)
 
-  if data is not None and isinstance(data, dict):
+  if data is not None and isinstance(data, (dict, list)):
     data = json.dumps(data)
 
   if tokens is not None:
@@ -1994,14 +2129,9 @@ def curl(url, tokens=None, headers=None, request_type="GET", data=None, parse=Fa
   if Options.HEADERS is not None:
     _headers.update(Options.HEADERS)
 
-  director = build_opener(*handler_chain)
-  if request_type in post_req:
-    _data = bytes(data)
-    req = Request(url, headers=_headers, data=_data)
-  else:
-    req = Request(url, headers=_headers)
-
-  req.get_method = lambda: request_type
+  api_client = get_api_client()
+  if request_type != "GET":
+    api_client.clear_cache()
 
   if print_url:
     if write_only_print:
@@ -2015,13 +2145,16 @@ def curl(url, tokens=None, headers=None, request_type="GET", data=None, parse=Fa
         Options.logger.info("POST Data: \n" + str(data))
 
   code = 200
-  if not (print_url and request_type in post_req):
+  if cache and request_type == "GET" and api_client.get_cached(url) is not None:
+    out = api_client.get_cached(url)
+  elif not (print_url and request_type in post_req):
     try:
-      resp = director.open(req)
-      out = resp.read()
+      code, out = api_client.request(url, request_type, _headers,
+                                     bytes(data) if request_type in post_req and data is not None else None)
       if isinstance(out, bytes):
         out = out.decode("utf-8")
-      code = resp.code
+      if cache and request_type == "GET":
+        api_client.cache(url, out)
     except URLError as e:
       Options.logger.error(str(e))
       if isinstance(e, HTTPError):
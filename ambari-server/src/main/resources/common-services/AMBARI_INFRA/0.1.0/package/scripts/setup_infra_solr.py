@@ -100,33 +100,34 @@ def setup_infra_solr(name = None):
            group=params.user_group,
            mode=0640)
 
-    solr_cloud_util.set_cluster_prop(
-      zookeeper_quorum=params.zookeeper_quorum,
-      solr_znode=params.infra_solr_znode,
-      java64_home=params.java64_home,
-      prop_name="urlScheme",
-      prop_value=url_scheme,
-      jaas_file=jaas_file
-    )
-
-    solr_cloud_util.setup_kerberos_plugin(
-      zookeeper_quorum=params.zookeeper_quorum,
-      solr_znode=params.infra_solr_znode,
-      jaas_file=jaas_file,
-      java64_home=params.java64_home,
-      secure=params.security_enabled,
-      security_json_location=security_json_file_location
-    )
+    with solr_cloud_util.SolrCliBatch(params.tmp_dir):
+      solr_cloud_util.set_cluster_prop(
+        zookeeper_quorum=params.zookeeper_quorum,
+        solr_znode=params.infra_solr_znode,
+        java64_home=params.java64_home,
+        prop_name="urlScheme",
+        prop_value=url_scheme,
+        jaas_file=jaas_file
+      )
 
-    if params.security_enabled:
-      solr_cloud_util.secure_solr_znode(
+      solr_cloud_util.setup_kerberos_plugin(
         zookeeper_quorum=params.zookeeper_quorum,
         solr_znode=params.infra_solr_znode,
         jaas_file=jaas_file,
         java64_home=params.java64_home,
-        sasl_users_str=params.infra_solr_sasl_user
+        secure=params.security_enabled,
+        security_json_location=security_json_file_location
       )
 
+      if params.security_enabled:
+        solr_cloud_util.secure_solr_znode(
+          zookeeper_quorum=params.zookeeper_quorum,
+          solr_znode=params.infra_solr_znode,
+          jaas_file=jaas_file,
+          java64_home=params.java64_home,
+          sasl_users_str=params.infra_solr_sasl_user
+        )
+
 
   elif name == 'client':
     solr_cloud_util.setup_solr_client(params.config)
@@ -20,7 +20,7 @@ limitations under the License.
 import httplib
 
 from ambari_commons.parallel_processing import PrallelProcessResult, execute_in_parallel, SUCCESS
-from service_check import post_metrics_to_collector
+from service_check import post_metrics_to_collector, in_current_environment
 from resource_management.core.logger import Logger
 from resource_management.core.base import Fail
 from resource_management import Template
@@ -276,7 +276,7 @@ def create_ams_datasource():
   Create AMS datasource in Grafana, if exsists make sure the collector url is accurate
   """
   Logger.info("Trying to find working metric collector")
-  results = execute_in_parallel(do_ams_collector_post, params.ams_collector_hosts.split(','), params)
+  results = execute_in_parallel(in_current_environment(do_ams_collector_post), params.ams_collector_hosts.split(','), params)
   new_datasource_host = ""
 
   for host in params.ams_collector_hosts.split(','):
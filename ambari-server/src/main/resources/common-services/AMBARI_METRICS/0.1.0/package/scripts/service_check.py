@@ -20,6 +20,7 @@ limitations under the License.
 
 from resource_management.core.logger import Logger
 from resource_management.core.base import Fail
+from resource_management.core.environment import Environment
 from resource_management import Script
 from resource_management import Template
 
@@ -144,7 +145,8 @@ class AMSServiceCheck(Script):
     Logger.info("Ambari Metrics service check was started.")
     env.set_params(params)
 
-    results = execute_in_parallel(self.service_check_for_single_host, params.ams_collector_hosts.split(','), params)
+    results = execute_in_parallel(in_current_environment(self.service_check_for_single_host),
+                                  params.ams_collector_hosts.split(','), params)
 
     for host in str(params.ams_collector_hosts).split(","):
       if host in results:
@@ -155,6 +157,18 @@ class AMSServiceCheck(Script):
           Logger.warning(results[host].result)
     raise Fail("All metrics collectors are unavailable.")
 
+def in_current_environment(function):
+  """
+  execute_in_parallel runs the function on pool threads, which have no Environment
+  for rendering templates. Let them use the one of the calling thread.
+  """
+  env = Environment.get_instance()
+
+  def run_in_environment(element, params):
+    with env:
+      return function(element, params)
+  return run_in_environment
+
 def post_metrics_to_collector(ams_metrics_post_url, metric_collector_host, metric_collector_port, metric_collector_https_enabled,
                               metric_json, headers, ca_certs, tries = 1, connect_timeout = 10):
   for i in xrange(0, tries):
@@ -139,15 +139,16 @@ def metadata(type='server'):
                                        roles = [params.infra_solr_role_atlas, params.infra_solr_role_ranger_audit, params.infra_solr_role_dev],
                                        new_service_principals = [params.atlas_jaas_principal])
 
-      create_collection('vertex_index', 'atlas_configs', jaasFile)
-      create_collection('edge_index', 'atlas_configs', jaasFile)
-      create_collection('fulltext_index', 'atlas_configs', jaasFile)
-
-      if params.security_enabled:
-        secure_znode(format('{infra_solr_znode}/configs/atlas_configs'), jaasFile)
-        secure_znode(format('{infra_solr_znode}/collections/vertex_index'), jaasFile)
-        secure_znode(format('{infra_solr_znode}/collections/edge_index'), jaasFile)
-        secure_znode(format('{infra_solr_znode}/collections/fulltext_index'), jaasFile)
+      with solr_cloud_util.SolrCliBatch(params.tmp_dir):
+        create_collection('vertex_index', 'atlas_configs', jaasFile)
+        create_collection('edge_index', 'atlas_configs', jaasFile)
+        create_collection('fulltext_index', 'atlas_configs', jaasFile)
+
+        if params.security_enabled:
+          secure_znode(format('{infra_solr_znode}/configs/atlas_configs'), jaasFile)
+          secure_znode(format('{infra_solr_znode}/collections/vertex_index'), jaasFile)
+          secure_znode(format('{infra_solr_znode}/collections/edge_index'), jaasFile)
+          secure_znode(format('{infra_solr_znode}/collections/fulltext_index'), jaasFile)
 
     File(params.atlas_hbase_setup,
          group=params.user_group,
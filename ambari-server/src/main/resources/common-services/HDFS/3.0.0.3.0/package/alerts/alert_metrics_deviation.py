@@ -28,7 +28,7 @@ import os
 import ambari_commons.network as network
 
 from resource_management import Environment
-from ambari_commons.aggregate_functions import sample_standard_deviation, mean
+from ambari_commons.aggregate_functions import RunningStatistics
 
 from resource_management.libraries.functions.curl_krb_request import curl_krb_request
 from resource_management.libraries.functions.curl_krb_request import DEFAULT_KERBEROS_KINIT_TIMER_MS
@@ -332,17 +332,6 @@ def execute(configurations={}, parameters={}, host_name=None):
     return (RESULT_STATE_UNKNOWN, ["Unable to retrieve metrics from the Ambari Metrics service."])
 
   data_json = json.loads(data)
-  metrics = []
-  # will get large standard deviation for multiple hosts,
-  # if host1 reports small local values, but host2 reports large local values
-  for metrics_data in data_json["metrics"]:
-    metrics += metrics_data["metrics"].values()
-  pass
-
-  if not metrics or len(metrics) < 2:
-    number_of_data_points = len(metrics) if metrics else 0
-    return (RESULT_STATE_SKIPPED, ["There are not enough data points to calculate the standard deviation ({0} sampled)".format(
-      number_of_data_points)])
 
   minimum_value_multiplier = 1
   if 'dfs.FSNamesystem.CapacityUsed' in metric_name:
@@ -350,14 +339,27 @@ def execute(configurations={}, parameters={}, host_name=None):
   elif 'rpc.rpc.datanode' in metric_name or 'rpc.rpc.client' in metric_name:
     minimum_value_multiplier = 1000  # seconds to millis
 
-  if minimum_value_threshold:
-    # Filter out points below min threshold
-    metrics = [metric for metric in metrics if metric > (minimum_value_threshold * minimum_value_multiplier)]
-    if len(metrics) < 2:
-      return (RESULT_STATE_OK, ['There were no data points above the minimum threshold of {0} seconds'.format(minimum_value_threshold)])
+  # aggregate the data points in a single pass without copying them;
+  # will get large standard deviation for multiple hosts,
+  # if host1 reports small local values, but host2 reports large local values
+  number_of_data_points = 0
+  stats = RunningStatistics(reservoir_size=0)
+  for metrics_data in data_json["metrics"]:
+    for metric in metrics_data["metrics"].itervalues():
+      number_of_data_points += 1
+      # Filter out points below min threshold
+      if not minimum_value_threshold or metric > (minimum_value_threshold * minimum_value_multiplier):
+        stats.add(metric)
+
+  if number_of_data_points < 2:
+    return (RESULT_STATE_SKIPPED, ["There are not enough data points to calculate the standard deviation ({0} sampled)".format(
+      number_of_data_points)])
+
+  if stats.count < 2:
+    return (RESULT_STATE_OK, ['There were no data points above the minimum threshold of {0} seconds'.format(minimum_value_threshold)])
 
-  mean_value = mean(metrics)
-  stddev = sample_standard_deviation(metrics)
+  mean_value = stats.mean
+  stddev = stats.sample_standard_deviation()
 
   try:
     deviation_percent = stddev / float(mean_value) * 100
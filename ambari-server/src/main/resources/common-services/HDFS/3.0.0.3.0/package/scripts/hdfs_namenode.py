@@ -28,6 +28,7 @@ from resource_management.core.resources.service import Service
 from resource_management.libraries.functions import namenode_ha_utils
 from resource_management.libraries.functions.decorator import retry
 from resource_management.libraries.functions.format import format
+from resource_management.libraries.functions.hdfs_utils import wait_for_namenode_safemode_off
 from resource_management.libraries.functions.check_process_status import check_process_status
 from resource_management.libraries.resources.execute_hadoop import ExecuteHadoop
 from resource_management.libraries.functions import Direction
@@ -66,14 +67,21 @@ def wait_for_safemode_off(hdfs_binary, afterwait_sleep=0, execute_kinit=False):
     Execute(kinit_command, user=params.hdfs_user, logoutput=True)
 
   try:
-    # Note, this fails if namenode_address isn't prefixed with "params."
-
-    dfsadmin_base_command = get_dfsadmin_base_command(hdfs_binary, use_specific_namenode=True)
-    is_namenode_safe_mode_off = dfsadmin_base_command + " -safemode get | grep 'Safe mode is OFF'"
-
-    # Wait up to 30 mins
-    Execute(is_namenode_safe_mode_off, tries=retries, try_sleep=sleep_seconds,
-      user=params.hdfs_user, logoutput=True)
+    # Polling the NameNode JMX is much cheaper than starting a dfsadmin JVM on every try,
+    # and also shows how the block reports are coming in.
+    namenode_web_address, is_https_enabled = namenode_ha_utils.get_namenode_web_address(params.hdfs_site,
+                                                                                         params.namenode_id)
+    if not namenode_web_address or not wait_for_namenode_safemode_off(namenode_web_address, is_https_enabled,
+        retries * sleep_seconds, security_enabled=params.security_enabled, run_user=params.hdfs_user):
+      Logger.info("Could not read the NameNode JMX, falling back to dfsadmin to check Safemode.")
+
+      # Note, this fails if namenode_address isn't prefixed with "params."
+      dfsadmin_base_command = get_dfsadmin_base_command(hdfs_binary, use_specific_namenode=True)
+      is_namenode_safe_mode_off = dfsadmin_base_command + " -safemode get | grep 'Safe mode is OFF'"
+
+      # Wait up to 30 mins
+      Execute(is_namenode_safe_mode_off, tries=retries, try_sleep=sleep_seconds,
+        user=params.hdfs_user, logoutput=True)
 
     # Wait a bit more since YARN still depends on block reports coming in.
     # Also saw intermittent errors with HBASE service check if it was done too soon.
@@ -32,7 +32,7 @@ from resource_management.core.source import Template
 from resource_management.core.exceptions import ComponentIsNotRunning
 from resource_management.core.logger import Logger
 from resource_management.libraries.functions.curl_krb_request import curl_krb_request
-from resource_management.libraries.functions.namenode_ha_utils import get_namenode_states
+from resource_management.libraries.functions.namenode_ha_utils import get_namenode_states, invalidate_namenode_states_cache
 from resource_management.libraries.functions.show_logs import show_logs
 from resource_management.libraries.script.script import Script
 from ambari_commons.inet_utils import ensure_ssl_using_protocol
@@ -103,6 +103,8 @@ def initiate_safe_zkfc_failover():
     Logger.info(msg)
     code, out = shell.call(failover_command, user=params.hdfs_user, logoutput=True)
     Logger.info(format("Rolling Upgrade - failover command returned {code}"))
+    # the NameNode states found so far are stale after a failover attempt
+    invalidate_namenode_states_cache(params.hdfs_site)
     wait_for_standby = False
 
     if code == 0:
@@ -19,16 +19,23 @@ limitations under the License.
 
 import base64
 import getpass
+import grp
 import os
+import pwd
+import Queue
+import re
 import string
 import subprocess
 import sys
 import tempfile
+import threading
 from tempfile import gettempdir
 
 from resource_management.libraries.script.script import Script
 from resource_management.libraries.functions.format import format
 from resource_management.libraries.functions.default import default
+from resource_management.core import shell
+from resource_management.core import sudo
 from resource_management.core.exceptions import Fail
 from resource_management.core.logger import Logger
 from resource_management.core.resources.system import Directory, Execute, File
@@ -37,6 +44,10 @@ from utils import get_property_value
 from ambari_commons.os_utils import remove_file
 from ambari_agent import Constants
 
+# kadmin prints its prompt before the output of each query read from stdin
+KADMIN_PROMPT_PATTERN = re.compile(r'^(\s*kadmin(\.local)?:\s*)+')
+KADMIN_PRINCIPAL_CREATED_PATTERN = re.compile(r'Principal "[^"]*" created')
+
 class KerberosScript(Script):
   KRB5_REALM_PROPERTIES = [
     'kdc',
@@ -45,6 +56,9 @@ class KerberosScript(Script):
     'master_kdc'
   ]
 
+  KEYTAB_WRITE_THREADS = 8
+  KEYTAB_TMP_FILE_SUFFIX = '.tmp'
+
   KRB5_SECTION_NAMES = [
     'libdefaults',
     'logging',
@@ -129,50 +143,65 @@ class KerberosScript(Script):
     )
 
   @staticmethod
-  def invoke_kadmin(query, admin_identity=None, default_realm=None):
+  def get_kadmin_command(admin_identity=None, default_realm=None):
     """
-    Executes the kadmin or kadmin.local command (depending on whether auth_identity is set or not
-    and returns command result code and standard out data.
+    Builds the kadmin or kadmin.local command line (depending on whether auth_identity is set or not).
+    If the administrator credentials are given as a keytab, it is written to a temporary file, which the
+    caller has to remove.
 
-    :param query: the kadmin query to execute
     :param admin_identity: the identity for the administrative user (optional)
     :param default_realm: the default realm to assume
-    :return: return_code, out
+    :return: command, auth_keytab_file (None if no temporary file was created)
     """
-    if (query is not None) and (len(query) > 0):
-      auth_principal = None
-      auth_keytab_file = None
-
-      if admin_identity is not None:
-        auth_principal = get_property_value(admin_identity, 'principal')
+    auth_principal = None
+    auth_keytab_file = None
 
-      if auth_principal is None:
-        kadmin = 'kadmin.local'
-        credential = ''
-      else:
-        kadmin = 'kadmin -p "%s"' % auth_principal
+    if admin_identity is not None:
+      auth_principal = get_property_value(admin_identity, 'principal')
 
-        auth_password = get_property_value(admin_identity, 'password')
+    if auth_principal is None:
+      kadmin = 'kadmin.local'
+      credential = ''
+    else:
+      kadmin = 'kadmin -p "%s"' % auth_principal
 
-        if auth_password is None:
-          auth_keytab = get_property_value(admin_identity, 'keytab')
+      auth_password = get_property_value(admin_identity, 'password')
 
-          if auth_keytab is not None:
-            (fd, auth_keytab_file) = tempfile.mkstemp()
-            os.write(fd, base64.b64decode(auth_keytab))
-            os.close(fd)
+      if auth_password is None:
+        auth_keytab = get_property_value(admin_identity, 'keytab')
 
-          credential = '-k -t %s' % auth_keytab_file
-        else:
-          credential = '-w "%s"' % auth_password
+        if auth_keytab is not None:
+          (fd, auth_keytab_file) = tempfile.mkstemp()
+          os.write(fd, base64.b64decode(auth_keytab))
+          os.close(fd)
 
-      if (default_realm is not None) and (len(default_realm) > 0):
-        realm = '-r %s' % default_realm
+        credential = '-k -t %s' % auth_keytab_file
       else:
-        realm = ''
+        credential = '-w "%s"' % auth_password
+
+    if (default_realm is not None) and (len(default_realm) > 0):
+      realm = '-r %s' % default_realm
+    else:
+      realm = ''
+
+    return '%s %s %s' % (kadmin, credential, realm), auth_keytab_file
+
+  @staticmethod
+  def invoke_kadmin(query, admin_identity=None, default_realm=None):
+    """
+    Executes the kadmin or kadmin.local command (depending on whether auth_identity is set or not
+    and returns command result code and standard out data.
+
+    :param query: the kadmin query to execute
+    :param admin_identity: the identity for the administrative user (optional)
+    :param default_realm: the default realm to assume
+    :return: return_code, out
+    """
+    if (query is not None) and (len(query) > 0):
+      kadmin, auth_keytab_file = KerberosScript.get_kadmin_command(admin_identity, default_realm)
 
       try:
-        command = '%s %s %s -q "%s"' % (kadmin, credential, realm, query.replace('"', '\\"'))
+        command = '%s -q "%s"' % (kadmin, query.replace('"', '\\"'))
         return shell.checked_call(command)
       except:
         raise
@@ -180,6 +209,122 @@ class KerberosScript(Script):
         if auth_keytab_file is not None:
           os.remove(auth_keytab_file)
 
+  @staticmethod
+  def invoke_kadmin_batch(queries, admin_identity=None, default_realm=None):
+    """
+    Executes all of the queries in a single kadmin or kadmin.local session, feeding them on its standard
+    input, so that the process is started and authenticated once rather than once per query.
+    Since kadmin does not tell which output belongs to which query, the caller has to look for the
+    messages about each principal in the output.
+
+    :param queries: the kadmin queries to execute
+    :param admin_identity: the identity for the administrative user (optional)
+    :param default_realm: the default realm to assume
+    :return: return_code, out
+    """
+    if not queries:
+      return 0, ''
+
+    kadmin, auth_keytab_file = KerberosScript.get_kadmin_command(admin_identity, default_realm)
+
+    try:
+      process = subprocess.Popen(kadmin, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+      out, _ = process.communicate('\n'.join(queries) + '\nquit\n')
+      return process.returncode, out
+    finally:
+      if auth_keytab_file is not None:
+        os.remove(auth_keytab_file)
+
+  @staticmethod
+  def create_principals_and_keytabs(identities, auth_identity=None, default_realm=None):
+    """
+    Creates the principals of all identities and exports the keytabs of those having a keytab_file
+    in a single kadmin session. Principals which already exist are not treated as failures, their
+    keys are exported as they are.
+
+    :param identities: dictionaries with a principal, an optional password and an optional keytab_file
+    :param auth_identity: the identity for the administrative user (optional)
+    :param default_realm: the default realm to assume
+    :return: a dictionary of principal -> failure message, for the principals which failed
+    """
+    if (auth_identity is None) or (len(auth_identity) == 0):
+      norandkey = '-norandkey'
+    else:
+      norandkey = ''
+
+    queries = []
+    principals = []
+    keytab_principals = set()
+    for identity in identities or []:
+      principal = get_property_value(identity, 'principal')
+      if (principal is None) or (len(principal) == 0):
+        continue
+      principals.append(principal)
+
+      password = get_property_value(identity, 'password')
+      if password is None:
+        credentials = '-randkey'
+      else:
+        credentials = '-pw "%s"' % password
+      queries.append('addprinc %s %s' % (credentials, principal))
+
+      keytab_file = get_property_value(identity, 'keytab_file')
+      if (keytab_file is not None) and (len(keytab_file) > 0):
+        queries.append('ktadd -k %s %s %s' % (keytab_file, norandkey, principal))
+        keytab_principals.add(principal)
+
+    if not queries:
+      return {}
+
+    result_code, out = KerberosScript.invoke_kadmin_batch(queries, auth_identity, default_realm)
+    if result_code != 0:
+      raise Fail(Logger.filter_text("Execution of kadmin returned %d. %s" % (result_code, out)))
+
+    failures = {}
+    lines = (out or '').splitlines()
+    for principal in principals:
+      failure = KerberosScript._get_kadmin_batch_failure(principal, principal in keytab_principals, lines)
+      if failure is not None:
+        Logger.error("Failed to create principal or keytab for %s: %s" % (principal, failure))
+        failures[principal] = failure
+
+    return failures
+
+  @staticmethod
+  def _get_kadmin_batch_failure(principal, has_keytab, lines):
+    """
+    Finds the errors about the principal in kadmin output. Reading the queries from stdin,
+    kadmin prefixes its output with its prompt, and also prints warnings, so it looks like
+
+     kadmin.local:  WARNING: no policy specified for nn/c6401.ambari.apache.org@EXAMPLE.COM; defaulting to no policy
+     Principal "nn/c6401.ambari.apache.org@EXAMPLE.COM" created.
+     kadmin.local:  add_principal: Principal or policy already exists while creating "dn/c6401.ambari.apache.org@EXAMPLE.COM".
+     kadmin.local:  Entry for principal nn/c6401.ambari.apache.org with kvno 2, encryption type aes256-cts added to keytab WRFILE:/etc/security/keytabs/nn.service.keytab.
+     kadmin.local:  ktadd: Principal hbase/c6401.ambari.apache.org does not exist.
+
+    :return: the failure message or None if the principal (and its keytab) were created
+    """
+    # kadmin may or may not add the default realm to the principal
+    principal_pattern = re.compile(r'(^|[\s"])%s(@\S+?)?([\s";]|\.?$)' % re.escape(principal))
+    errors = []
+    keytab_added = False
+
+    for line in lines:
+      line = KADMIN_PROMPT_PATTERN.sub('', line).strip()
+      if not principal_pattern.search(line) or line.startswith('WARNING:') or line.startswith('Authenticating as principal'):
+        continue
+      if 'Entry for principal' in line:
+        keytab_added = True
+      elif not KADMIN_PRINCIPAL_CREATED_PATTERN.search(line) and 'already exists' not in line:
+        errors.append(line)
+
+    if errors:
+      return ' '.join(errors)
+    if has_keytab and not keytab_added:
+      return 'no keytab entries were exported'
+    return None
+
   @staticmethod
   def create_keytab_file(principal, path, auth_identity=None):
     success = False
@@ -302,9 +447,15 @@ class KerberosScript(Script):
 
   @staticmethod
   def create_principals(identities, auth_identity=None):
+    """
+    Creates the principals, and exports the keytabs, of the identities in a single kadmin session.
+    Nothing in Ambari calls this yet: the principals and keytabs of the cluster hosts are created by
+    the server (CreatePrincipalsServerAction and CreateKeytabFilesServerAction), one kadmin call each.
+    """
     if identities is not None:
-      for identity in identities:
-        KerberosScript.create_principal(identity, auth_identity)
+      failures = KerberosScript.create_principals_and_keytabs(identities, auth_identity)
+      if failures:
+        raise Fail("Failed to create principals: %s" % ', '.join(sorted(failures.keys())))
 
   @staticmethod
   def create_or_update_administrator_identity():
@@ -371,19 +522,112 @@ class KerberosScript(Script):
       return 0, ''
 
 
+  @staticmethod
+  def keytab_file_matches(path, content, owner, group, mode):
+    """
+    Tells whether the keytab file already has the given content, ownership and mode.
+    """
+    if not sudo.path_isfile(path):
+      return False
+
+    file_stat = sudo.stat(path)
+    try:
+      if file_stat.st_uid != pwd.getpwnam(owner).pw_uid:
+        return False
+      if group and file_stat.st_gid != grp.getgrnam(group).gr_gid:
+        return False
+    except KeyError:
+      # let writing the file report the missing user or group
+      return False
+
+    return file_stat.st_mode == mode and sudo.read_file(path) == content
+
+  @staticmethod
+  def write_keytab_file_atomically(path, content, owner, group, mode):
+    """
+    Writes the keytab next to its destination and renames it into place, so that services never read
+    a partially written keytab. Ownership and mode are set before the content is written, so the keys
+    are never readable by anyone else.
+    """
+    try:
+      user_entity = pwd.getpwnam(owner)
+    except KeyError:
+      raise Fail("User '{0}' doesn't exist".format(owner))
+    try:
+      group_entity = grp.getgrnam(group) if group else None
+    except KeyError:
+      raise Fail("Group '{0}' doesn't exist".format(group))
+
+    tmp_path = path + KerberosScript.KEYTAB_TMP_FILE_SUFFIX
+    try:
+      sudo.create_file(tmp_path, None)
+      sudo.chmod(tmp_path, 0)
+      sudo.chown(tmp_path, user_entity, group_entity)
+      sudo.chmod(tmp_path, mode)
+      sudo.create_file(tmp_path, content)
+      sudo.rename(tmp_path, path)
+    except:
+      if sudo.path_lexists(tmp_path):
+        sudo.unlink(tmp_path)
+      raise
+
+  @staticmethod
+  def write_keytab_files(keytabs, max_threads=None):
+    """
+    Writes the keytabs concurrently.
+
+    :param keytabs: (path, content, owner, group, mode) tuples
+    :raises Fail: naming the keytabs which could not be written, after all of them were tried
+    """
+    keytabs = list(keytabs)
+    failures = []
+    failures_lock = threading.Lock()
+
+    def write_keytabs(keytab_queue):
+      while True:
+        try:
+          keytab = keytab_queue.get_nowait()
+        except Queue.Empty:
+          return
+        try:
+          KerberosScript.write_keytab_file_atomically(*keytab)
+          Logger.info("Written keytab %s" % keytab[0])
+        except Exception, err:
+          Logger.error("Failed to write keytab %s: %s" % (keytab[0], str(err)))
+          with failures_lock:
+            failures.append(keytab[0])
+
+    keytab_queue = Queue.Queue()
+    for keytab in keytabs:
+      keytab_queue.put(keytab)
+
+    threads = []
+    for i in range(min(len(keytabs), max_threads or KerberosScript.KEYTAB_WRITE_THREADS)):
+      thread = threading.Thread(target=write_keytabs, args=(keytab_queue,))
+      thread.start()
+      threads.append(thread)
+    for thread in threads:
+      thread.join()
+
+    if failures:
+      raise Fail("Failed to write keytabs: %s" % ', '.join(sorted(failures)))
+
   def write_keytab_file(self):
     import params
     import stat
 
     if params.kerberos_command_params is not None:
+      keytabs = []
+      keytab_dirs = []
+
       for item  in params.kerberos_command_params:
         keytab_content_base64 = get_property_value(item, 'keytab_content_base64')
         if (keytab_content_base64 is not None) and (len(keytab_content_base64) > 0):
           keytab_file_path = get_property_value(item, 'keytab_file_path')
           if (keytab_file_path is not None) and (len(keytab_file_path) > 0):
             head, tail = os.path.split(keytab_file_path)
-            if head:
-              Directory(head, create_parents = True, mode=0755, owner="root", group="root")
+            if head and head not in keytab_dirs:
+              keytab_dirs.append(head)
 
             owner = get_property_value(item, 'keytab_file_owner_name')
             if not owner:
@@ -404,16 +648,7 @@ class KerberosScript(Script):
               mode |= stat.S_IRGRP
 
             keytab_content = base64.b64decode(keytab_content_base64)
-
-            # to hide content in command output
-            def make_lambda(data):
-              return lambda: data
-
-            File(keytab_file_path,
-                 content=make_lambda(keytab_content),
-                 mode=mode,
-                 owner=owner,
-                 group=group)
+            keytabs.append((keytab_file_path, keytab_content, owner, group, mode))
 
             principal = get_property_value(item, 'principal')
             if principal is not None:
@@ -426,6 +661,14 @@ class KerberosScript(Script):
 
               self.put_structured_out(curr_content)
 
+      for keytab_dir in keytab_dirs:
+        Directory(keytab_dir, create_parents = True, mode=0755, owner="root", group="root")
+
+      # only the keytabs which changed are written again, to keep re-distributing keytabs cheap
+      changed_keytabs = [keytab for keytab in keytabs if not KerberosScript.keytab_file_matches(*keytab)]
+      Logger.info("%d of %d keytabs are up to date" % (len(keytabs) - len(changed_keytabs), len(keytabs)))
+      KerberosScript.write_keytab_files(changed_keytabs)
+
   def delete_keytab_file(self):
     import params
 
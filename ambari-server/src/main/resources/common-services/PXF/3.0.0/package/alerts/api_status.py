@@ -150,7 +150,9 @@ def execute(configurations={}, parameters={}, host_name=None):
       if 'dfs.nameservices' in configurations[HDFS_SITE]:
         if configurations[CLUSTER_ENV_SECURITY]:
           _ensure_kerberos_authentication(configurations[ACTING_USER], resolved_principal, configurations[KEYTAB_FILE], None)
-        namenode_address = get_active_namenode(ConfigDictionary(configurations[HDFS_SITE]), configurations[CLUSTER_ENV_SECURITY], configurations[ACTING_USER])[1]
+        # alerts run in the long lived agent process, always ask the NameNodes
+        namenode_address = get_active_namenode(ConfigDictionary(configurations[HDFS_SITE]), configurations[CLUSTER_ENV_SECURITY],
+                                               configurations[ACTING_USER], use_cache=False)[1]
       else:
         namenode_address = configurations[HDFS_SITE]['dfs.namenode.http-address']
 
@@ -734,20 +734,21 @@ def setup_ranger_audit_solr():
                                    new_service_principals = service_principals)
 
 
-  solr_cloud_util.create_collection(
-    zookeeper_quorum = params.zookeeper_quorum,
-    solr_znode = params.solr_znode,
-    collection = params.ranger_solr_collection_name,
-    config_set = params.ranger_solr_config_set,
-    java64_home = params.java_home,
-    shards = params.ranger_solr_shards,
-    replication_factor = int(params.replication_factor),
-    jaas_file = params.solr_jaas_file)
-
-  if params.security_enabled and params.has_infra_solr \
-    and not params.is_external_solrCloud_enabled and params.stack_supports_ranger_kerberos:
-    secure_znode(format('{solr_znode}/configs/{ranger_solr_config_set}'), params.solr_jaas_file)
-    secure_znode(format('{solr_znode}/collections/{ranger_solr_collection_name}'), params.solr_jaas_file)
+  with solr_cloud_util.SolrCliBatch(params.tmp_dir):
+    solr_cloud_util.create_collection(
+      zookeeper_quorum = params.zookeeper_quorum,
+      solr_znode = params.solr_znode,
+      collection = params.ranger_solr_collection_name,
+      config_set = params.ranger_solr_config_set,
+      java64_home = params.java_home,
+      shards = params.ranger_solr_shards,
+      replication_factor = int(params.replication_factor),
+      jaas_file = params.solr_jaas_file)
+
+    if params.security_enabled and params.has_infra_solr \
+      and not params.is_external_solrCloud_enabled and params.stack_supports_ranger_kerberos:
+      secure_znode(format('{solr_znode}/configs/{ranger_solr_config_set}'), params.solr_jaas_file)
+      secure_znode(format('{solr_znode}/collections/{ranger_solr_collection_name}'), params.solr_jaas_file)
 
 def setup_ranger_admin_passwd_change():
   import params
@@ -27,6 +27,9 @@ import datetime
 import time
 import re
 import copy
+import shutil
+import threading
+import Queue
 from optparse import OptionGroup
 from flask import Flask, Response, jsonify, request, abort
 from flask.ext.cors import CORS
@@ -56,17 +59,22 @@ class Params:
   INPUT_DIR = None
   VERBOSE = None
   AGGREGATE = None
+  THREADS = 4
+  CHUNK_SIZE = 24 * 60 * 60 * 1000 # milliseconds
+  RESUME = False
 
   @staticmethod
-  def get_collector_uri(metricNames, hostname=None):
+  def get_collector_uri(metricNames, hostname=None, start_time=None, end_time=None):
+    start_time = Params.START_TIME if start_time is None else start_time
+    end_time = Params.END_TIME if end_time is None else end_time
     if hostname:
       return 'http://{0}:{1}/ws/v1/timeline/metrics?metricNames={2}&hostname={3}&appId={4}&startTime={5}&endTime={6}&precision={7}' \
         .format(Params.AMS_HOSTNAME, Params.AMS_PORT, metricNames, hostname, Params.AMS_APP_ID,
-                Params.START_TIME, Params.END_TIME, Params.PRECISION)
+                start_time, end_time, Params.PRECISION)
     else:
       return 'http://{0}:{1}/ws/v1/timeline/metrics?metricNames={2}&appId={3}&startTime={4}&endTime={5}&precision={6}' \
-        .format(Params.AMS_HOSTNAME, Params.AMS_PORT, metricNames, Params.AMS_APP_ID, Params.START_TIME,
-                Params.END_TIME, Params.PRECISION)
+        .format(Params.AMS_HOSTNAME, Params.AMS_PORT, metricNames, Params.AMS_APP_ID, start_time,
+                end_time, Params.PRECISION)
 
 class Utils:
 
@@ -156,26 +164,166 @@ class Utils:
     aggregate = True if not Params.HOSTS else False
     properties = {"APP_ID" : Params.AMS_APP_ID, "START_TIME" : Params.START_TIME, "END_TIME" : Params.END_TIME, "AGGREGATE" : aggregate}
 
+    if Params.RESUME and os.path.exists(conf_file):
+      previous_properties = Utils.read_json_file(conf_file)
+      if previous_properties != properties:
+        logger.error('Cannot resume export in {0}, it was started with different parameters: {1}'.format(Params.OUT_DIR, previous_properties))
+        logger.info('Aborting...')
+        sys.exit(1)
+
     with open(conf_file, 'w') as file:
       file.write(json.dumps(properties))
 
-class AmsMetricsProcessor:
+  @staticmethod
+  def write_json_file_atomically(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+      json.dump(data, file)
+    os.rename(tmp_path, path)
+
+  @staticmethod
+  def makedirs(path):
+    if not os.path.isdir(path):
+      os.makedirs(path)
+
+class AmsMetricsExporter:
+  """
+  Exports metrics with a bounded number of worker threads. The time range of every (host, metric) pair is
+  split into chunks of Params.CHUNK_SIZE; each chunk is requested separately and written to the chunks dir
+  as soon as it arrives. When the last chunk of a metric is on disk, the chunks are merged into the metric
+  file and removed. Chunk and metric files are written atomically, so a failed or interrupted export can be
+  resumed (--resume) from the last completed chunk.
+  """
+  CHUNKS_DIR = '.chunks'
+  AGGREGATE_DIR = '_aggregate'
+
+  def __init__(self, metrics, hosts, threads=None):
+    self.metrics = metrics
+    self.hosts = hosts if hosts else [None]
+    self.threads = threads if threads else Params.THREADS
+    self.tasks = Queue.Queue()
+    self.lock = threading.Lock()
+    self.pending_chunks = {}
+    self.failed_chunks = 0
+
+  @staticmethod
+  def get_chunks(start_time, end_time, chunk_size):
+    chunks = []
+    chunk_start = start_time
+    while chunk_start < end_time:
+      chunk_end = min(chunk_start + chunk_size, end_time)
+      chunks.append((chunk_start, chunk_end))
+      chunk_start = chunk_end
+    return chunks if chunks else [(start_time, end_time)]
+
+  @staticmethod
+  def get_metric_path(metric, host):
+    if host:
+      return os.path.join(Params.OUT_DIR, host, metric)
+    return os.path.join(Params.OUT_DIR, metric)
+
+  @staticmethod
+  def get_chunks_dir(metric, host):
+    return os.path.join(Params.OUT_DIR, AmsMetricsExporter.CHUNKS_DIR,
+                        host if host else AmsMetricsExporter.AGGREGATE_DIR, metric)
+
+  @staticmethod
+  def get_chunk_path(metric, host, chunk):
+    return os.path.join(AmsMetricsExporter.get_chunks_dir(metric, host), '{0}_{1}'.format(*chunk))
 
   @staticmethod
-  def write_metrics_to_file(metrics, host=None):
-
-    for metric in metrics:
-      uri = Params.get_collector_uri(metric, host)
-      logger.info('Request URI: %s' % str(uri))
-      metrics_json = Utils.get_data_from_url(uri)
-      if metrics_json:
-        if host:
-          path = os.path.join(Params.OUT_DIR, host, metric)
+  def merge_chunks(chunk_files):
+    """
+    Merge collector responses of consecutive time ranges, series are identified by
+    metric name, host name, app id and instance id.
+    """
+    series = {}
+    ordered_keys = []
+    for chunk_file in chunk_files:
+      for metric in Utils.read_json_file(chunk_file).get('metrics', []):
+        key = (metric.get('metricname'), metric.get('hostname'), metric.get('appid'), metric.get('instanceid'))
+        if key not in series:
+          series[key] = metric
+          ordered_keys.append(key)
         else:
-          path = os.path.join(Params.OUT_DIR, metric)
-        logger.info('Writing metric file: %s' % path)
-        with open(path, 'w') as file:
-          file.write(json.dumps(metrics_json))
+          series[key].setdefault('metrics', {}).update(metric.get('metrics', {}))
+    return {'metrics': [series[key] for key in ordered_keys]}
+
+  def export(self):
+    chunks = self.get_chunks(Params.START_TIME, Params.END_TIME, Params.CHUNK_SIZE)
+
+    for host in self.hosts:
+      Utils.makedirs(os.path.join(Params.OUT_DIR, host) if host else Params.OUT_DIR)
+      for metric in self.metrics:
+        if os.path.exists(self.get_metric_path(metric, host)):
+          logger.debug('Metric file already exported, skipping: %s' % self.get_metric_path(metric, host))
+          continue
+        Utils.makedirs(self.get_chunks_dir(metric, host))
+        missing_chunks = [chunk for chunk in chunks if not os.path.exists(self.get_chunk_path(metric, host, chunk))]
+        self.pending_chunks[(metric, host)] = len(missing_chunks)
+        if not missing_chunks:
+          self.write_metric_file(metric, host, chunks)
+        for chunk in missing_chunks:
+          self.tasks.put((metric, host, chunk, chunks))
+
+    logger.info('Exporting %d chunks with %d threads' % (self.tasks.qsize(), self.threads))
+    workers = []
+    for i in range(min(self.threads, self.tasks.qsize())):
+      worker = threading.Thread(target=self.work, name='ams-export-%d' % i)
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+    # join with timeouts, so a keyboard interrupt is still delivered to the main thread
+    for worker in workers:
+      while worker.is_alive():
+        worker.join(1)
+
+    if self.failed_chunks:
+      logger.error('%d chunks could not be exported, run the export again with --resume to retry them' % self.failed_chunks)
+      return False
+
+    shutil.rmtree(os.path.join(Params.OUT_DIR, self.CHUNKS_DIR), ignore_errors=True)
+    return True
+
+  def work(self):
+    while True:
+      try:
+        metric, host, chunk, chunks = self.tasks.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        if not self.export_chunk(metric, host, chunk):
+          with self.lock:
+            self.failed_chunks += 1
+          continue
+        with self.lock:
+          self.pending_chunks[(metric, host)] -= 1
+          last_chunk = self.pending_chunks[(metric, host)] == 0
+        if last_chunk:
+          self.write_metric_file(metric, host, chunks)
+      except Exception as e:
+        logger.error('Exporting chunk %s of %s failed: %s' % (str(chunk), metric, str(e)))
+        with self.lock:
+          self.failed_chunks += 1
+
+  def export_chunk(self, metric, host, chunk):
+    uri = Params.get_collector_uri(metric, host, chunk[0], chunk[1])
+    logger.info('Request URI: %s' % str(uri))
+    metrics_json = Utils.get_data_from_url(uri)
+    if metrics_json is None:
+      return False
+    Utils.write_json_file_atomically(self.get_chunk_path(metric, host, chunk), metrics_json)
+    return True
+
+  def write_metric_file(self, metric, host, chunks):
+    path = self.get_metric_path(metric, host)
+    chunk_files = [self.get_chunk_path(metric, host, chunk) for chunk in chunks]
+    logger.info('Writing metric file: %s' % path)
+    Utils.write_json_file_atomically(path, self.merge_chunks(chunk_files))
+    shutil.rmtree(self.get_chunks_dir(metric, host), ignore_errors=True)
+
+
+class AmsMetricsProcessor:
 
   @staticmethod
   def get_metrics_metadata():
@@ -213,7 +361,9 @@ class AmsMetricsProcessor:
     for metrics_dir in AmsMetricsProcessor.get_metrics_dirs(Params.INPUT_DIR):
       for dir_item in os.listdir(metrics_dir):
         dir_item_path = os.path.join(metrics_dir, dir_item)
-        if os.path.isdir(dir_item_path):
+        if dir_item == AmsMetricsExporter.CHUNKS_DIR:
+          logger.warn('Skipping chunks of an unfinished export in {0}'.format(metrics_dir))
+        elif os.path.isdir(dir_item_path):
           if dir_item not in Params.HOSTS:
             Params.HOSTS.append(os.path.basename(dir_item))
           metrics_for_hosts[dir_item] = {}
@@ -238,29 +388,27 @@ class AmsMetricsProcessor:
     logger.info('Reading metrics file.')
     with open(Params.METRICS_FILE, 'r') as file:
       for line in file:
-        Params.METRICS.append(line.strip())
+        if line.strip():
+          Params.METRICS.append(line.strip())
     logger.info('Reading hosts file.')
 
     logger.info('Reading hosts file.')
     if Params.HOSTS_FILE and os.path.exists(Params.HOSTS_FILE):
       with open(Params.HOSTS_FILE, 'r') as file:
         for line in file:
-          Params.HOSTS.append(line.strip())
+          if line.strip():
+            Params.HOSTS.append(line.strip())
     else:
       logger.info('No hosts file found, aggregate metrics will be exported.')
 
-    if Params.HOSTS:
-      for host in Params.HOSTS:
-        os.makedirs(os.path.join(Params.OUT_DIR, host)) # create host dir
-        AmsMetricsProcessor.write_metrics_to_file(Params.METRICS, host)
-    else:
-      os.makedirs(os.path.join(Params.OUT_DIR))
-      AmsMetricsProcessor.write_metrics_to_file(Params.METRICS, None)
+    Utils.makedirs(Params.OUT_DIR)
+    Utils.set_configs()
+    return AmsMetricsExporter(Params.METRICS, Params.HOSTS).export()
 
   def process(self):
     if Params.ACTION == "export":
-      self.export_ams_metrics()
-      Utils.set_configs()
+      if not self.export_ams_metrics():
+        sys.exit(1)
     else:
       Utils.get_configs()
       self.metrics_for_hosts = self.ger_metrics_from_input_dir()
@@ -409,6 +557,13 @@ def main():
                     help="End time in milliseconds since epoch or UTC timestamp in YYYY-MM-DDTHH:mm:ssZ format.")
   export_options_group.add_option("-o", "--output-dir", dest="output_dir", default=output_dir,
                     help="Output dir. [default: %s]" % output_dir)
+  export_options_group.add_option("-t", "--threads", dest="threads", type="int", default=Params.THREADS,
+                    help="Number of concurrent requests to AMS. [default: %d]" % Params.THREADS)
+  export_options_group.add_option("-k", "--chunk-minutes", dest="chunk_minutes", type="int",
+                    default=Params.CHUNK_SIZE / 60000,
+                    help="Length of the time range requested at once, in minutes. [default: %d]" % (Params.CHUNK_SIZE / 60000))
+  export_options_group.add_option("-u", "--resume", dest="resume_dir", metavar='DIR',
+                    help="Resume an unfinished export in DIR (an ambari_metrics_export_* dir) from the last completed chunk.")
   parser.add_option_group(export_options_group)
   #start Flask server -----------------------------------------------------
 
@@ -449,6 +604,25 @@ def main():
 
     Params.OUT_DIR = output_dir if options.output_dir == output_dir else os.path.join(options.output_dir, 'ambari_metrics_export_' + time_suffix)
 
+    if options.resume_dir:
+      if not os.path.isdir(options.resume_dir):
+        logger.warn('Export dir to resume does not exist: {0}'.format(options.resume_dir))
+        logger.info('Aborting...')
+        sys.exit(1)
+      Params.OUT_DIR = options.resume_dir
+      Params.RESUME = True
+
+    if options.threads < 1 or options.chunk_minutes < 1:
+      logger.warn('Number of threads and chunk length must be positive.')
+      logger.info('Aborting...')
+      sys.exit(1)
+
+    Params.THREADS = options.threads
+
+    Params.CHUNK_SIZE = options.chunk_minutes * 60 * 1000
+
+    Params.START_TIME = Utils.get_epoch(options.start_time)
+
     if Params.START_TIME == -1:
       logger.warn('No start time provided, or it is in the wrong format. Please '
                   'provide milliseconds since epoch or a value in YYYY-MM-DDTHH:mm:ssZ format')
@@ -463,8 +637,6 @@ def main():
       logger.info('Aborting...')
       sys.exit(1)
 
-    Params.START_TIME = Utils.get_epoch(options.start_time)
-
     ams_metrics_processor = AmsMetricsProcessor()
     ams_metrics_processor.process()
 
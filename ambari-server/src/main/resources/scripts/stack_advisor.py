@@ -19,9 +19,13 @@ limitations under the License.
 '''
 
 import ambari_simplejson as json
+import logging
 import os
+import socket
 import sys
+import threading
 import traceback
+from StringIO import StringIO
 
 RECOMMEND_COMPONENT_LAYOUT_ACTION = 'recommend-component-layout'
 VALIDATE_COMPONENT_LAYOUT_ACTION = 'validate-component-layout'
@@ -34,7 +38,17 @@ ALL_ACTIONS = [RECOMMEND_COMPONENT_LAYOUT_ACTION,
                RECOMMEND_CONFIGURATIONS,
                RECOMMEND_CONFIGURATION_DEPENDENCIES,
                VALIDATE_CONFIGURATIONS]
-USAGE = "Usage: <action> <hosts_file> <services_file>\nPossible actions are: {0}\n".format( str(ALL_ACTIONS) )
+RESULT_FILES = {RECOMMEND_COMPONENT_LAYOUT_ACTION: "component-layout.json",
+                VALIDATE_COMPONENT_LAYOUT_ACTION: "component-layout-validation.json",
+                RECOMMEND_CONFIGURATIONS: "configurations.json",
+                RECOMMEND_CONFIGURATION_DEPENDENCIES: "configurations.json",
+                VALIDATE_CONFIGURATIONS: "configurations-validation.json"}
+SERVE_ACTION = 'serve'
+SERVE_STDIO_ACTION = 'serve-stdio'
+USAGE = "Usage: <action> <hosts_file> <services_file>\n" \
+        "       {0} <socket_file>\n" \
+        "       {1}\n" \
+        "Possible actions are: {2}\n".format(SERVE_ACTION, SERVE_STDIO_ACTION, str(ALL_ACTIONS))
 
 SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 STACK_ADVISOR_PATH_TEMPLATE = os.path.join(SCRIPT_DIRECTORY, '../stacks/stack_advisor.py')
@@ -45,6 +59,15 @@ STACK_ADVISOR_IMPL_CLASS_TEMPLATE = '{0}{1}StackAdvisor'
 ADVISOR_CONTEXT = "advisor_context"
 CALL_TYPE = "call_type"
 
+# When set, the CLI hands requests over to a warm worker listening on this unix socket
+# (see serve()) and only falls back to running the advisor in-process if it cannot connect.
+STACK_ADVISOR_SOCKET_ENV = "AMBARI_STACK_ADVISOR_SOCKET"
+WORKER_CONNECT_TIMEOUT = 5
+# name of the logger set up by resource_management.core.logger.Logger, which advisors log to
+RESOURCE_MANAGEMENT_LOGGER = "resource_management"
+
+# stacks/stack_advisor.py as loaded by loadDefaultStackAdvisorModule(), (signature, module)
+DEFAULT_STACK_ADVISOR_MODULE = None
 
 
 class StackAdvisorException(Exception):
@@ -71,6 +94,14 @@ def dumpJson(json_object, dump_file):
 def main(argv=None):
   args = argv[1:]
 
+  if len(args) == 2 and args[0] == SERVE_ACTION:
+    serve(args[1])
+    return
+
+  if len(args) == 1 and args[0] == SERVE_STDIO_ACTION:
+    serveStdio()
+    return
+
   if len(args) < 3:
     sys.stderr.write(USAGE)
     sys.exit(2)
@@ -83,10 +114,39 @@ def main(argv=None):
   hostsFile = args[1]
   servicesFile = args[2]
 
+  socket_file = os.environ.get(STACK_ADVISOR_SOCKET_ENV)
+  if socket_file:
+    response = delegateToWorker(socket_file, action, loadJson(hostsFile), loadJson(servicesFile))
+    if response is not None:
+      sys.stdout.write(response.get("stdout", ""))
+      sys.stderr.write(response.get("stderr", ""))
+      if response["exit_code"] == 0:
+        dumpJson(response["result"], getResultFile(action, hostsFile))
+      sys.exit(response["exit_code"])
+
+  performAction(action, hostsFile, servicesFile)
+
+
+def getResultFile(action, hostsFile):
+  """Results are written next to the hosts file, into the file the server reads for the action"""
+  actionDir = os.path.realpath(os.path.dirname(hostsFile))
+  return os.path.join(actionDir, RESULT_FILES[action])
+
+
+def performAction(action, hostsFile, servicesFile, stackAdvisorFactory=None):
   # Parse hostsFile and servicesFile
   hosts = loadJson(hostsFile)
   services = loadJson(servicesFile)
 
+  result = runAction(action, hosts, services, stackAdvisorFactory)
+  dumpJson(result, getResultFile(action, hostsFile))
+
+
+def runAction(action, hosts, services, stackAdvisorFactory=None):
+  """Runs the action against the parsed hosts and services, returns its result"""
+  if stackAdvisorFactory is None:
+    stackAdvisorFactory = instantiateStackAdvisor
+
   # Instantiate StackAdvisor and call action related method
   stackName = services["Versions"]["stack_name"]
   stackVersion = services["Versions"]["stack_version"]
@@ -95,10 +155,7 @@ def main(argv=None):
   if "stack_hierarchy" in services["Versions"]:
     parentVersions = services["Versions"]["stack_hierarchy"]["stack_versions"]
 
-  stackAdvisor = instantiateStackAdvisor(stackName, stackVersion, parentVersions)
-
-  # Perform action
-  actionDir = os.path.realpath(os.path.dirname(args[1]))
+  stackAdvisor = stackAdvisorFactory(stackName, stackVersion, parentVersions)
 
   # filter
   hosts = stackAdvisor.filterHostMounts(hosts, services)
@@ -106,39 +163,69 @@ def main(argv=None):
   if action == RECOMMEND_COMPONENT_LAYOUT_ACTION:
     services[ADVISOR_CONTEXT] = {CALL_TYPE : 'recommendComponentLayout'}
     result = stackAdvisor.recommendComponentLayout(services, hosts)
-    result_file = os.path.join(actionDir, "component-layout.json")
   elif action == VALIDATE_COMPONENT_LAYOUT_ACTION:
     services[ADVISOR_CONTEXT] = {CALL_TYPE : 'validateComponentLayout'}
     result = stackAdvisor.validateComponentLayout(services, hosts)
-    result_file = os.path.join(actionDir, "component-layout-validation.json")
   elif action == RECOMMEND_CONFIGURATIONS:
     services[ADVISOR_CONTEXT] = {CALL_TYPE : 'recommendConfigurations'}
     result = stackAdvisor.recommendConfigurations(services, hosts)
-    result_file = os.path.join(actionDir, "configurations.json")
   elif action == RECOMMEND_CONFIGURATION_DEPENDENCIES:
     services[ADVISOR_CONTEXT] = {CALL_TYPE : 'recommendConfigurationDependencies'}
     result = stackAdvisor.recommendConfigurationDependencies(services, hosts)
-    result_file = os.path.join(actionDir, "configurations.json")
   else:  # action == VALIDATE_CONFIGURATIONS
     services[ADVISOR_CONTEXT] = {CALL_TYPE: 'validateConfigurations'}
     result = stackAdvisor.validateConfigurations(services, hosts)
-    result_file = os.path.join(actionDir, "configurations-validation.json")
 
-  dumpJson(result, result_file)
+  return result
 
 
 def instantiateStackAdvisor(stackName, stackVersion, parentVersions):
   """Instantiates StackAdvisor implementation for the specified Stack"""
+  try:
+    clazz = loadStackAdvisorClass(stackName, stackVersion, parentVersions)
+    print "Returning " + clazz.__name__ + " implementation"
+    return clazz()
+  except Exception as e:
+    traceback.print_exc()
+    print "Returning default implementation"
+    return loadDefaultStackAdvisorModule().DefaultStackAdvisor()
+
+
+def loadDefaultStackAdvisorModule():
+  """
+  Loads stacks/stack_advisor.py once and reuses the module afterwards, so that state kept
+  in its globals (such as loaded service advisors) survives between requests of a worker.
+  The module is only executed again once the file itself changes.
+  """
   import imp
+  global DEFAULT_STACK_ADVISOR_MODULE
+
+  signature = getFilesSignature([STACK_ADVISOR_PATH_TEMPLATE])
+  if DEFAULT_STACK_ADVISOR_MODULE is None or DEFAULT_STACK_ADVISOR_MODULE[0] != signature:
+    with open(STACK_ADVISOR_PATH_TEMPLATE, 'rb') as fp:
+      module = imp.load_module('stack_advisor', fp, STACK_ADVISOR_PATH_TEMPLATE, ('.py', 'rb', imp.PY_SOURCE))
+    DEFAULT_STACK_ADVISOR_MODULE = (signature, module)
+
+  # stack advisor implementations import DefaultStackAdvisor from 'stack_advisor'
+  sys.modules['stack_advisor'] = DEFAULT_STACK_ADVISOR_MODULE[1]
+  return DEFAULT_STACK_ADVISOR_MODULE[1]
+
 
-  with open(STACK_ADVISOR_PATH_TEMPLATE, 'rb') as fp:
-    default_stack_advisor = imp.load_module('stack_advisor', fp, STACK_ADVISOR_PATH_TEMPLATE, ('.py', 'rb', imp.PY_SOURCE))
+def loadStackAdvisorClass(stackName, stackVersion, parentVersions):
+  """Loads the StackAdvisor class for the specified Stack, walking the whole version hierarchy"""
+  import imp
+
+  default_stack_advisor = loadDefaultStackAdvisorModule()
   className = STACK_ADVISOR_DEFAULT_IMPL_CLASS
   stack_advisor = default_stack_advisor
 
   versions = [stackVersion]
   versions.extend(parentVersions)
 
+  # every hierarchy is executed into a module of its own, so that classes of
+  # different stacks cached by a long-lived worker never share globals
+  sys.modules.pop('stack_advisor_impl', None)
+
   for version in reversed(versions):
     try:
       path = STACK_ADVISOR_IMPL_PATH_TEMPLATE.format(stackName, version)
@@ -152,14 +239,235 @@ def instantiateStackAdvisor(stackName, stackVersion, parentVersions):
       traceback.print_exc()
       print "StackAdvisor implementation for stack {0}, version {1} was not found".format(stackName, version)
 
+  return getattr(stack_advisor, className)
+
+
+def getStackAdvisorFiles(stackName, stackVersion, parentVersions):
+  """Returns all files the StackAdvisor for the specified Stack may be loaded from"""
+  files = [STACK_ADVISOR_PATH_TEMPLATE]
+  for version in [stackVersion] + list(parentVersions):
+    files.append(STACK_ADVISOR_IMPL_PATH_TEMPLATE.format(stackName, version))
+  return files
+
+
+def getFilesSignature(files):
+  """Returns (path, mtime, size) for every file, None values are used for missing files"""
+  signature = []
+  for path in files:
+    try:
+      stat = os.stat(path)
+      signature.append((path, stat.st_mtime, stat.st_size))
+    except OSError:
+      signature.append((path, None, None))
+  return tuple(signature)
+
+
+class StackAdvisorCache(object):
+  """
+  Keeps loaded StackAdvisor classes per stack name, version and hierarchy.
+  An entry is reloaded as soon as any of the files it was loaded from changes,
+  appears or disappears. A fresh StackAdvisor instance is returned on every call,
+  so no request state is shared between calls.
+  """
+
+  def __init__(self):
+    self.classes = {}
+    self.lock = threading.RLock()
+
+  def instantiateStackAdvisor(self, stackName, stackVersion, parentVersions):
+    key = (stackName, stackVersion, tuple(parentVersions))
+    signature = getFilesSignature(getStackAdvisorFiles(stackName, stackVersion, parentVersions))
+
+    with self.lock:
+      cached = self.classes.get(key)
+      if cached is None or cached[0] != signature:
+        try:
+          clazz = loadStackAdvisorClass(stackName, stackVersion, parentVersions)
+        except Exception:
+          traceback.print_exc()
+          print "Returning default implementation"
+          clazz = loadDefaultStackAdvisorModule().DefaultStackAdvisor
+        self.classes[key] = cached = (signature, clazz)
+
+    print "Returning " + cached[1].__name__ + " implementation"
+    return cached[1]()
+
+  def invalidate(self):
+    with self.lock:
+      self.classes.clear()
+
+
+def delegateToWorker(socket_file, action, hosts, services):
+  """
+  Passes the request, along with the parsed hosts and services, to a warm worker started
+  by serve(). Returns the worker response, or None if no worker is reachable and the request
+  has to be processed in-process.
+  """
+  if not os.path.exists(socket_file):
+    return None
+
+  request = {"action": action,
+             "hosts": hosts,
+             "services": services}
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
   try:
-    clazz = getattr(stack_advisor, className)
-    print "Returning " + className + " implementation"
-    return clazz()
-  except Exception as e:
-    traceback.print_exc()
-    print "Returning default implementation"
-    return default_stack_advisor.DefaultStackAdvisor()
+    try:
+      sock.settimeout(WORKER_CONNECT_TIMEOUT)
+      sock.connect(socket_file)
+      # the advisor itself may legitimately take long on big clusters
+      sock.settimeout(None)
+      sock.sendall(json.dumps(request) + "\n")
+      response = readLine(sock)
+    except socket.error as err:
+      sys.stderr.write("Stack advisor worker at {0} is not available: {1}\n".format(socket_file, str(err)))
+      return None
+  finally:
+    sock.close()
+
+  if not response:
+    return None
+  return json.loads(response)
+
+
+def readLine(sock):
+  chunks = []
+  while True:
+    data = sock.recv(65536)
+    if not data:
+      break
+    chunks.append(data)
+    if data.endswith("\n"):
+      break
+  return "".join(chunks)
+
+
+def redirectLoggerStreams(streams):
+  """
+  The handlers of the resource_management logger write to the sys.stdout and sys.stderr
+  current when the first advisor initialized it. Points the handlers writing to one of
+  the streams keys to the matching value instead.
+  """
+  for handler in logging.getLogger(RESOURCE_MANAGEMENT_LOGGER).handlers:
+    if isinstance(handler, logging.StreamHandler) and handler.stream in streams:
+      handler.stream = streams[handler.stream]
+
+
+def handleWorkerRequest(request, cache):
+  """
+  Processes a single request received by the worker, mirroring the CLI exit codes.
+  The result is returned in the response along with the name of the file the CLI
+  would have written it to.
+  """
+  out, err = StringIO(), StringIO()
+  old_out, old_err = sys.stdout, sys.stderr
+  sys.stdout, sys.stderr = out, err
+  redirectLoggerStreams({old_out: out, old_err: err})
+  exit_code = 0
+  result = None
+  try:
+    try:
+      if request.get("action") not in ALL_ACTIONS:
+        sys.stderr.write(USAGE)
+        exit_code = 2
+      else:
+        result = runAction(request["action"], request["hosts"], request["services"],
+                           stackAdvisorFactory=cache.instantiateStackAdvisor)
+    except StackAdvisorException as stack_exception:
+      traceback.print_exc()
+      print "Error occured in stack advisor.\nError details: {0}".format(str(stack_exception))
+      exit_code = 1
+    except Exception as e:
+      traceback.print_exc()
+      print "Error occured in stack advisor.\nError details: {0}".format(str(e))
+      exit_code = 2
+  finally:
+    sys.stdout, sys.stderr = old_out, old_err
+    redirectLoggerStreams({out: old_out, err: old_err})
+
+  return {"exit_code": exit_code, "stdout": out.getvalue(), "stderr": err.getvalue(),
+          "result": result, "result_file": RESULT_FILES.get(request.get("action"))}
+
+
+def serve(socket_file, cache=None, stop_event=None):
+  """
+  Runs a long-lived stack advisor worker on a local unix socket.
+  Requests are processed one at a time, since advisors are not thread-safe,
+  while loaded StackAdvisor classes stay cached between requests.
+  """
+  if cache is None:
+    cache = StackAdvisorCache()
+
+  if os.path.exists(socket_file):
+    os.remove(socket_file)
+
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  # the socket file is created by bind(), make sure it is never accessible to other users
+  old_umask = os.umask(0177)
+  try:
+    server.bind(socket_file)
+  finally:
+    os.umask(old_umask)
+  server.listen(16)
+  server.settimeout(1)
+  try:
+    while stop_event is None or not stop_event.is_set():
+      try:
+        conn, _ = server.accept()
+      except socket.timeout:
+        continue
+
+      try:
+        conn.settimeout(None)
+        line = readLine(conn)
+        if line:
+          response = handleWorkerRequest(json.loads(line), cache)
+          conn.sendall(json.dumps(response) + "\n")
+      except Exception:
+        traceback.print_exc()
+      finally:
+        conn.close()
+  finally:
+    server.close()
+    if os.path.exists(socket_file):
+      os.remove(socket_file)
+
+
+def serveStdio(cache=None):
+  """
+  Runs a long-lived stack advisor worker reading requests from stdin and writing responses
+  to stdout, which is how Ambari Server talks to the worker it starts.
+  """
+  # keep the original stdout for responses only, whatever advisors write to
+  # the stdout file descriptor directly ends up in stderr instead
+  responses = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+  os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+  serveStream(sys.stdin, responses, cache)
+
+
+def serveStream(requests, responses, cache=None):
+  """
+  Processes requests read from the stream until it is closed, one JSON document per line.
+  Every request gets exactly one response line, in order.
+  """
+  if cache is None:
+    cache = StackAdvisorCache()
+
+  while True:
+    line = requests.readline()
+    if not line:
+      break
+    if not line.strip():
+      continue
+
+    try:
+      request = json.loads(line)
+    except ValueError as err:
+      response = {"exit_code": 2, "stdout": "", "stderr": "Malformed request: {0}\n".format(str(err)),
+                  "result": None, "result_file": None}
+    else:
+      response = handleWorkerRequest(request, cache)
+    responses.write(json.dumps(response) + "\n")
+    responses.flush()
 
 
 if __name__ == '__main__':
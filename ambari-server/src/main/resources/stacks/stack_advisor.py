@@ -24,6 +24,7 @@ import random
 import re
 import socket
 import string
+import sys
 import traceback
 from math import ceil, floor
 from urlparse import urlparse
@@ -33,6 +34,29 @@ from resource_management.libraries.functions.data_structure_utils import get_fro
 from resource_management.core.exceptions import Fail
 from resource_management.core.logger import Logger
 
+# Service advisor modules loaded so far, path -> ((mtime, size), module).
+# Lets a long-lived stack advisor worker skip re-compiling unchanged service advisors.
+SERVICE_ADVISOR_MODULES = {}
+
+
+def load_service_advisor_module(path):
+  """
+  Loads the service advisor module at the given path, reusing the already loaded one
+  unless the file has changed since.
+  """
+  stat = os.stat(path)
+  signature = (stat.st_mtime, stat.st_size)
+  cached = SERVICE_ADVISOR_MODULES.get(path)
+  if cached is not None and cached[0] == signature:
+    return cached[1]
+
+  # load every service advisor into a module of its own, so cached modules never share globals
+  sys.modules.pop('service_advisor_impl', None)
+  with open(path, 'rb') as fp:
+    service_advisor = imp.load_module('service_advisor_impl', fp, path, ('.py', 'rb', imp.PY_SOURCE))
+  SERVICE_ADVISOR_MODULES[path] = (signature, service_advisor)
+  return service_advisor
+
 
 class StackAdvisor(object):
   """
@@ -558,25 +582,24 @@ class DefaultStackAdvisor(StackAdvisor):
 
     if path is not None and os.path.exists(path) and class_name is not None:
       try:
-        with open(path, 'rb') as fp:
-          service_advisor = imp.load_module('service_advisor_impl', fp, path, ('.py', 'rb', imp.PY_SOURCE))
-
-          # Find the class name by reading from all of the available attributes of the python file.
-          attributes = dir(service_advisor)
-          best_class_name = class_name
-          for potential_class_name in attributes:
-            if not potential_class_name.startswith("__"):
-              m = class_name_pattern.match(potential_class_name)
-              if m:
-                best_class_name = potential_class_name
-                break
-
-          if hasattr(service_advisor, best_class_name):
-            Logger.info("ServiceAdvisor implementation for service {0} was loaded".format(service_name))
-            return getattr(service_advisor, best_class_name)()
-          else:
-            Logger.error("Failed to load or create ServiceAdvisor implementation for service {0}: " \
-                  "Expecting class name {1} but it was not found.".format(service_name, best_class_name))
+        service_advisor = load_service_advisor_module(path)
+
+        # Find the class name by reading from all of the available attributes of the python file.
+        attributes = dir(service_advisor)
+        best_class_name = class_name
+        for potential_class_name in attributes:
+          if not potential_class_name.startswith("__"):
+            m = class_name_pattern.match(potential_class_name)
+            if m:
+              best_class_name = potential_class_name
+              break
+
+        if hasattr(service_advisor, best_class_name):
+          Logger.info("ServiceAdvisor implementation for service {0} was loaded".format(service_name))
+          return getattr(service_advisor, best_class_name)()
+        else:
+          Logger.error("Failed to load or create ServiceAdvisor implementation for service {0}: " \
+                "Expecting class name {1} but it was not found.".format(service_name, best_class_name))
       except Exception as e:
         traceback.print_exc()
         Logger.error("Failed to load or create ServiceAdvisor implementation for service {0}".format(service_name))
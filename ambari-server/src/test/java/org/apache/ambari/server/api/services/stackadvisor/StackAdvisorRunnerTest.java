@@ -19,15 +19,22 @@
 package org.apache.ambari.server.api.services.stackadvisor;
 
 import static org.easymock.EasyMock.expect;
+import static org.junit.Assert.assertEquals;
+import static org.junit.Assert.assertTrue;
 import static org.junit.Assert.fail;
 import static org.powermock.api.easymock.PowerMock.createNiceMock;
 import static org.powermock.api.easymock.PowerMock.replay;
+import static org.powermock.api.easymock.PowerMock.verify;
 import static org.powermock.api.support.membermodification.MemberModifier.stub;
 
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
 import java.io.File;
 import java.io.IOException;
 
 import org.apache.ambari.server.api.services.stackadvisor.commands.StackAdvisorCommandType;
+import org.apache.ambari.server.configuration.Configuration;
+import org.apache.commons.io.FileUtils;
 import org.junit.After;
 import org.junit.Before;
 import org.junit.Test;
@@ -126,4 +133,67 @@ public class StackAdvisorRunnerTest {
     }
   }
 
+  @Test
+  public void testRunScript_worker_writesResult() throws Exception {
+    String script = "echo";
+    StackAdvisorCommandType saCommandType = StackAdvisorCommandType.RECOMMEND_COMPONENT_LAYOUT;
+    File actionDirectory = temp.newFolder("actionDir");
+    FileUtils.writeStringToFile(new File(actionDirectory, "hosts.json"), "{\"items\": []}");
+    FileUtils.writeStringToFile(new File(actionDirectory, "services.json"), "{\"services\": []}");
+    Configuration configuration = createNiceMock(Configuration.class);
+    ProcessBuilder processBuilder = createNiceMock(ProcessBuilder.class);
+    Process process = createNiceMock(Process.class);
+    ByteArrayOutputStream requests = new ByteArrayOutputStream();
+    String response = "{\"exit_code\": 0, \"stdout\": \"Returning DefaultStackAdvisor implementation\", "
+        + "\"stderr\": \"\", \"result\": {\"resources\": []}, \"result_file\": \"component-layout.json\"}\n";
+
+    stub(PowerMock.method(StackAdvisorRunner.class, "prepareWorkerCommand"))
+        .toReturn(processBuilder);
+    expect(configuration.isStackAdvisorWorkerEnabled()).andReturn(true);
+    expect(processBuilder.start()).andReturn(process).once();
+    expect(process.getOutputStream()).andReturn(requests);
+    expect(process.getInputStream()).andReturn(new ByteArrayInputStream(response.getBytes("UTF-8")));
+    replay(configuration, processBuilder, process);
+
+    StackAdvisorRunner saRunner = new StackAdvisorRunner(configuration);
+    saRunner.runScript(script, saCommandType, actionDirectory);
+
+    verify(processBuilder);
+    String request = requests.toString("UTF-8");
+    assertTrue(request.contains("\"action\":\"recommend-component-layout\""));
+    assertTrue(request.contains("\"hosts\":{\"items\":[]}"));
+    assertEquals("{\"resources\":[]}",
+        FileUtils.readFileToString(new File(actionDirectory, "component-layout.json")));
+    assertEquals("Returning DefaultStackAdvisor implementation",
+        FileUtils.readFileToString(new File(actionDirectory, "stackadvisor.out")));
+  }
+
+  @Test
+  public void testRunScript_workerFails_runsScript() throws Exception {
+    String script = "echo";
+    StackAdvisorCommandType saCommandType = StackAdvisorCommandType.RECOMMEND_COMPONENT_LAYOUT;
+    File actionDirectory = temp.newFolder("actionDir");
+    FileUtils.writeStringToFile(new File(actionDirectory, "hosts.json"), "{\"items\": []}");
+    FileUtils.writeStringToFile(new File(actionDirectory, "services.json"), "{\"services\": []}");
+    Configuration configuration = createNiceMock(Configuration.class);
+    ProcessBuilder workerBuilder = createNiceMock(ProcessBuilder.class);
+    ProcessBuilder processBuilder = createNiceMock(ProcessBuilder.class);
+    Process process = createNiceMock(Process.class);
+
+    stub(PowerMock.method(StackAdvisorRunner.class, "prepareWorkerCommand"))
+        .toReturn(workerBuilder);
+    stub(PowerMock.method(StackAdvisorRunner.class, "prepareShellCommand"))
+        .toReturn(processBuilder);
+    expect(configuration.isStackAdvisorWorkerEnabled()).andReturn(true);
+    expect(workerBuilder.start()).andThrow(new IOException());
+    expect(processBuilder.start()).andReturn(process).once();
+    expect(process.waitFor()).andReturn(0);
+    replay(configuration, workerBuilder, processBuilder, process);
+
+    StackAdvisorRunner saRunner = new StackAdvisorRunner(configuration);
+    saRunner.runScript(script, saCommandType, actionDirectory);
+
+    verify(processBuilder);
+  }
+
 }
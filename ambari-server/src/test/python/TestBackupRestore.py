@@ -22,6 +22,9 @@ import unittest
 import os
 os.environ["ROOT"] = ""
 
+import shutil
+import tempfile
+import zipfile
 import mock
 from mock.mock import MagicMock, patch
 from ambari_server import BackupRestore
@@ -77,20 +80,132 @@ class TestBKRestore(unittest.TestCase):
       self.assertTrue(True)
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+  @patch.object(BackupRestore, "LARGE_FILE_SIZE", new=100)
+  def test_incremental_backup_and_restore(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      state_dir = os.path.join(tmp_dir, "state")
+      backup_dir = os.path.join(tmp_dir, "backups") + os.sep
+      os.makedirs(os.path.join(state_dir, "sub"))
+      os.makedirs(backup_dir)
+      files = {
+        os.path.join(state_dir, "small"): "small content",
+        os.path.join(state_dir, "sub", "large"): "large content " * 100,
+        os.path.join(state_dir, "sub", "changed"): "before",
+      }
+      for path, content in files.iteritems():
+        with open(path, 'w') as f:
+          f.write(content)
+
+      BackupRestore.BackupRestore([state_dir], "full.zip", backup_dir).perform_backup()
+
+      full = zipfile.ZipFile(backup_dir + "full.zip")
+      self.assertEqual(None, full.testzip())
+      self.assertEqual(3, len(full.namelist()))
+      full.close()
+      # large files are compressed to part archives
+      part = zipfile.ZipFile(backup_dir + "full.zip.part1")
+      self.assertEqual(None, part.testzip())
+      self.assertEqual(files[os.path.join(state_dir, "sub", "large")],
+                       part.read(BackupRestore.get_arcname(os.path.join(state_dir, "sub", "large"))))
+      part.close()
+
+      files[os.path.join(state_dir, "sub", "changed")] = "after, with a new size"
+      with open(os.path.join(state_dir, "sub", "changed"), 'w') as f:
+        f.write(files[os.path.join(state_dir, "sub", "changed")])
+
+      BackupRestore.BackupRestore([state_dir], "incremental.zip", backup_dir).perform_backup(incremental=True)
+
+      incremental = zipfile.ZipFile(backup_dir + "incremental.zip")
+      self.assertEqual(sorted([BackupRestore.get_arcname(os.path.join(state_dir, "sub", "changed")),
+                               BackupRestore.MANIFEST_NAME]), sorted(incremental.namelist()))
+      incremental.close()
+
+      manifest = BackupRestore.load_manifest(os.path.join(backup_dir, BackupRestore.MANIFEST_NAME))
+      self.assertEqual("full.zip", manifest['files'][os.path.join(state_dir, "small")]['archive'])
+      self.assertEqual("full.zip.part1", manifest['files'][os.path.join(state_dir, "sub", "large")]['archive'])
+      self.assertEqual("incremental.zip", manifest['files'][os.path.join(state_dir, "sub", "changed")]['archive'])
+
+      restore_dir = os.path.join(tmp_dir, "restore")
+      manifest = BackupRestore.read_archive_manifest(backup_dir + "incremental.zip")
+      BackupRestore.restore_from_manifest(backup_dir, "incremental.zip", manifest, restore_dir)
+
+      for path, content in files.iteritems():
+        with open(os.path.join(restore_dir, BackupRestore.get_arcname(path))) as f:
+          self.assertEqual(content, f.read())
+
+      # the archives an incremental backup depends on are required
+      os.remove(backup_dir + "full.zip")
+      try:
+        BackupRestore.restore_from_manifest(backup_dir, "incremental.zip", manifest, restore_dir)
+        self.fail("should throw exception")
+      except Exception, e:
+        self.assertTrue("full.zip" in str(e))
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  @patch.object(BackupRestore, "LARGE_FILE_SIZE", new=100)
+  @patch.object(BackupRestore, "DEFAULT_POOL_SIZE", new=2)
+  def test_backup_parts_renamed(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      state_dir = os.path.join(tmp_dir, "state")
+      backup_dir = os.path.join(tmp_dir, "backups") + os.sep
+      os.makedirs(state_dir)
+      os.makedirs(backup_dir)
+      files = dict((os.path.join(state_dir, "large{0}".format(i)), "large content {0} ".format(i) * (20 + i))
+                   for i in range(5))
+      files[os.path.join(state_dir, "small")] = "small content"
+      for path, content in files.iteritems():
+        with open(path, 'w') as f:
+          f.write(content)
+
+      BackupRestore.BackupRestore([state_dir], "backup.zip", backup_dir).perform_backup()
+      # one part per worker
+      self.assertEqual(sorted(["backup.zip", "backup.zip.part1", "backup.zip.part2", BackupRestore.MANIFEST_NAME]),
+                       sorted(os.listdir(backup_dir)))
+
+      # the parts follow the archive when it is renamed
+      for name in ["backup.zip", "backup.zip.part1", "backup.zip.part2"]:
+        os.rename(backup_dir + name, backup_dir + name.replace("backup", "renamed"))
+      restore_dir = os.path.join(tmp_dir, "restore")
+      manifest = BackupRestore.read_archive_manifest(backup_dir + "renamed.zip")
+      BackupRestore.restore_from_manifest(backup_dir, "renamed.zip", manifest, restore_dir)
+
+      for path, content in files.iteritems():
+        with open(os.path.join(restore_dir, BackupRestore.get_arcname(path))) as f:
+          self.assertEqual(content, f.read())
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def test_incremental_backup_same_archive_name(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      state_dir = os.path.join(tmp_dir, "state")
+      backup_dir = os.path.join(tmp_dir, "backups") + os.sep
+      os.makedirs(state_dir)
+      os.makedirs(backup_dir)
+      with open(os.path.join(state_dir, "unchanged"), 'w') as f:
+        f.write("unchanged")
+
+      BackupRestore.BackupRestore([state_dir], "backup.zip", backup_dir).perform_backup(incremental=True)
+      with open(os.path.join(state_dir, "added"), 'w') as f:
+        f.write("added")
+
+      # the first archive is still needed, the second backup gets a name of its own
+      backup_restore = BackupRestore.BackupRestore([state_dir], "backup.zip", backup_dir)
+      backup_restore.perform_backup(incremental=True)
+      self.assertNotEqual("backup.zip", backup_restore.zipname)
+      self.assertTrue(backup_restore.zipname.startswith("backup-"))
+      self.assertEqual(sorted(["backup.zip", backup_restore.zipname, BackupRestore.MANIFEST_NAME]),
+                       sorted(os.listdir(backup_dir)))
+
+      manifest = BackupRestore.read_archive_manifest(backup_dir + backup_restore.zipname)
+      self.assertEqual("backup.zip", manifest['files'][os.path.join(state_dir, "unchanged")]['archive'])
+      self.assertEqual(backup_restore.zipname, manifest['files'][os.path.join(state_dir, "added")]['archive'])
+
+      self.assertNotEqual(backup_restore.zipname, BackupRestore.get_incremental_zipname(backup_dir,
+                                                                                        backup_restore.zipname))
+      self.assertEqual("other.zip", BackupRestore.get_incremental_zipname(backup_dir, "other.zip"))
+    finally:
+      shutil.rmtree(tmp_dir)
@@ -359,30 +359,6 @@ class TestBootstrap(TestCase):
                      "$SUDO chmod 755 /var/lib/ambari-agent/data ; "
                      "$SUDO chmod 1777 /var/lib/ambari-agent/tmp")
 
-  @patch.object(BootstrapDefault, "getOsCheckScript")
-  @patch.object(BootstrapDefault, "getOsCheckScriptRemoteLocation")
-  @patch.object(SCP, "__init__")
-  @patch.object(SCP, "run")
-  @patch.object(HostLog, "write")
-  def test_copyOsCheckScript(self, write_mock, run_mock, init_mock,
-                    getOsCheckScriptRemoteLocation_mock, getOsCheckScript_mock):
-    shared_state = SharedState("root", "123", "sshkey_file", "scriptDir", "bootdir",
-                               "setupAgentFile", "ambariServer", "centos6",
-                               None, "8440", "root")
-    bootstrap_obj = Bootstrap("hostname", shared_state)
-    getOsCheckScript_mock.return_value = "OsCheckScript"
-    getOsCheckScriptRemoteLocation_mock.return_value = "OsCheckScriptRemoteLocation"
-    expected = 42
-    init_mock.return_value = None
-    run_mock.return_value = expected
-    res = bootstrap_obj.copyOsCheckScript()
-    self.assertEquals(res, expected)
-    input_file = str(init_mock.call_args[0][4])
-    remote_file = str(init_mock.call_args[0][5])
-    self.assertEqual(input_file, "OsCheckScript")
-    self.assertEqual(remote_file, "OsCheckScriptRemoteLocation")
-
-
   @patch.object(BootstrapDefault, "getRemoteName")
   @patch.object(BootstrapDefault, "hasPassword")
   @patch.object(OSCheck, "is_suse_family")
@@ -412,31 +388,13 @@ class TestBootstrap(TestCase):
   @patch.object(OSCheck, "is_ubuntu_family")
   @patch.object(OSCheck, "is_redhat_family")
   @patch.object(BootstrapDefault, "getMoveRepoFileCommand")
-  @patch.object(BootstrapDefault, "getRepoDir")
   @patch.object(BootstrapDefault, "getRepoFile")
-  @patch.object(BootstrapDefault, "getRemoteName")
-  @patch.object(SCP, "__init__")
-  @patch.object(SCP, "run")
   @patch.object(SSH, "__init__")
   @patch.object(SSH, "run")
   @patch.object(HostLog, "write")
-  def test_copyNeededFiles(self, write_mock, ssh_run_mock, ssh_init_mock,
-                           scp_run_mock, scp_init_mock,
-                           getRemoteName_mock, getRepoFile_mock, getRepoDir,
+  def test_installRepoFile(self, write_mock, ssh_run_mock, ssh_init_mock, getRepoFile_mock,
                            getMoveRepoFileCommand, is_redhat_family, is_ubuntu_family, is_suse_family,
                            os_path_exists_mock):
-    #
-    # Ambari repo file exists
-    #
-    def os_path_exists_side_effect(*args, **kwargs):
-      if args[0] == getRepoFile_mock():
-        return True
-      else:
-        return False
-
-    os_path_exists_mock.side_effect = os_path_exists_side_effect
-    os_path_exists_mock.return_value = None
-
     shared_state = SharedState("root", "123", "sshkey_file", "scriptDir", "bootdir",
                                "setupAgentFile", "ambariServer", "centos6",
                                None, "8440", "root")
@@ -445,61 +403,138 @@ class TestBootstrap(TestCase):
     is_suse_family.return_value = False
     bootstrap_obj = Bootstrap("hostname", shared_state)
     getMoveRepoFileCommand.return_value = "MoveRepoFileCommand"
-    getRepoDir.return_value  = "RepoDir"
-    getRemoteName_mock.return_value = "RemoteName"
     getRepoFile_mock.return_value = "RepoFile"
-    expected1 = {"exitstatus": 42, "log": "log42", "errormsg": "errorMsg"}
-    expected2 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    expected3 = {"exitstatus": 1, "log": "log1", "errormsg": "errorMsg"}
-    expected4 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    scp_init_mock.return_value = None
+    os_path_exists_mock.return_value = True
+    expected = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
     ssh_init_mock.return_value = None
-    # Testing max retcode return
-    scp_run_mock.side_effect = [expected1, expected3]
-    ssh_run_mock.side_effect = [expected2, expected4]
-    res = bootstrap_obj.copyNeededFiles()
-    self.assertEquals(res, expected1["exitstatus"])
-    input_file = str(scp_init_mock.call_args[0][4])
-    remote_file = str(scp_init_mock.call_args[0][5])
-    self.assertEqual(input_file, "setupAgentFile")
-    self.assertEqual(remote_file, "RemoteName")
+    ssh_run_mock.return_value = expected
+    res = bootstrap_obj.installRepoFile()
+    self.assertEquals(res, expected)
+    # moving and chmod are done in a single remote command
+    self.assertEquals(ssh_run_mock.call_count, 1)
     command = str(ssh_init_mock.call_args[0][4])
-    self.assertEqual(command, "/var/lib/ambari-agent/tmp/ambari-sudo.sh chmod 644 RepoFile")
-    # Another order
-    expected1 = {"exitstatus": 0, "log": "log0", "errormsg": "errorMsg"}
-    expected2 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    expected3 = {"exitstatus": 1, "log": "log1", "errormsg": "errorMsg"}
-    expected4 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    scp_run_mock.side_effect = [expected1, expected3]
-    ssh_run_mock.side_effect = [expected2, expected4]
-    res = bootstrap_obj.copyNeededFiles()
-    self.assertEquals(res, expected2["exitstatus"])
-    # yet another order
-    expected1 = {"exitstatus": 33, "log": "log33", "errormsg": "errorMsg"}
-    expected2 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    expected3 = {"exitstatus": 42, "log": "log42", "errormsg": "errorMsg"}
-    expected4 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    scp_run_mock.side_effect = [expected1, expected3]
-    ssh_run_mock.side_effect = [expected2, expected4]
-    res = bootstrap_obj.copyNeededFiles()
-    self.assertEquals(res, expected3["exitstatus"])
-
-    #
-    #Ambari repo file does not exist
-    #
-    os_path_exists_mock.side_effect = None
-    os_path_exists_mock.return_value = False
+    self.assertEqual(command, "MoveRepoFileCommand && /var/lib/ambari-agent/tmp/ambari-sudo.sh chmod 644 RepoFile")
 
-    #Expectations:
-    # SSH will not be called at all
-    # SCP will be called once for copying the setup script file
-    scp_run_mock.reset_mock()
+    # apt cache is updated on ubuntu
+    is_ubuntu_family.return_value = True
+    bootstrap_obj.installRepoFile()
+    command = str(ssh_init_mock.call_args[0][4])
+    self.assertTrue(command.startswith("MoveRepoFileCommand && /var/lib/ambari-agent/tmp/ambari-sudo.sh chmod 644 RepoFile && "))
+    self.assertTrue("apt-get update" in command)
+
+    # Ambari repo file does not exist, it is not an error
     ssh_run_mock.reset_mock()
-    expectedResult = {"exitstatus": 33, "log": "log33", "errormsg": "errorMsg"}
-    scp_run_mock.side_effect = [expectedResult]
-    res = bootstrap_obj.copyNeededFiles()
+    os_path_exists_mock.return_value = False
+    res = bootstrap_obj.installRepoFile()
     self.assertFalse(ssh_run_mock.called)
-    self.assertEquals(res, expectedResult["exitstatus"])
+    self.assertEquals(res["exitstatus"], 0)
+
+
+  @patch.object(BootstrapDefault, "getRemoteName")
+  @patch.object(BootstrapDefault, "getOsCheckScript")
+  @patch.object(BootstrapDefault, "getRepoFile")
+  @patch.object(SSH, "__init__")
+  @patch.object(SSH, "run")
+  @patch.object(HostLog, "write")
+  def test_copyBootstrapArchive(self, write_mock, ssh_run_mock, ssh_init_mock,
+                                getRepoFile_mock, getOsCheckScript_mock, getRemoteName_mock):
+    import shutil
+    import tarfile
+    from StringIO import StringIO
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      def create_file(name, content):
+        path = os.path.join(tmp_dir, name)
+        if not os.path.exists(os.path.dirname(path)):
+          os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+          f.write(content)
+        return path
+      ambari_sudo = create_file("ambari-sudo.sh", "sudo")
+      python_wrap = create_file("create-python-wrap.sh", "wrap")
+      create_file("ambari_commons/__init__.py", "commons")
+      create_file("ambari_commons/__init__.pyc", "compiled")
+      getOsCheckScript_mock.return_value = create_file("os_check_type.py", "os check")
+      getRepoFile_mock.return_value = create_file("ambari.repo", "repo")
+      password_file = create_file("host_pass", "secret")
+      setup_agent_file = create_file("setupAgent.py", "setup")
+      getRemoteName_mock.side_effect = lambda name: "/var/lib/ambari-agent/tmp/" + \
+                                                    os.path.splitext(name)[0] + "123" + os.path.splitext(name)[1]
+
+      shared_state = SharedState("root", "123", "sshkey_file", "scriptDir", "bootdir",
+                                 setup_agent_file, "ambariServer", "centos6",
+                                 None, "8440", "root", password_file=password_file)
+      bootstrap_obj = Bootstrap("hostname", shared_state)
+      bootstrap_obj.ambari_commons = os.path.join(tmp_dir, "ambari_commons")
+      expected = {"exitstatus": 0, "log": "log0", "errormsg": "errorMsg"}
+      ssh_init_mock.return_value = None
+      ssh_run_mock.return_value = expected
+
+      with patch("bootstrap.SERVER_AMBARI_SUDO", ambari_sudo):
+        with patch("bootstrap.CREATE_PYTHON_WRAP_SCRIPT", python_wrap):
+          res = bootstrap_obj.copyBootstrapArchive()
+      self.assertEquals(res, expected)
+      # all files are sent with one ssh call
+      self.assertEquals(ssh_run_mock.call_count, 1)
+      self.assertTrue(bootstrap_obj.copied_password_file)
+      command = str(ssh_init_mock.call_args[0][4])
+      self.assertEquals(command, "tar --no-same-owner -xzf - -C /var/lib/ambari-agent/tmp && "
+                                 "chmod 600 /var/lib/ambari-agent/tmp/host_pass123")
+
+      archive = tarfile.open(fileobj=StringIO(ssh_init_mock.call_args[1]["input"]), mode="r:gz")
+      repo_name = os.path.basename(getRemoteName_mock(bootstrap_obj.AMBARI_REPO_FILENAME))
+      self.assertEquals(sorted(archive.getnames()),
+                        sorted(["ambari-sudo.sh", repo_name, "ambari_commons", "ambari_commons/__init__.py",
+                                "create-python-wrap.sh", "host_pass123", "os_check_type123.py", "setupAgent123.py"]))
+      self.assertEquals(archive.getmember("host_pass123").mode, 0600)
+      self.assertEquals(archive.extractfile("setupAgent123.py").read(), "setup")
+    finally:
+      shutil.rmtree(tmp_dir)
+
+
+  @patch("subprocess.call")
+  @patch.object(HostLog, "write")
+  def test_openControlMaster(self, write_mock, call_mock):
+    import shutil
+    tmp_dir = tempfile.mkdtemp()
+    shared_state = SharedState("root", "123", "sshkey_file", "scriptDir", tmp_dir,
+                               "setupAgentFile", "ambariServer", "centos6",
+                               None, "8440", "root")
+    bootstrap_obj = Bootstrap("hostname", shared_state)
+    call_mock.return_value = 255
+    # failing to open the master connection does not fail the bootstrap
+    res = bootstrap_obj.openControlMaster()
+    self.assertEquals(res["exitstatus"], 0)
+    command = call_mock.call_args[0][0]
+    self.assertTrue("ControlMaster=yes" in command)
+    self.assertTrue("ControlPath=" + bootstrap_obj.getControlPath() in command)
+    self.assertEquals(command[-1], "root@hostname")
+
+    # ssh commands are multiplexed once the master connection socket exists
+    self.assertEquals(bootstrap.get_control_options(tmp_dir, "root", "hostname", "123"), [])
+    open(bootstrap_obj.getControlPath(), "w").close()
+    self.assertEquals(bootstrap.get_control_options(tmp_dir, "root", "hostname", "123"),
+                      ["-o", "ControlPath=" + bootstrap_obj.getControlPath()])
+    shutil.rmtree(tmp_dir)
+
+
+  def test_AdaptiveParallelism(self):
+    parallelism = bootstrap.AdaptiveParallelism(initial=20, minimum=5, maximum=22)
+    parallelism.report(None)
+    self.assertEquals(parallelism.limit, 20)
+    # grows while hosts connect fast
+    for i in range(5):
+      parallelism.report(0.5)
+    self.assertEquals(parallelism.limit, 22)
+    # halves when connecting gets slow, but not again until the new limit is exercised
+    parallelism.report(10)
+    self.assertEquals(parallelism.limit, 11)
+    parallelism.report(10)
+    self.assertEquals(parallelism.limit, 11)
+    for i in range(11):
+      parallelism.report(10)
+    self.assertEquals(parallelism.limit, 5)
+
 
   @patch.object(BootstrapDefault, "getOsCheckScriptRemoteLocation")
   @patch.object(SSH, "__init__")
@@ -646,62 +681,6 @@ class TestBootstrap(TestCase):
     self.assertEqual(command, "rm PasswordFile")
 
 
-  @patch.object(BootstrapDefault, "getPasswordFile")
-  @patch.object(SCP, "__init__")
-  @patch.object(SCP, "run")
-  @patch.object(SSH, "__init__")
-  @patch.object(SSH, "run")
-  @patch.object(HostLog, "write")
-  def test_copyPasswordFile(self, write_mock, ssh_run_mock,
-                            ssh_init_mock, scp_run_mock,
-                            scp_init_mock, getPasswordFile_mock):
-    shared_state = SharedState("root", "123", "sshkey_file", "scriptDir", "bootdir",
-                               "setupAgentFile", "ambariServer", "centos6",
-                               None, "8440", "root", password_file="PasswordFile")
-    bootstrap_obj = Bootstrap("hostname", shared_state)
-    getPasswordFile_mock.return_value = "PasswordFile"
-     # Testing max retcode return
-    expected1 = {"exitstatus": 42, "log": "log42", "errormsg": "errorMsg"}
-    expected2 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    scp_init_mock.return_value = None
-    scp_run_mock.return_value = expected1
-    ssh_init_mock.return_value = None
-    ssh_run_mock.return_value = expected2
-    res = bootstrap_obj.copyPasswordFile()
-    self.assertEquals(res, expected1["exitstatus"])
-    input_file = str(scp_init_mock.call_args[0][4])
-    remote_file = str(scp_init_mock.call_args[0][4])
-    self.assertEqual(input_file, "PasswordFile")
-    self.assertEqual(remote_file, "PasswordFile")
-    command = str(ssh_init_mock.call_args[0][4])
-    self.assertEqual(command, "chmod 600 PasswordFile")
-    # Another order
-    expected1 = {"exitstatus": 0, "log": "log0", "errormsg": "errorMsg"}
-    expected2 = {"exitstatus": 17, "log": "log17", "errormsg": "errorMsg"}
-    scp_run_mock.return_value = expected1
-    ssh_run_mock.return_value = expected2
-
-
-  @patch.object(SSH, "__init__")
-  @patch.object(SSH, "run")
-  @patch.object(HostLog, "write")
-  @patch.object(BootstrapDefault, "getPasswordFile")
-  def test_changePasswordFileModeOnHost(self, getPasswordFile_mock, write_mock,
-                                        run_mock, init_mock):
-    shared_state = SharedState("root", "123", "sshkey_file", "scriptDir", "bootdir",
-                               "setupAgentFile", "ambariServer", "centos6",
-                               None, "8440", "root")
-    bootstrap_obj = Bootstrap("hostname", shared_state)
-    expected = 42
-    getPasswordFile_mock.return_value = "PasswordFile"
-    init_mock.return_value = None
-    run_mock.return_value = expected
-    res = bootstrap_obj.changePasswordFileModeOnHost()
-    self.assertEquals(res, expected)
-    command = str(init_mock.call_args[0][4])
-    self.assertEqual(command, "chmod 600 PasswordFile")
-
-
   @patch.object(HostLog, "write")
   def test_try_to_execute(self, write_mock):
     expected = 43
@@ -747,18 +726,20 @@ class TestBootstrap(TestCase):
     hasPassword_mock.return_value = False
     try_to_execute_mock.return_value = {"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}
     bootstrap_obj.run()
-    self.assertEqual(try_to_execute_mock.call_count, 10) # <- Adjust if changed
+    self.assertEqual(try_to_execute_mock.call_count, 9) # <- Adjust if changed
+    self.assertEqual(len(bootstrap_obj.getStatus()["phase_timings"]), 8)
     self.assertTrue(createDoneFile_mock.called)
     self.assertEqual(bootstrap_obj.getStatus()["return_code"], 0)
 
     try_to_execute_mock.reset_mock()
     createDoneFile_mock.reset_mock()
+    del bootstrap_obj.phase_timings[:]
     # Testing workflow with password
     bootstrap_obj.copied_password_file = True
     hasPassword_mock.return_value = True
     try_to_execute_mock.return_value = {"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}
     bootstrap_obj.run()
-    self.assertEqual(try_to_execute_mock.call_count, 13) # <- Adjust if changed
+    self.assertEqual(try_to_execute_mock.call_count, 10) # <- Adjust if changed
     self.assertTrue(createDoneFile_mock.called)
     self.assertEqual(bootstrap_obj.getStatus()["return_code"], 0)
 
@@ -769,10 +750,11 @@ class TestBootstrap(TestCase):
     # Testing workflow when some action failed before copying password
     bootstrap_obj.copied_password_file = False
     hasPassword_mock.return_value = False
-    try_to_execute_mock.side_effect = [{"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}, {"exitstatus": 1, "log":"log1", "errormsg":"errormsg1"}]
+    try_to_execute_mock.side_effect = [{"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}, {"exitstatus": 1, "log":"log1", "errormsg":"errormsg1"}, {"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}]
     bootstrap_obj.run()
-    self.assertEqual(try_to_execute_mock.call_count, 2) # <- Adjust if changed
+    self.assertEqual(try_to_execute_mock.call_count, 3) # <- Adjust if changed
     self.assertTrue("ERROR" in error_mock.call_args[0][0])
+    self.assertTrue("Bootstrap phase timings" in write_mock.call_args_list[0][0][0])
     self.assertTrue("ERROR" in write_mock.call_args[0][0])
     self.assertTrue(createDoneFile_mock.called)
     self.assertEqual(bootstrap_obj.getStatus()["return_code"], 1)
@@ -782,9 +764,9 @@ class TestBootstrap(TestCase):
     # Testing workflow when some action failed after copying password
     bootstrap_obj.copied_password_file = True
     hasPassword_mock.return_value = True
-    try_to_execute_mock.side_effect = [{"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}, {"exitstatus": 42, "log":"log42", "errormsg":"errormsg42"}, {"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}]
+    try_to_execute_mock.side_effect = [{"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}, {"exitstatus": 42, "log":"log42", "errormsg":"errormsg42"}, {"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}, {"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}]
     bootstrap_obj.run()
-    self.assertEqual(try_to_execute_mock.call_count, 3) # <- Adjust if changed
+    self.assertEqual(try_to_execute_mock.call_count, 4) # <- Adjust if changed
     self.assertTrue(createDoneFile_mock.called)
     self.assertEqual(bootstrap_obj.getStatus()["return_code"], 42)
 
@@ -796,12 +778,12 @@ class TestBootstrap(TestCase):
     # removing password failed too
     bootstrap_obj.copied_password_file = True
     hasPassword_mock.return_value = True
-    try_to_execute_mock.side_effect = [{"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}, {"exitstatus": 17, "log":"log17", "errormsg":"errormsg17"}, {"exitstatus": 19, "log":"log19", "errormsg":"errormsg19"}]
+    try_to_execute_mock.side_effect = [{"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}, {"exitstatus": 17, "log":"log17", "errormsg":"errormsg17"}, {"exitstatus": 19, "log":"log19", "errormsg":"errormsg19"}, {"exitstatus": 0, "log":"log0", "errormsg":"errormsg0"}]
     bootstrap_obj.run()
-    self.assertEqual(try_to_execute_mock.call_count, 3) # <- Adjust if changed
-    self.assertTrue("ERROR" in write_mock.call_args_list[0][0][0])
+    self.assertEqual(try_to_execute_mock.call_count, 4) # <- Adjust if changed
+    self.assertTrue("ERROR" in write_mock.call_args_list[1][0][0])
     self.assertTrue("ERROR" in error_mock.call_args[0][0])
-    self.assertTrue("WARNING" in write_mock.call_args_list[1][0][0])
+    self.assertTrue("WARNING" in write_mock.call_args_list[2][0][0])
     self.assertTrue("WARNING" in warn_mock.call_args[0][0])
     self.assertTrue(createDoneFile_mock.called)
     self.assertEqual(bootstrap_obj.getStatus()["return_code"], 17)
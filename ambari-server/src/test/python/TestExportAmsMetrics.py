@@ -0,0 +1,167 @@
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import glob
+import imp
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+from mock.mock import patch, MagicMock
+
+export_ams_metrics_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       '../../main/resources/scripts/export_ams_metrics.py')
+# flask only serves the exported metrics (-a run), the export itself does not use it
+flask_stub = MagicMock()
+flask_restful_stub = MagicMock(Resource=object)
+flask_modules = {'flask': flask_stub, 'flask.ext': flask_stub.ext, 'flask.ext.cors': flask_stub.ext.cors,
+                 'flask_restful': flask_restful_stub}
+# only the stubs are taken out of sys.modules again, unlike patch.dict, which would also drop
+# the modules the script imports
+saved_modules = dict((name, sys.modules[name]) for name in flask_modules if name in sys.modules)
+sys.modules.update(flask_modules)
+try:
+  with open(export_ams_metrics_path, 'rb') as fp:
+    export_ams_metrics = imp.load_module('export_ams_metrics', fp, export_ams_metrics_path,
+                                         ('.py', 'rb', imp.PY_SOURCE))
+finally:
+  for name in flask_modules:
+    del sys.modules[name]
+  sys.modules.update(saved_modules)
+
+START_TIME = 1500000000000
+END_TIME = START_TIME + 3 * 60 * 60 * 1000
+CHUNK_SIZE = 60 * 60 * 1000
+
+
+class CollectorStubHandler(BaseHTTPRequestHandler):
+  """
+  Answers every metrics request with one data point per minute of the requested time range,
+  or with an error for the chunks listed in server.failing_chunks.
+  """
+  protocol_version = "HTTP/1.1"
+
+  def do_GET(self):
+    query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+    metric = query['metricNames'][0]
+    host = query['hostname'][0] if 'hostname' in query else None
+    start_time, end_time = int(query['startTime'][0]), int(query['endTime'][0])
+    self.server.requests.append((metric, host, start_time, end_time))
+
+    if (metric, host, start_time) in self.server.failing_chunks:
+      self.reply(500, "collector unavailable")
+      return
+    points = dict((str(t), float(t - START_TIME) / 60000) for t in range(start_time, end_time, 60000))
+    self.reply(200, json.dumps({"metrics": [{"metricname": metric, "hostname": host, "appid": "HOST",
+                                             "metrics": points}]}))
+
+  def reply(self, code, body):
+    self.send_response(code)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class TestExportAmsMetrics(TestCase):
+
+  def setUp(self):
+    self.server = HTTPServer(("localhost", 0), CollectorStubHandler)
+    self.server.requests = []
+    self.server.failing_chunks = set()
+    self.server_thread = threading.Thread(target=self.server.serve_forever)
+    self.server_thread.daemon = True
+    self.server_thread.start()
+
+    self.tmp_dir = tempfile.mkdtemp()
+    self.metrics_file = os.path.join(self.tmp_dir, "metrics.txt")
+    with open(self.metrics_file, "w") as fp:
+      fp.write("cpu_user\nmem_free\n")
+    self.hosts_file = os.path.join(self.tmp_dir, "hosts.txt")
+    with open(self.hosts_file, "w") as fp:
+      fp.write("host1\nhost2\n")
+
+    export_ams_metrics.logger = logging.getLogger('AmbariMetricsExportTest')
+    export_ams_metrics.logger.addHandler(logging.NullHandler())
+    export_ams_metrics.logger.propagate = False
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+    shutil.rmtree(self.tmp_dir)
+
+  def export(self, *args):
+    argv = ['export_ams_metrics.py', '-a', 'export', '-s', 'localhost', '-p', str(self.server.server_port),
+            '-c', 'HOST', '-m', self.metrics_file, '-f', self.hosts_file, '-b', str(START_TIME),
+            '-e', str(END_TIME), '-t', '2', '-k', str(CHUNK_SIZE / 60000)] + list(args)
+    # Params keeps the parsed metrics and hosts in class attributes
+    with patch.multiple(export_ams_metrics.Params, METRICS=[], HOSTS=[], RESUME=False), \
+         patch.object(export_ams_metrics.Utils, "setup_logger"), \
+         patch("sys.argv", argv):
+      export_ams_metrics.main()
+
+  def read_export(self, export_dir):
+    exported = {}
+    for root, dirs, files in os.walk(export_dir):
+      for f in files:
+        path = os.path.join(root, f)
+        with open(path) as fp:
+          exported[os.path.relpath(path, export_dir)] = json.load(fp)
+    return exported
+
+  def test_resume(self):
+    failing_chunks = set([("cpu_user", "host2", START_TIME + CHUNK_SIZE),
+                          ("mem_free", "host1", START_TIME + 2 * CHUNK_SIZE)])
+    self.server.failing_chunks = failing_chunks
+
+    output_dir = os.path.join(self.tmp_dir, "interrupted")
+    os.mkdir(output_dir)
+    self.assertRaises(SystemExit, self.export, '-o', output_dir)
+    self.assertEqual(12, len(self.server.requests))
+    export_dir, = glob.glob(os.path.join(output_dir, 'ambari_metrics_export_*'))
+    # metrics with all chunks exported are complete, the others are kept in chunks
+    self.assertTrue(os.path.exists(os.path.join(export_dir, "host1", "cpu_user")))
+    self.assertFalse(os.path.exists(os.path.join(export_dir, "host2", "cpu_user")))
+    self.assertTrue(os.path.isdir(os.path.join(export_dir, ".chunks", "host2", "cpu_user")))
+
+    # only the missing chunks are requested again
+    self.server.requests = []
+    self.server.failing_chunks = set()
+    self.export('-o', output_dir, '-u', export_dir)
+    self.assertEqual(failing_chunks, set((metric, host, start_time)
+                                         for metric, host, start_time, end_time in self.server.requests))
+    self.assertEqual(2, len(self.server.requests))
+    self.assertFalse(os.path.exists(os.path.join(export_dir, ".chunks")))
+
+    # and the resumed export is the same as an uninterrupted one
+    complete_dir = os.path.join(self.tmp_dir, "complete")
+    os.mkdir(complete_dir)
+    self.export('-o', complete_dir)
+    resumed = self.read_export(export_dir)
+    self.assertEqual(self.read_export(glob.glob(os.path.join(complete_dir, 'ambari_metrics_export_*'))[0]), resumed)
+    self.assertEqual(5, len(resumed))
+    self.assertEqual(180, len(resumed[os.path.join("host2", "cpu_user")]["metrics"][0]["metrics"]))
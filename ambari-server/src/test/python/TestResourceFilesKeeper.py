@@ -25,6 +25,8 @@ import os
 import logging
 import tempfile
 import pprint
+import shutil
+import zipfile
 from xml.dom import minidom
 
 from unittest import TestCase
@@ -436,11 +438,81 @@ class TestResourceFilesKeeper(TestCase):
     pass
 
 
+  def test_count_hash_sum_incremental(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      test_dir = os.path.join(tmp_dir, ResourceFilesKeeper.PACKAGE_DIR)
+      shutil.copytree(self.DUMMY_UNCHANGEABLE_PACKAGE, test_dir)
+      for f in [ResourceFilesKeeper.HASH_SUM_FILE, ResourceFilesKeeper.ARCHIVE_NAME]:
+        if os.path.exists(os.path.join(test_dir, f)):
+          os.unlink(os.path.join(test_dir, f))
+      resource_files_keeper = ResourceFilesKeeper(self.TEST_RESOURCES_DIR, self.SOME_PATH, incremental=True)
+
+      # the hash is the same as the one counted without manifest
+      hash_sum = resource_files_keeper.count_hash_sum(test_dir)
+      self.assertEquals(hash_sum, self.DUMMY_UNCHANGEABLE_PACKAGE_HASH)
+      self.assertTrue(os.path.isfile(os.path.join(test_dir, ResourceFilesKeeper.MANIFEST_FILE)))
+
+      # unchanged files are not read again
+      real_open = open
+      def open_side_effect(path, *args):
+        if not path.endswith(ResourceFilesKeeper.MANIFEST_FILE):
+          raise Exception("File {0} should not be read".format(path))
+        return real_open(path, *args)
+      with patch("__builtin__.open") as open_mock:
+        open_mock.side_effect = open_side_effect
+        hash_sum = resource_files_keeper.count_hash_sum(test_dir)
+      self.assertEquals(hash_sum, self.DUMMY_UNCHANGEABLE_PACKAGE_HASH)
+
+      # a new file is noticed
+      with open(os.path.join(test_dir, "new_file.sh"), "w") as fh:
+        fh.write("echo new")
+      hash_sum = resource_files_keeper.count_hash_sum(test_dir)
+      self.assertNotEquals(hash_sum, self.DUMMY_UNCHANGEABLE_PACKAGE_HASH)
+      self.assertEquals(hash_sum, ResourceFilesKeeper(self.TEST_RESOURCES_DIR, self.SOME_PATH).count_hash_sum(test_dir))
+    finally:
+      shutil.rmtree(tmp_dir)
+
+
+  def test_update_directory_archives_parallel(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      stacks_dir = os.path.join(tmp_dir, ResourceFilesKeeper.STACKS_DIR)
+      for stack_version in ["1.0", "2.0"]:
+        package_dir = os.path.join(stacks_dir, "HDP", stack_version, "services", "HIVE", ResourceFilesKeeper.PACKAGE_DIR)
+        os.makedirs(package_dir)
+        open(os.path.join(stacks_dir, "HDP", stack_version, ResourceFilesKeeper.METAINFO_XML), "w").close()
+        with open(os.path.join(package_dir, "script.py"), "w") as fh:
+          fh.write("print '{0}'".format(stack_version))
+      custom_actions_dir = os.path.join(tmp_dir, ResourceFilesKeeper.CUSTOM_ACTIONS_DIR)
+      os.makedirs(custom_actions_dir)
+      with open(os.path.join(custom_actions_dir, "action.py"), "w") as fh:
+        fh.write("pass")
+
+      resource_files_keeper = ResourceFilesKeeper(tmp_dir, stacks_dir, incremental=True, parallel_jobs=2)
+      resource_files_keeper.update_directory_archives()
+
+      for directory in [os.path.join(stacks_dir, "HDP", "1.0", "services", "HIVE", ResourceFilesKeeper.PACKAGE_DIR),
+                        os.path.join(stacks_dir, "HDP", "2.0", "services", "HIVE", ResourceFilesKeeper.PACKAGE_DIR),
+                        custom_actions_dir]:
+        self.assertEquals(resource_files_keeper.read_hash_sum(directory),
+                          ResourceFilesKeeper(tmp_dir, stacks_dir).count_hash_sum(directory))
+        archive = zipfile.ZipFile(os.path.join(directory, ResourceFilesKeeper.ARCHIVE_NAME))
+        self.assertEquals(len(archive.namelist()), 1)
+        archive.close()
+        self.assertFalse(os.path.exists(os.path.join(directory, ResourceFilesKeeper.ARCHIVE_NAME +
+                                                     ResourceFilesKeeper.TMP_FILE_SUFFIX)))
+    finally:
+      shutil.rmtree(tmp_dir)
+
+
   def test_is_ignored(self):
     resource_files_keeper = ResourceFilesKeeper(self.TEST_RESOURCES_DIR, self.DUMMY_UNCHANGEABLE_PACKAGE)
     self.assertTrue(resource_files_keeper.is_ignored(".hash"))
     self.assertTrue(resource_files_keeper.is_ignored("archive.zip"))
     self.assertTrue(resource_files_keeper.is_ignored("dummy.pyc"))
+    self.assertTrue(resource_files_keeper.is_ignored(".hash_manifest"))
+    self.assertTrue(resource_files_keeper.is_ignored("archive.zip.tmp"))
     self.assertFalse(resource_files_keeper.is_ignored("dummy.py"))
     self.assertFalse(resource_files_keeper.is_ignored("1.sh"))
     pass
@@ -630,4 +630,174 @@ class TestStackAdvisorInitialization(TestCase):
                                 {'name': 'mapreduce.map.memory.mb', 'type': 'mapred-site'},
                                 {'name': 'mapreduce.reduce.memory.mb', 'type': 'mapred-site'}]
 
-    self.assertEquals(properties_dict, expected_properties_dict)
\ No newline at end of file
+    self.assertEquals(properties_dict, expected_properties_dict)
+
+  def test_stackAdvisorCache(self):
+    import shutil
+    import tempfile
+    import time
+    path_template = os.path.join(self.test_directory, '../resources/stacks/{0}/{1}/services/stack_advisor.py')
+    setattr(self.stack_advisor, "STACK_ADVISOR_IMPL_PATH_TEMPLATE", path_template)
+    cache = self.stack_advisor.StackAdvisorCache()
+
+    first = cache.instantiateStackAdvisor("XYZ", "1.0.1", ["1.0.0"])
+    second = cache.instantiateStackAdvisor("XYZ", "1.0.1", ["1.0.0"])
+    self.assertEquals("XYZ101StackAdvisor", first.__class__.__name__)
+    # class is loaded once, but every call gets its own instance
+    self.assertTrue(first.__class__ is second.__class__)
+    self.assertFalse(first is second)
+
+    # a stack advisor file appearing in the hierarchy invalidates the cached class
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      tmp_template = os.path.join(tmp_dir, '{0}/{1}/services/stack_advisor.py')
+      for version in ["1.0.0", "1.0.1"]:
+        os.makedirs(os.path.dirname(tmp_template.format("XYZ", version)))
+      shutil.copy(path_template.format("XYZ", "1.0.0"), tmp_template.format("XYZ", "1.0.0"))
+      setattr(self.stack_advisor, "STACK_ADVISOR_IMPL_PATH_TEMPLATE", tmp_template)
+
+      parent_only = cache.instantiateStackAdvisor("XYZ", "1.0.1", ["1.0.0"])
+      self.assertEquals("XYZ100StackAdvisor", parent_only.__class__.__name__)
+      self.assertTrue(parent_only.__class__ is cache.instantiateStackAdvisor("XYZ", "1.0.1", ["1.0.0"]).__class__)
+
+      shutil.copy(path_template.format("XYZ", "1.0.1"), tmp_template.format("XYZ", "1.0.1"))
+      reloaded = cache.instantiateStackAdvisor("XYZ", "1.0.1", ["1.0.0"])
+      self.assertEquals("XYZ101StackAdvisor", reloaded.__class__.__name__)
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  WORKER_HOSTS = {"items": [{"Hosts": {"host_name": "host1"}}]}
+  WORKER_SERVICES = {"Versions": {"stack_name": "XYZ", "stack_version": "1.0.1",
+                                  "stack_hierarchy": {"stack_versions": ["1.0.0"]}},
+                     "services": [{"StackServices": {"service_name": "YARN"},
+                                   "components": [{"StackServiceComponents": {"component_name": "NODEMANAGER"}}]}]}
+
+  def test_stackAdvisorWorker(self):
+    import json
+    import shutil
+    import tempfile
+    import threading
+    path_template = os.path.join(self.test_directory, '../resources/stacks/{0}/{1}/services/stack_advisor.py')
+    setattr(self.stack_advisor, "STACK_ADVISOR_IMPL_PATH_TEMPLATE", path_template)
+
+    tmp_dir = tempfile.mkdtemp()
+    socket_file = os.path.join(tmp_dir, "stack-advisor.sock")
+    hosts = self.WORKER_HOSTS
+    services = self.WORKER_SERVICES
+
+    class TestCache(self.stack_advisor.StackAdvisorCache):
+      def instantiateStackAdvisor(self, stackName, stackVersion, parentVersions):
+        advisor = super(TestCache, self).instantiateStackAdvisor(stackName, stackVersion, parentVersions)
+        # test stack advisors do not implement the whole StackAdvisor interface
+        advisor.filterHostMounts = lambda hosts, services: hosts
+        return advisor
+
+    stop_event = threading.Event()
+    worker = threading.Thread(target=self.stack_advisor.serve, args=(socket_file,),
+                              kwargs={"cache": TestCache(), "stop_event": stop_event})
+    worker.start()
+    try:
+      for i in range(50):
+        if os.path.exists(socket_file):
+          break
+        stop_event.wait(0.1)
+
+      # the socket is never accessible to other users
+      self.assertEquals(0, os.stat(socket_file).st_mode & 0077)
+
+      response = self.stack_advisor.delegateToWorker(socket_file, "recommend-configurations", hosts, services)
+      self.assertEquals(0, response["exit_code"])
+      self.assertTrue("Returning XYZ101StackAdvisor implementation" in response["stdout"])
+      self.assertEquals("configurations.json", response["result_file"])
+      self.assertEquals("-Xmx101m", response["result"]["recommendations"]["blueprint"]["configurations"]
+                                                      ["yarn-site"]["properties"]["yarn.nodemanager.resource.memory-mb"])
+
+      response = self.stack_advisor.delegateToWorker(socket_file, "recommend-configurations", hosts, {})
+      self.assertEquals(2, response["exit_code"])
+      self.assertEquals(None, response["result"])
+    finally:
+      stop_event.set()
+      worker.join()
+      shutil.rmtree(tmp_dir)
+
+    # no worker listening - the caller falls back to running the advisor in-process
+    self.assertEquals(None, self.stack_advisor.delegateToWorker(socket_file, "recommend-configurations",
+                                                                hosts, services))
+
+  def test_stackAdvisorStreamWorker(self):
+    import json
+    from StringIO import StringIO
+    path_template = os.path.join(self.test_directory, '../resources/stacks/{0}/{1}/services/stack_advisor.py')
+    setattr(self.stack_advisor, "STACK_ADVISOR_IMPL_PATH_TEMPLATE", path_template)
+    cache = self.stack_advisor.StackAdvisorCache()
+    instantiate = cache.instantiateStackAdvisor
+
+    def instantiateStackAdvisor(stackName, stackVersion, parentVersions):
+      advisor = instantiate(stackName, stackVersion, parentVersions)
+      # test stack advisors do not implement the whole StackAdvisor interface
+      advisor.filterHostMounts = lambda hosts, services: hosts
+      return advisor
+    cache.instantiateStackAdvisor = instantiateStackAdvisor
+
+    requests = StringIO("\n".join([json.dumps({"action": "recommend-configurations",
+                                               "hosts": self.WORKER_HOSTS, "services": self.WORKER_SERVICES}),
+                                   "not json",
+                                   json.dumps({"action": "unknown-action"})]) + "\n")
+    responses = StringIO()
+    self.stack_advisor.serveStream(requests, responses, cache)
+
+    responses = [json.loads(line) for line in responses.getvalue().splitlines()]
+    self.assertEquals([0, 2, 2], [response["exit_code"] for response in responses])
+    self.assertEquals("-Xmx101m", responses[0]["result"]["recommendations"]["blueprint"]["configurations"]
+                                                 ["yarn-site"]["properties"]["yarn.nodemanager.resource.memory-mb"])
+    self.assertTrue("Malformed request" in responses[1]["stderr"])
+    self.assertTrue("Usage" in responses[2]["stderr"])
+
+  def test_stackAdvisorStreamWorkerLogger(self):
+    import json
+    import logging
+    import sys
+    from StringIO import StringIO
+    from mock.mock import patch
+    from resource_management.core.logger import Logger
+    path_template = os.path.join(self.test_directory, '../resources/stacks/{0}/{1}/services/stack_advisor.py')
+    setattr(self.stack_advisor, "STACK_ADVISOR_IMPL_PATH_TEMPLATE", path_template)
+    cache = self.stack_advisor.StackAdvisorCache()
+    instantiate = cache.instantiateStackAdvisor
+
+    def instantiateStackAdvisor(stackName, stackVersion, parentVersions):
+      advisor = instantiate(stackName, stackVersion, parentVersions)
+      advisor.filterHostMounts = lambda hosts, services: hosts
+      # as DefaultStackAdvisor.__init__ does
+      Logger.initialize_logger()
+      Logger.info("Advising {0}-{1}".format(stackName, stackVersion))
+      Logger.error("Advisor error")
+      return advisor
+    cache.instantiateStackAdvisor = instantiateStackAdvisor
+
+    request = json.dumps({"action": "recommend-configurations",
+                          "hosts": self.WORKER_HOSTS, "services": self.WORKER_SERVICES})
+    requests = StringIO(request + "\n" + request + "\n")
+    responses = StringIO()
+    resource_management_logger = logging.getLogger("resource_management")
+    # the logger is set up again by the first advisor, on the streams of the first request
+    with patch.object(Logger, "logger", None), \
+         patch.object(resource_management_logger, "handlers", []):
+      self.stack_advisor.serveStream(requests, responses, cache)
+      streams = [handler.stream for handler in resource_management_logger.handlers]
+
+    responses = [json.loads(line) for line in responses.getvalue().splitlines()]
+    self.assertEquals([0, 0], [response["exit_code"] for response in responses])
+    for response in responses:
+      self.assertEquals(1, response["stdout"].count("Advising XYZ-1.0.1"))
+      self.assertEquals(1, response["stderr"].count("Advisor error"))
+    # the handlers are back on the streams of the worker between requests
+    self.assertEquals(sorted([id(sys.stdout), id(sys.stderr)]), sorted(id(stream) for stream in streams))
+
+  def test_defaultStackAdvisorModuleLoadedOnce(self):
+    default_module = self.stack_advisor.loadDefaultStackAdvisorModule()
+    default_module.SERVICE_ADVISOR_MODULES["/some/service_advisor.py"] = "cached"
+
+    self.assertTrue(default_module is self.stack_advisor.loadDefaultStackAdvisorModule())
+    # loaded service advisors are not thrown away by a later request
+    self.assertEquals("cached", default_module.SERVICE_ADVISOR_MODULES["/some/service_advisor.py"])
@@ -103,6 +103,7 @@ class TestUpgradeHelper(TestCase):
     return resp
 
   def tearDown(self):
+    upgradeHelper.curl = self.original_curl
     sys.stdout = sys.__stdout__
 
   @patch("optparse.OptionParser")
@@ -372,9 +373,9 @@ class TestUpgradeHelper(TestCase):
       "TASKTRACKER": ["test2.host.vm"],
       "HISTORYSERVER": ["test3.host.vm"]
     }
-    SERVICE_URL_FORMAT = upgradeHelper.Options.CLUSTER_URL + '/services/{0}'
-    COMPONENT_URL_FORMAT = SERVICE_URL_FORMAT + '/components/{1}'
-    HOST_COMPONENT_URL_FORMAT = upgradeHelper.Options.CLUSTER_URL + '/hosts/{0}/host_components/{1}'
+    SERVICES_URL = upgradeHelper.Options.CLUSTER_URL + '/services'
+    COMPONENTS_URL_FORMAT = SERVICES_URL + '?ServiceInfo/service_name={0}'
+    HOSTS_URL = upgradeHelper.Options.CLUSTER_URL + '/hosts'
     service_comp = {
       "YARN": ["NODEMANAGER", "RESOURCEMANAGER", "YARN_CLIENT"],
       "MAPREDUCE2": ["HISTORYSERVER", "MAPREDUCE2_CLIENT"]}
@@ -387,32 +388,37 @@ class TestUpgradeHelper(TestCase):
     get_stack_name_mock.return_value = ""
     has_component_mock.return_value = False
     read_mapping_mock.return_value = host_mapping
-    expected_curl_args = []
+    expected_curl_args = [[
+      (SERVICES_URL,),
+      {
+        "validate": True,
+        "request_type": "POST",
+        "data": [{"ServiceInfo": {"service_name": service}} for service in service_comp.keys()]
+      }
+    ]]
 
     for service in service_comp.keys():
       expected_curl_args.append([
-        (SERVICE_URL_FORMAT.format(service),),
+        (COMPONENTS_URL_FORMAT.format(service),),
         {
           "validate": True,
-          "request_type": "POST"
+          "request_type": "POST",
+          "data": {"components": [{"ServiceComponentInfo": {"component_name": component}}
+                                  for component in service_comp[service]]}
         }
       ])
       for component in service_comp[service]:
         expected_curl_args.append([
-          (COMPONENT_URL_FORMAT.format(service, component),),
+          (HOSTS_URL,),
           {
             "validate": True,
-            "request_type": "POST"
+            "request_type": "POST",
+            "data": {
+              "RequestInfo": {"query": "Hosts/host_name.in(%s)" % ",".join(host_mapping[new_old_host_map[component]])},
+              "Body": {"host_components": [{"HostRoles": {"component_name": component}}]}
+            }
           }
         ])
-        for host in host_mapping[new_old_host_map[component]]:
-          expected_curl_args.append([
-            (HOST_COMPONENT_URL_FORMAT.format(host, component),),
-            {
-              "validate": True,
-              "request_type": "POST"
-            }
-          ])
 
     # execute testing function
     upgradeHelper.add_services()
@@ -770,6 +776,98 @@ class TestUpgradeHelper(TestCase):
     self.assertEquals(expected_result, actual_result)
     pass
 
+  @patch.object(upgradeHelper, "curl")
+  def test_build_all_options(self, curl_mock):
+    desired_configs = {
+      "core-site": {"tag": "version1"},
+      "hdfs-site": {"tag": "version2"}
+    }
+    curl_mock.return_value = {
+      "items": [
+        {"type": "core-site", "tag": "version1", "properties": {"a": "b"}},
+        {"type": "hdfs-site", "tag": "version2", "properties": {"c": "d"}},
+        {"type": "hdfs-site", "tag": "version1", "properties": {"c": "e"}}
+      ]
+    }
+
+    actual_result = upgradeHelper.build_all_options(desired_configs)
+
+    # a single request for all the config types
+    self.assertEqual(1, curl_mock.call_count)
+    self.assertEqual(upgradeHelper.Options.CLUSTER_URL +
+                     "/configurations?(type=core-site&tag=version1)|(type=hdfs-site&tag=version2)",
+                     curl_mock.call_args[0][0])
+    self.assertEqual([{"type": "core-site", "tag": "version1", "properties": {"a": "b"}},
+                      {"type": "hdfs-site", "tag": "version2", "properties": {"c": "d"}}], actual_result["items"])
+
+  @patch.object(upgradeHelper.Options, "CURL_PRINT_ONLY", new=None)
+  def test_curl_keep_alive_and_cache(self):
+    import BaseHTTPServer
+    import threading
+
+    requests = []
+    connections = set()
+
+    class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+      protocol_version = "HTTP/1.1"
+
+      def _respond(self, code, body):
+        requests.append((self.command, self.path))
+        connections.add(self.client_address)
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def do_GET(self):
+        if self.path.endswith("/missing"):
+          self._respond(404, "")
+        else:
+          self._respond(200, json.dumps({"path": self.path}))
+
+      def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._respond(201, "")
+
+      def log_message(self, *args):
+        pass
+
+    server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), StubHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    curl = self.original_curl
+    upgradeHelper.Options.api_client = upgradeHelper.ApiClient()
+    try:
+      url = "http://127.0.0.1:%d/api/v1/clusters/c1" % server.server_address[1]
+
+      self.assertEqual({"path": "/api/v1/clusters/c1/components/NAMENODE"},
+                       curl(url + "/components/NAMENODE", parse=True, cache=True))
+      self.assertEqual({"path": "/api/v1/clusters/c1/components/NAMENODE"},
+                       curl(url + "/components/NAMENODE", parse=True, cache=True))
+      self.assertEqual(1, len(requests))
+
+      # writes invalidate the memoized lookups
+      curl(url + "/services", request_type="POST", data=[{"ServiceInfo": {"service_name": "YARN"}}], validate=True)
+      curl(url + "/components/NAMENODE", parse=True, cache=True)
+      self.assertEqual(3, len(requests))
+
+      try:
+        curl(url + "/missing")
+        self.fail("should throw exception")
+      except upgradeHelper.HTTPError as e:
+        self.assertEqual(404, e.code)
+
+      self.assertEqual(4, upgradeHelper.Options.api_client.round_trips)
+      # every request went over the same connection
+      self.assertEqual(1, len(connections))
+    finally:
+      upgradeHelper.Options.api_client.close()
+      upgradeHelper.Options.api_client = None
+      server.shutdown()
+      server.server_close()
+
   @patch.object(upgradeHelper, "get_config_resp_all")
   @patch("os.mkdir")
   @patch("os.path.exists")
@@ -30,6 +30,7 @@ from resource_management.core.exceptions import Fail
 
 
 @patch.object(Script, 'format_package_name', new = MagicMock())
+@patch("resource_management.libraries.functions.jmx.JmxConnection.get_bean", new = MagicMock(return_value = None))
 class TestNamenode(RMFTestCase):
   COMMON_SERVICES_PACKAGE_DIR = "HDFS/2.1.0.2.0/package"
   STACK_VERSION = "2.0.6"
@@ -267,6 +268,22 @@ class TestNamenode(RMFTestCase):
     )
     self.assertNoMoreResources()
 
+  def test_start_default_safemode_off_from_jmx(self):
+    # patched inside the test, since the class level patch would take precedence over a method level one
+    with patch("resource_management.libraries.functions.jmx.JmxConnection.get_bean") as get_bean_mock:
+      get_bean_mock.return_value = {"Safemode": ""}
+      self.executeScript(self.COMMON_SERVICES_PACKAGE_DIR + "/scripts/namenode.py",
+                         classname = "NameNode",
+                         command = "start",
+                         config_file = "default.json",
+                         stack_version = self.STACK_VERSION,
+                         target = RMFTestCase.TARGET_COMMON_SERVICES,
+                         call_mocks = [(0,"")],
+      )
+    get_bean_mock.assert_called_with("Hadoop:service=NameNode,name=NameNodeInfo")
+    executed = [resource.name for resource in RMFTestCase.env.resource_list if resource.__class__.__name__ == 'Execute']
+    self.assertFalse([command for command in executed if "-safemode get" in command])
+
   def test_stop_default(self):
     self.executeScript(self.COMMON_SERVICES_PACKAGE_DIR + "/scripts/namenode.py",
                        classname = "NameNode",
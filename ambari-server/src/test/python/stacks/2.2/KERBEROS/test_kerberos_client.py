@@ -20,12 +20,50 @@ limitations under the License.
 import json
 from mock.mock import MagicMock, patch
 import os
+import shutil
 import sys
+import tempfile
 import use_cases
 from stacks.utils.RMFTestCase import *
+from resource_management.core.exceptions import Fail
 
 from only_for_platform import not_for_platform, PLATFORM_WINDOWS
 
+KADMIN_STUB = """
+import sys
+
+with open("%(sessions_file)s", "a") as f:
+  f.write("session\\n")
+
+print("Authenticating as principal root/admin@EXAMPLE.COM with password.")
+
+# dn already exists, broken cannot be created. Like the real kadmin.local reading
+# from stdin, the prompt is printed before the output of every query.
+while True:
+  sys.stdout.write("kadmin.local:  ")
+  line = sys.stdin.readline()
+  args = line.split()
+  if not args or args[0] == "quit":
+    break
+  principal = args[-1]
+  if args[0] == "addprinc":
+    if principal.startswith("dn/"):
+      print('add_principal: Principal or policy already exists while creating "%%s@EXAMPLE.COM".' %% principal)
+    elif principal.startswith("broken/"):
+      print('add_principal: Operation requires add privilege while creating "%%s@EXAMPLE.COM".' %% principal)
+    else:
+      print("WARNING: no policy specified for %%s@EXAMPLE.COM; defaulting to no policy" %% principal)
+      print('Principal "%%s@EXAMPLE.COM" created.' %% principal)
+  elif args[0] == "ktadd":
+    if principal.startswith("broken/"):
+      print("ktadd: Principal %%s does not exist." %% principal)
+    else:
+      open(args[2], "w").close()
+      print("Entry for principal %%s with kvno 2, encryption type aes256-cts-hmac-sha1-96 added to keytab WRFILE:%%s." %% (principal, args[2]))
+      print("Entry for principal %%s with kvno 2, encryption type des3-cbc-sha1 added to keytab WRFILE:%%s." %% (principal, args[2]))
+  sys.stdout.flush()
+"""
+
 @not_for_platform(PLATFORM_WINDOWS)
 class TestKerberosClient(RMFTestCase):
   COMMON_SERVICES_PACKAGE_DIR = "KERBEROS/1.10.3-10/package"
@@ -188,8 +226,59 @@ class TestKerberosClient(RMFTestCase):
     self.assertEqual("I'm empty", get_property_value(d, 'none', '', True, "I'm empty"))
     self.assertEqual("", get_property_value(d, 'none', '', False, "I'm empty"))
 
+  def test_create_principals_and_keytabs_single_kadmin_session(self):
+    package_dir = os.path.join(RMFTestCase._getCommonServicesFolder(), self.COMMON_SERVICES_PACKAGE_DIR)
+    scripts_dir = os.path.join(package_dir, "scripts")
+    sys.path += [scripts_dir]
+    from kerberos_common import KerberosScript
+
+    # a stub kadmin.local which answers like the real one and counts its sessions
+    stub_dir = tempfile.mkdtemp()
+    try:
+      with open(os.path.join(stub_dir, "kadmin.local"), "w") as f:
+        f.write("#!%s\n" % sys.executable)
+        f.write(KADMIN_STUB % {'sessions_file': os.path.join(stub_dir, "sessions")})
+      os.chmod(os.path.join(stub_dir, "kadmin.local"), 0755)
+
+      identities = [
+        {"principal": "nn/c6401.ambari.apache.org", "keytab_file": os.path.join(stub_dir, "nn.service.keytab")},
+        {"principal": "dn/c6401.ambari.apache.org", "keytab_file": os.path.join(stub_dir, "dn.service.keytab")},
+        {"principal": "ambari-qa@EXAMPLE.COM", "password": "secret"},
+        {"principal": "broken/c6401.ambari.apache.org", "keytab_file": os.path.join(stub_dir, "broken.keytab")},
+      ]
+
+      with patch.dict(os.environ, {"PATH": stub_dir + os.pathsep + os.environ["PATH"]}):
+        failures = KerberosScript.create_principals_and_keytabs(identities)
+
+      with open(os.path.join(stub_dir, "sessions"), "r") as f:
+        self.assertEqual(1, len(f.readlines()))
+
+      self.assertEqual(["broken/c6401.ambari.apache.org"], failures.keys())
+      self.assertTrue("does not exist" in failures["broken/c6401.ambari.apache.org"])
+      self.assertTrue(os.path.isfile(os.path.join(stub_dir, "nn.service.keytab")))
+      self.assertTrue(os.path.isfile(os.path.join(stub_dir, "dn.service.keytab")))
+    finally:
+      shutil.rmtree(stub_dir)
+
+    # output of a real kadmin.local session reading addprinc and ktadd from stdin
+    lines = [
+      'Authenticating as principal root/admin@EXAMPLE.COM with password.',
+      'kadmin.local:  WARNING: no policy specified for nn/c6401.ambari.apache.org@EXAMPLE.COM; defaulting to no policy',
+      'Principal "nn/c6401.ambari.apache.org@EXAMPLE.COM" created.',
+      'kadmin.local:  Entry for principal nn/c6401.ambari.apache.org with kvno 2, encryption type aes256-cts-hmac-sha1-96 added to keytab WRFILE:/etc/security/keytabs/nn.service.keytab.',
+      'Entry for principal nn/c6401.ambari.apache.org with kvno 2, encryption type aes128-cts-hmac-sha1-96 added to keytab WRFILE:/etc/security/keytabs/nn.service.keytab.',
+      'kadmin.local:  ',
+    ]
+    self.assertEqual(None, KerberosScript._get_kadmin_batch_failure("nn/c6401.ambari.apache.org", True, lines))
+    self.assertEqual('no keytab entries were exported',
+                     KerberosScript._get_kadmin_batch_failure("nn/c6401.ambari.apache.org", True, lines[:3]))
+
   def test_set_keytab(self):
     import base64
+    package_dir = os.path.join(RMFTestCase._getCommonServicesFolder(), self.COMMON_SERVICES_PACKAGE_DIR)
+    scripts_dir = os.path.join(package_dir, "scripts")
+    sys.path += [scripts_dir]
+    from kerberos_common import KerberosScript
 
     config_file = "stacks/2.2/configs/default.json"
     with open(config_file, "r") as f:
@@ -246,59 +335,81 @@ class TestKerberosClient(RMFTestCase):
       "principal": "ambari-qa@EXAMPLE.COM"
     })
 
-    self.executeScript(self.COMMON_SERVICES_PACKAGE_DIR + "/scripts/kerberos_client.py",
-                       classname="KerberosClient",
-                       command="set_keytab",
-                       config_dict=json_data,
-                       stack_version = self.STACK_VERSION,
-                       target = RMFTestCase.TARGET_COMMON_SERVICES
-    )
+    # the smoke user keytab is already there
+    keytab_file_matches_mock = MagicMock(side_effect=lambda path, *args: path.endswith("smokeuser.headless.keytab"))
+    with patch.object(KerberosScript, "keytab_file_matches", keytab_file_matches_mock):
+      with patch.object(KerberosScript, "write_keytab_file_atomically") as write_keytab_mock:
+        self.executeScript(self.COMMON_SERVICES_PACKAGE_DIR + "/scripts/kerberos_client.py",
+                           classname="KerberosClient",
+                           command="set_keytab",
+                           config_dict=json_data,
+                           stack_version = self.STACK_VERSION,
+                           target = RMFTestCase.TARGET_COMMON_SERVICES
+        )
 
     self.assertResourceCalled('Directory', "/etc/security/keytabs",
                               owner='root',
                               group='root',
                               mode=0755,
                               create_parents = True)
-
-    self.assertResourceCalled('File', "/etc/security/keytabs/spnego.service.keytab",
-                              owner='root',
-                              group='hadoop',
-                              mode=0440,
-                              content=CallFunctionMock(call_result=base64.b64decode("BQIAAABbAAIAC0VYQU1QTEUuQ09NAARIVFRQABdjNjU"
-                                                       "wMS5hbWJhcmkuYXBhY2hlLm9yZwAAAAFUodgKAQASAC"
-                                                       "A5N4gKUJsizCzwRD11Q/6sdZhJjlJmuuMeMKw/WefIb"
-                                                       "gAAAFMAAgALRVhBTVBMRS5DT00ABEhUVFAAF2M2NTAx"
-                                                       "LmFtYmFyaS5hcGFjaGUub3JnAAAAAVSh2AoBABAAGLA"
-                                                       "3huUxDmRK2da5Z7WPZ+zTbdnBkXCrKgAAAEsAAgALRV"
-                                                       "hBTVBMRS5DT00ABEhUVFAAF2M2NTAxLmFtYmFyaS5hc"
-                                                       "GFjaGUub3JnAAAAAVSh2AoBABcAEIT0yzbx1fnhmuaG"
-                                                       "5qtg444AAABDAAIAC0VYQU1QTEUuQ09NAARIVFRQABd"
-                                                       "jNjUwMS5hbWJhcmkuYXBhY2hlLm9yZwAAAAFUodgKAQ"
-                                                       "ADAAiov1LleuaMgwAAAEsAAgALRVhBTVBMRS5DT00AB"
-                                                       "EhUVFAAF2M2NTAxLmFtYmFyaS5hcGFjaGUub3JnAAAA"
-                                                       "AVSh2AoBABEAECBTe9uCaSiPxnoGRldhAks="))
-    )
-
-    self.assertResourceCalled('Directory', "/etc/security/keytabs",
-                              owner='root',
-                              group='root',
-                              mode=0755,
-                              create_parents = True)
-
-    self.assertResourceCalled('File', "/etc/security/keytabs/smokeuser.headless.keytab",
-                          owner='ambari-qa',
-                          group='hadoop',
-                          mode=0400,
-                          content=CallFunctionMock(call_result=base64.b64decode("BQIAAABHAAEAC0VYQU1QTEUuQ09NAAlhbWJhcmktcWEAAAA"
-                                                   "BVKHYCgEAEgAg3OBDOecGoznTHZiPwmlmK4TI6bdRdrl/6q"
-                                                   "TV8Kml2TAAAAA/AAEAC0VYQU1QTEUuQ09NAAlhbWJhcmktc"
-                                                   "WEAAAABVKHYCgEAEAAYzqEjkX/xDoO8ij0cJmc3ZG7Qfzgl"
-                                                   "/SN2AAAANwABAAtFWEFNUExFLkNPTQAJYW1iYXJpLXFhAAA"
-                                                   "AAVSh2AoBABcAEHzLG1kfqxhEoTe4erUldvQAAAAvAAEAC0"
-                                                   "VYQU1QTEUuQ09NAAlhbWJhcmktcWEAAAABVKHYCgEAAwAIO"
-                                                   "PK6UkwyUSMAAAA3AAEAC0VYQU1QTEUuQ09NAAlhbWJhcmkt"
-                                                   "cWEAAAABVKHYCgEAEQAQVqISRJwXIQnG28lI34mfeA=="))
-    )
+    self.assertNoMoreResources()
+
+    smokeuser_keytab = base64.b64decode("BQIAAABHAAEAC0VYQU1QTEUuQ09NAAlhbWJhcmktcWEAAAA"
+                                        "BVKHYCgEAEgAg3OBDOecGoznTHZiPwmlmK4TI6bdRdrl/6q"
+                                        "TV8Kml2TAAAAA/AAEAC0VYQU1QTEUuQ09NAAlhbWJhcmktc"
+                                        "WEAAAABVKHYCgEAEAAYzqEjkX/xDoO8ij0cJmc3ZG7Qfzgl"
+                                        "/SN2AAAANwABAAtFWEFNUExFLkNPTQAJYW1iYXJpLXFhAAA"
+                                        "AAVSh2AoBABcAEHzLG1kfqxhEoTe4erUldvQAAAAvAAEAC0"
+                                        "VYQU1QTEUuQ09NAAlhbWJhcmktcWEAAAABVKHYCgEAAwAIO"
+                                        "PK6UkwyUSMAAAA3AAEAC0VYQU1QTEUuQ09NAAlhbWJhcmkt"
+                                        "cWEAAAABVKHYCgEAEQAQVqISRJwXIQnG28lI34mfeA==")
+    keytab_file_matches_mock.assert_any_call("/etc/security/keytabs/smokeuser.headless.keytab", smokeuser_keytab,
+                                             'ambari-qa', 'hadoop', 0400)
+
+    spnego_keytab = base64.b64decode("BQIAAABbAAIAC0VYQU1QTEUuQ09NAARIVFRQABdjNjU"
+                                     "wMS5hbWJhcmkuYXBhY2hlLm9yZwAAAAFUodgKAQASAC"
+                                     "A5N4gKUJsizCzwRD11Q/6sdZhJjlJmuuMeMKw/WefIb"
+                                     "gAAAFMAAgALRVhBTVBMRS5DT00ABEhUVFAAF2M2NTAx"
+                                     "LmFtYmFyaS5hcGFjaGUub3JnAAAAAVSh2AoBABAAGLA"
+                                     "3huUxDmRK2da5Z7WPZ+zTbdnBkXCrKgAAAEsAAgALRV"
+                                     "hBTVBMRS5DT00ABEhUVFAAF2M2NTAxLmFtYmFyaS5hc"
+                                     "GFjaGUub3JnAAAAAVSh2AoBABcAEIT0yzbx1fnhmuaG"
+                                     "5qtg444AAABDAAIAC0VYQU1QTEUuQ09NAARIVFRQABd"
+                                     "jNjUwMS5hbWJhcmkuYXBhY2hlLm9yZwAAAAFUodgKAQ"
+                                     "ADAAiov1LleuaMgwAAAEsAAgALRVhBTVBMRS5DT00AB"
+                                     "EhUVFAAF2M2NTAxLmFtYmFyaS5hcGFjaGUub3JnAAAA"
+                                     "AVSh2AoBABEAECBTe9uCaSiPxnoGRldhAks=")
+    write_keytab_mock.assert_called_once_with("/etc/security/keytabs/spnego.service.keytab", spnego_keytab,
+                                              'root', 'hadoop', 0440)
+
+  def test_write_keytab_files(self):
+    import grp
+    import pwd
+    package_dir = os.path.join(RMFTestCase._getCommonServicesFolder(), self.COMMON_SERVICES_PACKAGE_DIR)
+    scripts_dir = os.path.join(package_dir, "scripts")
+    sys.path += [scripts_dir]
+    from kerberos_common import KerberosScript
+
+    owner = pwd.getpwuid(os.getuid()).pw_name
+    group = grp.getgrgid(os.getgid()).gr_name
+    keytab_dir = tempfile.mkdtemp()
+    try:
+      keytabs = [(os.path.join(keytab_dir, "%d.keytab" % i), "keytab %d" % i, owner, group, 0440) for i in range(10)]
+      self.assertFalse(KerberosScript.keytab_file_matches(*keytabs[0]))
+
+      KerberosScript.write_keytab_files(keytabs, max_threads=4)
+
+      for keytab in keytabs:
+        self.assertTrue(KerberosScript.keytab_file_matches(*keytab))
+      self.assertFalse(KerberosScript.keytab_file_matches(keytabs[0][0], "changed", owner, group, 0440))
+      self.assertFalse(KerberosScript.keytab_file_matches(keytabs[0][0], keytabs[0][1], owner, group, 0400))
+      # no temporary files are left behind
+      self.assertEqual(10, len(os.listdir(keytab_dir)))
+
+      self.assertRaises(Fail, KerberosScript.write_keytab_files,
+                        [(os.path.join(keytab_dir, "missing", "a.keytab"), "keytab", owner, group, 0400)])
+    finally:
+      shutil.rmtree(keytab_dir)
 
   def test_delete_keytab(self):
     config_file = "stacks/2.2/configs/default.json"
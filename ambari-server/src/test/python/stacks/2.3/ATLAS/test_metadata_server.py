@@ -163,9 +163,14 @@ class TestMetadataServer(RMFTestCase):
                                       action=['delete'],
                                       create_parents=True)
 
-      self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection vertex_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-      self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection edge_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-      self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection fulltext_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
+      self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                      content='--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tvertex_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\n'
+                                              '--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tedge_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\n'
+                                              '--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tfulltext_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\n',
+                                      mode=0600)
+      self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --batch-file /tmp/solr_cli_batch_0.[0-9]*')
+      self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                      action=['delete'])
 
   def configureResourcesCalledSecure(self):
     # Both server and client
@@ -308,14 +313,18 @@ class TestMetadataServer(RMFTestCase):
                               + kinit_path_local +" -kt /etc/security/keytabs/ambari-infra-solr.keytab infra-solr/c6401.ambari.apache.org@EXAMPLE.COM; ambari-sudo.sh curl -H 'Content-type:application/json' -d '{\"set-user-role\": {\"atlas@EXAMPLE.COM\": [\"atlas_user\", \"ranger_audit_user\", \"dev\"]}}' -s -o /dev/null -w'%{http_code}' --negotiate -u: -k http://c6401.ambari.apache.org:8886/solr/admin/authorization | grep 200",
                               logoutput = True, tries = 30, try_sleep = 10)
 
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection vertex_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection edge_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection fulltext_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-
-    self.assertResourceCalled('Execute', "ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr/configs/atlas_configs --secure-znode --jaas-file /usr/hdp/current/atlas-server/conf/atlas_jaas.conf --sasl-users atlas,infra-solr --retry 5 --interval 10")
-    self.assertResourceCalled('Execute', "ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr/collections/vertex_index --secure-znode --jaas-file /usr/hdp/current/atlas-server/conf/atlas_jaas.conf --sasl-users atlas,infra-solr --retry 5 --interval 10")
-    self.assertResourceCalled('Execute', "ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr/collections/edge_index --secure-znode --jaas-file /usr/hdp/current/atlas-server/conf/atlas_jaas.conf --sasl-users atlas,infra-solr --retry 5 --interval 10")
-    self.assertResourceCalled('Execute', "ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr/collections/fulltext_index --secure-znode --jaas-file /usr/hdp/current/atlas-server/conf/atlas_jaas.conf --sasl-users atlas,infra-solr --retry 5 --interval 10")
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    content='--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tvertex_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\t--jaas-file\t/usr/hdp/current/atlas-server/conf/atlas_jaas.conf\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tedge_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\t--jaas-file\t/usr/hdp/current/atlas-server/conf/atlas_jaas.conf\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tfulltext_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\t--jaas-file\t/usr/hdp/current/atlas-server/conf/atlas_jaas.conf\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181\t--znode\t/infra-solr/configs/atlas_configs\t--secure-znode\t--jaas-file\t/usr/hdp/current/atlas-server/conf/atlas_jaas.conf\t--sasl-users\tatlas,infra-solr\t--retry\t5\t--interval\t10\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181\t--znode\t/infra-solr/collections/vertex_index\t--secure-znode\t--jaas-file\t/usr/hdp/current/atlas-server/conf/atlas_jaas.conf\t--sasl-users\tatlas,infra-solr\t--retry\t5\t--interval\t10\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181\t--znode\t/infra-solr/collections/edge_index\t--secure-znode\t--jaas-file\t/usr/hdp/current/atlas-server/conf/atlas_jaas.conf\t--sasl-users\tatlas,infra-solr\t--retry\t5\t--interval\t10\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181\t--znode\t/infra-solr/collections/fulltext_index\t--secure-znode\t--jaas-file\t/usr/hdp/current/atlas-server/conf/atlas_jaas.conf\t--sasl-users\tatlas,infra-solr\t--retry\t5\t--interval\t10\n',
+                                    mode=0600)
+    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --batch-file /tmp/solr_cli_batch_0.[0-9]*')
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    action=['delete'])
 
   def test_configure_default(self):
     self.executeScript(self.COMMON_SERVICES_PACKAGE_DIR + "/scripts/metadata_server.py",
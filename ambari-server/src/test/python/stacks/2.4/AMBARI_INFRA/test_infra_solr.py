@@ -103,8 +103,13 @@ class TestInfraSolr(RMFTestCase):
                                 )
 
       self.assertResourceCalled('Execute', 'ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr --create-znode --retry 30 --interval 5')
-      self.assertResourceCalled('Execute', 'ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --cluster-prop --property-name urlScheme --property-value http')
-      self.assertResourceCalled('Execute', 'ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr --setup-kerberos-plugin')
+      self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                      content='--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--cluster-prop\t--property-name\turlScheme\t--property-value\thttp\n'
+                                              '--zookeeper-connect-string\tc6401.ambari.apache.org:2181\t--znode\t/infra-solr\t--setup-kerberos-plugin\n',
+                                      mode=0600)
+      self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --batch-file /tmp/solr_cli_batch_0.[0-9]*')
+      self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                      action=['delete'])
 
   def test_configure_default(self):
     self.executeScript(self.COMMON_SERVICES_PACKAGE_DIR + "/scripts/infra_solr.py",
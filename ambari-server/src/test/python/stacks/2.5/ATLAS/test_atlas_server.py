@@ -160,9 +160,14 @@ class TestAtlasServer(RMFTestCase):
     self.assertResourceCalledRegexp('^Directory$', '^/tmp/solr_config_atlas_configs_0.[0-9]*',
                                     action=['delete'],
                                     create_parents=True)
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection vertex_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection edge_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection fulltext_index --config-set atlas_configs --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    content='--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tvertex_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tedge_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tfulltext_index\t--config-set\tatlas_configs\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\n',
+                                    mode=0600)
+    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --batch-file /tmp/solr_cli_batch_0.[0-9]*')
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    action=['delete'])
 
 
   def test_configure_default(self):
@@ -84,7 +84,12 @@ class TestRangerAdmin(RMFTestCase):
     self.assertResourceCalledRegexp('^Directory$', '^/tmp/solr_config_ranger_audits_0.[0-9]*',
                                     action=['delete'],
                                     create_parents=True)
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection ranger_audits --config-set ranger_audits --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    content='--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tranger_audits\t--config-set\tranger_audits\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\n',
+                                    mode=0600)
+    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --batch-file /tmp/solr_cli_batch_0.[0-9]*')
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    action=['delete'])
 
     self.assertResourceCalled('Execute', '/usr/bin/ranger-admin-start',
       environment = {'JAVA_HOME': u'/usr/jdk64/jdk1.7.0_45'},
@@ -162,10 +167,14 @@ class TestRangerAdmin(RMFTestCase):
                                          "\'{\"set-user-role\": {\"hbase@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"nn@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"knox@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"rangerkms@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"kafka@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"hive@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"nifi@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"storm@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"], \"yarn@EXAMPLE.COM\": [\"ranger_audit_user\", \"dev\"]}}\' -s -o /dev/null -w\'%{http_code}\' --negotiate -u: -k http://c6401.ambari.apache.org:8886/solr/admin/authorization | grep 200",
                               logoutput = True, tries = 30, try_sleep = 10)
 
-    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181/infra-solr --create-collection --collection ranger_audits --config-set ranger_audits --shards 1 --replication 1 --max-shards 1 --retry 5 --interval 10')
-
-    self.assertResourceCalled('Execute','ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr/configs/ranger_audits --secure-znode --jaas-file /usr/hdp/current/ranger-admin/conf/ranger_solr_jaas.conf --sasl-users rangeradmin,infra-solr --retry 5 --interval 10')
-    self.assertResourceCalled('Execute', 'ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --zookeeper-connect-string c6401.ambari.apache.org:2181 --znode /infra-solr/collections/ranger_audits --secure-znode --jaas-file /usr/hdp/current/ranger-admin/conf/ranger_solr_jaas.conf --sasl-users rangeradmin,infra-solr --retry 5 --interval 10')
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    content='--zookeeper-connect-string\tc6401.ambari.apache.org:2181/infra-solr\t--create-collection\t--collection\tranger_audits\t--config-set\tranger_audits\t--shards\t1\t--replication\t1\t--max-shards\t1\t--retry\t5\t--interval\t10\t--no-sharding\t--jaas-file\t/usr/hdp/current/ranger-admin/conf/ranger_solr_jaas.conf\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181\t--znode\t/infra-solr/configs/ranger_audits\t--secure-znode\t--jaas-file\t/usr/hdp/current/ranger-admin/conf/ranger_solr_jaas.conf\t--sasl-users\trangeradmin,infra-solr\t--retry\t5\t--interval\t10\n'
+                                            '--zookeeper-connect-string\tc6401.ambari.apache.org:2181\t--znode\t/infra-solr/collections/ranger_audits\t--secure-znode\t--jaas-file\t/usr/hdp/current/ranger-admin/conf/ranger_solr_jaas.conf\t--sasl-users\trangeradmin,infra-solr\t--retry\t5\t--interval\t10\n',
+                                    mode=0600)
+    self.assertResourceCalledRegexp('^Execute$', '^ambari-sudo.sh JAVA_HOME=/usr/jdk64/jdk1.7.0_45 /usr/lib/ambari-infra-solr-client/solrCloudCli.sh --batch-file /tmp/solr_cli_batch_0.[0-9]*')
+    self.assertResourceCalledRegexp('^File$', '^/tmp/solr_cli_batch_0.[0-9]*',
+                                    action=['delete'])
 
     self.assertResourceCalled('Execute', '/usr/bin/ranger-admin-start',
       environment = {'JAVA_HOME': u'/usr/jdk64/jdk1.7.0_45'},
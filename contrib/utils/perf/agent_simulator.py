@@ -0,0 +1,532 @@
+#!/usr/bin/env python
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Runs thousands of logical Ambari agents inside a single process so the
+heartbeat and command dispatch paths of ambari-server can be load tested from
+one machine, without Docker or a real ambari-agent per host.
+
+Every logical agent registers, heartbeats and "executes" the commands it
+receives the way the PERF stack (FAKEHDFS, FAKEYARN, ...) does: nothing is run,
+the command is reported IN_PROGRESS and completes after a configurable latency.
+All agent state lives on a single event loop thread; the HTTP round trips are
+handed to a small pool of workers that each keep one connection open.
+
+Example:
+  python agent_simulator.py --server-url https://ambari-server:8441 \\
+    --agent-prefix perf-agent --agents-count 5000 --agent-version 2.5.0.0 \\
+    --command-latency 2 --latency-jitter 1
+"""
+
+import argparse
+import heapq
+import httplib
+import itertools
+import json
+import logging
+import Queue
+import random
+import ssl
+import sys
+import threading
+import time
+import urlparse
+
+logger = logging.getLogger("agent_simulator")
+
+REGISTER_PATH = "/agent/v1/register/{0}"
+HEARTBEAT_PATH = "/agent/v1/heartbeat/{0}"
+
+EXECUTION_COMMAND = 'EXECUTION_COMMAND'
+BACKGROUND_EXECUTION_COMMAND = 'BACKGROUND_EXECUTION_COMMAND'
+STATUS_COMMAND = 'STATUS_COMMAND'
+
+IN_PROGRESS_STATUS = 'IN_PROGRESS'
+COMPLETED_STATUS = 'COMPLETED'
+FAILED_STATUS = 'FAILED'
+
+LIVE_STATUS = "STARTED"
+DEAD_STATUS = "INSTALLED"
+
+# state a component is left in once a role command succeeds
+ROLE_COMMAND_STATES = {
+  'INSTALL': DEAD_STATUS,
+  'START': LIVE_STATUS,
+  'STOP': DEAD_STATUS,
+  'RESTART': LIVE_STATUS
+}
+
+HEARTBEAT_IDLE_INTERVAL_DEFAULT_MIN_SEC = 1
+HEARTBEAT_IDLE_INTERVAL_DEFAULT_MAX_SEC = 10
+MINIMUM_INTERVAL_BETWEEN_HEARTBEATS = 0.1
+
+DEFAULT_WORKERS = 32
+REQUEST_TIMEOUT = 60
+
+
+class EventLoop:
+  """
+  Single threaded timer loop. Callbacks are run in due time order on the thread
+  that called run(), so they never need any locking between themselves.
+  """
+
+  def __init__(self):
+    self.events = []
+    self.sequence = itertools.count()
+    self.condition = threading.Condition()
+    self.stopped = False
+
+  def call_at(self, due, callback, *args):
+    with self.condition:
+      heapq.heappush(self.events, (due, next(self.sequence), callback, args))
+      self.condition.notify()
+
+  def call_later(self, delay, callback, *args):
+    self.call_at(time.time() + delay, callback, *args)
+
+  def stop(self):
+    with self.condition:
+      self.stopped = True
+      self.condition.notify()
+
+  def run(self, duration=None):
+    deadline = time.time() + duration if duration else None
+    while True:
+      with self.condition:
+        while not self.stopped:
+          now = time.time()
+          if deadline is not None and now >= deadline:
+            return
+          if self.events and self.events[0][0] <= now:
+            break
+          timeout = self.events[0][0] - now if self.events else None
+          if deadline is not None:
+            timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+          self.condition.wait(timeout)
+        if self.stopped:
+          return
+        due, _, callback, args = heapq.heappop(self.events)
+      try:
+        callback(*args)
+      except Exception:
+        logger.exception("Event callback %s failed", callback)
+
+
+class ServerConnection:
+  """
+  Keep-alive connection to the agent endpoints of ambari-server.
+  The server certificate is not verified, same as the agent does for one-way SSL.
+  """
+
+  def __init__(self, server_url):
+    parsed = urlparse.urlparse(server_url)
+    self.secure = parsed.scheme == 'https'
+    self.host = parsed.hostname
+    self.port = parsed.port or (8441 if self.secure else 8440)
+    self.connection = None
+
+  def _connect(self):
+    if self.secure:
+      kwargs = {}
+      if hasattr(ssl, '_create_unverified_context'):
+        kwargs['context'] = ssl._create_unverified_context()
+      return httplib.HTTPSConnection(self.host, self.port, timeout=REQUEST_TIMEOUT, **kwargs)
+    return httplib.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT)
+
+  def post(self, path, data):
+    if self.connection is None:
+      self.connection = self._connect()
+    try:
+      self.connection.request('POST', path, data, {'Content-Type': 'application/json'})
+      response = self.connection.getresponse()
+      body = response.read()
+    except Exception:
+      self.close()
+      raise
+    if response.status != 200:
+      raise IOError('Request to {0} failed with {1} {2}'.format(path, response.status, response.reason))
+    return json.loads(body)
+
+  def close(self):
+    if self.connection is not None:
+      self.connection.close()
+      self.connection = None
+
+
+class SimulatedAgent:
+  """
+  State of one logical agent. Only ever touched from the event loop thread.
+  """
+
+  def __init__(self, simulator, hostname):
+    self.simulator = simulator
+    self.hostname = hostname
+    self.response_id = -1
+    self.registered = False
+    self.request_in_flight = False
+    self.heartbeat_generation = 0
+    self.last_state_timestamp = 0.0
+    self.heartbeat_interval = simulator.options.heartbeat_interval
+    # component name -> live status of the component
+    self.components = {}
+    # task id -> latest command report, completed ones are dropped once sent
+    self.reports = {}
+    self.component_statuses = []
+
+  def register(self):
+    self.registered = False
+    self.heartbeat_generation += 1
+    self.simulator.send(self, REGISTER_PATH.format(self.hostname), self.build_registration(), self.on_register)
+
+  def build_registration(self):
+    options = self.simulator.options
+    return {
+      'responseId': -1,
+      'timestamp': int(time.time() * 1000),
+      'hostname': self.hostname,
+      'currentPingPort': 8670,
+      'publicHostname': self.hostname,
+      'hardwareProfile': {
+        'hostname': self.hostname.split('.')[0],
+        'fqdn': self.hostname,
+        'architecture': 'x86_64',
+        'hardwareisa': 'x86_64',
+        'hardwaremodel': 'x86_64',
+        'kernel': 'Linux',
+        'osfamily': options.os_family,
+        'operatingsystem': options.os_family,
+        'operatingsystemrelease': options.os_release,
+        'physicalprocessorcount': 4,
+        'processorcount': 4,
+        'memorysize': 16 * 1024 * 1024,
+        'memoryfree': 8 * 1024 * 1024,
+        'memorytotal': 16 * 1024 * 1024,
+        'mounts': []
+      },
+      'agentEnv': {},
+      'agentVersion': options.agent_version,
+      'prefix': '/var/lib/ambari-agent/data'
+    }
+
+  def on_register(self, response, error):
+    if error is not None:
+      delay = random.randint(0, self.simulator.options.max_reconnect_retry_delay)
+      logger.debug("Unable to register %s (%s), retrying in %s seconds", self.hostname, error, delay)
+      self.simulator.loop.call_later(delay, self.register)
+      return
+
+    if int(response.get('exitstatus', 0)) == 1:
+      logger.error("Registration of %s refused: %s", self.hostname, response.get('log'))
+      self.simulator.stats['refused'] += 1
+      return
+
+    self.response_id = int(response['responseId'])
+    self.registered = True
+    self.simulator.stats['registrations'] += 1
+    self.add_status_commands(response.get('statusCommands', []))
+    self.schedule_heartbeat(0)
+
+  def schedule_heartbeat(self, delay):
+    """
+    Any previously scheduled heartbeat becomes stale, so completing a command
+    can pull the next heartbeat in without doubling the heartbeat rate.
+    """
+    self.heartbeat_generation += 1
+    self.simulator.loop.call_later(delay, self.heartbeat, self.heartbeat_generation)
+
+  def heartbeat(self, generation):
+    if generation != self.heartbeat_generation or not self.registered:
+      return
+    if self.request_in_flight:
+      self.schedule_heartbeat(MINIMUM_INTERVAL_BETWEEN_HEARTBEATS)
+      return
+
+    data, sent_reports, send_state = self.build_heartbeat()
+    self.simulator.send(self, HEARTBEAT_PATH.format(self.hostname), data,
+                        self.on_heartbeat, sent_reports, send_state)
+
+  def build_heartbeat(self):
+    now = time.time()
+    send_state = now - self.last_state_timestamp > self.simulator.options.state_interval
+    reports = self.reports.values()
+    heartbeat = {
+      'responseId': self.response_id,
+      'timestamp': int(now * 1000),
+      'hostname': self.hostname,
+      'nodeStatus': {'status': 'HEALTHY', 'cause': 'NONE'},
+      'recoveryTimestamp': -1,
+      'reports': reports,
+      'componentStatus': self.component_statuses
+    }
+    if send_state:
+      heartbeat['agentEnv'] = {}
+      heartbeat['mounts'] = []
+    self.component_statuses = []
+    return heartbeat, reports, send_state
+
+  def on_heartbeat(self, response, error, sent_reports, send_state):
+    if error is not None:
+      self.simulator.stats['heartbeat_failures'] += 1
+      logger.debug("Heartbeat of %s failed: %s", self.hostname, error)
+      delay = random.randint(0, self.simulator.options.max_reconnect_retry_delay)
+      self.schedule_heartbeat(delay)
+      return
+
+    self.simulator.stats['heartbeats'] += 1
+
+    if int(response.get('exitstatus', 0)) != 0 or response.get('registrationCommand') is not None:
+      logger.info("Server asked %s to register again", self.hostname)
+      self.register()
+      return
+
+    server_id = int(response['responseId'])
+    if server_id != self.response_id + 1:
+      logger.error("Error in responseId sequence of %s - registering again", self.hostname)
+      self.register()
+      return
+    self.response_id = server_id
+    if send_state:
+      self.last_state_timestamp = time.time()
+
+    # reports that were delivered and are final are not sent again
+    for report in sent_reports:
+      if report['status'] != IN_PROGRESS_STATUS and self.reports.get(report['taskId']) is report:
+        del self.reports[report['taskId']]
+
+    cluster_size = int(response.get('clusterSize', -1))
+    if cluster_size > 0:
+      self.heartbeat_interval = self.simulator.get_heartbeat_interval(cluster_size)
+
+    self.cancel_commands(response.get('cancelCommands', []))
+    self.execute_commands(response.get('executionCommands', []))
+    self.add_status_commands(response.get('statusCommands', []))
+
+    self.schedule_heartbeat(self.heartbeat_interval - MINIMUM_INTERVAL_BETWEEN_HEARTBEATS)
+
+  def execute_commands(self, commands):
+    for command in commands:
+      if command.get('commandType') not in [EXECUTION_COMMAND, BACKGROUND_EXECUTION_COMMAND]:
+        continue
+      report = self.build_report(command, IN_PROGRESS_STATUS, 777)
+      self.reports[command['taskId']] = report
+      self.simulator.stats['commands_received'] += 1
+      self.simulator.loop.call_later(self.simulator.get_command_latency(), self.complete_command, command, report)
+
+  def complete_command(self, command, in_progress_report):
+    # the command was cancelled in the meantime
+    if self.reports.get(command['taskId']) is not in_progress_report:
+      return
+
+    if random.random() < self.simulator.options.failure_rate:
+      report = self.build_report(command, FAILED_STATUS, 1)
+      self.simulator.stats['commands_failed'] += 1
+    else:
+      report = self.build_report(command, COMPLETED_STATUS, 0)
+      if command.get('roleCommand') in ROLE_COMMAND_STATES:
+        self.components[command['role']] = ROLE_COMMAND_STATES[command['roleCommand']]
+      if 'configurationTags' in command:
+        report['configurationTags'] = command['configurationTags']
+      self.simulator.stats['commands_completed'] += 1
+    self.reports[command['taskId']] = report
+
+    # like the real agent, report the result right away
+    self.schedule_heartbeat(MINIMUM_INTERVAL_BETWEEN_HEARTBEATS)
+
+  def cancel_commands(self, commands):
+    for command in commands:
+      task_id = command.get('target_task_id')
+      report = self.reports.get(task_id)
+      if report is None or report['status'] != IN_PROGRESS_STATUS:
+        continue
+      cancelled = dict(report)
+      cancelled.update({
+        'status': FAILED_STATUS,
+        'exitCode': 1,
+        'stderr': 'Command aborted. Reason: {0}'.format(command.get('reason'))
+      })
+      self.reports[task_id] = cancelled
+
+  def add_status_commands(self, commands):
+    for command in commands:
+      if command.get('commandType', STATUS_COMMAND) != STATUS_COMMAND:
+        continue
+      component = command['componentName']
+      self.component_statuses.append({
+        'componentName': component,
+        'msg': '',
+        'status': self.components.get(component, DEAD_STATUS),
+        'clusterName': command['clusterName'],
+        'serviceName': command['serviceName'],
+        'stackVersion': '',
+        'securityState': 'UNKNOWN'
+      })
+
+  def build_report(self, command, status, exit_code):
+    return {
+      'role': command['role'],
+      'actionId': command['commandId'],
+      'taskId': command['taskId'],
+      'clusterName': command['clusterName'],
+      'serviceName': command['serviceName'],
+      'roleCommand': command['roleCommand'],
+      'status': status,
+      'exitCode': exit_code,
+      'stdout': 'Simulated {0} of {1}'.format(command['roleCommand'], command['role']),
+      'stderr': 'None',
+      'structuredOut': '{}'
+    }
+
+
+class Simulator:
+  """
+  Owns the event loop, the agents and the pool of workers doing the HTTP calls.
+  """
+
+  def __init__(self, options):
+    self.options = options
+    self.loop = EventLoop()
+    self.requests = Queue.Queue()
+    self.stats = dict.fromkeys(['registrations', 'refused', 'heartbeats', 'heartbeat_failures',
+                                'commands_received', 'commands_completed', 'commands_failed'], 0)
+    self.round_trip_total = 0.0
+    self.round_trips = 0
+    self.agents = [SimulatedAgent(self, self.get_hostname(i))
+                   for i in xrange(options.start, options.start + options.agents_count)]
+
+  def get_hostname(self, index):
+    hostname = "{0}-{1}".format(self.options.agent_prefix, index)
+    if self.options.domain:
+      hostname += "." + self.options.domain
+    return hostname
+
+  def get_heartbeat_interval(self, cluster_size):
+    """
+    Same cluster size based interval as NetUtil.get_agent_heartbeat_idle_interval_sec.
+    """
+    interval = cluster_size // HEARTBEAT_IDLE_INTERVAL_DEFAULT_MAX_SEC
+    return max(HEARTBEAT_IDLE_INTERVAL_DEFAULT_MIN_SEC, min(interval, self.options.heartbeat_interval))
+
+  def get_command_latency(self):
+    return max(0.0, self.options.command_latency + random.uniform(-1, 1) * self.options.latency_jitter)
+
+  def send(self, agent, path, payload, callback, *args):
+    """
+    Serializes the payload on the loop thread and queues the POST for a worker.
+    The callback is run back on the loop thread as callback(response, error, *args).
+    """
+    agent.request_in_flight = True
+    self.requests.put((agent, path, json.dumps(payload), callback, args))
+
+  def _on_response(self, agent, callback, response, error, elapsed, args):
+    agent.request_in_flight = False
+    self.round_trip_total += elapsed
+    self.round_trips += 1
+    callback(response, error, *args)
+
+  def _worker(self):
+    connection = ServerConnection(self.options.server_url)
+    while True:
+      item = self.requests.get()
+      if item is None:
+        connection.close()
+        return
+      agent, path, data, callback, args = item
+      response, error = None, None
+      started = time.time()
+      try:
+        response = connection.post(path, data)
+      except Exception, err:
+        error = err
+      self.loop.call_later(0, self._on_response, agent, callback, response, error, time.time() - started, args)
+
+  def log_stats(self):
+    round_trip = self.round_trip_total / self.round_trips if self.round_trips else 0.0
+    logger.info("agents=%s registered=%s stats=%s pending_requests=%s avg_round_trip=%.3fs",
+                len(self.agents), len([a for a in self.agents if a.registered]), self.stats,
+                self.requests.qsize(), round_trip)
+    self.loop.call_later(self.options.report_interval, self.log_stats)
+
+  def run(self):
+    workers = []
+    for i in xrange(self.options.workers):
+      worker = threading.Thread(target=self._worker, name="agent-simulator-worker-{0}".format(i))
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+
+    # spread the registrations so the server is not hit by all of them at once
+    for i, agent in enumerate(self.agents):
+      delay = self.options.ramp_up * i / len(self.agents) if self.agents else 0
+      self.loop.call_later(delay, agent.register)
+    self.loop.call_later(self.options.report_interval, self.log_stats)
+
+    try:
+      self.loop.run(self.options.duration)
+    except KeyboardInterrupt:
+      logger.info("Interrupted")
+    finally:
+      self.loop.stop()
+      for _ in workers:
+        self.requests.put(None)
+    self.log_stats()
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Simulate many Ambari agents running the PERF stack in one process.')
+  parser.add_argument('--server-url', type=str, required=True,
+                      help='Agent endpoint of ambari-server, e.g. https://ambari-server:8441')
+  parser.add_argument('--agent-prefix', type=str, default='perf-agent',
+                      help='Prefix of the simulated host names')
+  parser.add_argument('--domain', type=str, default='',
+                      help='Domain appended to the simulated host names')
+  parser.add_argument('--start', type=int, default=1,
+                      help='Index of the first simulated host')
+  parser.add_argument('--agents-count', type=int, required=True,
+                      help='Number of agents to simulate')
+  parser.add_argument('--agent-version', type=str, required=True,
+                      help='Agent version reported at registration, must match the server')
+  parser.add_argument('--os-family', type=str, default='redhat')
+  parser.add_argument('--os-release', type=str, default='7.2')
+  parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                      help='Number of concurrent connections to the server')
+  parser.add_argument('--heartbeat-interval', type=float, default=HEARTBEAT_IDLE_INTERVAL_DEFAULT_MAX_SEC,
+                      help='Maximum number of seconds between heartbeats')
+  parser.add_argument('--state-interval', type=int, default=60,
+                      help='Seconds between heartbeats that carry the host state')
+  parser.add_argument('--command-latency', type=float, default=1.0,
+                      help='Seconds a command takes to complete')
+  parser.add_argument('--latency-jitter', type=float, default=0.0,
+                      help='Random +/- seconds added to the command latency')
+  parser.add_argument('--failure-rate', type=float, default=0.0,
+                      help='Fraction of commands that are reported as FAILED')
+  parser.add_argument('--ramp-up', type=float, default=60.0,
+                      help='Seconds over which agent registrations are spread')
+  parser.add_argument('--max-reconnect-retry-delay', type=int, default=30)
+  parser.add_argument('--report-interval', type=float, default=30.0,
+                      help='Seconds between statistics log lines')
+  parser.add_argument('--duration', type=float, default=None,
+                      help='Stop after this many seconds, run forever by default')
+  parser.add_argument('--verbose', action='store_true')
+  options = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.DEBUG if options.verbose else logging.INFO,
+                      format='%(asctime)s %(levelname)s %(message)s')
+  Simulator(options).run()
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
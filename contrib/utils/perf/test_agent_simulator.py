@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Unit tests of agent_simulator.py, run with:
+  python -m unittest test_agent_simulator
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import threading
+import time
+import unittest
+
+import agent_simulator
+
+
+class FakeLoop:
+  """
+  Runs the scheduled callbacks one by one on demand, on a virtual clock.
+  """
+
+  def __init__(self):
+    self.now = 0.0
+    self.events = []
+    self.sequence = itertools.count()
+
+  def call_later(self, delay, callback, *args):
+    heapq.heappush(self.events, (self.now + delay, next(self.sequence), callback, args))
+
+  def run_next(self):
+    self.now, _, callback, args = heapq.heappop(self.events)
+    callback(*args)
+
+
+class FakeSimulator(agent_simulator.Simulator):
+  """
+  Keeps the requests of the agents instead of sending them, until respond() is called.
+  """
+
+  def __init__(self, options):
+    agent_simulator.Simulator.__init__(self, options)
+    self.loop = FakeLoop()
+    self.sent = []
+
+  def send(self, agent, path, payload, callback, *args):
+    agent.request_in_flight = True
+    # a copy of the payload as it would have gone over the wire
+    self.sent.append((agent, path, json.loads(json.dumps(payload)), callback, args))
+
+  def run_until_sent(self):
+    while not self.sent:
+      self.loop.run_next()
+    return self.sent[0][1], self.sent[0][2]
+
+  def respond(self, response, error=None):
+    agent, path, payload, callback, args = self.sent.pop(0)
+    self._on_response(agent, callback, response, error, 0.0, args)
+
+
+def get_options(**kwargs):
+  options = argparse.Namespace(server_url='http://localhost:8440', agent_prefix='perf-agent', domain='',
+                               start=1, agents_count=1, agent_version='2.5.0.0', os_family='redhat',
+                               os_release='7.2', workers=1, heartbeat_interval=10, state_interval=60,
+                               command_latency=15.0, latency_jitter=0.0, failure_rate=0.0, ramp_up=0.0,
+                               max_reconnect_retry_delay=30, report_interval=30.0, duration=None)
+  for name, value in kwargs.items():
+    setattr(options, name, value)
+  return options
+
+
+def get_command(task_id, role_command='START'):
+  return {'commandType': agent_simulator.EXECUTION_COMMAND, 'taskId': task_id, 'commandId': '1-1',
+          'role': 'FAKENAMENODE', 'roleCommand': role_command, 'clusterName': 'perf',
+          'serviceName': 'FAKEHDFS'}
+
+
+class TestEventLoop(unittest.TestCase):
+
+  def test_due_time_order(self):
+    loop = agent_simulator.EventLoop()
+    called = []
+    now = time.time()
+    loop.call_at(now + 0.03, called.append, 'third')
+    loop.call_at(now + 0.01, called.append, 'first')
+    # same due time - run in the order they were scheduled
+    loop.call_at(now + 0.01, called.append, 'second')
+    loop.call_at(now + 0.04, loop.stop)
+    loop.call_at(now + 0.05, called.append, 'after stop')
+
+    loop.run(duration=5)
+    self.assertEqual(['first', 'second', 'third'], called)
+
+  def test_failing_callback(self):
+    loop = agent_simulator.EventLoop()
+    called = []
+
+    def fail():
+      raise ValueError("failed")
+    loop.call_later(0, fail)
+    loop.call_later(0.01, called.append, 'next')
+    loop.call_later(0.02, loop.stop)
+
+    loop.run(duration=5)
+    self.assertEqual(['next'], called)
+
+  def test_stop_from_another_thread(self):
+    loop = agent_simulator.EventLoop()
+    loop.call_later(60, loop.stop)
+    stopper = threading.Timer(0.05, loop.stop)
+    stopper.start()
+
+    started = time.time()
+    loop.run()
+    stopper.join()
+    self.assertTrue(time.time() - started < 30)
+
+  def test_duration(self):
+    loop = agent_simulator.EventLoop()
+    started = time.time()
+    loop.run(duration=0.05)
+    self.assertTrue(time.time() - started >= 0.05)
+
+
+class TestSimulatedAgent(unittest.TestCase):
+
+  def setUp(self):
+    self.simulator = FakeSimulator(get_options())
+    self.agent = self.simulator.agents[0]
+
+  def register(self):
+    self.agent.register()
+    path, payload = self.simulator.run_until_sent()
+    self.assertEqual('/agent/v1/register/perf-agent-1', path)
+    self.assertEqual('2.5.0.0', payload['agentVersion'])
+    self.simulator.respond({'responseId': 0, 'exitstatus': 0})
+    self.assertTrue(self.agent.registered)
+
+  def heartbeat(self, response):
+    path, payload = self.simulator.run_until_sent()
+    self.assertEqual('/agent/v1/heartbeat/perf-agent-1', path)
+    response['responseId'] = payload['responseId'] + 1
+    self.simulator.respond(response)
+    return payload
+
+  def test_register_heartbeat_command_complete(self):
+    self.register()
+
+    payload = self.heartbeat({'executionCommands': [get_command(1)]})
+    self.assertEqual(0, payload['responseId'])
+    self.assertEqual([], payload['reports'])
+
+    # the command is reported in progress until its latency has passed
+    payload = self.heartbeat({})
+    self.assertEqual(['IN_PROGRESS'], [report['status'] for report in payload['reports']])
+
+    payload = self.heartbeat({'statusCommands': [{'componentName': 'FAKENAMENODE', 'clusterName': 'perf',
+                                                  'serviceName': 'FAKEHDFS'}]})
+    self.assertEqual(['COMPLETED'], [report['status'] for report in payload['reports']])
+    # reported right after the completion, not at the next regular heartbeat
+    self.assertAlmostEqual(15.1, self.simulator.loop.now)
+
+    # a delivered final report is not sent again, the component is live
+    payload = self.heartbeat({})
+    self.assertEqual([], payload['reports'])
+    self.assertEqual(['STARTED'], [status['status'] for status in payload['componentStatus']])
+    self.assertEqual(1, self.simulator.stats['commands_completed'])
+    self.assertEqual(4, self.simulator.stats['heartbeats'])
+
+  def test_cancel_command(self):
+    self.register()
+    self.heartbeat({'executionCommands': [get_command(1)]})
+    self.heartbeat({'cancelCommands': [{'target_task_id': 1, 'reason': 'Stage timeout'}]})
+
+    payload = self.heartbeat({})
+    self.assertEqual(['FAILED'], [report['status'] for report in payload['reports']])
+    self.assertEqual('Command aborted. Reason: Stage timeout', payload['reports'][0]['stderr'])
+
+    # the cancelled command does not complete any more
+    payload = self.heartbeat({})
+    self.assertEqual([], payload['reports'])
+    self.assertEqual(0, self.simulator.stats['commands_completed'])
+
+  def test_register_again(self):
+    self.register()
+    self.simulator.run_until_sent()
+    self.simulator.respond({'responseId': 5})
+
+    path, payload = self.simulator.run_until_sent()
+    self.assertEqual('/agent/v1/register/perf-agent-1', path)
+    self.assertFalse(self.agent.registered)
+
+  def test_heartbeat_failure(self):
+    self.register()
+    self.simulator.run_until_sent()
+    self.simulator.respond(None, IOError('Connection refused'))
+
+    # the failed heartbeat is retried with the same response id
+    payload = self.heartbeat({})
+    self.assertEqual(0, payload['responseId'])
+    self.assertEqual(1, self.simulator.stats['heartbeat_failures'])
+
+
+if __name__ == "__main__":
+  unittest.main()